@@ -22,6 +22,7 @@ from position.controllers import positions_import_from_sample_file
 from voter.models import Voter, VoterDeviceLinkManager, VoterManager, voter_has_authority, voter_setup
 from wevote_functions.functions import convert_to_int, delete_voter_api_device_id_cookie, generate_voter_device_id, \
     get_voter_api_device_id, positive_value_exists, set_voter_api_device_id, STATE_CODE_MAP
+from wevote_functions.http_client import retrieve_http_client_statistics
 
 BALLOT_ITEMS_SYNC_URL = get_environment_variable("BALLOT_ITEMS_SYNC_URL")
 BALLOT_RETURNED_SYNC_URL = get_environment_variable("BALLOT_RETURNED_SYNC_URL")
@@ -317,8 +318,10 @@ def statistics_summary_view(request):
     google_civic_daily_summary_list = google_civic_api_counter_manager.retrieve_daily_summaries()
     vote_smart_api_counter_manager = VoteSmartApiCounterManager()
     vote_smart_daily_summary_list = vote_smart_api_counter_manager.retrieve_daily_summaries()
+    http_client_statistics_list = retrieve_http_client_statistics()
     template_values = {
         'google_civic_daily_summary_list':  google_civic_daily_summary_list,
+        'http_client_statistics_list':      http_client_statistics_list,
         'vote_smart_daily_summary_list':    vote_smart_daily_summary_list,
     }
     response = render(request, 'admin_tools/statistics_summary.html', template_values)
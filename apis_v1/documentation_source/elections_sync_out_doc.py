@@ -25,6 +25,23 @@ def elections_sync_out_doc_template_values(url_root):
             'value':        'string',  # boolean, integer, long, string
             'description':  'Although optional, We Vote is built using the json value',
         },
+        {
+            'name':         'since',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'Only return the rows changed at or after this ISO 8601 date and time. Use the '
+                            'X-Sync-Next-Since header of the last response.',
+        },
+        {
+            'name':         'after_id',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Used with page_size. Start after this row. Use the Link header of the last response.',
+        },
+        {
+            'name':         'page_size',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Return no more than this many rows. If there are more, the Link header has the URL of '
+                            'the next page.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -64,7 +81,9 @@ def elections_sync_out_doc_template_values(url_root):
         'api_response': api_response,
         'api_response_notes':
             "NOTE: Success returns a single entry in a json list, "
-            "so you need to loop through that list to get to the single election entry.",
+            "so you need to loop through that list to get to the single election entry. "
+            "The response is streamed, and gzipped if the request has \"Accept-Encoding: gzip\". Send the ETag "
+            "header back in If-None-Match to get \"304 Not Modified\" when nothing has changed.",
         'potential_status_codes_list': potential_status_codes_list,
     }
     return template_values
@@ -20,6 +20,23 @@ def positions_sync_out_doc_template_values(url_root):
         },
     ]
     optional_query_parameter_list = [
+        {
+            'name':         'since',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'Only return the rows changed at or after this ISO 8601 date and time. Use the '
+                            'X-Sync-Next-Since header of the last response.',
+        },
+        {
+            'name':         'after_id',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Used with page_size. Start after this row. Use the Link header of the last response.',
+        },
+        {
+            'name':         'page_size',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Return no more than this many rows. If there are more, the Link header has the URL of '
+                            'the next page.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -78,7 +95,8 @@ def positions_sync_out_doc_template_values(url_root):
         'optional_query_parameter_list': optional_query_parameter_list,
         'api_response': api_response,
         'api_response_notes':
-            "",
+            "The response is streamed, and gzipped if the request has \"Accept-Encoding: gzip\". Send the ETag "
+            "header back in If-None-Match to get \"304 Not Modified\" when nothing has changed.",
         'potential_status_codes_list': potential_status_codes_list,
     }
     return template_values
@@ -0,0 +1,86 @@
+# apis_v1/test_views_candidates_sync_out.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from candidate.models import CandidateCampaign
+import datetime
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+import gzip
+import json
+from wevote_functions.sync_out import parse_sync_out_since, SYNC_OUT_SINCE_OVERLAP_SECONDS
+
+
+class WeVoteAPIsV1TestsCandidatesSyncOut(TestCase):
+
+    def setUp(self):
+        self.candidates_sync_out_url = reverse("apis_v1:candidatesSyncOutView")
+        self.candidate_list = [CandidateCampaign.objects.create(
+            candidate_name='Candidate {number}'.format(number=number), google_civic_election_id='4184')
+            for number in range(5)]
+        CandidateCampaign.objects.create(candidate_name='Candidate in another election',
+                                         google_civic_election_id='4162')
+
+    def sync_out(self, **parameters):
+        parameters.setdefault('format', 'json')
+        parameters.setdefault('google_civic_election_id', 4184)
+        headers = {}
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_ACCEPT_ENCODING'):
+            if header in parameters:
+                headers[header] = parameters.pop(header)
+        return self.client.get(self.candidates_sync_out_url, parameters, **headers)
+
+    def streamed_json(self, response):
+        return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_all_candidates_for_election(self):
+        response = self.sync_out()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.has_header('X-Sync-Next-Since'))
+        self.assertEqual([one_candidate['we_vote_id'] for one_candidate in self.streamed_json(response)],
+                         [candidate.we_vote_id for candidate in self.candidate_list])
+
+        # Nothing has changed, so the same ETag gets "304 Not Modified"
+        response = self.sync_out(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.candidate_list[0].candidate_name = 'Candidate Zero'
+        self.candidate_list[0].save()
+        self.assertEqual(self.sync_out(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_since(self):
+        CandidateCampaign.objects.filter(id__in=[candidate.id for candidate in self.candidate_list[:3]]).update(
+            date_last_changed=timezone.now() - datetime.timedelta(days=7))
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        self.assertEqual([one_candidate['we_vote_id'] for one_candidate in self.streamed_json(self.sync_out(
+            since=since))], [candidate.we_vote_id for candidate in self.candidate_list[3:]])
+
+        # The next "since" goes back a little, for the rows saved by transactions that hadn't committed yet
+        response = self.sync_out(since=since)
+        sync_next_since = parse_sync_out_since(response['X-Sync-Next-Since'])
+        self.assertLessEqual(sync_next_since,
+                             timezone.now() - datetime.timedelta(seconds=SYNC_OUT_SINCE_OVERLAP_SECONDS))
+
+        response = self.sync_out(since='last tuesday')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content.decode())['status'], 'SYNC_OUT_SINCE_NOT_VALID')
+
+    def test_pages(self):
+        we_vote_id_list = []
+        parameters = {'page_size': 2}
+        for page_number in range(3):
+            response = self.sync_out(**parameters)
+            we_vote_id_list += [one_candidate['we_vote_id'] for one_candidate in self.streamed_json(response)]
+            if page_number < 2:
+                next_page_url = response['Link'][1:response['Link'].index('>')]
+                parameters['after_id'] = int(next_page_url.split('after_id=')[1].split('&')[0])
+            else:
+                self.assertFalse(response.has_header('Link'))
+        self.assertEqual(we_vote_id_list, [candidate.we_vote_id for candidate in self.candidate_list])
+
+    def test_gzip(self):
+        response = self.sync_out(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        structured_json = json.loads(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'))
+        self.assertEqual(len(structured_json), 5)
@@ -0,0 +1,77 @@
+# apis_v1/test_views_stateless_api_middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+import json
+from social.apps.django_app.default.models import UserSocialAuth
+import time
+from unittest import mock
+from voter.models import Voter
+from wevote_social.context_processors import profile_photo
+from wevote_social.middleware import SocialMiddleware
+
+
+class WeVoteAPIsV1TestsStatelessApiMiddleware(TestCase):
+
+    def setUp(self):
+        self.voter = Voter.objects.create_superuser('voter@wevote.us', 'not-a-real-password')
+        UserSocialAuth.objects.create(user=self.voter, provider='facebook', uid='4184')
+        self.client.login(email='voter@wevote.us', password='not-a-real-password')
+        response = self.client.get(reverse("apis_v1:deviceIdGenerateView"))
+        self.voter_device_id = json.loads(response.content.decode())['voter_device_id']
+        self.client.get(reverse("apis_v1:voterCreateView"), {'voter_device_id': self.voter_device_id})
+
+    def test_facebook_is_looked_up_when_used(self):
+        request = RequestFactory().get('/')
+        request.user = self.voter
+        with self.assertNumQueries(0):
+            SocialMiddleware().process_request(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(profile_photo(request)['social']['profile_photo'],
+                             'https://graph.facebook.com/4184/picture')
+        with self.assertNumQueries(0):
+            profile_photo(request)
+
+        request = RequestFactory().get('/')
+        request.user = Voter.objects.create_user('another.voter@wevote.us', password='not-a-real-password')
+        SocialMiddleware().process_request(request)
+        self.assertEqual(profile_photo(request), {})
+
+    def test_api_requests_skip_the_session(self):
+        response = self.client.get(reverse("apis_v1:voterRetrieveView"), {'voter_device_id': self.voter_device_id})
+        self.assertEqual(json.loads(response.content.decode())['voter_device_id'], self.voter_device_id)
+        for attribute_name in ('session', 'user', 'facebook'):
+            self.assertFalse(hasattr(response.wsgi_request, attribute_name), attribute_name)
+
+        # The API docs pages are rendered with the signed in user
+        response = self.client.get(reverse("apis_v1:apisIndex"))
+        self.assertEqual(response.wsgi_request.user, self.voter)
+
+    def test_benchmark_voter_api_request_overhead(self):
+        url_list = [reverse("apis_v1:voterRetrieveView"), reverse("apis_v1:voterAddressRetrieveView"),
+                    reverse("apis_v1:voterBallotItemsRetrieveView")]
+        request_count = 50
+
+        def time_requests():
+            with CaptureQueriesContext(connection) as queries:
+                start_time = time.time()
+                for number in range(request_count):
+                    self.client.get(url_list[number % len(url_list)], {'voter_device_id': self.voter_device_id})
+                seconds = time.time() - start_time
+            return seconds, len(queries)
+
+        with mock.patch('wevote_functions.middleware.stateless_api_url_regex', None):
+            seconds_with_session, queries_with_session = time_requests()
+        seconds_stateless, queries_stateless = time_requests()
+        self.assertLessEqual(queries_stateless, queries_with_session)
+
+        print("{request_count} voter API requests, signed in: with session, auth and social middleware "
+              "{seconds_with_session:.3f}s and {queries_with_session} queries, stateless {seconds_stateless:.3f}s and "
+              "{queries_stateless} queries".format(
+                  request_count=request_count, seconds_with_session=seconds_with_session,
+                  queries_with_session=queries_with_session, seconds_stateless=seconds_stateless,
+                  queries_stateless=queries_stateless))
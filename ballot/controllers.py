@@ -12,15 +12,14 @@ from django.contrib import messages
 from election.models import ElectionManager
 from exception.models import handle_exception
 from import_export_google_civic.controllers import voter_ballot_items_retrieve_from_google_civic_for_api
-import json
 from measure.models import ContestMeasureList
 from office.models import ContestOfficeListManager
 from polling_location.models import PollingLocationManager
-import requests
 from voter.models import BALLOT_ADDRESS, VoterAddressManager, \
     VoterDeviceLinkManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.sync_out import import_rows_from_master_server
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -38,20 +37,12 @@ def ballot_items_import_from_master_server(request, google_civic_election_id):
     # Request json file from We Vote servers
     messages.add_message(request, messages.INFO, "Loading Ballot Items from We Vote Master servers")
     logger.info("Loading Ballot Items from We Vote Master servers")
-    request = requests.get(BALLOT_ITEMS_SYNC_URL, params={
+    return import_rows_from_master_server(BALLOT_ITEMS_SYNC_URL, {
         "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":                   'json',
         "google_civic_election_id": google_civic_election_id,
-    })
-    structured_json = json.loads(request.text)
-    results = filter_ballot_items_structured_json_for_local_duplicates(structured_json)
-    filtered_structured_json = results['structured_json']
-    duplicates_removed = results['duplicates_removed']
-
-    import_results = ballot_items_import_from_structured_json(filtered_structured_json)
-    import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+    }, 'ballot_items_{google_civic_election_id}'.format(google_civic_election_id=google_civic_election_id),
+        filter_ballot_items_structured_json_for_local_duplicates, ballot_items_import_from_structured_json)
 
 
 def ballot_returned_import_from_master_server(request, google_civic_election_id):
@@ -63,20 +54,12 @@ def ballot_returned_import_from_master_server(request, google_civic_election_id)
     messages.add_message(request, messages.INFO, "Loading Ballot Returned entries (saved ballots, specific to one "
                                                  "location) from We Vote Master servers")
     logger.info("Loading Ballot Returned entries (saved ballots, specific to one location) from We Vote Master servers")
-    request = requests.get(BALLOT_RETURNED_SYNC_URL, params={
+    return import_rows_from_master_server(BALLOT_RETURNED_SYNC_URL, {
         "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":                   'json',
         "google_civic_election_id": google_civic_election_id,
-    })
-    structured_json = json.loads(request.text)
-    results = filter_ballot_returned_structured_json_for_local_duplicates(structured_json)
-    filtered_structured_json = results['structured_json']
-    duplicates_removed = results['duplicates_removed']
-
-    import_results = ballot_returned_import_from_structured_json(filtered_structured_json)
-    import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+    }, 'ballot_returned_{google_civic_election_id}'.format(google_civic_election_id=google_civic_election_id),
+        filter_ballot_returned_structured_json_for_local_duplicates, ballot_returned_import_from_structured_json)
 
 
 def filter_ballot_items_structured_json_for_local_duplicates(structured_json):
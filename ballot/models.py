@@ -4,14 +4,21 @@
 
 from candidate.models import CandidateCampaign
 import datetime  # Note this is importing the module. "from datetime import datetime" imports the class
-from django.db import models
-from django.db.models import F, Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Q
 from election.models import ElectionManager
 from exception.models import handle_exception, handle_record_found_more_than_one_exception
+from geoip.models import GeocodeCacheManager
 from geopy.geocoders import get_geocoder_for_service
+import hashlib
+import json
 from measure.models import ContestMeasureManager
 from office.models import ContestOfficeManager
 from polling_location.models import PollingLocationManager
+import threading
+import time
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
 
@@ -28,6 +35,30 @@ KIND_OF_BALLOT_ITEM_CHOICES = (
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# find_closest_ballot_returned searches an in-process k-d tree of BallotReturned coordinates for each
+#  (google_civic_election_id, state), instead of sorting every BallotReturned in the state by distance in the database.
+#  Each tree is built the first time it is needed. BallotReturned.save keeps the trees in this process up to date, and
+#  we rebuild a tree after this many seconds so we pick up ballots saved by other processes.
+BALLOT_RETURNED_SPATIAL_INDEX_TIMEOUT = getattr(settings, 'BALLOT_RETURNED_SPATIAL_INDEX_TIMEOUT', 600)
+ballot_returned_spatial_indexes = {}
+ballot_returned_spatial_indexes_lock = threading.Lock()
+
+# A BallotTemplate never changes once it is created (a different set of ballot items gets a different fingerprint),
+#  so we can keep its items in the Django cache for a long time
+BALLOT_TEMPLATE_CACHE_TIMEOUT = getattr(settings, 'BALLOT_TEMPLATE_CACHE_TIMEOUT', 86400)
+
+# The BallotItem fields a BallotTemplateItem keeps, and that go into the BallotTemplate fingerprint
+BALLOT_TEMPLATE_ITEM_FIELDS = [
+    'google_ballot_placement',
+    'local_ballot_order',
+    'contest_office_id',
+    'contest_office_we_vote_id',
+    'contest_measure_id',
+    'contest_measure_we_vote_id',
+    'ballot_item_display_name',
+    'measure_subtitle',
+]
+
 
 class BallotItem(models.Model):
     """
@@ -72,6 +103,8 @@ class BallotItem(models.Model):
 
     measure_subtitle = models.TextField(verbose_name="google civic referendum subtitle",
                                         null=True, blank=True, default="")
+    # Set each time this row is saved, so the ballotItemsSyncOut endpoint can send only the rows changed since a date
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True, db_index=True)
 
     def is_contest_office(self):
         if self.contest_office_id:
@@ -340,6 +373,11 @@ class BallotItemListManager(models.Model):
             if positive_value_exists(google_civic_election_id):
                 ballot_item_queryset = ballot_item_queryset.filter(google_civic_election_id=google_civic_election_id)
             ballot_item_queryset.delete()
+            voter_ballot_template_queryset = VoterBallotTemplate.objects.filter(voter_id=voter_id)
+            if positive_value_exists(google_civic_election_id):
+                voter_ballot_template_queryset = voter_ballot_template_queryset.filter(
+                    google_civic_election_id=google_civic_election_id)
+            voter_ballot_template_queryset.delete()
 
             ballot_item_list_deleted = True
             status = 'BALLOT_ITEMS_DELETED'
@@ -405,7 +443,17 @@ class BallotItemListManager(models.Model):
                 ballot_item_list_found = True
                 status = 'BALLOT_ITEMS_FOUND, retrieve_all_ballot_items_for_voter'
             else:
-                status = 'NO_BALLOT_ITEMS_FOUND_0'
+                # A voter given the ballot from a nearby address shares that BallotTemplate instead of having
+                #  their own BallotItem entries (see copy_ballot_items)
+                ballot_template_manager = BallotTemplateManager()
+                template_results = ballot_template_manager.retrieve_ballot_template_items_for_voter(
+                    voter_id, google_civic_election_id)
+                if template_results['ballot_item_list_found']:
+                    ballot_item_list = template_results['ballot_item_list']
+                    ballot_item_list_found = True
+                    status = 'BALLOT_ITEMS_FOUND_IN_BALLOT_TEMPLATE, retrieve_all_ballot_items_for_voter'
+                else:
+                    status = 'NO_BALLOT_ITEMS_FOUND_0'
         except BallotItem.DoesNotExist:
             # No ballot items found. Not a problem.
             status = 'NO_BALLOT_ITEMS_FOUND_DoesNotExist'
@@ -479,7 +527,11 @@ class BallotItemListManager(models.Model):
         return 0
 
     def copy_ballot_items(self, ballot_returned, to_voter_id):
-
+        """
+        Give this voter the ballot items from ballot_returned. Many voters share the same few ballots, so instead of
+        copying every ballot item into new entries for the voter, we point the voter to the BallotTemplate with the
+        same ballot items.
+        """
         # Get all ballot items from the reference ballot_returned
         if positive_value_exists(ballot_returned.polling_location_we_vote_id):
             retrieve_results = self.retrieve_all_ballot_items_for_polling_location(
@@ -493,16 +545,30 @@ class BallotItemListManager(models.Model):
             }
             return error_results
 
-        ballot_item_list = retrieve_results['ballot_item_list']
-        ballot_item_manager = BallotItemManager()
+        ballot_template_manager = BallotTemplateManager()
+        template_results = ballot_template_manager.retrieve_or_create_ballot_template(
+            ballot_returned.google_civic_election_id, retrieve_results['ballot_item_list'])
+        if not template_results['ballot_template_found']:
+            error_results = {
+                'ballot_returned_copied': False,
+            }
+            return error_results
+        ballot_template = template_results['ballot_template']
+
+        link_results = ballot_template_manager.update_or_create_voter_ballot_template(
+            to_voter_id, ballot_returned.google_civic_election_id, ballot_template.id)
+        if not link_results['success']:
+            error_results = {
+                'ballot_returned_copied': False,
+            }
+            return error_results
 
-        for ballot_item in ballot_item_list:
-            create_results = ballot_item_manager.update_or_create_ballot_item_for_voter(
-                to_voter_id, ballot_returned.google_civic_election_id,
-                ballot_item.google_ballot_placement,
-                ballot_item.ballot_item_display_name, ballot_item.measure_subtitle, ballot_item.local_ballot_order,
-                ballot_item.contest_office_id, ballot_item.contest_office_we_vote_id,
-                ballot_item.contest_measure_id, ballot_item.contest_measure_we_vote_id)
+        # Ballot items the voter had for this election, from another address, would hide the template
+        BallotItem.objects.filter(voter_id=to_voter_id,
+                                  google_civic_election_id=ballot_returned.google_civic_election_id).delete()
+        if ballot_returned.ballot_template_id != ballot_template.id:
+            BallotReturned.objects.filter(id=ballot_returned.id).update(ballot_template_id=ballot_template.id)
+            ballot_returned.ballot_template_id = ballot_template.id
 
         results = {
             'ballot_returned_copied': True,
@@ -617,6 +683,191 @@ class BallotItemListManager(models.Model):
         return results
 
 
+class BallotTemplate(models.Model):
+    """
+    One entry for each distinct set of ballot items in an election. Voters who get the ballot from a nearby address
+    point to a BallotTemplate (with VoterBallotTemplate) instead of getting their own copy of each BallotItem.
+    """
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", default=0, null=False)
+    # A hash of the ballot items, so voters with the same ballot share one template
+    fingerprint = models.CharField(verbose_name="hash of the ballot items", max_length=64, null=False)
+    ballot_item_count = models.PositiveIntegerField(verbose_name="number of ballot items", default=0, null=False)
+    date_created = models.DateTimeField(verbose_name='date created', null=True, auto_now_add=True)
+
+    class Meta:
+        unique_together = ('google_civic_election_id', 'fingerprint')
+
+
+class BallotTemplateItem(models.Model):
+    """
+    One ballot item in a BallotTemplate. This has the same fields as BallotItem that the ballot display uses, so it
+    can be used in place of a BallotItem.
+    """
+    ballot_template_id = models.PositiveIntegerField(verbose_name="ballot template id", null=False, db_index=True)
+    # Stored as text like BallotItem.google_civic_election_id, so the API returns the same values
+    google_civic_election_id = models.CharField(verbose_name="google civic election id", max_length=20, null=False)
+    google_ballot_placement = models.BigIntegerField(
+        verbose_name="the order this item should appear on the ballot", null=True, blank=True, unique=False)
+    local_ballot_order = models.IntegerField(
+        verbose_name="locally calculated order this item should appear on the ballot", null=True, blank=True)
+    contest_office_id = models.CharField(verbose_name="local id for this contest office", max_length=255, null=True,
+                                         blank=True)
+    contest_office_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for this office", max_length=255, default=None, null=True,
+        blank=True, unique=False)
+    contest_measure_id = models.CharField(
+        verbose_name="contest_measure unique id", max_length=255, null=True, blank=True)
+    contest_measure_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for this measure", max_length=255, default=None, null=True,
+        blank=True, unique=False)
+    ballot_item_display_name = models.CharField(verbose_name="a label we can sort by", max_length=255, null=True,
+                                                blank=True)
+    measure_subtitle = models.TextField(verbose_name="google civic referendum subtitle",
+                                        null=True, blank=True, default="")
+
+    def is_contest_office(self):
+        if self.contest_office_id:
+            return True
+        return False
+
+    def is_contest_measure(self):
+        if self.contest_measure_id:
+            return True
+        return False
+
+    def display_ballot_item(self):
+        return self.ballot_item_display_name
+
+
+class VoterBallotTemplate(models.Model):
+    """
+    The BallotTemplate a voter sees for one election
+    """
+    voter_id = models.IntegerField(verbose_name="the voter unique id", default=0, null=False, blank=False)
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", default=0, null=False)
+    ballot_template_id = models.PositiveIntegerField(verbose_name="ballot template id", null=False)
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('voter_id', 'google_civic_election_id')
+
+
+class BallotTemplateManager(models.Model):
+
+    def __unicode__(self):
+        return "BallotTemplateManager"
+
+    def calculate_ballot_template_fingerprint(self, google_civic_election_id, ballot_item_list):
+        ballot_item_values_list = sorted(
+            [[str(getattr(ballot_item, field_name)) for field_name in BALLOT_TEMPLATE_ITEM_FIELDS]
+             for ballot_item in ballot_item_list])
+        ballot_template_text = json.dumps([convert_to_int(google_civic_election_id), ballot_item_values_list])
+        return hashlib.sha256(ballot_template_text.encode('utf-8')).hexdigest()
+
+    def retrieve_or_create_ballot_template(self, google_civic_election_id, ballot_item_list):
+        """
+        Find the BallotTemplate with exactly these ballot items, or create it
+        :param ballot_item_list: BallotItem (or BallotTemplateItem) objects
+        """
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        ballot_item_list = list(ballot_item_list)
+        fingerprint = self.calculate_ballot_template_fingerprint(google_civic_election_id, ballot_item_list)
+        try:
+            ballot_template = BallotTemplate.objects.filter(google_civic_election_id=google_civic_election_id,
+                                                            fingerprint=fingerprint).first()
+            if ballot_template is not None:
+                status = 'BALLOT_TEMPLATE_FOUND'
+            else:
+                # The template and its items are saved together, so another process never sees a template without
+                #  its items
+                with transaction.atomic():
+                    ballot_template, ballot_template_created = BallotTemplate.objects.get_or_create(
+                        google_civic_election_id=google_civic_election_id, fingerprint=fingerprint,
+                        defaults={'ballot_item_count': len(ballot_item_list)})
+                    if ballot_template_created:
+                        BallotTemplateItem.objects.bulk_create([
+                            BallotTemplateItem(ballot_template_id=ballot_template.id,
+                                               google_civic_election_id=str(google_civic_election_id),
+                                               **{field_name: getattr(ballot_item, field_name)
+                                                  for field_name in BALLOT_TEMPLATE_ITEM_FIELDS})
+                            for ballot_item in ballot_item_list])
+                status = 'BALLOT_TEMPLATE_CREATED' if ballot_template_created else 'BALLOT_TEMPLATE_FOUND'
+            ballot_template_found = True
+            success = True
+        except Exception as e:
+            status = 'BALLOT_TEMPLATE_NOT_SAVED'
+            handle_exception(e, logger=logger, exception_message=status)
+            ballot_template = None
+            ballot_template_found = False
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'ballot_template_found':    ballot_template_found,
+            'ballot_template':          ballot_template,
+        }
+        return results
+
+    def update_or_create_voter_ballot_template(self, voter_id, google_civic_election_id, ballot_template_id):
+        try:
+            VoterBallotTemplate.objects.update_or_create(
+                voter_id=voter_id, google_civic_election_id=convert_to_int(google_civic_election_id),
+                defaults={'ballot_template_id': ballot_template_id})
+            success = True
+            status = 'VOTER_BALLOT_TEMPLATE_SAVED'
+        except Exception as e:
+            success = False
+            status = 'VOTER_BALLOT_TEMPLATE_NOT_SAVED'
+            handle_exception(e, logger=logger, exception_message=status)
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def delete_voter_ballot_template(self, voter_id, google_civic_election_id):
+        """
+        Call this when the voter gets their own ballot items for this election
+        """
+        VoterBallotTemplate.objects.filter(
+            voter_id=voter_id, google_civic_election_id=convert_to_int(google_civic_election_id)).delete()
+
+    def retrieve_ballot_template_items(self, ballot_template_id):
+        cache_key = 'ballot_template_items_{ballot_template_id}'.format(ballot_template_id=ballot_template_id)
+        ballot_template_item_list = cache.get(cache_key)
+        if ballot_template_item_list is None:
+            ballot_template_item_list = list(BallotTemplateItem.objects.filter(
+                ballot_template_id=ballot_template_id).order_by('local_ballot_order', 'google_ballot_placement'))
+            cache.set(cache_key, ballot_template_item_list, BALLOT_TEMPLATE_CACHE_TIMEOUT)
+        return ballot_template_item_list
+
+    def retrieve_ballot_template_items_for_voter(self, voter_id, google_civic_election_id=0):
+        """
+        :param google_civic_election_id: If 0, use the voter's most recent template
+        """
+        voter_ballot_template_query = VoterBallotTemplate.objects.filter(voter_id=voter_id)
+        if positive_value_exists(google_civic_election_id):
+            voter_ballot_template_query = voter_ballot_template_query.filter(
+                google_civic_election_id=convert_to_int(google_civic_election_id))
+        voter_ballot_template = voter_ballot_template_query.order_by('-date_last_changed').first()
+        if voter_ballot_template is None:
+            ballot_item_list = []
+        else:
+            ballot_item_list = self.retrieve_ballot_template_items(voter_ballot_template.ballot_template_id)
+
+        results = {
+            'success':                  True,
+            'status':                   'BALLOT_TEMPLATE_ITEMS_RETRIEVED',
+            'ballot_item_list_found':   True if len(ballot_item_list) else False,
+            'ballot_item_list':         ballot_item_list,
+        }
+        return results
+
+
 class BallotReturned(models.Model):
     """
     This is a generated table with a summary of address + election combinations returned ballot data
@@ -650,10 +901,23 @@ class BallotReturned(models.Model):
                                         verbose_name='normalized state returned from Google')
     normalized_zip = models.CharField(max_length=255, blank=True, null=True,
                                       verbose_name='normalized zip returned from Google')
+    # The BallotTemplate most recently shared with voters from this ballot (see BallotItemListManager.copy_ballot_items)
+    ballot_template_id = models.PositiveIntegerField(verbose_name="ballot template id", null=True, blank=True)
+    # Set each time this row is saved, so the ballotReturnedSyncOut endpoint can send only the rows changed since a date
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True, db_index=True)
 
     def election_date_text(self):
         return self.election_date.strftime('%Y-%m-%d')
 
+    def save(self, *args, **kwargs):
+        super(BallotReturned, self).save(*args, **kwargs)
+        update_ballot_returned_spatial_indexes(self)
+
+    def delete(self, *args, **kwargs):
+        ballot_returned_id = self.id
+        super(BallotReturned, self).delete(*args, **kwargs)
+        remove_from_ballot_returned_spatial_indexes(ballot_returned_id)
+
 
 class BallotReturnedManager(models.Model):
     """
@@ -894,7 +1158,7 @@ class BallotReturnedManager(models.Model):
         """
         We search for the closest address for this election in the ballot_returned table. We never have to worry
         about test elections being returned with this routine, because we don't store ballot_returned entries for
-        test elections.
+        test elections. If google_civic_election_id is 0, we search the ballots from all elections in the state.
         :param text_for_map_search:
         :param google_civic_election_id:
         :return:
@@ -902,19 +1166,30 @@ class BallotReturnedManager(models.Model):
         ballot_returned_found = False
         ballot_returned = None
 
+        # We only ask Google about addresses that aren't in the GeocodeCache yet
         google_client = get_geocoder_for_service('google')()
-        location = google_client.geocode(text_for_map_search)
-        if location is None:
+        geocode_cache_manager = GeocodeCacheManager()
+        location = geocode_cache_manager.retrieve_geocoded_location(text_for_map_search, google_client)
+        # The formatted address has format "line_1, state zip, USA"
+        address_part_list = (location['formatted_address'] or '').split(', ')
+        if not location['location_found']:
             status = 'Could not find location matching "{}"'.format(text_for_map_search)
+        elif len(address_part_list) < 2:
+            status = 'Could not find the state in "{}"'.format(location['formatted_address'])
         else:
-            address = location.address
-            # address has format "line_1, state zip, USA"
-            state = address.split(', ')[-2][:2]
-            ballot = BallotReturned.objects.\
-                filter(normalized_state=state).\
-                annotate(distance=(F('latitude') - location.latitude) ** 2 +
-                                  (F('longitude') - location.longitude) ** 2).\
-                order_by('distance').first()
+            state = address_part_list[-2][:2]
+            ballot = None
+            ballot_returned_id = find_closest_ballot_returned_id(
+                location['latitude'], location['longitude'], state, google_civic_election_id)
+            if positive_value_exists(ballot_returned_id):
+                try:
+                    ballot = BallotReturned.objects.get(id=ballot_returned_id)
+                except BallotReturned.DoesNotExist:
+                    # Deleted by another process since we built the index, so rebuild it and try again
+                    clear_ballot_returned_spatial_indexes()
+                    ballot_returned_id = find_closest_ballot_returned_id(
+                        location['latitude'], location['longitude'], state, google_civic_election_id)
+                    ballot = BallotReturned.objects.filter(id=ballot_returned_id).first()
 
             if ballot is not None:
                 ballot_returned = ballot
@@ -945,10 +1220,16 @@ class BallotReturnedManager(models.Model):
             status = 'MISSING_BALLOT_RETURNED_POLLING_LOCATION_AND_VOTER_ID-update_or_create_ballot_returned'
         else:
             try:
+                # get_or_create doesn't copy lookups like __iexact onto a new entry, so we pass them as defaults
                 ballot_returned, new_ballot_returned_created = BallotReturned.objects.get_or_create(
                     google_civic_election_id__exact=google_civic_election_id,
                     polling_location_we_vote_id__iexact=polling_location_we_vote_id,
-                    voter_id__iexact=voter_id
+                    voter_id__iexact=voter_id,
+                    defaults={
+                        'google_civic_election_id':     google_civic_election_id,
+                        'polling_location_we_vote_id':  polling_location_we_vote_id,
+                        'voter_id':                     convert_to_int(voter_id),
+                    }
                 )
 
                 if election_date is not False:
@@ -1334,3 +1615,126 @@ def copy_existing_ballot_items_from_stored_ballot(voter_id, text_for_map_search,
         'ballot_returned_copied':       True,
     }
     return results
+
+
+class BallotReturnedSpatialIndex(object):
+    """
+    A 2-d tree of (latitude, longitude, ballot_returned_id) points. We compare distances the way
+    find_closest_ballot_returned always has: the squared difference in degrees. Points added after the tree is built
+    are kept in a short list that we scan, and removed points are skipped, until the tree is rebuilt.
+    """
+    def __init__(self, point_list):
+        self.root = self.build_tree(list(point_list), 0)
+        self.point_count = len(point_list)
+        self.added_points = {}
+        self.removed_ids = set()
+        self.date_built = time.time()
+
+    def build_tree(self, point_list, axis):
+        if not point_list:
+            return None
+        point_list.sort(key=lambda point: point[axis])
+        median = len(point_list) // 2
+        next_axis = 1 - axis
+        return (point_list[median], axis,
+                self.build_tree(point_list[:median], next_axis),
+                self.build_tree(point_list[median + 1:], next_axis))
+
+    def is_stale(self):
+        if time.time() - self.date_built > BALLOT_RETURNED_SPATIAL_INDEX_TIMEOUT:
+            return True
+        # Once the extra points are a large share of the tree, scanning them costs more than a rebuild
+        return len(self.added_points) + len(self.removed_ids) > max(64, self.point_count // 8)
+
+    def add(self, ballot_returned_id, latitude, longitude):
+        self.removed_ids.add(ballot_returned_id)
+        self.added_points[ballot_returned_id] = (latitude, longitude, ballot_returned_id)
+
+    def remove(self, ballot_returned_id):
+        self.removed_ids.add(ballot_returned_id)
+        self.added_points.pop(ballot_returned_id, None)
+
+    def find_closest_id(self, latitude, longitude):
+        closest = [None, float('inf')]  # [ballot_returned_id, distance]
+        self.search_tree(self.root, (latitude, longitude), closest)
+        for point in self.added_points.values():
+            distance = (point[0] - latitude) ** 2 + (point[1] - longitude) ** 2
+            if distance < closest[1]:
+                closest[0], closest[1] = point[2], distance
+        return closest[0]
+
+    def search_tree(self, node, target, closest):
+        if node is None:
+            return
+        point, axis, left, right = node
+        if point[2] not in self.removed_ids:
+            distance = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+            if distance < closest[1]:
+                closest[0], closest[1] = point[2], distance
+        difference = target[axis] - point[axis]
+        near_branch, far_branch = (left, right) if difference < 0 else (right, left)
+        self.search_tree(near_branch, target, closest)
+        if difference ** 2 < closest[1]:
+            self.search_tree(far_branch, target, closest)
+
+
+def fetch_ballot_returned_spatial_index_keys(ballot_returned):
+    """
+    Each ballot is in the index for its election, and in the index for all elections (google_civic_election_id 0)
+    """
+    return [(convert_to_int(ballot_returned.google_civic_election_id), ballot_returned.normalized_state),
+            (0, ballot_returned.normalized_state)]
+
+
+def retrieve_ballot_returned_spatial_index(state, google_civic_election_id=0):
+    index_key = (convert_to_int(google_civic_election_id), state)
+    with ballot_returned_spatial_indexes_lock:
+        spatial_index = ballot_returned_spatial_indexes.get(index_key)
+    if spatial_index is not None and not spatial_index.is_stale():
+        return spatial_index
+
+    ballot_returned_query = BallotReturned.objects.filter(normalized_state=state)
+    if positive_value_exists(google_civic_election_id):
+        ballot_returned_query = ballot_returned_query.filter(google_civic_election_id=google_civic_election_id)
+    ballot_returned_query = ballot_returned_query.exclude(latitude=None).exclude(longitude=None)
+    spatial_index = BallotReturnedSpatialIndex(
+        ballot_returned_query.values_list('latitude', 'longitude', 'id'))
+    with ballot_returned_spatial_indexes_lock:
+        ballot_returned_spatial_indexes[index_key] = spatial_index
+    return spatial_index
+
+
+def find_closest_ballot_returned_id(latitude, longitude, state, google_civic_election_id=0):
+    """
+    :return: The id of the closest BallotReturned in this state (and election, if we have one), or 0
+    """
+    spatial_index = retrieve_ballot_returned_spatial_index(state, google_civic_election_id)
+    with ballot_returned_spatial_indexes_lock:
+        ballot_returned_id = spatial_index.find_closest_id(latitude, longitude)
+    return ballot_returned_id if ballot_returned_id is not None else 0
+
+
+def update_ballot_returned_spatial_indexes(ballot_returned):
+    """
+    Move this ballot to its current location in the indexes this process has already built. Indexes we haven't built
+    yet will read it from the database.
+    """
+    index_keys = fetch_ballot_returned_spatial_index_keys(ballot_returned)
+    has_location = ballot_returned.latitude is not None and ballot_returned.longitude is not None
+    with ballot_returned_spatial_indexes_lock:
+        for index_key, spatial_index in ballot_returned_spatial_indexes.items():
+            if has_location and index_key in index_keys:
+                spatial_index.add(ballot_returned.id, ballot_returned.latitude, ballot_returned.longitude)
+            else:
+                spatial_index.remove(ballot_returned.id)
+
+
+def remove_from_ballot_returned_spatial_indexes(ballot_returned_id):
+    with ballot_returned_spatial_indexes_lock:
+        for spatial_index in ballot_returned_spatial_indexes.values():
+            spatial_index.remove(ballot_returned_id)
+
+
+def clear_ballot_returned_spatial_indexes():
+    with ballot_returned_spatial_indexes_lock:
+        ballot_returned_spatial_indexes.clear()
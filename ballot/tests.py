@@ -1,9 +1,17 @@
 from unittest import mock
 from collections import namedtuple
+import random
+import time
 
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ballot.models import BallotReturned, BallotReturnedManager
+from ballot.models import BALLOT_TEMPLATE_ITEM_FIELDS, BallotItem, BallotItemListManager, BallotReturned, \
+    BallotReturnedManager, BallotTemplate, BallotTemplateItem, BallotTemplateManager, \
+    clear_ballot_returned_spatial_indexes, find_closest_ballot_returned_id
 
 
 Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
@@ -12,6 +20,7 @@ Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
 class BallotTestCase(TestCase):
 
     def setUp(self):
+        clear_ballot_returned_spatial_indexes()
         BallotReturned.objects.create(**{'google_civic_election_id': 4184,
                                          'latitude': 34.6604854,
                                          'longitude': -90.184124,
@@ -45,6 +54,15 @@ class BallotTestCase(TestCase):
                                       'ballot_returned_found': False,
                                       'ballot_returned': None})
 
+    def test_address_without_state(self):
+        with mock.patch('ballot.models.get_geocoder_for_service') as mock_geopy:
+            google_client = mock_geopy('google')()
+            google_client.geocode.return_value = Location(address='USA', latitude=39.8, longitude=-98.6)
+            result = self.ballot_manager.find_closest_ballot_returned('USA')
+            self.assertEqual(result, {'status': 'Could not find the state in "USA"',
+                                      'ballot_returned_found': False,
+                                      'ballot_returned': None})
+
     def test_ballot_found(self):
         ballot_in_ms = BallotReturned.objects.get()
         self.assertEqual(ballot_in_ms.normalized_state, 'MS')
@@ -81,3 +99,167 @@ class BallotTestCase(TestCase):
             self.assertEqual(result, {'status': 'Ballot returned found.',
                                       'ballot_returned_found': True,
                                       'ballot_returned': ballot_in_jackson})
+
+
+# Rough latitude and longitude bounds for a few states, so the synthetic ballots are spread across the country
+STATE_BOUNDS = {
+    'CA': (32.5, 42.0, -124.4, -114.1),
+    'MS': (30.2, 35.0, -91.6, -88.1),
+    'NY': (40.5, 45.0, -79.8, -71.9),
+    'TX': (25.8, 36.5, -106.6, -93.5),
+    'WA': (45.5, 49.0, -124.8, -116.9),
+}
+
+
+def find_closest_ballot_returned_with_database_sort(latitude, longitude, state, google_civic_election_id):
+    # How find_closest_ballot_returned worked before the spatial index
+    return BallotReturned.objects.\
+        filter(normalized_state=state, google_civic_election_id=google_civic_election_id).\
+        annotate(distance=(F('latitude') - latitude) ** 2 + (F('longitude') - longitude) ** 2).\
+        order_by('distance').first()
+
+
+class BallotReturnedSpatialIndexTestCase(TestCase):
+
+    def setUp(self):
+        clear_ballot_returned_spatial_indexes()
+        self.random = random.Random(4184)
+        ballot_returned_list = []
+        for state, (latitude_min, latitude_max, longitude_min, longitude_max) in STATE_BOUNDS.items():
+            for number in range(2000):
+                ballot_returned_list.append(BallotReturned(
+                    google_civic_election_id=4184 if number % 4 else 4162,
+                    polling_location_we_vote_id='wv01ploc{state}{number}'.format(state=state, number=number),
+                    latitude=self.random.uniform(latitude_min, latitude_max),
+                    longitude=self.random.uniform(longitude_min, longitude_max),
+                    normalized_state=state))
+        BallotReturned.objects.bulk_create(ballot_returned_list)
+
+    def random_location(self, state):
+        latitude_min, latitude_max, longitude_min, longitude_max = STATE_BOUNDS[state]
+        return self.random.uniform(latitude_min, latitude_max), self.random.uniform(longitude_min, longitude_max)
+
+    def squared_distance(self, ballot_returned_id, latitude, longitude):
+        ballot_returned = BallotReturned.objects.get(id=ballot_returned_id)
+        return (ballot_returned.latitude - latitude) ** 2 + (ballot_returned.longitude - longitude) ** 2
+
+    def test_index_matches_database_sort(self):
+        for state in STATE_BOUNDS:
+            for lookup_number in range(20):
+                latitude, longitude = self.random_location(state)
+                ballot_returned = find_closest_ballot_returned_with_database_sort(latitude, longitude, state, 4184)
+                ballot_returned_id = find_closest_ballot_returned_id(latitude, longitude, state, 4184)
+                # Compare distances, in case two ballots are the same distance away
+                self.assertAlmostEqual(self.squared_distance(ballot_returned_id, latitude, longitude),
+                                       self.squared_distance(ballot_returned.id, latitude, longitude))
+                self.assertEqual(BallotReturned.objects.get(id=ballot_returned_id).google_civic_election_id, 4184)
+
+    def test_index_follows_update_or_create_ballot_returned(self):
+        latitude, longitude = self.random_location('MS')
+        # Build the index for this election and the one for all elections, so the update has to change them in place
+        find_closest_ballot_returned_id(latitude, longitude, 'MS', 4184)
+        find_closest_ballot_returned_id(latitude, longitude, 'MS')
+        ballot_returned_manager = BallotReturnedManager()
+        ballot_returned_manager.update_or_create_ballot_returned(
+            'wv01plocnew', 0, 4184, latitude=latitude, longitude=longitude, normalized_state='MS')
+        new_ballot_returned = BallotReturned.objects.get(polling_location_we_vote_id='wv01plocnew')
+        with self.assertNumQueries(0):
+            self.assertEqual(find_closest_ballot_returned_id(latitude, longitude, 'MS', 4184), new_ballot_returned.id)
+            self.assertEqual(find_closest_ballot_returned_id(latitude, longitude, 'MS'), new_ballot_returned.id)
+
+        # Once it moves to another state, it is no longer found in Mississippi
+        ballot_returned_manager.update_or_create_ballot_returned(
+            'wv01plocnew', 0, 4184, normalized_state='AL')
+        self.assertNotEqual(find_closest_ballot_returned_id(latitude, longitude, 'MS', 4184), new_ballot_returned.id)
+
+        new_ballot_returned = BallotReturned.objects.get(polling_location_we_vote_id='wv01plocnew')
+        new_ballot_returned.normalized_state = 'MS'
+        new_ballot_returned.save()
+        self.assertEqual(find_closest_ballot_returned_id(latitude, longitude, 'MS', 4184), new_ballot_returned.id)
+        new_ballot_returned.delete()
+        self.assertNotEqual(find_closest_ballot_returned_id(latitude, longitude, 'MS', 4184), new_ballot_returned.id)
+
+    def test_benchmark_index_and_database_sort(self):
+        lookup_list = [(state,) + self.random_location(state) for state in STATE_BOUNDS for number in range(40)]
+        # Build the indexes first, like a server that has already answered a few lookups
+        for state in STATE_BOUNDS:
+            find_closest_ballot_returned_id(0, 0, state, 4184)
+
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as queries_before:
+            for state, latitude, longitude in lookup_list:
+                find_closest_ballot_returned_with_database_sort(latitude, longitude, state, 4184)
+        seconds_before = time.time() - start_time
+
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as queries_after:
+            for state, latitude, longitude in lookup_list:
+                find_closest_ballot_returned_id(latitude, longitude, state, 4184)
+        seconds_after = time.time() - start_time
+
+        print("find_closest_ballot_returned, {ballot_count} ballots, {lookup_count} lookups: "
+              "database sort {queries_before} queries {seconds_before:.3f}s, "
+              "spatial index {queries_after} queries {seconds_after:.3f}s".format(
+                  ballot_count=BallotReturned.objects.count(), lookup_count=len(lookup_list),
+                  queries_before=len(queries_before), seconds_before=seconds_before,
+                  queries_after=len(queries_after), seconds_after=seconds_after))
+        self.assertEqual(len(queries_after), 0)
+
+
+class BallotTemplateTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ballot_returned = BallotReturned.objects.create(google_civic_election_id=4184,
+                                                             polling_location_we_vote_id='wv01ploc1')
+        for number in range(1, 21):
+            BallotItem.objects.create(google_civic_election_id='4184',
+                                      polling_location_we_vote_id='wv01ploc1',
+                                      google_ballot_placement=number,
+                                      local_ballot_order=number,
+                                      contest_office_id=str(number),
+                                      contest_office_we_vote_id='wv01off{number}'.format(number=number),
+                                      ballot_item_display_name='Office {number}'.format(number=number))
+
+    def ballot_item_values(self, ballot_item_list):
+        return [[getattr(ballot_item, field_name) for field_name in ['google_civic_election_id'] +
+                 BALLOT_TEMPLATE_ITEM_FIELDS] for ballot_item in ballot_item_list]
+
+    def test_voters_share_one_ballot_template(self):
+        ballot_item_list_manager = BallotItemListManager()
+        for voter_id in (1, 2):
+            copy_results = ballot_item_list_manager.copy_ballot_items(self.ballot_returned, voter_id)
+            self.assertTrue(copy_results['ballot_returned_copied'])
+        self.assertEqual(BallotTemplate.objects.count(), 1)
+        self.assertEqual(BallotTemplateItem.objects.count(), 20)
+        self.assertEqual(BallotItem.objects.filter(voter_id__in=[1, 2]).count(), 0)
+
+        polling_location_results = ballot_item_list_manager.retrieve_all_ballot_items_for_polling_location(
+            'wv01ploc1', 4184)
+        for voter_id in (1, 2):
+            voter_results = ballot_item_list_manager.retrieve_all_ballot_items_for_voter(voter_id, 4184)
+            self.assertTrue(voter_results['ballot_item_list_found'])
+            self.assertEqual(self.ballot_item_values(voter_results['ballot_item_list']),
+                             self.ballot_item_values(polling_location_results['ballot_item_list']))
+
+    def test_voter_ballot_items_replace_ballot_template(self):
+        ballot_item_list_manager = BallotItemListManager()
+        ballot_item_list_manager.copy_ballot_items(self.ballot_returned, 1)
+        BallotTemplateManager().delete_voter_ballot_template(1, 4184)
+        BallotItem.objects.create(voter_id=1, google_civic_election_id='4184', contest_office_id='99',
+                                  contest_office_we_vote_id='wv01off99', ballot_item_display_name='Office 99')
+        voter_results = ballot_item_list_manager.retrieve_all_ballot_items_for_voter(1, 4184)
+        self.assertEqual([ballot_item.contest_office_we_vote_id for ballot_item in voter_results['ballot_item_list']],
+                         ['wv01off99'])
+
+        ballot_item_list_manager.delete_all_ballot_items_for_voter(1, 4184)
+        self.assertFalse(ballot_item_list_manager.retrieve_all_ballot_items_for_voter(1, 4184)[
+            'ballot_item_list_found'])
+
+    def test_fewer_writes_than_copying_ballot_items(self):
+        ballot_item_list_manager = BallotItemListManager()
+        ballot_item_list_manager.copy_ballot_items(self.ballot_returned, 1)
+        with CaptureQueriesContext(connection) as queries:
+            ballot_item_list_manager.copy_ballot_items(self.ballot_returned, 2)
+        # The second voter only gets a link to the existing template, not 20 new ballot items
+        self.assertLess(len(queries), 20)
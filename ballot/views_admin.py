@@ -18,10 +18,10 @@ from geopy.geocoders import get_geocoder_for_service
 from measure.models import ContestMeasure, ContestMeasureManager
 from polling_location.models import PollingLocation, PollingLocationManager
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.sync_out import sync_out_response
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -38,8 +38,7 @@ class BallotItemsSyncOutView(APIView):
         if positive_value_exists(google_civic_election_id):
             ballot_item_list = ballot_item_list.filter(google_civic_election_id=google_civic_election_id)
 
-        serializer = BallotItemSerializer(ballot_item_list, many=True)
-        return Response(serializer.data)
+        return sync_out_response(request, ballot_item_list, BallotItemSerializer, 'date_last_changed')
 
 
 # This page does not need to be protected.
@@ -54,8 +53,7 @@ class BallotReturnedSyncOutView(APIView):
         if positive_value_exists(google_civic_election_id):
             ballot_returned_list = ballot_returned_list.filter(google_civic_election_id=google_civic_election_id)
 
-        serializer = BallotReturnedSerializer(ballot_returned_list, many=True)
-        return Response(serializer.data)
+        return sync_out_response(request, ballot_returned_list, BallotReturnedSerializer, 'date_last_changed')
 
 
 @login_required
@@ -13,9 +13,9 @@ from import_export_vote_smart.controllers import retrieve_and_match_candidate_fr
 import json
 from office.models import ContestOfficeManager
 from politician.models import PoliticianManager
-import requests
 import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_functions.sync_out import import_rows_from_master_server
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -44,22 +44,13 @@ def candidates_import_from_master_server(request, google_civic_election_id=''):
     """
     messages.add_message(request, messages.INFO, "Loading Candidates from We Vote Master servers")
     logger.info("Loading Candidates from We Vote Master servers")
-    # Request json file from We Vote servers
-    request = requests.get(CANDIDATES_SYNC_URL, params={
+    # Request json file from We Vote servers, and import the candidates as they arrive
+    return import_rows_from_master_server(CANDIDATES_SYNC_URL, {
         "key": WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":   'json',
         "google_civic_election_id": google_civic_election_id,
-    })
-    structured_json = json.loads(request.text)
-
-    results = filter_candidates_structured_json_for_local_duplicates(structured_json)
-    filtered_structured_json = results['structured_json']
-    duplicates_removed = results['duplicates_removed']
-
-    import_results = candidates_import_from_structured_json(filtered_structured_json)
-    import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+    }, 'candidates_{google_civic_election_id}'.format(google_civic_election_id=google_civic_election_id),
+        filter_candidates_structured_json_for_local_duplicates, candidates_import_from_structured_json)
 
 
 def filter_candidates_structured_json_for_local_duplicates(structured_json):
@@ -456,6 +456,8 @@ class CandidateCampaign(models.Model):
     # Official Statement from Candidate in Ballot Guide
     ballot_guide_official_statement = models.TextField(verbose_name="official candidate statement from ballot guide",
                                                        null=True, blank=True, default="")
+    # Set each time this row is saved, so the candidatesSyncOut endpoint can send only the rows changed since a date
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True, db_index=True)
 
     def election(self):
         try:
@@ -23,11 +23,11 @@ from import_export_vote_smart.votesmart_local import VotesmartApiError
 from politician.models import PoliticianManager
 from position.models import PositionEntered, PositionListManager
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, \
     positive_value_exists
+from wevote_functions.sync_out import sync_out_response
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -42,8 +42,7 @@ class CandidatesSyncOutView(APIView):
         if positive_value_exists(google_civic_election_id):
             candidate_list = candidate_list.filter(google_civic_election_id=google_civic_election_id)
 
-        serializer = CandidateCampaignSerializer(candidate_list, many=True)
-        return Response(serializer.data)
+        return sync_out_response(request, candidate_list, CandidateCampaignSerializer, 'date_last_changed')
 
 
 @login_required
@@ -115,20 +115,121 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'wevote_functions.middleware.StatelessApiSessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'corsheaders.middleware.CorsPostCsrfMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'wevote_functions.middleware.StatelessApiAuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'wevote_social.middleware.SocialMiddleware',
     'wevote_social.middleware.WeVoteSocialAuthExceptionMiddleware',
+    'voter.middleware.VoterRequestCacheMiddleware',
 )
 
+# The requests whose path matches this regular expression skip the session, auth and social middleware, since the JSON
+#  APIs identify the voter with voter_device_id (see wevote_functions/middleware.py). The API docs pages still get them.
+STATELESS_API_URL_PATTERN = r'^/apis/v1/(?!docs/)'
+
+# How many seconds we keep voter_device_id -> voter lookups in the Django cache (see voter/models.py). Keep this short
+#  unless CACHES is set up with a cache that all of the workers share.
+VOTER_CACHE_TIMEOUT = 60
+
+# How many we_vote_id integers each process reserves from WeVoteSetting at a time (see wevote_settings/models.py)
+WE_VOTE_ID_BLOCK_SIZE = 100
+
+# How many seconds we keep the voterGuidesToFollow list for a ballot item in the Django cache
+#  (see voter_guide/models.py)
+VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT = 300
+
+# How many seconds we keep the organizations each voter follows or ignores in the Django cache (see follow/models.py)
+FOLLOW_ORGANIZATION_CACHE_TIMEOUT = 300
+
+# How many seconds each process keeps its index of BallotReturned locations before rebuilding it (see ballot/models.py)
+BALLOT_RETURNED_SPATIAL_INDEX_TIMEOUT = 600
+
+# How many seconds each process caches the items of a shared BallotTemplate. Templates never change once created.
+BALLOT_TEMPLATE_CACHE_TIMEOUT = 86400
+
+# The harvest_ballots_for_election command asks Google Civic for the ballot at each polling location with this many
+#  requests at once, and starts no more than this many requests each second (see import_export_google_civic)
+GOOGLE_CIVIC_HARVEST_WORKERS = 4
+GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND = 5
+# Store each ballot from Google Civic with a few bulk queries, instead of one update_or_create for each office,
+#  candidate, measure and ballot item
+GOOGLE_CIVIC_BULK_STORE = True
+
+# With the mode 'record', the ballot harvester keeps voterInfoQuery responses (gzipped) in this folder for
+#  GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT seconds. With 'replay' it only uses responses already in the folder and never
+#  asks Google. Voters' addresses are never kept (see import_export_google_civic/controllers.py)
+GOOGLE_CIVIC_RESPONSE_CACHE_MODE = 'off'
+GOOGLE_CIVIC_RESPONSE_CACHE_PATH = os.path.join(BASE_DIR, 'import_export_google_civic', 'import_data',
+                                                'voter_info_cache')
+GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT = 21600
+# Each process counts calls to the Google Civic API in memory, and saves them along with the daily and weekly
+#  summaries once it has this many, or the oldest is this many seconds old (see import_export_google_civic/models.py)
+GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE = 50
+GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS = 60
+
+# Addresses are geocoded with this geopy service (or the dotted path to a geocoder class), and the results are kept in
+#  GeocodeCache. The save_ballot_coordinates command geocodes this many addresses at once, and starts no more than
+#  this many requests each second (see geoip/models.py)
+GEOCODER_BACKEND = 'google'
+GEOCODE_WORKERS = 4
+GEOCODE_REQUESTS_PER_SECOND = 10
+
+# Requests to other servers (see wevote_functions/http_client.py) give up after these many seconds waiting to connect,
+#  or waiting for more of the response. Connection errors, time outs and server errors are tried again this many
+#  times, waiting a random time of up to HTTP_CLIENT_RETRY_BACKOFF_SECONDS, doubling with each try. We keep up to
+#  HTTP_CLIENT_POOL_CONNECTIONS_PER_HOST connections open to each of HTTP_CLIENT_POOL_HOSTS hosts.
+HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS = 5
+HTTP_CLIENT_READ_TIMEOUT_SECONDS = 60
+HTTP_CLIENT_MAXIMUM_RETRIES = 3
+HTTP_CLIENT_RETRY_BACKOFF_SECONDS = 0.5
+HTTP_CLIENT_POOL_HOSTS = 20
+HTTP_CLIENT_POOL_CONNECTIONS_PER_HOST = 10
+
+# The *SyncOut endpoints read this many rows from the database at a time. When importing from the We Vote master
+#  server, we ask only for the rows changed since the last complete import (see wevote_functions/sync_out.py)
+SYNC_OUT_ROWS_PER_QUERY = 1000
+MASTER_SERVER_SYNC_DELTA = True
+# X-Sync-Next-Since is this many seconds before the response started, so rows saved by transactions that were still
+#  open at that moment are sent again with the next delta
+SYNC_OUT_SINCE_OVERLAP_SECONDS = 300
+
+# The update_search_indexes command reads this many rows from the database at a time, and sends this many documents
+#  to Elastic Search in each bulk request (see search/controllers.py)
+SEARCH_INDEX_ROWS_PER_FETCH = 2000
+SEARCH_INDEX_BULK_CHUNK_SIZE = 500
+# Without ELASTIC_SEARCH_CONNECTION_STRING, searchAll uses an index each process keeps in memory. It reloads the
+#  objects saved by other processes every LOCAL_SEARCH_INDEX_REFRESH_SECONDS, and is rebuilt after
+#  LOCAL_SEARCH_INDEX_TIMEOUT seconds (see search/models.py)
+LOCAL_SEARCH_INDEX_REFRESH_SECONDS = 60
+LOCAL_SEARCH_INDEX_TIMEOUT = 86400
+# Building the index also removes the SearchIndexChange entries older than this many seconds
+SEARCH_INDEX_CHANGE_RETENTION_SECONDS = 604800
+
+# When scraping organization and candidate websites for social media handles, we fetch this many pages at once, wait
+#  this many seconds between requests to the same host, stop reading each page after this many bytes, and save what we
+#  find this many at a time (see import_export_twitter/controllers.py)
+SOCIAL_MEDIA_SCRAPE_WORKERS = 8
+SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST = 1
+SOCIAL_MEDIA_SCRAPE_MAXIMUM_BYTES = 1048576
+SOCIAL_MEDIA_SCRAPE_SAVE_BATCH_SIZE = 100
+
+# How many processes the transfer_vote_smart_ratings_to_positions command uses to turn the Vote Smart ratings of an
+#  election's candidates into positions (see import_export_vote_smart/controllers.py)
+VOTE_SMART_TRANSFER_WORKERS = 4
+# How many candidates we ask Vote Smart for the ratings of at the same time
+VOTE_SMART_RATINGS_RETRIEVE_WORKERS = 4
+# We count our Vote Smart API calls in memory, and save the counts every so many calls or seconds
+#  (see import_export_vote_smart/models.py)
+VOTE_SMART_API_COUNTER_FLUSH_SIZE = 50
+VOTE_SMART_API_COUNTER_FLUSH_SECONDS = 60
+
 AUTHENTICATION_BACKENDS = (
     'social.backends.facebook.FacebookOAuth2',
     'social.backends.google.GoogleOAuth2',
@@ -348,3 +449,7 @@ if os.path.exists(os.path.join(GEOIP_PATH, 'GeoIPCity.dat')):
     GEOIP_CITY = 'GeoIPCity.dat'  # use the paid db
 else:
     GEOIP_CITY = 'GeoLiteCity.dat'  # use the free db
+# Each process remembers the GeoIP location of this many IPv4 /24 prefixes, and checks this often whether
+#  update_geoip_data has replaced the database (see geoip/controllers.py)
+GEOIP_IP_PREFIX_CACHE_SIZE = 10000
+GEOIP_DATABASE_CHECK_SECONDS = 60
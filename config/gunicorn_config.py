@@ -0,0 +1,12 @@
+# config/gunicorn_config.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# Server hooks for gunicorn (see Procfile)
+
+
+def worker_exit(server, worker):
+    # Save what this worker has counted in memory (ex/ calls to the Google Civic API), since a worker stopped by the
+    #  arbiter doesn't always run atexit
+    from wevote_functions.functions import flush_buffered_counters
+    flush_buffered_counters()
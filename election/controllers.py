@@ -7,9 +7,9 @@ from config.base import get_environment_variable
 from import_export_google_civic.controllers import retrieve_from_google_civic_api_election_query, \
     store_results_from_google_civic_api_election_query
 import json
-import requests
 import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_functions.sync_out import import_rows_from_master_server
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -54,13 +54,10 @@ def elections_import_from_master_server(request=None):
     """
     # Request json file from We Vote servers
     logger.info("Loading Election from We Vote Master servers")
-    request = requests.get(ELECTIONS_SYNC_URL, params={
+    return import_rows_from_master_server(ELECTIONS_SYNC_URL, {
         "key":      WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":   'json',
-    })
-    structured_json = json.loads(request.text)
-
-    return elections_import_from_structured_json(structured_json)
+    }, 'elections', None, elections_import_from_structured_json)
 
 
 def elections_import_from_structured_json(structured_json):
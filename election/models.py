@@ -51,6 +51,8 @@ class Election(models.Model):
     # The state code for the election. This is not directly provided from Google Civic, but useful when we are
     # entering elections manually.
     state_code = models.CharField(verbose_name="state code for the election", max_length=2, null=True, blank=True)
+    # Set each time this row is saved, so the electionsSyncOut endpoint can send only the rows changed since a date
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True, db_index=True)
 
     def get_election_state(self):
         if positive_value_exists(self.state_code):
@@ -28,6 +28,7 @@ from rest_framework.response import Response
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, get_voter_device_id, positive_value_exists
+from wevote_functions.sync_out import sync_out_response
 from wevote_settings.models import fetch_next_we_vote_election_id_integer
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -39,6 +40,8 @@ def election_all_ballots_retrieve_view(request, election_local_id=0):
     Reach out to Google and retrieve (for one election):
     1) Polling locations (so we can use those addresses to retrieve a representative set of ballots)
     2) Cycle through a portion of those polling locations, enough that we are caching all of the possible ballot items
+    This runs inside one request, one polling location at a time. For a large state, use the
+    harvest_ballots_for_election management command instead, which makes several requests at once and can resume.
     :param request:
     :return:
     """
@@ -359,8 +362,7 @@ class ElectionsSyncOutView(APIView):
             return HttpResponse(json.dumps(json_data), content_type='application/json')
         else:
             election_list = results['election_list']
-            serializer = ElectionSerializer(election_list, many=True)
-            return Response(serializer.data)
+            return sync_out_response(request, election_list, ElectionSerializer, 'date_last_changed')
 
 
 # This page does not need to be protected.
@@ -2,12 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from exception.models import handle_record_found_more_than_one_exception,\
     handle_record_not_found_exception, handle_record_not_saved_exception
 from organization.models import OrganizationManager
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import convert_to_int, generate_chunks, positive_value_exists
 from voter.models import VoterManager
 
 
@@ -22,6 +24,12 @@ FOLLOWING_CHOICES = (
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# The organizations a voter follows or ignores are checked on almost every ballot, position list and voter guide call,
+#  so we keep them in the Django cache as frozensets (see FollowOrganizationList.retrieve_follow_organization_sets).
+#  Saving a FollowOrganization clears the voter's entry, but unless CACHES points to a cache shared by all of the
+#  workers, only in the worker that made the change.
+FOLLOW_ORGANIZATION_CACHE_TIMEOUT = getattr(settings, 'FOLLOW_ORGANIZATION_CACHE_TIMEOUT', 300)
+
 
 class FollowOrganization(models.Model):
     # We are relying on built-in Python id field
@@ -66,6 +74,14 @@ class FollowOrganization(models.Model):
             return True
         return False
 
+    def save(self, *args, **kwargs):
+        super(FollowOrganization, self).save(*args, **kwargs)
+        delete_cached_follow_organization_sets(self.voter_id)
+
+    def delete(self, *args, **kwargs):
+        super(FollowOrganization, self).delete(*args, **kwargs)
+        delete_cached_follow_organization_sets(self.voter_id)
+
 
 class FollowOrganizationManager(models.Model):
 
@@ -301,30 +317,74 @@ class FollowOrganizationList(models.Model):
             return follow_organization_list
 
     def retrieve_follow_organization_by_voter_id_simple_id_array(self, voter_id, return_we_vote_id=False):
-        follow_organization_list_manager = FollowOrganizationList()
-        follow_organization_list = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id(voter_id)
-        follow_organization_list_simple_array = []
-        if len(follow_organization_list):
-            for follow_organization in follow_organization_list:
-                if return_we_vote_id:
-                    follow_organization_list_simple_array.append(follow_organization.organization_we_vote_id)
-                else:
-                    follow_organization_list_simple_array.append(follow_organization.organization_id)
-        return follow_organization_list_simple_array
+        follow_organization_sets = self.retrieve_follow_organization_sets(voter_id)
+        if return_we_vote_id:
+            return list(follow_organization_sets['following_we_vote_ids'])
+        else:
+            return list(follow_organization_sets['following_ids'])
 
     def retrieve_ignore_organization_by_voter_id_simple_id_array(self, voter_id, return_we_vote_id=False):
-        follow_organization_list_manager = FollowOrganizationList()
-        ignore_organization_list = \
-            follow_organization_list_manager.retrieve_ignore_organization_by_voter_id(voter_id)
-        ignore_organization_list_simple_array = []
-        if len(ignore_organization_list):
-            for ignore_organization in ignore_organization_list:
-                if return_we_vote_id:
-                    ignore_organization_list_simple_array.append(ignore_organization.organization_we_vote_id)
-                else:
-                    ignore_organization_list_simple_array.append(ignore_organization.organization_id)
-        return ignore_organization_list_simple_array
+        follow_organization_sets = self.retrieve_follow_organization_sets(voter_id)
+        if return_we_vote_id:
+            return list(follow_organization_sets['ignoring_we_vote_ids'])
+        else:
+            return list(follow_organization_sets['ignoring_ids'])
+
+    def retrieve_follow_organization_sets(self, voter_id):
+        """
+        The organizations this voter follows and ignores, for fast "in" checks
+        :return: dict with the frozensets following_ids, following_we_vote_ids, ignoring_ids and ignoring_we_vote_ids
+        """
+        voter_id = convert_to_int(voter_id)
+        follow_organization_sets_by_voter_id = self.retrieve_follow_organization_sets_for_voter_id_list([voter_id])
+        return follow_organization_sets_by_voter_id.get(voter_id, create_empty_follow_organization_sets())
+
+    def retrieve_follow_organization_sets_for_voter_id_list(self, voter_id_list):
+        """
+        Load the follow and ignore sets for many voters at once, for batch jobs. Voters found in the cache are not
+        queried again, and the rest are retrieved with one query for every 500 voters.
+        :return: dict of voter_id -> the same dict retrieve_follow_organization_sets returns
+        """
+        voter_id_set = set(convert_to_int(voter_id) for voter_id in voter_id_list if positive_value_exists(voter_id))
+        cache_key_to_voter_id = {fetch_follow_organization_sets_cache_key(voter_id): voter_id
+                                 for voter_id in voter_id_set}
+        follow_organization_sets_by_voter_id = {}
+        for cache_key, follow_organization_sets in cache.get_many(list(cache_key_to_voter_id.keys())).items():
+            follow_organization_sets_by_voter_id[cache_key_to_voter_id[cache_key]] = follow_organization_sets
+
+        voter_ids_not_cached = [voter_id for voter_id in voter_id_set
+                                if voter_id not in follow_organization_sets_by_voter_id]
+        for voter_id_chunk in generate_chunks(voter_ids_not_cached):
+            sets_by_voter_id = {voter_id: {'following_ids': set(), 'following_we_vote_ids': set(),
+                                           'ignoring_ids': set(), 'ignoring_we_vote_ids': set()}
+                                for voter_id in voter_id_chunk}
+            try:
+                follow_organization_query = FollowOrganization.objects.filter(
+                    voter_id__in=voter_id_chunk, following_status__in=(FOLLOWING, FOLLOW_IGNORE))
+                follow_organization_query = follow_organization_query.values_list(
+                    'voter_id', 'organization_id', 'organization_we_vote_id', 'following_status')
+                for voter_id, organization_id, organization_we_vote_id, following_status in follow_organization_query:
+                    one_voter_sets = sets_by_voter_id[voter_id]
+                    if following_status == FOLLOWING:
+                        one_voter_sets['following_ids'].add(organization_id)
+                        if positive_value_exists(organization_we_vote_id):
+                            one_voter_sets['following_we_vote_ids'].add(organization_we_vote_id)
+                    else:
+                        one_voter_sets['ignoring_ids'].add(organization_id)
+                        if positive_value_exists(organization_we_vote_id):
+                            one_voter_sets['ignoring_we_vote_ids'].add(organization_we_vote_id)
+            except Exception as e:
+                handle_record_not_found_exception(e, logger=logger)
+                continue
+
+            sets_to_cache = {}
+            for voter_id, one_voter_sets in sets_by_voter_id.items():
+                one_voter_sets = {set_name: frozenset(set_values) for set_name, set_values in one_voter_sets.items()}
+                follow_organization_sets_by_voter_id[voter_id] = one_voter_sets
+                sets_to_cache[fetch_follow_organization_sets_cache_key(voter_id)] = one_voter_sets
+            cache.set_many(sets_to_cache, FOLLOW_ORGANIZATION_CACHE_TIMEOUT)
+
+        return follow_organization_sets_by_voter_id
 
     def retrieve_follow_organization_by_organization_id(self, organization_id):
         # Retrieve a list of follow_organization entries for this organization
@@ -345,3 +405,25 @@ class FollowOrganizationList(models.Model):
         else:
             follow_organization_list = {}
             return follow_organization_list
+
+
+def create_empty_follow_organization_sets():
+    return {
+        'following_ids':            frozenset(),
+        'following_we_vote_ids':    frozenset(),
+        'ignoring_ids':             frozenset(),
+        'ignoring_we_vote_ids':     frozenset(),
+    }
+
+
+def fetch_follow_organization_sets_cache_key(voter_id):
+    return 'follow_organization_sets_{voter_id}'.format(voter_id=voter_id)
+
+
+def delete_cached_follow_organization_sets(voter_id):
+    """
+    Call this when a voter starts or stops following or ignoring an organization
+    """
+    if not positive_value_exists(voter_id):
+        return
+    cache.delete(fetch_follow_organization_sets_cache_key(convert_to_int(voter_id)))
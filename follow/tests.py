@@ -0,0 +1,70 @@
+# follow/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.cache import cache
+from django.test import TestCase
+from follow.models import FOLLOWING, FollowOrganization, FollowOrganizationList, FollowOrganizationManager
+from organization.models import Organization
+
+
+class FollowOrganizationSetsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.organization_list = [
+            Organization.objects.create_organization_simple(
+                organization_name="Org{number}".format(number=number),
+                organization_website="www.org{number}.org".format(number=number),
+                organization_twitter_handle="org{number}".format(number=number))
+            for number in range(1, 5)]
+        follow_organization_manager = FollowOrganizationManager()
+        for voter_id in range(1, 4):
+            follow_organization_manager.toggle_on_voter_following_organization(
+                voter_id, self.organization_list[0].id, self.organization_list[0].we_vote_id)
+            follow_organization_manager.toggle_ignore_voter_following_organization(
+                voter_id, self.organization_list[1].id, self.organization_list[1].we_vote_id)
+            follow_organization_manager.toggle_off_voter_following_organization(
+                voter_id, self.organization_list[2].id, self.organization_list[2].we_vote_id)
+
+    def test_sets_match_follow_organization_rows(self):
+        follow_organization_sets = FollowOrganizationList().retrieve_follow_organization_sets(1)
+        self.assertEqual(follow_organization_sets['following_ids'], frozenset([self.organization_list[0].id]))
+        self.assertEqual(follow_organization_sets['following_we_vote_ids'],
+                         frozenset([self.organization_list[0].we_vote_id]))
+        self.assertEqual(follow_organization_sets['ignoring_ids'], frozenset([self.organization_list[1].id]))
+        self.assertEqual(follow_organization_sets['ignoring_we_vote_ids'],
+                         frozenset([self.organization_list[1].we_vote_id]))
+        self.assertEqual(FollowOrganizationList().retrieve_follow_organization_by_voter_id_simple_id_array(1),
+                         [self.organization_list[0].id])
+        self.assertEqual(FollowOrganizationList().retrieve_follow_organization_sets(99)['following_ids'], frozenset())
+
+    def test_sets_are_cached_until_toggle(self):
+        follow_organization_list_manager = FollowOrganizationList()
+        follow_organization_list_manager.retrieve_follow_organization_sets(1)
+        with self.assertNumQueries(0):
+            follow_organization_list_manager.retrieve_follow_organization_sets(1)
+
+        FollowOrganizationManager().toggle_voter_following_organization(
+            1, self.organization_list[2].id, self.organization_list[2].we_vote_id, FOLLOWING)
+        self.assertEqual(follow_organization_list_manager.retrieve_follow_organization_sets(1)['following_ids'],
+                         frozenset([self.organization_list[0].id, self.organization_list[2].id]))
+        # Other voters are not affected
+        self.assertEqual(follow_organization_list_manager.retrieve_follow_organization_sets(2)['following_ids'],
+                         frozenset([self.organization_list[0].id]))
+
+        FollowOrganization.objects.get(voter_id=1, organization_id=self.organization_list[1].id).delete()
+        self.assertEqual(follow_organization_list_manager.retrieve_follow_organization_sets(1)['ignoring_ids'],
+                         frozenset())
+
+    def test_sets_for_voter_id_list(self):
+        follow_organization_list_manager = FollowOrganizationList()
+        follow_organization_list_manager.retrieve_follow_organization_sets(1)
+        with self.assertNumQueries(1):
+            follow_organization_sets_by_voter_id = \
+                follow_organization_list_manager.retrieve_follow_organization_sets_for_voter_id_list([1, 2, 3, 4])
+        self.assertEqual(sorted(follow_organization_sets_by_voter_id.keys()), [1, 2, 3, 4])
+        for voter_id in (1, 2, 3):
+            self.assertEqual(follow_organization_sets_by_voter_id[voter_id],
+                             follow_organization_list_manager.retrieve_follow_organization_sets(voter_id))
+        self.assertEqual(follow_organization_sets_by_voter_id[4]['ignoring_ids'], frozenset())
@@ -3,12 +3,83 @@
 # -*- coding: UTF-8 -*-
 
 # requires an installation of the C library at https://github.com/maxmind/geoip-api-c
+from django.conf import settings
 from django.contrib.gis.geoip import GeoIP
+import os
+import re
+import threading
+import time
 import wevote_functions.admin
-from wevote_functions.functions import get_ip_from_headers, positive_value_exists
+from wevote_functions.functions import get_ip_from_headers, LruCache, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# How many IP address prefixes (the first three numbers of an IPv4 address) we remember the GeoIP location of
+GEOIP_IP_PREFIX_CACHE_SIZE = getattr(settings, 'GEOIP_IP_PREFIX_CACHE_SIZE', 10000)
+# How many seconds between checks of whether update_geoip_data has replaced the GeoIP city database
+GEOIP_DATABASE_CHECK_SECONDS = getattr(settings, 'GEOIP_DATABASE_CHECK_SECONDS', 60)
+IPV4_PREFIX_REGEX = re.compile(r'^(\d{1,3}\.\d{1,3}\.\d{1,3})\.\d{1,3}$')
+
+# One GeoIP reader for each process, which memory maps the database files instead of reading them on each request
+geoip_reader = {}
+geoip_reader_lock = threading.Lock()
+geoip_location_by_ip_prefix = LruCache(GEOIP_IP_PREFIX_CACHE_SIZE)
+NOT_CACHED = object()
+
+
+def fetch_geoip_city_database_modified():
+    try:
+        return os.path.getmtime(os.path.join(settings.GEOIP_PATH, settings.GEOIP_CITY))
+    except (AttributeError, OSError):
+        return None
+
+
+def fetch_geoip_reader():
+    """
+    :return: This process's GeoIP reader. When the city database file has been replaced since we opened it, we open
+    the new one, and forget the locations we looked up in the old one.
+    """
+    reader = geoip_reader.get('reader')
+    if reader is not None and time.time() - geoip_reader['date_checked'] < GEOIP_DATABASE_CHECK_SECONDS:
+        return reader
+    with geoip_reader_lock:
+        database_modified = fetch_geoip_city_database_modified()
+        if geoip_reader.get('reader') is None or database_modified != geoip_reader['database_modified']:
+            # Requests still using the old reader keep it open until they are done with it
+            geoip_reader['reader'] = GeoIP(cache=GeoIP.GEOIP_MMAP_CACHE)
+            geoip_reader['database_modified'] = database_modified
+            geoip_location_by_ip_prefix.clear()
+        geoip_reader['date_checked'] = time.time()
+        return geoip_reader['reader']
+
+
+def reload_geoip_reader():
+    """
+    Check for a new GeoIP city database the next time we look up a location
+    """
+    with geoip_reader_lock:
+        if 'date_checked' in geoip_reader:
+            geoip_reader['date_checked'] = 0
+
+
+def retrieve_geoip_city(ip_address):
+    """
+    Look up the GeoIP city record for ip_address. IPv4 addresses that share their first three numbers are almost always
+    in the same place, so we remember the location of each of those /24 prefixes.
+    :return: The GeoIP city dict, or None if the location isn't known
+    """
+    reader = fetch_geoip_reader()  # First, so a new database clears the cache
+    prefix_match = IPV4_PREFIX_REGEX.match(ip_address)
+    if prefix_match is None:
+        return reader.city(ip_address)
+
+    ip_prefix = prefix_match.group(1)
+    location = geoip_location_by_ip_prefix.get(ip_prefix, NOT_CACHED)
+    if location is NOT_CACHED:
+        location = reader.city(ip_address)
+        geoip_location_by_ip_prefix.set(ip_prefix, location)
+    return location
+
 
 def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
     """
@@ -36,8 +107,7 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
 
         return response_content
 
-    g = GeoIP()
-    location = g.city(ip_address)
+    location = retrieve_geoip_city(ip_address)
     if location is None:
         # Consider this alternate way of responding to front end:
         # return HttpResponse('no matching location for IP address {}'.format(ip_address), status=400)
@@ -1,31 +1,63 @@
 from django.core.management.base import BaseCommand
-from geopy.geocoders import get_geocoder_for_service
-from geopy.exc import GeocoderQuotaExceeded
 
 from ballot.models import BallotReturned
+from geoip.models import fetch_geocoder, GEOCODE_REQUESTS_PER_SECOND, GEOCODE_WORKERS, GeocodeCacheManager, \
+    normalize_address_for_geocode
+from wevote_functions.functions import bulk_update_objects
 
 
 class Command(BaseCommand):
     help = 'Populates the latitude and longitude fields of BallotReturned'
 
-    def populate_latitude_for_ballots(self):
-        for b in BallotReturned.objects.filter(latitude=None).order_by('id'):
-            full_ballot_address = '{}, {}, {} {}'.format(
-                b.normalized_line1, b.normalized_city, b.normalized_state, b.normalized_zip)
-            location = self.google_client.geocode(full_ballot_address)
-            if location is None:
-                raise Exception('Could not find a location for ballot {}'.format(b.id))
-            b.latitude, b.longitude = location.latitude, location.longitude
-            print('ballot {}, found latitude {}, longitude {}'.format(b.id, b.latitude, b.longitude))
-            b.save()
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=GEOCODE_WORKERS,
+                            help='How many addresses to geocode at the same time')
+        parser.add_argument('--requests_per_second', type=float, default=GEOCODE_REQUESTS_PER_SECOND,
+                            help='The most geocoder requests to make each second, across all workers')
+        parser.add_argument('--batch_size', type=int, default=500,
+                            help='How many ballots to geocode and save together')
+        parser.add_argument('--backend', default='',
+                            help='A geopy service name, or the dotted path to a geocoder class')
 
     def handle(self, *args, **options):
-        self.google_client = get_geocoder_for_service('google')()
+        geocoder = fetch_geocoder(options['backend'])
+        geocode_cache_manager = GeocodeCacheManager()
+        ballots_saved = 0
+        ballots_not_found = 0
+        last_ballot_returned_id = 0
 
-        while BallotReturned.objects.filter(latitude=None).exists():
-            try:
-                self.populate_latitude_for_ballots()
-            except GeocoderQuotaExceeded:
-                self.google_client = get_geocoder_for_service('google')()
+        while True:
+            # Step through by id, so ballots the geocoder can't find don't stop us from reaching the rest
+            ballot_returned_list = list(BallotReturned.objects.filter(
+                latitude=None, id__gt=last_ballot_returned_id).order_by('id')[:options['batch_size']])
+            if not len(ballot_returned_list):
+                break
+            last_ballot_returned_id = ballot_returned_list[-1].id
 
-        print('Success! All BallotReturned objects now have latitude and longitude populated.')
+            full_ballot_address_by_id = {}
+            for b in ballot_returned_list:
+                full_ballot_address_by_id[b.id] = '{}, {}, {} {}'.format(
+                    b.normalized_line1, b.normalized_city, b.normalized_state, b.normalized_zip)
+            results = geocode_cache_manager.retrieve_geocoded_locations(
+                full_ballot_address_by_id.values(), geocoder, options['workers'], options['requests_per_second'])
+
+            ballot_returned_to_save_list = []
+            for b in ballot_returned_list:
+                location = results['location_dict'].get(
+                    normalize_address_for_geocode(full_ballot_address_by_id[b.id]))
+                if location is None or not location['location_found']:
+                    ballots_not_found += 1
+                    print('Could not find a location for ballot {}'.format(b.id))
+                    continue
+                b.latitude, b.longitude = location['latitude'], location['longitude']
+                ballot_returned_to_save_list.append(b)
+            # Each web process picks these up when it next rebuilds its BallotReturned spatial index
+            ballots_saved += bulk_update_objects(ballot_returned_to_save_list, ['latitude', 'longitude'])
+            print('Saved latitude and longitude for {} ballots, up to ballot {}'.format(
+                ballots_saved, last_ballot_returned_id))
+
+        if ballots_not_found:
+            print('{} ballots were saved. {} ballots could not be found, and still need latitude and longitude.'.format(
+                ballots_saved, ballots_not_found))
+        else:
+            print('Success! All BallotReturned objects now have latitude and longitude populated.')
@@ -5,6 +5,7 @@ import urllib
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from geoip.controllers import reload_geoip_reader
 
 
 download_folder = settings.GEOIP_PATH
@@ -26,10 +27,15 @@ class Command(BaseCommand):
             if ext != '.gz':
                 raise CommandError('Something went wrong while decompressing {}'.format(dowloadpath))
             self.stdout.write('Extracting {} to {}\n'.format(dowloadpath, outfilepath))
-            with gzip.open(dowloadpath, 'rb') as infile, open(outfilepath, 'wb') as outfile:
+            # The web processes memory map the database, so we replace the file instead of writing over it. They
+            #  open the new one when they notice it has changed.
+            temporary_outfilepath = outfilepath + '.new'
+            with gzip.open(dowloadpath, 'rb') as infile, open(temporary_outfilepath, 'wb') as outfile:
                 outfile.writelines(infile)
+            os.replace(temporary_outfilepath, outfilepath)
             self.stdout.write('Deleting {}\n'.format(dowloadpath))
             os.remove(dowloadpath)
             self.stdout.write('Done with {}\n'.format(path))
 
             self.stdout.write('\nDownload the paid db from MaxMind for more precise results. Ask Dale for the credentials'.format(path))
+        reload_geoip_reader()
@@ -1,3 +1,238 @@
-from django.db import models
+# geoip/models.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
 
-# Create your models here.
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.module_loading import import_string
+from exception.models import handle_exception
+from geopy.exc import GeocoderQuotaExceeded, GeocoderTimedOut, GeocoderUnavailable
+from geopy.geocoders import get_geocoder_for_service
+import time
+import wevote_functions.admin
+from wevote_functions.functions import generate_chunks, positive_value_exists, TokenBucket
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# A geopy service name like 'google', or the dotted path to a class with a geocode(text) method that returns an object
+#  with address, latitude and longitude (or None). The dotted path lets us test without calling a real geocoder.
+GEOCODER_BACKEND = getattr(settings, 'GEOCODER_BACKEND', 'google')
+GEOCODE_WORKERS = getattr(settings, 'GEOCODE_WORKERS', 4)
+GEOCODE_REQUESTS_PER_SECOND = getattr(settings, 'GEOCODE_REQUESTS_PER_SECOND', 10)
+# Errors that go away if we wait, so we try the address again with a longer wait each time
+GEOCODE_RETRY_EXCEPTIONS = (GeocoderQuotaExceeded, GeocoderTimedOut, GeocoderUnavailable)
+GEOCODE_MAXIMUM_RETRIES = 5
+# A voter is waiting on retrieve_geocoded_location, so we only ask about their address once more (after a second)
+GEOCODE_VOTER_MAXIMUM_RETRIES = 1
+GEOCODE_MAXIMUM_SECONDS_BETWEEN_RETRIES = 60
+
+
+class GeocodeCache(models.Model):
+    """
+    What the geocoder returned for one address, so we only ask about each address once. We also remember the
+    addresses the geocoder could not find.
+    """
+    normalized_address = models.CharField(verbose_name="address as sent to the geocoder", max_length=255,
+                                          unique=True, null=False)
+    location_found = models.BooleanField(verbose_name="geocoder found this address", default=False)
+    formatted_address = models.CharField(verbose_name="address returned by the geocoder", max_length=255,
+                                         null=True, blank=True)
+    latitude = models.FloatField(null=True, verbose_name='latitude returned from the geocoder')
+    longitude = models.FloatField(null=True, verbose_name='longitude returned from the geocoder')
+    date_last_updated = models.DateTimeField(verbose_name='date last updated', null=True, auto_now=True)
+
+
+class GeocodeCacheManager(models.Model):
+
+    def __unicode__(self):
+        return "GeocodeCacheManager"
+
+    def retrieve_geocoded_location(self, text_for_map_search, geocoder=None,
+                                   maximum_retries=GEOCODE_VOTER_MAXIMUM_RETRIES):
+        """
+        Return the location for this address from the cache, asking the geocoder only the first time
+        :param text_for_map_search:
+        :param geocoder: If not passed in, we use GEOCODER_BACKEND
+        :param maximum_retries: How many times we try the address again after a quota or time out error
+        :return:
+        """
+        results = self.retrieve_geocoded_locations([text_for_map_search], geocoder, worker_count=1,
+                                                   maximum_retries=maximum_retries)
+        normalized_address = normalize_address_for_geocode(text_for_map_search)
+        location = results['location_dict'].get(normalized_address, create_empty_geocoded_location())
+        results = {
+            'success':              results['success'],
+            'status':               results['status'],
+            'location_found':       location['location_found'],
+            'formatted_address':    location['formatted_address'],
+            'latitude':             location['latitude'],
+            'longitude':            location['longitude'],
+        }
+        return results
+
+    def retrieve_geocoded_locations(self, text_for_map_search_list, geocoder=None, worker_count=GEOCODE_WORKERS,
+                                    requests_per_second=GEOCODE_REQUESTS_PER_SECOND,
+                                    maximum_retries=GEOCODE_MAXIMUM_RETRIES):
+        """
+        Return the location for each address. Addresses that are not in the cache yet are sent to the geocoder from
+        worker_count threads, and the new locations are saved together. Only this thread uses the database.
+        :param text_for_map_search_list:
+        :param geocoder: If not passed in, we use GEOCODER_BACKEND
+        :param worker_count:
+        :param requests_per_second: 0 means no limit
+        :param maximum_retries: How many times we try an address again after a quota or time out error
+        :return: location_dict has an entry for each normalized address we have a location (or "not found") for
+        """
+        normalized_address_list = []
+        for text_for_map_search in text_for_map_search_list:
+            normalized_address = normalize_address_for_geocode(text_for_map_search)
+            if positive_value_exists(normalized_address) and normalized_address not in normalized_address_list:
+                normalized_address_list.append(normalized_address)
+
+        location_dict = {}
+        for normalized_address_chunk in generate_chunks(normalized_address_list):
+            for geocode_cache in GeocodeCache.objects.filter(normalized_address__in=normalized_address_chunk):
+                location_dict[geocode_cache.normalized_address] = {
+                    'location_found':       geocode_cache.location_found,
+                    'formatted_address':    geocode_cache.formatted_address,
+                    'latitude':             geocode_cache.latitude,
+                    'longitude':            geocode_cache.longitude,
+                }
+        addresses_to_geocode = [normalized_address for normalized_address in normalized_address_list
+                                if normalized_address not in location_dict]
+        if not len(addresses_to_geocode):
+            results = {
+                'success':              True,
+                'status':               'GEOCODED_LOCATIONS_RETRIEVED_FROM_CACHE',
+                'location_dict':        location_dict,
+                'addresses_geocoded':   0,
+                'addresses_failed':     0,
+            }
+            return results
+
+        if geocoder is None:
+            geocoder = fetch_geocoder()
+        token_bucket = TokenBucket(requests_per_second)
+
+        def geocode_one_address(normalized_address):
+            try:
+                return normalized_address, geocode_with_retries(geocoder, normalized_address, token_bucket,
+                                                                maximum_retries), None
+            except Exception as e:
+                return normalized_address, None, e
+
+        if worker_count > 1 and len(addresses_to_geocode) > 1:
+            with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                geocoded_list = list(executor.map(geocode_one_address, addresses_to_geocode))
+        else:
+            # Don't start a thread to look up the one address a voter typed in
+            geocoded_list = [geocode_one_address(normalized_address) for normalized_address in addresses_to_geocode]
+
+        geocode_cache_list = []
+        addresses_failed = 0
+        for normalized_address, location, error in geocoded_list:
+            if error is not None:
+                # We don't remember errors, so we can try this address again later
+                addresses_failed += 1
+                logger.error('GEOCODE_FAILED for "{address}": {error}'.format(address=normalized_address,
+                                                                              error=error))
+                continue
+            geocode_cache = GeocodeCache(normalized_address=normalized_address,
+                                         location_found=location is not None)
+            if location is not None:
+                geocode_cache.formatted_address = location.address[:255] if location.address else ''
+                geocode_cache.latitude = location.latitude
+                geocode_cache.longitude = location.longitude
+            geocode_cache_list.append(geocode_cache)
+            location_dict[normalized_address] = {
+                'location_found':       geocode_cache.location_found,
+                'formatted_address':    geocode_cache.formatted_address,
+                'latitude':             geocode_cache.latitude,
+                'longitude':            geocode_cache.longitude,
+            }
+
+        try:
+            # Another process may have saved some of these addresses while we were waiting on the geocoder
+            geocode_cache_new_list = []
+            for geocode_cache_chunk in generate_chunks(geocode_cache_list):
+                normalized_address_saved_list = list(GeocodeCache.objects.filter(
+                    normalized_address__in=[geocode_cache.normalized_address for geocode_cache in geocode_cache_chunk]
+                ).values_list('normalized_address', flat=True))
+                geocode_cache_new_list += [geocode_cache for geocode_cache in geocode_cache_chunk
+                                             if geocode_cache.normalized_address not in normalized_address_saved_list]
+            # A savepoint, so a duplicate address saved by another process doesn't break the caller's transaction
+            with transaction.atomic():
+                GeocodeCache.objects.bulk_create(geocode_cache_new_list, batch_size=500)
+            success = True
+            status = 'GEOCODED_LOCATIONS_RETRIEVED'
+        except Exception as e:
+            # We still return the locations. They will be geocoded again next time.
+            success = True
+            status = 'GEOCODED_LOCATIONS_RETRIEVED_BUT_NOT_CACHED'
+            handle_exception(e, logger=logger, exception_message=status)
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'location_dict':        location_dict,
+            'addresses_geocoded':   len(geocode_cache_list),
+            'addresses_failed':     addresses_failed,
+        }
+        return results
+
+
+def create_empty_geocoded_location():
+    return {
+        'location_found':       False,
+        'formatted_address':    None,
+        'latitude':             None,
+        'longitude':            None,
+    }
+
+
+def fetch_geocoder(geocoder_backend=''):
+    """
+    :param geocoder_backend: A geopy service name like 'google', or the dotted path to a geocoder class.
+    If empty, we use GEOCODER_BACKEND.
+    :return:
+    """
+    if not positive_value_exists(geocoder_backend):
+        geocoder_backend = GEOCODER_BACKEND
+    if '.' in geocoder_backend:
+        return import_string(geocoder_backend)()
+    return get_geocoder_for_service(geocoder_backend)()
+
+
+def geocode_with_retries(geocoder, text_for_map_search, token_bucket=None, maximum_retries=GEOCODE_MAXIMUM_RETRIES):
+    """
+    Ask the geocoder for this address. When it tells us to slow down or times out, wait twice as long as the time
+    before and ask again.
+    :return: The geopy Location, or None if the address wasn't found
+    """
+    retry_count = 0
+    while True:
+        if token_bucket is not None:
+            token_bucket.consume()
+        try:
+            return geocoder.geocode(text_for_map_search)
+        except GEOCODE_RETRY_EXCEPTIONS:
+            if retry_count >= maximum_retries:
+                raise
+            time.sleep(min(2 ** retry_count, GEOCODE_MAXIMUM_SECONDS_BETWEEN_RETRIES))
+            retry_count += 1
+
+
+def normalize_address_for_geocode(text_for_map_search):
+    """
+    Addresses that differ only in case, spacing or punctuation around commas share one GeocodeCache entry.
+    ex/ " 254  Hartford St ,San Francisco, CA 94114. " becomes "254 hartford st, san francisco, ca 94114"
+    """
+    if not positive_value_exists(text_for_map_search):
+        return ''
+    address_part_list = []
+    for address_part in str(text_for_map_search).lower().split(','):
+        address_part = ' '.join(address_part.split()).strip('.')
+        if positive_value_exists(address_part):
+            address_part_list.append(address_part)
+    return ', '.join(address_part_list)[:255]
@@ -1,3 +1,182 @@
+# geoip/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import namedtuple
+from django.contrib.gis.geoip import GeoIP
+from django.core.management import call_command
 from django.test import TestCase
+from geopy.exc import GeocoderQuotaExceeded
+import random
+import time
+from unittest import mock
+
+from ballot.models import BallotReturned
+from geoip.controllers import fetch_geoip_city_database_modified, geoip_location_by_ip_prefix, geoip_reader, \
+    reload_geoip_reader, retrieve_geoip_city
+from geoip.models import GeocodeCache, GeocodeCacheManager, normalize_address_for_geocode
+
+Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
+
+
+class FakeGeocoder(object):
+    """
+    Finds every address except the ones that mention "nowhere", without calling a real geocoder. The first
+    geocode() after quota_exceeded_count is set raises GeocoderQuotaExceeded that many times.
+    """
+    geocoded_address_list = []
+    quota_exceeded_count = 0
+
+    def geocode(self, text_for_map_search):
+        if FakeGeocoder.quota_exceeded_count > 0:
+            FakeGeocoder.quota_exceeded_count -= 1
+            raise GeocoderQuotaExceeded('Slow down')
+        FakeGeocoder.geocoded_address_list.append(text_for_map_search)
+        if 'nowhere' in text_for_map_search:
+            return None
+        return Location(address='{}, USA'.format(text_for_map_search.upper()),
+                        latitude=30.0 + len(text_for_map_search) / 100.0, longitude=-90.0)
+
+
+class GeocodeCacheTestCase(TestCase):
+
+    def setUp(self):
+        FakeGeocoder.geocoded_address_list = []
+        FakeGeocoder.quota_exceeded_count = 0
+
+    def test_normalize_address_for_geocode(self):
+        self.assertEqual(normalize_address_for_geocode(' 254  Hartford St ,San Francisco, CA 94114. '),
+                         '254 hartford st, san francisco, ca 94114')
+
+    def test_geocoder_is_asked_once_for_each_address(self):
+        geocode_cache_manager = GeocodeCacheManager()
+        for text_for_map_search in ('254 Hartford St, San Francisco, CA', '254 hartford st,  san francisco, ca',
+                                    'Nowhere, XX', 'nowhere, xx'):
+            geocode_cache_manager.retrieve_geocoded_location(text_for_map_search, FakeGeocoder())
+        self.assertEqual(FakeGeocoder.geocoded_address_list,
+                         ['254 hartford st, san francisco, ca', 'nowhere, xx'])
+        results = geocode_cache_manager.retrieve_geocoded_location('254 Hartford St, San Francisco, CA')
+        self.assertTrue(results['location_found'])
+        self.assertEqual(results['formatted_address'], '254 HARTFORD ST, SAN FRANCISCO, CA, USA')
+        self.assertFalse(geocode_cache_manager.retrieve_geocoded_location('Nowhere, XX')['location_found'])
+
+    @mock.patch('geoip.models.time.sleep')
+    def test_retry_after_quota_exceeded(self, mock_sleep):
+        FakeGeocoder.quota_exceeded_count = 2
+        results = GeocodeCacheManager().retrieve_geocoded_locations(['Jackson, MS'], FakeGeocoder())
+        self.assertTrue(results['location_dict']['jackson, ms']['location_found'])
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @mock.patch('geoip.models.time.sleep')
+    def test_voter_address_is_tried_again_once(self, mock_sleep):
+        FakeGeocoder.quota_exceeded_count = 2
+        results = GeocodeCacheManager().retrieve_geocoded_location('Jackson, MS', FakeGeocoder())
+        self.assertFalse(results['location_found'])
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    @mock.patch('geoip.models.time.sleep')
+    def test_errors_are_not_cached(self, mock_sleep):
+        FakeGeocoder.quota_exceeded_count = 100
+        results = GeocodeCacheManager().retrieve_geocoded_locations(['Jackson, MS'], FakeGeocoder(),
+                                                                    maximum_retries=2)
+        self.assertEqual(results['addresses_failed'], 1)
+        self.assertEqual(GeocodeCache.objects.count(), 0)
+
+    def test_save_ballot_coordinates(self):
+        for number in range(1, 31):
+            BallotReturned.objects.create(google_civic_election_id=4184, normalized_line1='{} main st'.format(number),
+                                          normalized_city='jackson', normalized_state='MS', normalized_zip='39204')
+        BallotReturned.objects.create(google_civic_election_id=4184, normalized_line1='1 nowhere rd',
+                                      normalized_city='jackson', normalized_state='MS', normalized_zip='39204')
+        call_command('save_ballot_coordinates', backend='geoip.tests.FakeGeocoder', workers=4, batch_size=8,
+                     requests_per_second=0)
+        self.assertEqual(BallotReturned.objects.filter(latitude=None).count(), 1)
+        self.assertEqual(len(FakeGeocoder.geocoded_address_list), 31)
+        ballot_returned = BallotReturned.objects.get(normalized_line1='12 main st')
+        self.assertAlmostEqual(ballot_returned.latitude, 30.0 + len('12 main st, jackson, ms 39204') / 100.0)
+
+        # A second run only asks about the ballot that still has no location, and gets the answer from the cache
+        call_command('save_ballot_coordinates', backend='geoip.tests.FakeGeocoder', requests_per_second=0)
+        self.assertEqual(len(FakeGeocoder.geocoded_address_list), 31)
+
+
+class FakeGeoIP(object):
+    """
+    Puts every address in the city named after its first number, and counts the readers opened and lookups made
+    """
+    GEOIP_MMAP_CACHE = 8  # The same value as django.contrib.gis.geoip.GeoIP
+    readers_opened = 0
+    lookup_count = 0
+
+    def __init__(self, cache=0):
+        FakeGeoIP.readers_opened += 1
+        self.reader_number = FakeGeoIP.readers_opened
+
+    def city(self, ip_address):
+        FakeGeoIP.lookup_count += 1
+        if ip_address.startswith('10.'):
+            return None
+        return {'city': 'City {}'.format(ip_address.split('.')[0]), 'region': 'CA', 'postal_code': '9410{}'.format(
+            self.reader_number)}
+
+
+class GeoIPReaderTestCase(TestCase):
+
+    def setUp(self):
+        FakeGeoIP.readers_opened = 0
+        FakeGeoIP.lookup_count = 0
+        geoip_reader.clear()
+        geoip_location_by_ip_prefix.clear()
+        self.addCleanup(geoip_reader.clear)
+        self.addCleanup(geoip_location_by_ip_prefix.clear)
+
+    @mock.patch('geoip.controllers.fetch_geoip_city_database_modified', return_value=1476800000.0)
+    @mock.patch('geoip.controllers.GeoIP', FakeGeoIP)
+    def test_reader_is_shared_and_locations_are_cached_by_prefix(self, mock_database_modified):
+        self.assertEqual(retrieve_geoip_city('69.181.21.132')['city'], 'City 69')
+        self.assertEqual(retrieve_geoip_city('69.181.21.7')['city'], 'City 69')
+        self.assertEqual(retrieve_geoip_city('69.181.22.7')['city'], 'City 69')
+        self.assertIsNone(retrieve_geoip_city('10.0.0.1'))
+        self.assertIsNone(retrieve_geoip_city('10.0.0.2'))
+        self.assertEqual(FakeGeoIP.readers_opened, 1)
+        self.assertEqual(FakeGeoIP.lookup_count, 3)
+
+        # After update_geoip_data replaces the database, we open it and forget the old locations
+        reload_geoip_reader()
+        self.assertEqual(retrieve_geoip_city('69.181.21.132')['postal_code'], '94101')
+        mock_database_modified.return_value = 1476900000.0
+        reload_geoip_reader()
+        self.assertEqual(retrieve_geoip_city('69.181.21.132')['postal_code'], '94102')
+        self.assertEqual(FakeGeoIP.lookup_count, 4)
+
+    def test_benchmark_geoip_lookups(self):
+        if fetch_geoip_city_database_modified() is None:
+            self.skipTest('The GeoIP city database is not installed')
+        generator = random.Random(4184)
+        ip_prefix_list = ['{}.{}.{}'.format(generator.randint(1, 223), generator.randint(0, 255),
+                                            generator.randint(0, 255)) for number in range(500)]
+        ip_address_list = ['{}.{}'.format(generator.choice(ip_prefix_list), generator.randint(1, 254))
+                           for number in range(5000)]
+
+        start_time = time.time()
+        for ip_address in ip_address_list[:200]:
+            GeoIP().city(ip_address)
+        lookups_per_second_new_reader = 200 / (time.time() - start_time)
+
+        reader = GeoIP(cache=GeoIP.GEOIP_MMAP_CACHE)
+        start_time = time.time()
+        for ip_address in ip_address_list:
+            reader.city(ip_address)
+        lookups_per_second_shared_reader = len(ip_address_list) / (time.time() - start_time)
+
+        start_time = time.time()
+        for ip_address in ip_address_list:
+            retrieve_geoip_city(ip_address)
+        lookups_per_second_prefix_cache = len(ip_address_list) / (time.time() - start_time)
 
-# Create your tests here.
+        print("GeoIP city lookups per second, {address_count} addresses in {prefix_count} /24 prefixes: new reader "
+              "each time {new_reader:.0f}, shared memory mapped reader {shared_reader:.0f}, shared reader and prefix "
+              "cache {prefix_cache:.0f}".format(
+                  address_count=len(ip_address_list), prefix_count=len(ip_prefix_list),
+                  new_reader=lookups_per_second_new_reader, shared_reader=lookups_per_second_shared_reader,
+                  prefix_cache=lookups_per_second_prefix_cache))
@@ -8,23 +8,61 @@
 
 # -*- coding: UTF-8 -*-
 
-from .models import GoogleCivicApiCounterManager
-from ballot.models import BallotItemManager, BallotItemListManager, BallotReturnedManager
-from candidate.models import CandidateCampaignManager
+from .models import BallotHarvestCheckpointManager, google_civic_api_counter_buffer, GoogleCivicApiCounterManager, \
+    HARVEST_BALLOT_STORED, HARVEST_NO_BALLOT, HARVEST_REQUEST_FAILED, HARVEST_STORE_FAILED
+from ballot.models import BallotItem, BallotItemManager, BallotItemListManager, BallotReturnedManager, \
+    BallotTemplateManager
+from candidate.models import CandidateCampaign, CandidateCampaignManager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from config.base import get_environment_variable
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
 from election.models import ElectionManager
+from exception.models import handle_exception
+from geoip.models import normalize_address_for_geocode
+import gzip
+import hashlib
 import json
-from measure.models import ContestMeasureManager
-from office.models import ContestOfficeManager
-import requests
+from measure.models import ContestMeasure, ContestMeasureManager
+from office.models import ContestOffice, ContestOfficeManager
+import os
+from polling_location.models import PollingLocation
+import tempfile
+import time
 from voter.models import fetch_voter_id_from_voter_device_link, VoterAddressManager
-from wevote_functions.functions import convert_state_text_to_state_code, convert_to_int, \
-    extract_state_from_ocd_division_id, is_voter_device_id_valid, logger, positive_value_exists
+from wevote_functions.functions import bulk_update_objects, convert_state_text_to_state_code, convert_to_int, \
+    extract_state_from_ocd_division_id, generate_chunks, is_voter_device_id_valid, logger, objects_bulk_saved, \
+    positive_value_exists, TokenBucket
+from wevote_functions.http_client import http_get, INTEGRATION_GOOGLE_CIVIC
+from wevote_settings.models import fetch_next_we_vote_id_integer_list, fetch_site_unique_id_prefix
 
 GOOGLE_CIVIC_API_KEY = get_environment_variable("GOOGLE_CIVIC_API_KEY")
 ELECTION_QUERY_URL = get_environment_variable("ELECTION_QUERY_URL")
 VOTER_INFO_URL = get_environment_variable("VOTER_INFO_URL")
 VOTER_INFO_JSON_FILE = get_environment_variable("VOTER_INFO_JSON_FILE")
+# How many requests the ballot harvester (harvest_ballots_for_polling_locations) makes to Google Civic at once, and
+#  how many it starts each second
+GOOGLE_CIVIC_HARVEST_WORKERS = getattr(settings, 'GOOGLE_CIVIC_HARVEST_WORKERS', 4)
+GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND = getattr(settings, 'GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND', 5)
+# Store the contests on a ballot with a few bulk queries (process_contests_from_structured_json_in_bulk) instead of
+#  an update_or_create for each office, candidate, measure and ballot item
+GOOGLE_CIVIC_BULK_STORE = getattr(settings, 'GOOGLE_CIVIC_BULK_STORE', True)
+
+# The ballot harvester can keep voterInfoQuery responses on disk, so we don't ask Google for the same polling location
+#  and election again. Voters' addresses (retrieve_one_ballot_from_google_civic_api) are never kept.
+#  RESPONSE_CACHE_OFF: Always ask Google
+#  RESPONSE_CACHE_RECORD: Use a recorded response younger than GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT, otherwise ask
+#   Google and record the response
+#  RESPONSE_CACHE_REPLAY: Only use recorded responses (of any age), and never ask Google. For development, load tests
+#   and re-harvests.
+RESPONSE_CACHE_OFF = 'off'
+RESPONSE_CACHE_RECORD = 'record'
+RESPONSE_CACHE_REPLAY = 'replay'
+GOOGLE_CIVIC_RESPONSE_CACHE_MODE = getattr(settings, 'GOOGLE_CIVIC_RESPONSE_CACHE_MODE', RESPONSE_CACHE_OFF)
+GOOGLE_CIVIC_RESPONSE_CACHE_PATH = getattr(settings, 'GOOGLE_CIVIC_RESPONSE_CACHE_PATH', os.path.join(
+    settings.BASE_DIR, 'import_export_google_civic', 'import_data', 'voter_info_cache'))
+GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT = getattr(settings, 'GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT', 21600)
 
 
 # GoogleRepresentatives
@@ -53,86 +91,100 @@ def process_candidates_from_structured_json(
     """
     results = {}
     for one_candidate in candidates_structured_json:
-        candidate_name = one_candidate['name'] if 'name' in one_candidate else ''
-        # For some reason Google Civic API violates the JSON standard and uses a / in front of '
-        candidate_name = candidate_name.replace('/', "'")
-        # We want to save the name exactly as it comes from the Google Civic API
-        google_civic_candidate_name = one_candidate['name'] if 'name' in one_candidate else ''
-        party = one_candidate['party'] if 'party' in one_candidate else ''
-        order_on_ballot = one_candidate['orderOnBallot'] if 'orderOnBallot' in one_candidate else 0
-        candidate_url = one_candidate['candidateUrl'] if 'candidateUrl' in one_candidate else ''
-        photo_url = one_candidate['photoUrl'] if 'photoUrl' in one_candidate else ''
-        email = one_candidate['email'] if 'email' in one_candidate else ''
-        phone = one_candidate['phone'] if 'phone' in one_candidate else ''
-
-        # Make sure we start with empty channel values
-        facebook_url = ''
-        twitter_url = ''
-        google_plus_url = ''
-        youtube_url = ''
-        if 'channels' in one_candidate:
-            channels = one_candidate['channels']
-            for one_channel in channels:
-                if 'type' in one_channel:
-                    if one_channel['type'] == 'Facebook':
-                        facebook_url = one_channel['id'] if 'id' in one_channel else ''
-                    if one_channel['type'] == 'Twitter':
-                        twitter_url = one_channel['id'] if 'id' in one_channel else ''
-                    if one_channel['type'] == 'GooglePlus':
-                        google_plus_url = one_channel['id'] if 'id' in one_channel else ''
-                    if one_channel['type'] == 'YouTube':
-                        youtube_url = one_channel['id'] if 'id' in one_channel else ''
-
-        # DALE 2016-02-20 It would be helpful to call a service here that disambiguated the candidate
-        # ...and linked to a politician
-        # ...and looked to see if there were any other candidate_campaign entries for this election (in case the
-        #   Google Civic contest_office name changed so we generated another contest)
-
-        we_vote_id = ''
-        # Make sure we have the minimum variables required to uniquely identify a candidate
-        if google_civic_election_id and contest_office_id and candidate_name:
-            # NOT using " and ocd_division_id"
-
-            # Make sure there isn't an alternate entry for this election and contest_office (under a similar but
-            # slightly different name TODO
-            # Note: This doesn't deal with duplicate Presidential candidates. These duplicates are caused because
-            # candidates are tied to a particular google_civic_election_id, so there is a different candidate entry
-            # for each Presidential candidate for each state.
-
-            updated_candidate_campaign_values = {
-                # Values we search against
-                'google_civic_election_id': google_civic_election_id,
-                'ocd_division_id': ocd_division_id,
-                # Note: When we decide to start updating candidate_name elsewhere within We Vote, we should stop
-                #  updating candidate_name via subsequent Google Civic imports
-                'candidate_name': candidate_name,
-                # The rest of the values
-                'state_code': state_code,  # Not required due to federal candidates
-                'party': party,
-                'candidate_email': email,
-                'candidate_phone': phone,
-                'order_on_ballot': order_on_ballot,
-                'candidate_url': candidate_url,
-                'photo_url': photo_url,
-                'facebook_url': facebook_url,
-                'twitter_url': twitter_url,
-                'google_plus_url': google_plus_url,
-                'youtube_url': youtube_url,
-                'google_civic_candidate_name': google_civic_candidate_name,
-                # 2016-02-20 Google Civic sometimes changes the name of contests, which can create a new contest
-                #  so we may need to update the candidate to a new contest_office_id
-                'contest_office_id': contest_office_id,
-                'contest_office_we_vote_id': contest_office_we_vote_id,
-            }
+        updated_candidate_campaign_values = extract_candidate_campaign_values_from_structured_json(
+            one_candidate, google_civic_election_id, ocd_division_id, state_code, contest_office_id,
+            contest_office_we_vote_id)
+        if updated_candidate_campaign_values is not None:
+            we_vote_id = ''
             candidate_campaign_manager = CandidateCampaignManager()
             results = candidate_campaign_manager.update_or_create_candidate_campaign(
                 we_vote_id, google_civic_election_id,
                 ocd_division_id, contest_office_id, contest_office_we_vote_id,
-                google_civic_candidate_name, updated_candidate_campaign_values)
+                updated_candidate_campaign_values['google_civic_candidate_name'], updated_candidate_campaign_values)
 
     return results
 
 
+def extract_candidate_campaign_values_from_structured_json(
+        one_candidate, google_civic_election_id, ocd_division_id, state_code, contest_office_id,
+        contest_office_we_vote_id):
+    """
+    :return: The values to save for this candidate, or None if we don't have the values needed to identify them
+    """
+    candidate_name = one_candidate['name'] if 'name' in one_candidate else ''
+    # For some reason Google Civic API violates the JSON standard and uses a / in front of '
+    candidate_name = candidate_name.replace('/', "'")
+    # We want to save the name exactly as it comes from the Google Civic API
+    google_civic_candidate_name = one_candidate['name'] if 'name' in one_candidate else ''
+    party = one_candidate['party'] if 'party' in one_candidate else ''
+    order_on_ballot = one_candidate['orderOnBallot'] if 'orderOnBallot' in one_candidate else 0
+    candidate_url = one_candidate['candidateUrl'] if 'candidateUrl' in one_candidate else ''
+    photo_url = one_candidate['photoUrl'] if 'photoUrl' in one_candidate else ''
+    email = one_candidate['email'] if 'email' in one_candidate else ''
+    phone = one_candidate['phone'] if 'phone' in one_candidate else ''
+
+    # Make sure we start with empty channel values
+    facebook_url = ''
+    twitter_url = ''
+    google_plus_url = ''
+    youtube_url = ''
+    if 'channels' in one_candidate:
+        channels = one_candidate['channels']
+        for one_channel in channels:
+            if 'type' in one_channel:
+                if one_channel['type'] == 'Facebook':
+                    facebook_url = one_channel['id'] if 'id' in one_channel else ''
+                if one_channel['type'] == 'Twitter':
+                    twitter_url = one_channel['id'] if 'id' in one_channel else ''
+                if one_channel['type'] == 'GooglePlus':
+                    google_plus_url = one_channel['id'] if 'id' in one_channel else ''
+                if one_channel['type'] == 'YouTube':
+                    youtube_url = one_channel['id'] if 'id' in one_channel else ''
+
+    # DALE 2016-02-20 It would be helpful to call a service here that disambiguated the candidate
+    # ...and linked to a politician
+    # ...and looked to see if there were any other candidate_campaign entries for this election (in case the
+    #   Google Civic contest_office name changed so we generated another contest)
+
+    # Make sure we have the minimum variables required to uniquely identify a candidate
+    if google_civic_election_id and contest_office_id and candidate_name:
+        # NOT using " and ocd_division_id"
+
+        # Make sure there isn't an alternate entry for this election and contest_office (under a similar but
+        # slightly different name TODO
+        # Note: This doesn't deal with duplicate Presidential candidates. These duplicates are caused because
+        # candidates are tied to a particular google_civic_election_id, so there is a different candidate entry
+        # for each Presidential candidate for each state.
+
+        updated_candidate_campaign_values = {
+            # Values we search against
+            'google_civic_election_id': google_civic_election_id,
+            'ocd_division_id': ocd_division_id,
+            # Note: When we decide to start updating candidate_name elsewhere within We Vote, we should stop
+            #  updating candidate_name via subsequent Google Civic imports
+            'candidate_name': candidate_name,
+            # The rest of the values
+            'state_code': state_code,  # Not required due to federal candidates
+            'party': party,
+            'candidate_email': email,
+            'candidate_phone': phone,
+            'order_on_ballot': order_on_ballot,
+            'candidate_url': candidate_url,
+            'photo_url': photo_url,
+            'facebook_url': facebook_url,
+            'twitter_url': twitter_url,
+            'google_plus_url': google_plus_url,
+            'youtube_url': youtube_url,
+            'google_civic_candidate_name': google_civic_candidate_name,
+            # 2016-02-20 Google Civic sometimes changes the name of contests, which can create a new contest
+            #  so we may need to update the candidate to a new contest_office_id
+            'contest_office_id': contest_office_id,
+            'contest_office_we_vote_id': contest_office_we_vote_id,
+        }
+        return updated_candidate_campaign_values
+    return None
+
+
 def process_contest_office_from_structured_json(
         one_contest_office_structured_json, google_civic_election_id, ocd_division_id, local_ballot_order, state_code,
         voter_id, polling_location_we_vote_id):
@@ -152,6 +204,73 @@ def process_contest_office_from_structured_json(
         }
         return update_or_create_contest_office_results
 
+    office_results = extract_contest_office_values_from_structured_json(
+        one_contest_office_structured_json, google_civic_election_id, ocd_division_id, state_code)
+    google_ballot_placement = office_results['google_ballot_placement']
+    candidates_structured_json = office_results['candidates_structured_json']
+    updated_contest_office_values = office_results['updated_contest_office_values']
+
+    we_vote_id = ''
+    maplight_id = 0
+    # Note that all of the information saved here is independent of a particular voter
+    if updated_contest_office_values is not None:
+        office_name = updated_contest_office_values['office_name']
+        contest_office_manager = ContestOfficeManager()
+        update_or_create_contest_office_results = contest_office_manager.update_or_create_contest_office(
+            we_vote_id, maplight_id, google_civic_election_id, office_name,
+            updated_contest_office_values)
+    else:
+        update_or_create_contest_office_results = {
+            'success': False,
+            'saved': 0,
+            'updated': 0,
+            'not_processed': 1,
+        }
+
+    if update_or_create_contest_office_results['success']:
+        contest_office = update_or_create_contest_office_results['contest_office']
+        contest_office_id = contest_office.id
+        contest_office_we_vote_id = contest_office.we_vote_id
+        ballot_item_display_name = contest_office.office_name
+    else:
+        contest_office_id = 0
+        contest_office_we_vote_id = ''
+        ballot_item_display_name = ''
+
+    # If a voter_id was passed in, save an entry for this office for the voter's ballot
+    if positive_value_exists(voter_id) and positive_value_exists(google_civic_election_id) \
+            and positive_value_exists(contest_office_id):
+        ballot_item_manager = BallotItemManager()
+        measure_subtitle = ""
+        ballot_item_manager.update_or_create_ballot_item_for_voter(
+            voter_id, google_civic_election_id, google_ballot_placement, ballot_item_display_name,
+            measure_subtitle, local_ballot_order, contest_office_id, contest_office_we_vote_id)
+        # We leave off these and rely on default empty values: contest_measure_id, contest_measure_we_vote_id
+
+    # If this is a polling location, we want to save the ballot information for it so we can use it as reference
+    #  for nearby voters (when we don't have their full address)
+    if positive_value_exists(polling_location_we_vote_id) and positive_value_exists(google_civic_election_id) \
+            and positive_value_exists(contest_office_id):
+        ballot_item_manager = BallotItemManager()
+        measure_subtitle = ""
+        ballot_item_manager.update_or_create_ballot_item_for_polling_location(
+            polling_location_we_vote_id, google_civic_election_id, google_ballot_placement, ballot_item_display_name,
+            measure_subtitle, local_ballot_order, contest_office_id, contest_office_we_vote_id)
+        # We leave off these and rely on default empty values: contest_measure_id, contest_measure_we_vote_id
+
+    # Note: We do not need to connect the candidates with the voter here for a ballot item
+    process_candidates_from_structured_json(
+        candidates_structured_json, google_civic_election_id, ocd_division_id, state_code, contest_office_id,
+        contest_office_we_vote_id)
+
+    return update_or_create_contest_office_results
+
+
+def extract_contest_office_values_from_structured_json(
+        one_contest_office_structured_json, google_civic_election_id, ocd_division_id, state_code):
+    """
+    :return: updated_contest_office_values is None if we don't have the values needed to identify the office
+    """
     office_name = one_contest_office_structured_json['office']
 
     # The number of candidates that a voter may vote for in this contest.
@@ -243,9 +362,6 @@ def process_contest_office_from_structured_json(
     candidates_structured_json = \
         one_contest_office_structured_json['candidates'] if 'candidates' in one_contest_office_structured_json else ''
 
-    we_vote_id = ''
-    maplight_id = 0
-    # Note that all of the information saved here is independent of a particular voter
     if google_civic_election_id and (district_id or district_name) and office_name:
         updated_contest_office_values = {
             # Values we search against
@@ -266,55 +382,15 @@ def process_contest_office_from_structured_json(
             'electorate_specifications': electorate_specifications,
             'special': special,
         }
-        contest_office_manager = ContestOfficeManager()
-        update_or_create_contest_office_results = contest_office_manager.update_or_create_contest_office(
-            we_vote_id, maplight_id, google_civic_election_id, office_name,
-            updated_contest_office_values)
-    else:
-        update_or_create_contest_office_results = {
-            'success': False,
-            'saved': 0,
-            'updated': 0,
-            'not_processed': 1,
-        }
-
-    if update_or_create_contest_office_results['success']:
-        contest_office = update_or_create_contest_office_results['contest_office']
-        contest_office_id = contest_office.id
-        contest_office_we_vote_id = contest_office.we_vote_id
-        ballot_item_display_name = contest_office.office_name
     else:
-        contest_office_id = 0
-        contest_office_we_vote_id = ''
-        ballot_item_display_name = ''
-
-    # If a voter_id was passed in, save an entry for this office for the voter's ballot
-    if positive_value_exists(voter_id) and positive_value_exists(google_civic_election_id) \
-            and positive_value_exists(contest_office_id):
-        ballot_item_manager = BallotItemManager()
-        measure_subtitle = ""
-        ballot_item_manager.update_or_create_ballot_item_for_voter(
-            voter_id, google_civic_election_id, google_ballot_placement, ballot_item_display_name,
-            measure_subtitle, local_ballot_order, contest_office_id, contest_office_we_vote_id)
-        # We leave off these and rely on default empty values: contest_measure_id, contest_measure_we_vote_id
-
-    # If this is a polling location, we want to save the ballot information for it so we can use it as reference
-    #  for nearby voters (when we don't have their full address)
-    if positive_value_exists(polling_location_we_vote_id) and positive_value_exists(google_civic_election_id) \
-            and positive_value_exists(contest_office_id):
-        ballot_item_manager = BallotItemManager()
-        measure_subtitle = ""
-        ballot_item_manager.update_or_create_ballot_item_for_polling_location(
-            polling_location_we_vote_id, google_civic_election_id, google_ballot_placement, ballot_item_display_name,
-            measure_subtitle, local_ballot_order, contest_office_id, contest_office_we_vote_id)
-        # We leave off these and rely on default empty values: contest_measure_id, contest_measure_we_vote_id
-
-    # Note: We do not need to connect the candidates with the voter here for a ballot item
-    process_candidates_from_structured_json(
-        candidates_structured_json, google_civic_election_id, ocd_division_id, state_code, contest_office_id,
-        contest_office_we_vote_id)
+        updated_contest_office_values = None
 
-    return update_or_create_contest_office_results
+    results = {
+        'google_ballot_placement':          google_ballot_placement,
+        'candidates_structured_json':       candidates_structured_json,
+        'updated_contest_office_values':    updated_contest_office_values,
+    }
+    return results
 
 
 def extract_value_from_array(structured_json, index_key, default_value):
@@ -369,6 +445,17 @@ def process_contests_from_structured_json(
     or
     "type": "Referendum",
     """
+    if GOOGLE_CIVIC_BULK_STORE:
+        one_ballot = {
+            'contests_structured_json':     contests_structured_json,
+            'google_civic_election_id':     google_civic_election_id,
+            'ocd_division_id':              ocd_division_id,
+            'state_code':                   state_code,
+            'voter_id':                     voter_id,
+            'polling_location_we_vote_id':  polling_location_we_vote_id,
+        }
+        return process_contests_from_structured_json_in_bulk([one_ballot])
+
     local_ballot_order = 0
     contests_saved = 0
     contests_updated = 0
@@ -410,29 +497,485 @@ def process_contests_from_structured_json(
     return results
 
 
+def process_contests_from_structured_json_in_bulk(ballot_list):
+    """
+    Store the contests from one or more ballots with a few queries, instead of an update_or_create for each office,
+    candidate, measure and ballot item. We collect all of them, look for the ones we already have with a few IN
+    queries, then create the new ones with bulk_create and save the changed ones with bulk_update_objects, in one
+    transaction. The values saved are the same as process_contest_office_from_structured_json and
+    process_contest_referendum_from_structured_json save.
+    :param ballot_list: One dict for each ballot, with contests_structured_json, google_civic_election_id,
+    ocd_division_id, state_code, voter_id and polling_location_we_vote_id
+    :return:
+    """
+    # Collect the values from every contest, in ballot order. Keys are the values update_or_create searches with.
+    contest_list = []
+    contest_office_values_by_key = {}
+    contest_measure_values_by_key = {}
+    for one_ballot in ballot_list:
+        google_civic_election_id = one_ballot['google_civic_election_id']
+        ocd_division_id = one_ballot['ocd_division_id']
+        state_code = one_ballot['state_code']
+        local_ballot_order = 0
+        for one_contest in one_ballot['contests_structured_json']:
+            local_ballot_order += 1  # Needed if ballotPlacement isn't provided by Google Civic
+            one_contest_entry = {
+                'ballot':                       one_ballot,
+                'local_ballot_order':           local_ballot_order,
+                'google_ballot_placement':      0,
+                'contest_office_key':           None,
+                'contest_measure_key':          None,
+                'candidates_structured_json':   [],
+            }
+            if one_contest['type'].lower() == 'referendum':
+                measure_results = extract_contest_measure_values_from_structured_json(
+                    one_contest, google_civic_election_id, ocd_division_id, state_code)
+                one_contest_entry['google_ballot_placement'] = measure_results['google_ballot_placement']
+                update_contest_measure_values = measure_results['update_contest_measure_values']
+                if update_contest_measure_values is not None and positive_value_exists(state_code):
+                    contest_measure_key = fetch_contest_measure_key(
+                        google_civic_election_id, update_contest_measure_values['district_id'],
+                        update_contest_measure_values['district_name'], update_contest_measure_values['measure_title'],
+                        state_code)
+                    one_contest_entry['contest_measure_key'] = contest_measure_key
+                    contest_measure_values_by_key[contest_measure_key] = update_contest_measure_values
+            elif 'candidates' in one_contest:
+                office_results = extract_contest_office_values_from_structured_json(
+                    one_contest, google_civic_election_id, ocd_division_id, state_code)
+                one_contest_entry['google_ballot_placement'] = office_results['google_ballot_placement']
+                one_contest_entry['candidates_structured_json'] = office_results['candidates_structured_json']
+                updated_contest_office_values = office_results['updated_contest_office_values']
+                if updated_contest_office_values is not None:
+                    contest_office_key = (str(google_civic_election_id),
+                                          updated_contest_office_values['office_name'].lower())
+                    one_contest_entry['contest_office_key'] = contest_office_key
+                    contest_office_values_by_key[contest_office_key] = updated_contest_office_values
+            contest_list.append(one_contest_entry)
+
+    try:
+        with transaction.atomic():
+            contest_office_results = bulk_update_or_create_by_key(
+                ContestOffice, contest_office_values_by_key,
+                retrieve_existing_contest_offices(contest_office_values_by_key.keys()),
+                'we_vote_id_last_contest_office_integer', 'off')
+            contest_offices_by_key = contest_office_results['objects_by_key']
+            contest_measure_results = bulk_update_or_create_by_key(
+                ContestMeasure, contest_measure_values_by_key,
+                retrieve_existing_contest_measures(contest_measure_values_by_key.keys()),
+                'we_vote_id_last_contest_measure_integer', 'meas')
+            contest_measures_by_key = contest_measure_results['objects_by_key']
+
+            # Candidates need the ids of their offices
+            candidate_campaign_values_by_key = {}
+            for one_contest_entry in contest_list:
+                contest_office = contest_offices_by_key.get(one_contest_entry['contest_office_key'])
+                if contest_office is None:
+                    continue
+                one_ballot = one_contest_entry['ballot']
+                for one_candidate in one_contest_entry['candidates_structured_json']:
+                    updated_candidate_campaign_values = extract_candidate_campaign_values_from_structured_json(
+                        one_candidate, one_ballot['google_civic_election_id'], one_ballot['ocd_division_id'],
+                        one_ballot['state_code'], contest_office.id, contest_office.we_vote_id)
+                    if updated_candidate_campaign_values is not None and \
+                            positive_value_exists(updated_candidate_campaign_values['google_civic_candidate_name']):
+                        candidate_campaign_key = (
+                            str(one_ballot['google_civic_election_id']),
+                            updated_candidate_campaign_values['google_civic_candidate_name'])
+                        candidate_campaign_values_by_key[candidate_campaign_key] = updated_candidate_campaign_values
+            bulk_update_or_create_by_key(
+                CandidateCampaign, candidate_campaign_values_by_key,
+                retrieve_existing_candidate_campaigns(candidate_campaign_values_by_key.keys()),
+                'we_vote_id_last_candidate_campaign_integer', 'cand')
+
+            # Ballot items for the voter or polling location each ballot is for
+            polling_location_we_vote_id_list = [
+                one_ballot['polling_location_we_vote_id'].lower() for one_ballot in ballot_list
+                if positive_value_exists(one_ballot['polling_location_we_vote_id'])]
+            polling_location_we_vote_ids_found = set(
+                PollingLocation.objects.annotate(we_vote_id_lower=Lower('we_vote_id')).filter(
+                    we_vote_id_lower__in=polling_location_we_vote_id_list).values_list('we_vote_id_lower', flat=True)
+            ) if len(polling_location_we_vote_id_list) else set()
+            ballot_item_values_by_key = {}
+            for one_contest_entry in contest_list:
+                one_ballot = one_contest_entry['ballot']
+                google_civic_election_id = one_ballot['google_civic_election_id']
+                contest_office = contest_offices_by_key.get(one_contest_entry['contest_office_key'])
+                contest_measure = contest_measures_by_key.get(one_contest_entry['contest_measure_key'])
+                if contest_office is not None:
+                    # Ballot items keep these ids as text
+                    ballot_item_values = {
+                        'contest_office_id': str(contest_office.id),
+                        'contest_office_we_vote_id': contest_office.we_vote_id,
+                        'contest_measure_id': '0',
+                        'contest_measure_we_vote_id': '',
+                        'ballot_item_display_name': contest_office.office_name,
+                        'measure_subtitle': "",
+                    }
+                elif contest_measure is not None:
+                    ballot_item_values = {
+                        'contest_office_id': '0',
+                        'contest_office_we_vote_id': '',
+                        'contest_measure_id': str(contest_measure.id),
+                        'contest_measure_we_vote_id': contest_measure.we_vote_id,
+                        'ballot_item_display_name': contest_measure.measure_title,
+                        'measure_subtitle': contest_measure.measure_subtitle,
+                    }
+                else:
+                    continue
+                if not positive_value_exists(google_civic_election_id) or \
+                        not positive_value_exists(ballot_item_values['contest_office_we_vote_id'] or
+                                                  ballot_item_values['contest_measure_we_vote_id']):
+                    continue
+                ballot_item_values['google_civic_election_id'] = google_civic_election_id
+                ballot_item_values['google_ballot_placement'] = one_contest_entry['google_ballot_placement']
+                ballot_item_values['local_ballot_order'] = one_contest_entry['local_ballot_order']
+
+                if positive_value_exists(one_ballot['voter_id']):
+                    ballot_item_key = fetch_ballot_item_key(
+                        google_civic_election_id, ballot_item_values['contest_office_id'],
+                        ballot_item_values['contest_measure_id'], voter_id=one_ballot['voter_id'])
+                    ballot_item_values_by_key[ballot_item_key] = dict(ballot_item_values,
+                                                                      voter_id=one_ballot['voter_id'])
+                # If this is a polling location, we want to save the ballot information for it so we can use it as
+                #  reference for nearby voters (when we don't have their full address)
+                polling_location_we_vote_id = one_ballot['polling_location_we_vote_id']
+                if positive_value_exists(polling_location_we_vote_id) and \
+                        polling_location_we_vote_id.lower() in polling_location_we_vote_ids_found:
+                    ballot_item_key = fetch_ballot_item_key(
+                        google_civic_election_id, ballot_item_values['contest_office_id'],
+                        ballot_item_values['contest_measure_id'],
+                        polling_location_we_vote_id=polling_location_we_vote_id)
+                    ballot_item_values_by_key[ballot_item_key] = dict(
+                        ballot_item_values, polling_location_we_vote_id=polling_location_we_vote_id)
+            bulk_update_or_create_by_key(BallotItem, ballot_item_values_by_key,
+                                         retrieve_existing_ballot_items(ballot_item_values_by_key.keys()))
+    except Exception as e:
+        status = 'PROCESS_CONTESTS_IN_BULK_FAILED'
+        handle_exception(e, logger=logger, exception_message=status)
+        results = {
+            'success': False,
+            'status': status,
+        }
+        return results
+
+    # Count each contest the way process_contests_from_structured_json does
+    contests_saved = 0
+    contests_updated = 0
+    contests_not_processed = 0
+    contest_keys_counted = set()
+    contest_keys_created = contest_office_results['keys_created'] | contest_measure_results['keys_created']
+    for one_contest_entry in contest_list:
+        contest_key = one_contest_entry['contest_office_key'] or one_contest_entry['contest_measure_key']
+        if contest_key not in contest_offices_by_key and contest_key not in contest_measures_by_key:
+            contests_not_processed += 1
+        elif contest_key in contest_keys_created and contest_key not in contest_keys_counted:
+            contests_saved += 1
+        else:
+            contests_updated += 1
+        contest_keys_counted.add(contest_key)
+
+    results = {
+        'success': True,
+        'status': 'Contests saved: {saved}, '
+                  'contests updated: {updated}, '
+                  'contests not_processed: {not_processed}'.format(saved=contests_saved, updated=contests_updated,
+                                                                   not_processed=contests_not_processed),
+    }
+    return results
+
+
+def fetch_contest_measure_key(google_civic_election_id, district_id, district_name, measure_title, state_code):
+    # ContestMeasureManager.update_or_create_contest_measure matches district_id exactly, and the rest without case
+    return (str(google_civic_election_id), district_id,
+            district_name.lower() if district_name is not None else None,
+            measure_title.lower() if measure_title is not None else None,
+            state_code.lower() if state_code is not None else None)
+
+
+def fetch_ballot_item_key(google_civic_election_id, contest_office_id, contest_measure_id, voter_id=0,
+                          polling_location_we_vote_id=''):
+    if positive_value_exists(voter_id):
+        return 'voter', str(google_civic_election_id), convert_to_int(voter_id), str(contest_office_id), \
+            str(contest_measure_id)
+    return 'polling_location', str(google_civic_election_id), polling_location_we_vote_id.lower(), \
+        str(contest_office_id), str(contest_measure_id)
+
+
+def retrieve_existing_contest_offices(contest_office_key_list):
+    contest_office_list = []
+    for contest_office_key_chunk in generate_chunks(contest_office_key_list):
+        contest_office_list += ContestOffice.objects.annotate(office_name_lower=Lower('office_name')).filter(
+            google_civic_election_id__in=set(key[0] for key in contest_office_key_chunk),
+            office_name_lower__in=set(key[1] for key in contest_office_key_chunk))
+    return [((contest_office.google_civic_election_id, contest_office.office_name_lower), contest_office)
+            for contest_office in contest_office_list]
+
+
+def retrieve_existing_contest_measures(contest_measure_key_list):
+    contest_measure_list = []
+    for contest_measure_key_chunk in generate_chunks(contest_measure_key_list):
+        contest_measure_list += ContestMeasure.objects.annotate(measure_title_lower=Lower('measure_title')).filter(
+            google_civic_election_id__in=set(key[0] for key in contest_measure_key_chunk),
+            measure_title_lower__in=set(key[3] for key in contest_measure_key_chunk))
+    return [(fetch_contest_measure_key(contest_measure.google_civic_election_id, contest_measure.district_id,
+                                       contest_measure.district_name, contest_measure.measure_title,
+                                       contest_measure.state_code), contest_measure)
+            for contest_measure in contest_measure_list]
+
+
+def retrieve_existing_candidate_campaigns(candidate_campaign_key_list):
+    candidate_campaign_list = []
+    for candidate_campaign_key_chunk in generate_chunks(candidate_campaign_key_list):
+        candidate_campaign_list += CandidateCampaign.objects.filter(
+            google_civic_election_id__in=set(key[0] for key in candidate_campaign_key_chunk),
+            google_civic_candidate_name__in=set(key[1] for key in candidate_campaign_key_chunk))
+    return [((candidate_campaign.google_civic_election_id, candidate_campaign.google_civic_candidate_name),
+             candidate_campaign) for candidate_campaign in candidate_campaign_list]
+
+
+def retrieve_existing_ballot_items(ballot_item_key_list):
+    ballot_item_list = []
+    for ballot_item_key_chunk in generate_chunks(ballot_item_key_list):
+        voter_id_list = set(key[2] for key in ballot_item_key_chunk if key[0] == 'voter')
+        polling_location_we_vote_id_list = set(key[2] for key in ballot_item_key_chunk if key[0] != 'voter')
+        ballot_item_query = BallotItem.objects.annotate(
+            polling_location_we_vote_id_lower=Lower('polling_location_we_vote_id')).filter(
+            google_civic_election_id__in=set(key[1] for key in ballot_item_key_chunk))
+        if len(voter_id_list):
+            ballot_item_list += ballot_item_query.filter(voter_id__in=voter_id_list)
+        if len(polling_location_we_vote_id_list):
+            ballot_item_list += ballot_item_query.filter(
+                polling_location_we_vote_id_lower__in=polling_location_we_vote_id_list)
+    existing_ballot_item_list = []
+    for ballot_item in ballot_item_list:
+        if positive_value_exists(ballot_item.voter_id):
+            ballot_item_key = fetch_ballot_item_key(
+                ballot_item.google_civic_election_id, ballot_item.contest_office_id, ballot_item.contest_measure_id,
+                voter_id=ballot_item.voter_id)
+        else:
+            ballot_item_key = fetch_ballot_item_key(
+                ballot_item.google_civic_election_id, ballot_item.contest_office_id, ballot_item.contest_measure_id,
+                polling_location_we_vote_id=ballot_item.polling_location_we_vote_id or '')
+        existing_ballot_item_list.append((ballot_item_key, ballot_item))
+    return existing_ballot_item_list
+
+
+def bulk_update_or_create_by_key(model_class, values_by_key, existing_object_list, we_vote_id_setting_name='',
+                                 we_vote_id_kind=''):
+    """
+    Like calling model_class.objects.update_or_create for each key in values_by_key, with a few queries.
+    Keys that match more than one existing object are not saved, like update_or_create raising
+    MultipleObjectsReturned.
+    :param values_by_key: The values to save (update_or_create's defaults) for each key
+    :param existing_object_list: (key, object) for every existing object that might match
+    :param we_vote_id_setting_name: When set, we give new objects we_vote_ids the way their save() would
+    :param we_vote_id_kind: ex/ 'off' for 'wv01off123'
+    :return: objects_by_key has the saved object for each key, and keys_created the keys of the new objects
+    """
+    existing_objects_by_key = {}
+    keys_with_multiple_objects = set()
+    for key, existing_object in existing_object_list:
+        if key not in values_by_key:
+            continue
+        if key in existing_objects_by_key:
+            keys_with_multiple_objects.add(key)
+        existing_objects_by_key[key] = existing_object
+
+    objects_by_key = {}
+    objects_to_create = []
+    objects_to_update = []
+    field_names_to_update = set()
+    for key, values in values_by_key.items():
+        if key in keys_with_multiple_objects:
+            continue
+        if key in existing_objects_by_key:
+            existing_object = existing_objects_by_key[key]
+            object_changed = False
+            for field_name, value in values.items():
+                # Compare as the field stores the value, so 12 and '12' in a CharField are the same
+                if getattr(existing_object, field_name) != model_class._meta.get_field(field_name).to_python(value):
+                    setattr(existing_object, field_name, value)
+                    field_names_to_update.add(field_name)
+                    object_changed = True
+            if object_changed:
+                objects_to_update.append(existing_object)
+            objects_by_key[key] = existing_object
+        else:
+            objects_by_key[key] = model_class(**values)
+            objects_to_create.append((key, objects_by_key[key]))
+
+    if positive_value_exists(we_vote_id_setting_name) and len(objects_to_create):
+        site_unique_id_prefix = fetch_site_unique_id_prefix()
+        next_integer_list = fetch_next_we_vote_id_integer_list(we_vote_id_setting_name, len(objects_to_create))
+        for (key, new_object), next_integer in zip(objects_to_create, next_integer_list):
+            new_object.we_vote_id = "wv{site_unique_id_prefix}{kind}{next_integer}".format(
+                site_unique_id_prefix=site_unique_id_prefix, kind=we_vote_id_kind, next_integer=next_integer)
+    model_class.objects.bulk_create([new_object for key, new_object in objects_to_create], batch_size=500)
+    bulk_update_objects(objects_to_update, sorted(field_names_to_update))
+
+    if positive_value_exists(we_vote_id_setting_name) and len(objects_to_create):
+        # bulk_create doesn't give us the new ids, so we look them up by we_vote_id
+        new_objects_by_we_vote_id = {new_object.we_vote_id: new_object for key, new_object in objects_to_create}
+        for we_vote_id_chunk in generate_chunks(new_objects_by_we_vote_id.keys()):
+            for object_id, we_vote_id in model_class.objects.filter(
+                    we_vote_id__in=we_vote_id_chunk).values_list('id', 'we_vote_id'):
+                new_objects_by_we_vote_id[we_vote_id].id = object_id
+        objects_bulk_saved.send(sender=model_class, object_list=list(new_objects_by_we_vote_id.values()))
+
+    results = {
+        'objects_by_key':   objects_by_key,
+        'keys_created':     set(key for key, new_object in objects_to_create),
+    }
+    return results
+
+
 def retrieve_one_ballot_from_google_civic_api(text_for_map_search, incoming_google_civic_election_id=0,
                                               use_test_election=False):
-    # Request json file from Google servers
-    # logger.info("Loading ballot for one address from voterInfoQuery from Google servers")
+    results = fetch_one_ballot_from_google_civic_api(text_for_map_search, incoming_google_civic_election_id,
+                                                     use_test_election)
+
+    # Use Google Civic API call counter to track the number of queries we are doing each day
+    if results['google_called']:
+        google_civic_api_counter_manager = GoogleCivicApiCounterManager()
+        google_civic_api_counter_manager.create_counter_entry('ballot', results['google_civic_election_id'])
+
+    return results
+
+
+def fetch_voter_info_response_cache_path(text_for_map_search, google_civic_election_id):
+    """
+    Where we keep the voterInfoQuery response for this address and election. The file is named with a hash, so the
+    address isn't in the name, and addresses that only differ in case or spacing share one file.
+    """
+    response_key = hashlib.sha256(json.dumps(
+        [normalize_address_for_geocode(text_for_map_search), convert_to_int(google_civic_election_id)]
+    ).encode('utf-8')).hexdigest()
+    return os.path.join(GOOGLE_CIVIC_RESPONSE_CACHE_PATH, response_key[:2], response_key + '.json.gz')
+
+
+def retrieve_cached_voter_info_response(text_for_map_search, google_civic_election_id, ignore_expiration=False):
+    """
+    :return: The structured_json recorded for this address and election, or None if there isn't one (or it is older
+    than GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT and ignore_expiration is False)
+    """
+    response_cache_path = fetch_voter_info_response_cache_path(text_for_map_search, google_civic_election_id)
+    try:
+        with gzip.open(response_cache_path, 'rt', encoding='utf-8') as response_cache_file:
+            cached_response = json.load(response_cache_file)
+    except (OSError, ValueError):
+        return None
+    if not ignore_expiration and \
+            time.time() - cached_response.get('date_recorded', 0) > GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT:
+        return None
+    return cached_response.get('structured_json')
+
+
+def store_cached_voter_info_response(text_for_map_search, google_civic_election_id, structured_json):
+    response_cache_path = fetch_voter_info_response_cache_path(text_for_map_search, google_civic_election_id)
+    try:
+        os.makedirs(os.path.dirname(response_cache_path), exist_ok=True)
+        # Write to a temporary file and then rename it, so another thread or process never reads half a response
+        response_cache_file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(response_cache_path), suffix='.tmp')
+        with os.fdopen(response_cache_file_descriptor, 'wb') as temporary_file:
+            with gzip.GzipFile(fileobj=temporary_file, mode='wb') as response_cache_file:
+                response_cache_file.write(json.dumps({
+                    'date_recorded':            time.time(),
+                    'structured_json':          structured_json,
+                }).encode('utf-8'))
+        os.replace(temporary_path, response_cache_path)
+    except OSError as e:
+        # The response cache is only an optimization
+        logger.error("store_cached_voter_info_response: {error}".format(error=e))
+
+
+def prune_voter_info_response_cache():
+    """
+    Remove the recorded responses older than GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT, and temporary files left behind by
+    a process that stopped while writing one.
+    :return: How many files we removed
+    """
+    oldest_time_to_keep = time.time() - GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT
+    files_removed = 0
+    for directory_path, directory_names, file_names in os.walk(GOOGLE_CIVIC_RESPONSE_CACHE_PATH):
+        for file_name in file_names:
+            file_path = os.path.join(directory_path, file_name)
+            try:
+                if os.path.getmtime(file_path) < oldest_time_to_keep:
+                    os.remove(file_path)
+                    files_removed += 1
+            except OSError:
+                # Another process removed or replaced it first
+                pass
+    return files_removed
+
+
+def fetch_one_ballot_from_google_civic_api(text_for_map_search, incoming_google_civic_election_id=0,
+                                           use_test_election=False, voter_info_url=VOTER_INFO_URL,
+                                           token_bucket=None, response_cache_mode=RESPONSE_CACHE_OFF):
+    """
+    Request the ballot for one address from voterInfoQuery. This doesn't touch the database (not even the
+    GoogleCivicApiCounter), so the ballot harvester can call it from its worker threads. If Google returns an error,
+    request_failed is True and success is False.
+    :param token_bucket: Optional TokenBucket we wait on before each request to Google (not for cached responses)
+    :param response_cache_mode: RESPONSE_CACHE_OFF, RESPONSE_CACHE_RECORD or RESPONSE_CACHE_REPLAY. Only the ballot
+    harvester turns on the response cache.
+    """
     if positive_value_exists(use_test_election):
-        request = requests.get(VOTER_INFO_URL, params={
-            "key": GOOGLE_CIVIC_API_KEY,
-            "address": text_for_map_search,
-            "electionId": 2000,  # The Google Civic API Test election
-        })
-    elif positive_value_exists(incoming_google_civic_election_id):
-        request = requests.get(VOTER_INFO_URL, params={
-            "key": GOOGLE_CIVIC_API_KEY,
-            "address": text_for_map_search,
-            "electionId": incoming_google_civic_election_id,
-        })
+        google_civic_election_id_requested = 2000  # The Google Civic API Test election
     else:
-        request = requests.get(VOTER_INFO_URL, params={
+        google_civic_election_id_requested = convert_to_int(incoming_google_civic_election_id)
+
+    structured_json = None
+    if response_cache_mode in (RESPONSE_CACHE_RECORD, RESPONSE_CACHE_REPLAY):
+        # When replaying, we serve whatever was recorded, however old
+        structured_json = retrieve_cached_voter_info_response(
+            text_for_map_search, google_civic_election_id_requested,
+            ignore_expiration=response_cache_mode == RESPONSE_CACHE_REPLAY)
+    from_response_cache = structured_json is not None
+    google_called = False
+    request_failed = False
+
+    if from_response_cache:
+        status = 'VOTER_INFO_RETRIEVED_FROM_RESPONSE_CACHE'
+    elif response_cache_mode == RESPONSE_CACHE_REPLAY:
+        # We don't know if there is a ballot, so a later harvest (recording, or with Google) should ask again
+        status = 'VOTER_INFO_NOT_IN_RESPONSE_CACHE'
+        request_failed = True
+        structured_json = {}
+    else:
+        # Request json file from Google servers
+        # logger.info("Loading ballot for one address from voterInfoQuery from Google servers")
+        params = {
             "key": GOOGLE_CIVIC_API_KEY,
             "address": text_for_map_search,
-        })
-
-    structured_json = json.loads(request.text)
+        }
+        if positive_value_exists(google_civic_election_id_requested):
+            params["electionId"] = google_civic_election_id_requested
+        if token_bucket is not None:
+            token_bucket.consume()
+        request = http_get(INTEGRATION_GOOGLE_CIVIC, voter_info_url, params=params)
+
+        try:
+            structured_json = json.loads(request.text)
+        except ValueError:
+            structured_json = {}
+        if request.status_code != 200 or not isinstance(structured_json, dict) or 'error' in structured_json:
+            # An error from Google (ex/ a bad key, quota exceeded or an address it can't parse) is not the same as
+            #  "no ballot for this address", so we don't record it or count it as a call
+            error_message = structured_json.get('error', {}) if isinstance(structured_json, dict) else {}
+            status = 'VOTER_INFO_REQUEST_FAILED status_code: {status_code} {message}'.format(
+                status_code=request.status_code,
+                message=error_message.get('message', '') if isinstance(error_message, dict) else error_message)
+            request_failed = True
+            structured_json = {}
+        else:
+            google_called = True
+            status = 'VOTER_INFO_RETRIEVED'
+            # We also record "no ballot for this address" responses
+            if response_cache_mode == RESPONSE_CACHE_RECORD:
+                store_cached_voter_info_response(text_for_map_search, google_civic_election_id_requested,
+                                                 structured_json)
 
     # # For internal testing. Write the json retrieved above into a local file
     # with open('/Users/dalemcgrew/PythonProjects/WeVoteServer/'
@@ -457,10 +1000,6 @@ def retrieve_one_ballot_from_google_civic_api(text_for_map_search, incoming_goog
             success = True
             google_civic_election_id = structured_json['election']['id']
 
-    # Use Google Civic API call counter to track the number of queries we are doing each day
-    google_civic_api_counter_manager = GoogleCivicApiCounterManager()
-    google_civic_api_counter_manager.create_counter_entry('ballot', google_civic_election_id)
-
     if 'pollingLocations' in structured_json:
         polling_location_retrieved = True
         success = True
@@ -472,11 +1011,125 @@ def retrieve_one_ballot_from_google_civic_api(text_for_map_search, incoming_goog
 
     results = {
         'success': success,
+        'status': status,
         'election_data_retrieved': election_data_retrieved,
         'polling_location_retrieved': polling_location_retrieved,
         'contests_retrieved': contests_retrieved,
+        'google_civic_election_id': google_civic_election_id,
         'structured_json': structured_json,
+        'from_response_cache': from_response_cache,
+        'google_called': google_called,  # Only these responses count as calls to the Google Civic API
+        'request_failed': request_failed,  # Google returned an error, so we don't know if there is a ballot
+    }
+    return results
+
+
+def harvest_ballots_for_polling_locations(google_civic_election_id, polling_location_list,
+                                          worker_count=GOOGLE_CIVIC_HARVEST_WORKERS,
+                                          requests_per_second=GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND,
+                                          resume=True, voter_info_url=VOTER_INFO_URL, progress_callback=None,
+                                          response_cache_mode=None):
+    """
+    Retrieve the ballot for each polling location from Google Civic, and store it. A pool of worker_count threads
+    makes the requests, sharing a token bucket so we stay under requests_per_second. The thread that calls this is the
+    only one that writes to the database: as each ballot comes back it stores the ballot, counts the call in
+    GoogleCivicApiCounter, and saves a BallotHarvestCheckpoint for the polling location. When resume is True, we skip
+    the polling locations that were finished by an earlier harvest.
+    :param polling_location_list: PollingLocation objects, or any iterable of them
+    :param progress_callback: Called with the results dict (counts so far) after each ballot is stored
+    :param response_cache_mode: See fetch_one_ballot_from_google_civic_api. If None, we use
+    GOOGLE_CIVIC_RESPONSE_CACHE_MODE. With RESPONSE_CACHE_REPLAY, a harvest makes no requests to Google at all.
+    """
+    if response_cache_mode is None:
+        response_cache_mode = GOOGLE_CIVIC_RESPONSE_CACHE_MODE
+    if response_cache_mode == RESPONSE_CACHE_RECORD:
+        # Replays use responses of any age, so we only remove the expired ones when recording
+        prune_voter_info_response_cache()
+
+    ballot_harvest_checkpoint_manager = BallotHarvestCheckpointManager()
+    if resume:
+        polling_location_we_vote_ids_harvested = \
+            ballot_harvest_checkpoint_manager.retrieve_polling_location_we_vote_ids_harvested(google_civic_election_id)
+    else:
+        polling_location_we_vote_ids_harvested = set()
+
+    results = {
+        'success':                          True,
+        'status':                           'BALLOT_HARVEST_COMPLETE',
+        'ballots_retrieved':                0,
+        'ballots_not_retrieved':            0,
+        'ballots_with_contests_retrieved':  0,
+        'polling_locations_skipped':        0,
     }
+
+    def polling_locations_to_harvest():
+        for polling_location in polling_location_list:
+            if polling_location.we_vote_id in polling_location_we_vote_ids_harvested:
+                results['polling_locations_skipped'] += 1
+                continue
+            yield polling_location.we_vote_id, polling_location.get_text_for_map_search()
+
+    token_bucket = TokenBucket(requests_per_second)
+
+    def fetch_one_ballot(polling_location_we_vote_id, text_for_map_search):
+        try:
+            one_ballot_results = fetch_one_ballot_from_google_civic_api(
+                text_for_map_search, google_civic_election_id, voter_info_url=voter_info_url,
+                token_bucket=token_bucket, response_cache_mode=response_cache_mode)
+        except Exception as e:
+            logger.error("harvest_ballots_for_polling_locations {polling_location_we_vote_id}: {error}".format(
+                polling_location_we_vote_id=polling_location_we_vote_id, error=e))
+            one_ballot_results = None
+        return polling_location_we_vote_id, one_ballot_results
+
+    google_civic_api_counter_manager = GoogleCivicApiCounterManager()
+    polling_location_iterator = polling_locations_to_harvest()
+    # Only keep a few requests waiting for each worker, so we don't load every polling location into memory at once
+    maximum_requests_waiting = worker_count * 2
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        requests_waiting = set()
+        while True:
+            for polling_location_we_vote_id, text_for_map_search in polling_location_iterator:
+                requests_waiting.add(executor.submit(fetch_one_ballot, polling_location_we_vote_id,
+                                                     text_for_map_search))
+                if len(requests_waiting) >= maximum_requests_waiting:
+                    break
+            if not requests_waiting:
+                break
+            requests_finished, requests_waiting = wait(requests_waiting, return_when=FIRST_COMPLETED)
+            for request_finished in requests_finished:
+                polling_location_we_vote_id, one_ballot_results = request_finished.result()
+                if one_ballot_results is None:
+                    harvest_status = HARVEST_REQUEST_FAILED
+                else:
+                    if one_ballot_results['google_called']:
+                        # Counted under the election we are harvesting, even when the address has no ballot for it
+                        google_civic_api_counter_manager.create_counter_entry('ballot', google_civic_election_id)
+                    if one_ballot_results['request_failed']:
+                        harvest_status = HARVEST_REQUEST_FAILED
+                    elif one_ballot_results['success']:
+                        store_one_ballot_results = store_one_ballot_from_google_civic_api(
+                            one_ballot_results['structured_json'], 0, polling_location_we_vote_id)
+                        harvest_status = HARVEST_BALLOT_STORED if store_one_ballot_results['success'] \
+                            else HARVEST_STORE_FAILED
+                    else:
+                        harvest_status = HARVEST_NO_BALLOT
+                    if one_ballot_results['contests_retrieved']:
+                        results['ballots_with_contests_retrieved'] += 1
+
+                if harvest_status == HARVEST_BALLOT_STORED:
+                    results['ballots_retrieved'] += 1
+                else:
+                    results['ballots_not_retrieved'] += 1
+                ballot_harvest_checkpoint_manager.update_or_create_checkpoint(
+                    google_civic_election_id, polling_location_we_vote_id, harvest_status)
+                # Saved with the checkpoints, even while requests are failing and nothing new is counted
+                google_civic_api_counter_buffer.flush_old_counts()
+                if progress_callback is not None:
+                    progress_callback(results)
+
+    # So the statistics include this harvest right away
+    google_civic_api_counter_manager.flush_counter_entries()
     return results
 
 
@@ -563,6 +1216,11 @@ def store_one_ballot_from_google_civic_api(one_ballot_json, voter_id=0, polling_
         status = "STORE_ONE_BALLOT_NO_CONTESTS_FOUND"
         success = False
 
+    if success and positive_value_exists(voter_id):
+        # The voter now has their own ballot items, so stop showing them a shared ballot for this election
+        ballot_template_manager = BallotTemplateManager()
+        ballot_template_manager.delete_voter_ballot_template(voter_id, google_civic_election_id)
+
     # When saving a ballot for individual voter, loop through all pollingLocations and store in local db
     # process_polling_locations_from_structured_json(one_ballot_json['pollingLocations'])
 
@@ -613,7 +1271,7 @@ def retrieve_from_google_civic_api_election_query():
         }
         return results
 
-    request = requests.get(ELECTION_QUERY_URL, params={
+    request = http_get(INTEGRATION_GOOGLE_CIVIC, ELECTION_QUERY_URL, params={
         "key": GOOGLE_CIVIC_API_KEY,  # This comes from an environment variable
     })
     # Use Google Civic API call counter to track the number of queries we are doing each day
@@ -810,44 +1468,17 @@ def process_contest_referendum_from_structured_json(
     "referendumUrl": "http://vig.cdn.sos.ca.gov/2014/general/en/pdf/proposition-45-title-summary-analysis.pdf",
     "district" <= this is an array
     """
-    referendum_title = one_contest_referendum_structured_json['referendumTitle'] if \
-        'referendumTitle' in one_contest_referendum_structured_json else ''
-    referendum_subtitle = one_contest_referendum_structured_json['referendumSubtitle'] if \
-        'referendumSubtitle' in one_contest_referendum_structured_json else ''
-    referendum_url = one_contest_referendum_structured_json['referendumUrl'] if \
-        'referendumUrl' in one_contest_referendum_structured_json else ''
-    referendum_text = one_contest_referendum_structured_json['referendumText'] if \
-        'referendumText' in one_contest_referendum_structured_json else ''
-
-    # These following fields exist for both candidates and referendum
-    results = process_contest_common_fields_from_structured_json(one_contest_referendum_structured_json)
-    google_ballot_placement = results['ballot_placement']  # A number specifying the position of this contest
-    # on the voter's ballot.
-    primary_party = results['primary_party']  # If this is a partisan election, the name of the party it is for.
-    district_name = results['district_name']  # The name of the district.
-    district_scope = results['district_scope']   # The geographic scope of this district. If unspecified the
-    # district's geography is not known. One of: national, statewide, congressional, stateUpper, stateLower,
-    # countywide, judicial, schoolBoard, cityWide, township, countyCouncil, cityCouncil, ward, special
-    district_id = results['district_id']
+    measure_results = extract_contest_measure_values_from_structured_json(
+        one_contest_referendum_structured_json, google_civic_election_id, ocd_division_id, state_code)
+    google_ballot_placement = measure_results['google_ballot_placement']
+    update_contest_measure_values = measure_results['update_contest_measure_values']
 
     # Note that all of the information saved here is independent of a particular voter
     we_vote_id = ''
-    if google_civic_election_id and (district_id or district_name) and referendum_title:
-        update_contest_measure_values = {
-            # Values we search against
-            'google_civic_election_id': google_civic_election_id,
-            'state_code': state_code.lower(),  # Not required for cases of federal offices
-            'district_id': district_id,
-            'district_name': district_name,
-            'measure_title': referendum_title,
-            # The rest of the values
-            'measure_subtitle': referendum_subtitle,
-            'measure_url': referendum_url,
-            'measure_text': referendum_text,
-            'ocd_division_id': ocd_division_id,
-            'primary_party': primary_party,
-            'district_scope': district_scope,
-        }
+    if update_contest_measure_values is not None:
+        referendum_title = update_contest_measure_values['measure_title']
+        district_id = update_contest_measure_values['district_id']
+        district_name = update_contest_measure_values['district_name']
         contest_measure_manager = ContestMeasureManager()
         update_or_create_contest_measure_results = contest_measure_manager.update_or_create_contest_measure(
             we_vote_id, google_civic_election_id, referendum_title, district_id, district_name, state_code,
@@ -893,6 +1524,57 @@ def process_contest_referendum_from_structured_json(
     return update_or_create_contest_measure_results
 
 
+def extract_contest_measure_values_from_structured_json(
+        one_contest_referendum_structured_json, google_civic_election_id, ocd_division_id, state_code):
+    """
+    :return: update_contest_measure_values is None if we don't have the values needed to identify the measure
+    """
+    referendum_title = one_contest_referendum_structured_json['referendumTitle'] if \
+        'referendumTitle' in one_contest_referendum_structured_json else ''
+    referendum_subtitle = one_contest_referendum_structured_json['referendumSubtitle'] if \
+        'referendumSubtitle' in one_contest_referendum_structured_json else ''
+    referendum_url = one_contest_referendum_structured_json['referendumUrl'] if \
+        'referendumUrl' in one_contest_referendum_structured_json else ''
+    referendum_text = one_contest_referendum_structured_json['referendumText'] if \
+        'referendumText' in one_contest_referendum_structured_json else ''
+
+    # These following fields exist for both candidates and referendum
+    results = process_contest_common_fields_from_structured_json(one_contest_referendum_structured_json)
+    google_ballot_placement = results['ballot_placement']  # A number specifying the position of this contest
+    # on the voter's ballot.
+    primary_party = results['primary_party']  # If this is a partisan election, the name of the party it is for.
+    district_name = results['district_name']  # The name of the district.
+    district_scope = results['district_scope']   # The geographic scope of this district. If unspecified the
+    # district's geography is not known. One of: national, statewide, congressional, stateUpper, stateLower,
+    # countywide, judicial, schoolBoard, cityWide, township, countyCouncil, cityCouncil, ward, special
+    district_id = results['district_id']
+
+    if google_civic_election_id and (district_id or district_name) and referendum_title:
+        update_contest_measure_values = {
+            # Values we search against
+            'google_civic_election_id': google_civic_election_id,
+            'state_code': state_code.lower(),  # Not required for cases of federal offices
+            'district_id': district_id,
+            'district_name': district_name,
+            'measure_title': referendum_title,
+            # The rest of the values
+            'measure_subtitle': referendum_subtitle,
+            'measure_url': referendum_url,
+            'measure_text': referendum_text,
+            'ocd_division_id': ocd_division_id,
+            'primary_party': primary_party,
+            'district_scope': district_scope,
+        }
+    else:
+        update_contest_measure_values = None
+
+    results = {
+        'google_ballot_placement':          google_ballot_placement,
+        'update_contest_measure_values':    update_contest_measure_values,
+    }
+    return results
+
+
 # GoogleDivisions  # Represents a political geographic division that matches the requested query.
 # Dale commentary, 2015-04-30 This information becomes useful when we are tying
 # voter address -> precincts -> jurisdictions
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from election.models import Election
+from import_export_google_civic.controllers import GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND, \
+    GOOGLE_CIVIC_HARVEST_WORKERS, GOOGLE_CIVIC_RESPONSE_CACHE_MODE, harvest_ballots_for_polling_locations, \
+    RESPONSE_CACHE_OFF, RESPONSE_CACHE_RECORD, RESPONSE_CACHE_REPLAY
+from polling_location.models import PollingLocation
+import signal
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Retrieves the ballot for each polling location in the election\'s state from Google Civic, and stores ' \
+           'it. Run it again to resume where it stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('google_civic_election_id', type=int)
+        parser.add_argument('--state', default='',
+                            help='Harvest the polling locations in this state, instead of the election\'s state')
+        parser.add_argument('--workers', type=int, default=GOOGLE_CIVIC_HARVEST_WORKERS,
+                            help='How many requests to make to Google Civic at once')
+        parser.add_argument('--requests_per_second', type=float, default=GOOGLE_CIVIC_HARVEST_REQUESTS_PER_SECOND,
+                            help='How many requests to start each second (0 for no limit)')
+        parser.add_argument('--restart', action='store_true', default=False,
+                            help='Ask again for polling locations finished by an earlier harvest')
+        parser.add_argument('--response_cache', default=GOOGLE_CIVIC_RESPONSE_CACHE_MODE,
+                            choices=[RESPONSE_CACHE_OFF, RESPONSE_CACHE_RECORD, RESPONSE_CACHE_REPLAY],
+                            help='"replay" stores the recorded voterInfoQuery responses without asking Google')
+
+    def handle(self, *args, **options):
+        # Stop with SystemExit, so the calls counted in memory are saved at exit (see flush_buffered_counters)
+        signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(128 + signal_number))
+
+        google_civic_election_id = options['google_civic_election_id']
+        state = options['state']
+        if not state:
+            try:
+                election = Election.objects.get(google_civic_election_id=google_civic_election_id)
+            except Election.DoesNotExist:
+                raise CommandError('Election {} not found'.format(google_civic_election_id))
+            state = election.get_election_state()
+        if not state:
+            raise CommandError('Election {} has no state. Use --state'.format(google_civic_election_id))
+
+        # Ordering by "location_name" creates a bit of (locational) random order
+        polling_location_query = PollingLocation.objects.filter(state__iexact=state).order_by('location_name')
+        polling_location_count = polling_location_query.count()
+        self.stdout.write('Harvesting ballots for election {} at {} polling locations in {}\n'.format(
+            google_civic_election_id, polling_location_count, state))
+
+        def show_progress(results):
+            finished_count = results['ballots_retrieved'] + results['ballots_not_retrieved']
+            if finished_count % 100 == 0:
+                self.stdout.write('{} of {} polling locations finished ({} skipped)\n'.format(
+                    finished_count + results['polling_locations_skipped'], polling_location_count,
+                    results['polling_locations_skipped']))
+
+        results = harvest_ballots_for_polling_locations(
+            google_civic_election_id, polling_location_query.iterator(), options['workers'],
+            options['requests_per_second'], resume=not options['restart'], progress_callback=show_progress,
+            response_cache_mode=options['response_cache'])
+        self.stdout.write('Ballots retrieved: {} (with contests: {}), not retrieved: {}, skipped: {}\n'.format(
+            results['ballots_retrieved'], results['ballots_with_contests_retrieved'],
+            results['ballots_not_retrieved'], results['polling_locations_skipped']))
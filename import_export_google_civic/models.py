@@ -3,15 +3,25 @@
 # https://developers.google.com/resources/api-libraries/documentation/civicinfo/v2/python/latest/civicinfo_v2.elections.html
 # -*- coding: UTF-8 -*-
 
-from ballot.models import BallotItem
+from ballot.models import BallotItem, VoterBallotTemplate
 from datetime import date, timedelta
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum
+from exception.models import handle_record_not_found_exception, handle_record_not_saved_exception
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions import BufferedCounter, convert_to_int, positive_value_exists
 
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# Each process counts calls to the Google Civic API in memory, and saves them (with the daily and weekly summaries)
+#  once it has this many, or when the oldest is this many seconds old (see GoogleCivicApiCounterManager)
+GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE = getattr(settings, 'GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE', 50)
+GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS = getattr(settings, 'GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS', 60)
+# The kind_of_action of the summary entries that count every kind of call
+KIND_OF_ACTION_ALL = 'all'
+
 
 def retrieve_google_civic_election_id_for_voter(voter_id):
     """
@@ -31,6 +41,12 @@ def retrieve_google_civic_election_id_for_voter(voter_id):
                 one_ballot_item = ballot_item_list[0]
                 google_civic_election_id = one_ballot_item.google_civic_election_id
                 success = True
+            else:
+                # The voter may be sharing a ballot from a nearby address instead
+                voter_ballot_template = VoterBallotTemplate.objects.filter(voter_id=voter_id).first()
+                if voter_ballot_template is not None:
+                    google_civic_election_id = voter_ballot_template.google_civic_election_id
+                    success = True
         except BallotItem.DoesNotExist:
             pass
 
@@ -74,6 +90,11 @@ class GoogleCivicApiCounterDailySummary(models.Model):
     kind_of_action = models.CharField(verbose_name="kind of call to google", max_length=50, null=True, blank=True)
     # If a 'ballot' entry, store the election this is for
     google_civic_election_id = models.PositiveIntegerField(verbose_name="google civic election id", null=True)
+    api_call_count = models.PositiveIntegerField(verbose_name="number of calls to google", null=False, default=0)
+    date_last_updated = models.DateTimeField(verbose_name='date last updated', null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('date_of_action', 'kind_of_action', 'google_civic_election_id')
 
 
 # This table contains summary entries generated from individual entries stored in the GoogleCivicApiCounter table
@@ -87,6 +108,11 @@ class GoogleCivicApiCounterWeeklySummary(models.Model):
     kind_of_action = models.CharField(verbose_name="kind of call to google", max_length=50, null=True, blank=True)
     # If a 'ballot' entry, store the election this is for
     google_civic_election_id = models.PositiveIntegerField(verbose_name="google civic election id", null=True)
+    api_call_count = models.PositiveIntegerField(verbose_name="number of calls to google", null=False, default=0)
+    date_last_updated = models.DateTimeField(verbose_name='date last updated', null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('year_of_action', 'week_of_action', 'kind_of_action', 'google_civic_election_id')
 
 
 # This table contains summary entries generated from individual entries stored in the GoogleCivicApiCounter table
@@ -106,62 +132,181 @@ class GoogleCivicApiCounterMonthlySummary(models.Model):
 class GoogleCivicApiCounterManager(models.Model):
     def create_counter_entry(self, kind_of_action, google_civic_election_id=0):
         """
-        Create an entry that records that a call to the Google Civic Api was made.
+        Record that a call to the Google Civic Api was made. The call is counted in memory, and saved along with the
+        other calls this process has made once there are GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE of them, or the
+        oldest is GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS old.
         """
-        try:
-            google_civic_election_id = convert_to_int(google_civic_election_id)
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        # TODO: We need to work out the timezone questions
+        return google_civic_api_counter_buffer.increase((date.today(), kind_of_action, google_civic_election_id))
 
-            # TODO: We need to work out the timezone questions
-            GoogleCivicApiCounter.objects.create(
-                kind_of_action=kind_of_action,
-                google_civic_election_id=google_civic_election_id,
-            )
-            success = True
-            status = 'ENTRY_SAVED'
-        except Exception:
-            success = False
-            status = 'SOME_ERROR'
-
-        results = {
-            'success':                  success,
-            'status':                   status,
-        }
-        return results
+    def flush_counter_entries(self):
+        """
+        Save the calls this process has counted (see save_google_civic_api_counter_entries)
+        """
+        return google_civic_api_counter_buffer.flush()
 
     def retrieve_daily_summaries(self, kind_of_action='', google_civic_election_id=0):
-        # Start with today and cycle backwards in time
+        """
+        Return the number of calls for up to 6 of the last 31 days with any calls, starting with today
+        """
+        # Include the calls this process hasn't saved yet
+        self.flush_counter_entries()
         daily_summaries = []
         day_on_stage = date.today()  # TODO: We need to work out the timezone questions
-        number_found = 0
-        maximum_attempts = 30
-        attempt_count = 0
+        maximum_days = 30
+        maximum_summaries = 6
 
         try:
-            # Limit the number of times this runs to EITHER 1) 5 positive numbers
-            #  OR 2) 30 days in the past, whichever comes first
-            while number_found <= 5 and attempt_count <= maximum_attempts:
-                attempt_count += 1
-                counter_queryset = GoogleCivicApiCounter.objects.all()
-                if positive_value_exists(kind_of_action):
-                    counter_queryset = counter_queryset.filter(kind_of_action=kind_of_action)
-                if positive_value_exists(google_civic_election_id):
-                    counter_queryset = counter_queryset.filter(google_civic_election_id=google_civic_election_id)
-
-                # Find the number of these entries on that particular day
-                counter_queryset = counter_queryset.filter(datetime_of_action__contains=day_on_stage)
-                api_call_count = len(counter_queryset)
-
-                # If any api calls were found on that date, pass it out for display
-                if positive_value_exists(api_call_count):
-                    daily_summary = {
-                        'date_string': day_on_stage,
-                        'count': api_call_count,
-                    }
-                    daily_summaries.append(daily_summary)
-                    number_found += 1
-
-                day_on_stage -= timedelta(days=1)
+            summary_queryset = GoogleCivicApiCounterDailySummary.objects.filter(
+                date_of_action__gte=day_on_stage - timedelta(days=maximum_days), api_call_count__gt=0)
+            if positive_value_exists(kind_of_action):
+                summary_queryset = summary_queryset.filter(kind_of_action=kind_of_action)
+            elif positive_value_exists(google_civic_election_id):
+                summary_queryset = summary_queryset.exclude(kind_of_action=KIND_OF_ACTION_ALL)
+            else:
+                summary_queryset = summary_queryset.filter(kind_of_action=KIND_OF_ACTION_ALL)
+            if positive_value_exists(google_civic_election_id):
+                summary_queryset = summary_queryset.filter(google_civic_election_id=google_civic_election_id)
+
+            # One entry per day, adding together the elections (or kinds of call) we didn't filter on
+            summary_queryset = summary_queryset.values('date_of_action').annotate(
+                api_call_total=Sum('api_call_count')).order_by('-date_of_action')
+            for daily_total in summary_queryset[:maximum_summaries]:
+                daily_summary = {
+                    'date_string': daily_total['date_of_action'],
+                    'count': daily_total['api_call_total'],
+                }
+                daily_summaries.append(daily_summary)
         except Exception:
             pass
 
         return daily_summaries
+
+
+def increase_summary_count(summary_model, api_call_count, **summary_key):
+    """
+    Add api_call_count to the summary entry with these values, creating the entry if it doesn't exist yet
+    """
+    if summary_model.objects.filter(**summary_key).update(api_call_count=F('api_call_count') + api_call_count):
+        return
+    try:
+        # A savepoint, so if another process creates this entry first we can still update it
+        with transaction.atomic():
+            summary_model.objects.create(api_call_count=api_call_count, **summary_key)
+    except IntegrityError:
+        summary_model.objects.filter(**summary_key).update(api_call_count=F('api_call_count') + api_call_count)
+
+
+def save_google_civic_api_counter_entries(counter_buffer):
+    """
+    Save the calls counted in counter_buffer: one GoogleCivicApiCounter entry for each call, and an increase to the
+    daily and weekly summaries for each kind of call, and for KIND_OF_ACTION_ALL.
+    :param counter_buffer: Key: (date_of_action, kind_of_action, google_civic_election_id), Value: number of calls
+    """
+    daily_count_by_key = {}
+    weekly_count_by_key = {}
+    counter_entry_list = []
+    for (date_of_action, kind_of_action, google_civic_election_id), api_call_count in counter_buffer.items():
+        year_of_action, week_of_action, day_of_week = date_of_action.isocalendar()
+        for summary_kind_of_action, summary_google_civic_election_id in (
+                (kind_of_action, google_civic_election_id), (KIND_OF_ACTION_ALL, 0)):
+            daily_key = (date_of_action, summary_kind_of_action, summary_google_civic_election_id)
+            daily_count_by_key[daily_key] = daily_count_by_key.get(daily_key, 0) + api_call_count
+            weekly_key = (year_of_action, week_of_action, summary_kind_of_action, summary_google_civic_election_id)
+            weekly_count_by_key[weekly_key] = weekly_count_by_key.get(weekly_key, 0) + api_call_count
+        counter_entry_list += [GoogleCivicApiCounter(kind_of_action=kind_of_action,
+                                                     google_civic_election_id=google_civic_election_id)
+                               for call_number in range(api_call_count)]
+
+    with transaction.atomic():
+        GoogleCivicApiCounter.objects.bulk_create(counter_entry_list, batch_size=500)
+        for (date_of_action, kind_of_action, google_civic_election_id), api_call_count \
+                in daily_count_by_key.items():
+            increase_summary_count(GoogleCivicApiCounterDailySummary, api_call_count,
+                                   date_of_action=date_of_action, kind_of_action=kind_of_action,
+                                   google_civic_election_id=google_civic_election_id)
+        for (year_of_action, week_of_action, kind_of_action, google_civic_election_id), api_call_count \
+                in weekly_count_by_key.items():
+            increase_summary_count(GoogleCivicApiCounterWeeklySummary, api_call_count,
+                                   year_of_action=year_of_action, week_of_action=week_of_action,
+                                   kind_of_action=kind_of_action,
+                                   google_civic_election_id=google_civic_election_id)
+
+
+# The calls this process has counted and not saved yet. They are saved once there are
+#  GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE of them, or the oldest is GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS old
+google_civic_api_counter_buffer = BufferedCounter(save_google_civic_api_counter_entries,
+                                                  GOOGLE_CIVIC_API_COUNTER_FLUSH_SIZE,
+                                                  GOOGLE_CIVIC_API_COUNTER_FLUSH_SECONDS)
+
+
+HARVEST_BALLOT_STORED = 'BALLOT_STORED'
+HARVEST_NO_BALLOT = 'NO_BALLOT'
+HARVEST_STORE_FAILED = 'STORE_FAILED'
+HARVEST_REQUEST_FAILED = 'REQUEST_FAILED'
+HARVEST_STATUS_CHOICES = (
+    (HARVEST_BALLOT_STORED,     'Ballot stored'),
+    (HARVEST_NO_BALLOT,         'Google Civic returned no ballot'),
+    (HARVEST_STORE_FAILED,      'Ballot could not be stored'),
+    (HARVEST_REQUEST_FAILED,    'Request to Google Civic failed'),
+)
+# When we resume a harvest, we skip the polling locations with one of these, and try the others again
+HARVEST_FINISHED_STATUS_LIST = [HARVEST_BALLOT_STORED, HARVEST_NO_BALLOT]
+
+
+class BallotHarvestCheckpoint(models.Model):
+    """
+    One entry for each polling location we have asked Google Civic for a ballot in this election, so a ballot
+    harvest (see import_export_google_civic/controllers.py harvest_ballots_for_polling_locations) can be resumed
+    """
+    google_civic_election_id = models.PositiveIntegerField(verbose_name="google civic election id", null=False)
+    polling_location_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id of the polling location", max_length=255, null=False)
+    harvest_status = models.CharField(max_length=15, choices=HARVEST_STATUS_CHOICES, null=False)
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
+    class Meta:
+        unique_together = ('google_civic_election_id', 'polling_location_we_vote_id')
+
+
+class BallotHarvestCheckpointManager(models.Model):
+
+    def __unicode__(self):
+        return "BallotHarvestCheckpointManager"
+
+    def retrieve_polling_location_we_vote_ids_harvested(self, google_civic_election_id):
+        """
+        :return: set of the polling_location_we_vote_ids we don't need to ask Google Civic about again
+        """
+        try:
+            checkpoint_query = BallotHarvestCheckpoint.objects.filter(
+                google_civic_election_id=convert_to_int(google_civic_election_id),
+                harvest_status__in=HARVEST_FINISHED_STATUS_LIST)
+            return set(checkpoint_query.values_list('polling_location_we_vote_id', flat=True))
+        except Exception as e:
+            handle_record_not_found_exception(e, logger=logger)
+            return set()
+
+    def update_or_create_checkpoint(self, google_civic_election_id, polling_location_we_vote_id, harvest_status):
+        try:
+            BallotHarvestCheckpoint.objects.update_or_create(
+                google_civic_election_id=convert_to_int(google_civic_election_id),
+                polling_location_we_vote_id=polling_location_we_vote_id,
+                defaults={'harvest_status': harvest_status})
+            success = True
+            status = 'BALLOT_HARVEST_CHECKPOINT_SAVED'
+        except Exception as e:
+            success = False
+            status = 'BALLOT_HARVEST_CHECKPOINT_NOT_SAVED'
+            handle_record_not_saved_exception(e, logger=logger, exception_message_optional=status)
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def delete_checkpoints_for_election(self, google_civic_election_id):
+        BallotHarvestCheckpoint.objects.filter(
+            google_civic_election_id=convert_to_int(google_civic_election_id)).delete()
@@ -0,0 +1,303 @@
+# import_export_google_civic/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from ballot.models import BallotItem, BallotReturned
+from candidate.models import CandidateCampaign
+from datetime import date
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from import_export_google_civic.controllers import harvest_ballots_for_polling_locations, \
+    process_contests_from_structured_json, prune_voter_info_response_cache, RESPONSE_CACHE_OFF, \
+    RESPONSE_CACHE_RECORD, RESPONSE_CACHE_REPLAY
+from import_export_google_civic.models import BallotHarvestCheckpoint, google_civic_api_counter_buffer, \
+    GoogleCivicApiCounter, GoogleCivicApiCounterDailySummary, GoogleCivicApiCounterManager, \
+    GoogleCivicApiCounterWeeklySummary, HARVEST_BALLOT_STORED, HARVEST_NO_BALLOT, HARVEST_REQUEST_FAILED, \
+    KIND_OF_ACTION_ALL
+import gzip
+import json
+from measure.models import ContestMeasure
+from office.models import ContestOffice
+import os
+from polling_location.models import PollingLocation
+import tempfile
+import threading
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+
+class VoterInfoQueryStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers like voterInfoQuery: a ballot with no contests for most addresses, no ballot for addresses on
+    "Nowhere Rd", a server error for addresses on "Broken St", and a json error for addresses on "Unparseable Ave"
+    """
+    addresses_requested = []
+    addresses_requested_lock = threading.Lock()
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)['address'][0]
+        with self.addresses_requested_lock:
+            self.addresses_requested.append(address)
+        if 'Broken St' in address:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b'Backend Error')
+            return
+        if 'Unparseable Ave' in address:
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': {'code': 400, 'message': 'Failed to parse address'}}).encode('utf-8'))
+            return
+        if 'Nowhere Rd' in address:
+            voter_info = {'kind': 'civicinfo#voterInfoResponse'}
+        else:
+            line1, city = address.split(', ')[:2]
+            voter_info = {
+                'kind': 'civicinfo#voterInfoResponse',
+                'election': {'id': '4184', 'name': 'California General Election', 'electionDay': '2016-11-08',
+                             'ocdDivisionId': 'ocd-division/country:us/state:ca'},
+                'normalizedInput': {'line1': line1, 'city': city, 'state': 'CA', 'zip': '94612'},
+                'contests': [],
+            }
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(voter_info).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HarvestBallotsForPollingLocationsTestCase(TestCase):
+
+    def setUp(self):
+        google_civic_api_counter_buffer.clear()
+        VoterInfoQueryStubHandler.addresses_requested = []
+        # These tests count each request, and a harvest tries failed polling locations again when it is resumed
+        retries_patch = mock.patch('wevote_functions.http_client.HTTP_CLIENT_MAXIMUM_RETRIES', 0)
+        retries_patch.start()
+        self.addCleanup(retries_patch.stop)
+        self.stub_server = ThreadingHTTPServer(('127.0.0.1', 0), VoterInfoQueryStubHandler)
+        threading.Thread(target=self.stub_server.serve_forever, daemon=True).start()
+        self.voter_info_url = 'http://127.0.0.1:{port}/voterinfo'.format(port=self.stub_server.server_address[1])
+
+        line1_list = ['{number} Broadway'.format(number=number) for number in range(1, 5)] + \
+            ['1 Nowhere Rd', '1 Broken St']
+        self.polling_location_list = [
+            PollingLocation(we_vote_id='wv01ploc{number}'.format(number=number), line1=line1, city='Oakland',
+                            state='CA', zip_long='94612')
+            for number, line1 in enumerate(line1_list, start=1)]
+
+    def tearDown(self):
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+
+    def harvest(self, resume=True, response_cache_mode=RESPONSE_CACHE_OFF):
+        return harvest_ballots_for_polling_locations(4184, self.polling_location_list, worker_count=3,
+                                                     requests_per_second=0, resume=resume,
+                                                     voter_info_url=self.voter_info_url,
+                                                     response_cache_mode=response_cache_mode)
+
+    def test_harvest_stores_ballots_and_checkpoints(self):
+        results = self.harvest()
+        self.assertEqual(results['ballots_retrieved'], 4)
+        self.assertEqual(results['ballots_not_retrieved'], 2)
+        self.assertEqual(len(VoterInfoQueryStubHandler.addresses_requested), 6)
+        self.assertEqual(BallotReturned.objects.filter(google_civic_election_id=4184).count(), 4)
+        # Failed requests are not counted as calls to Google Civic
+        self.assertEqual(GoogleCivicApiCounter.objects.count(), 5)
+        self.assertEqual(GoogleCivicApiCounterDailySummary.objects.get(
+            kind_of_action='ballot', google_civic_election_id=4184).api_call_count, 5)
+        harvest_status_by_polling_location = dict(BallotHarvestCheckpoint.objects.filter(
+            google_civic_election_id=4184).values_list('polling_location_we_vote_id', 'harvest_status'))
+        self.assertEqual(harvest_status_by_polling_location['wv01ploc1'], HARVEST_BALLOT_STORED)
+        self.assertEqual(harvest_status_by_polling_location['wv01ploc5'], HARVEST_NO_BALLOT)
+        self.assertEqual(harvest_status_by_polling_location['wv01ploc6'], HARVEST_REQUEST_FAILED)
+
+    def test_google_errors_are_not_no_ballot(self):
+        self.polling_location_list = [
+            PollingLocation(we_vote_id='wv01ploc7', line1='1 Unparseable Ave', city='Oakland', state='CA',
+                            zip_long='94612')]
+        results = self.harvest()
+        self.assertEqual(results['ballots_not_retrieved'], 1)
+        self.assertEqual(GoogleCivicApiCounter.objects.count(), 0)
+        # So the next harvest asks again
+        self.assertEqual(BallotHarvestCheckpoint.objects.get(polling_location_we_vote_id='wv01ploc7').harvest_status,
+                         HARVEST_REQUEST_FAILED)
+
+    def test_harvest_resumes_from_checkpoints(self):
+        self.harvest()
+        VoterInfoQueryStubHandler.addresses_requested = []
+        results = self.harvest()
+        # Only the failed request is tried again
+        self.assertEqual(results['polling_locations_skipped'], 5)
+        self.assertEqual(VoterInfoQueryStubHandler.addresses_requested, ['1 Broken St, Oakland, CA 94612'])
+
+        VoterInfoQueryStubHandler.addresses_requested = []
+        results = self.harvest(resume=False)
+        self.assertEqual(results['polling_locations_skipped'], 0)
+        self.assertEqual(len(VoterInfoQueryStubHandler.addresses_requested), 6)
+        self.assertEqual(BallotReturned.objects.filter(google_civic_election_id=4184).count(), 4)
+
+    def test_replay_recorded_responses(self):
+        with tempfile.TemporaryDirectory() as response_cache_path, \
+                mock.patch('import_export_google_civic.controllers.GOOGLE_CIVIC_RESPONSE_CACHE_PATH',
+                           response_cache_path):
+            self.harvest(response_cache_mode=RESPONSE_CACHE_RECORD)
+            self.assertEqual(GoogleCivicApiCounter.objects.count(), 5)
+
+            # Responses younger than GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT are used instead of asking again
+            VoterInfoQueryStubHandler.addresses_requested = []
+            self.harvest(resume=False, response_cache_mode=RESPONSE_CACHE_RECORD)
+            self.assertEqual(VoterInfoQueryStubHandler.addresses_requested, ['1 Broken St, Oakland, CA 94612'])
+
+            # Replay never asks Google, even for the address with no recorded response
+            self.stub_server.shutdown()
+            BallotReturned.objects.all().delete()
+            with mock.patch('import_export_google_civic.controllers.GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT', 0):
+                results = self.harvest(resume=False, response_cache_mode=RESPONSE_CACHE_REPLAY)
+            self.assertEqual(results['ballots_retrieved'], 4)
+            self.assertEqual(results['ballots_not_retrieved'], 2)
+            self.assertEqual(BallotReturned.objects.filter(google_civic_election_id=4184).count(), 4)
+            self.assertEqual(GoogleCivicApiCounter.objects.count(), 5)
+            # The address with no recorded response isn't finished
+            self.assertEqual(BallotHarvestCheckpoint.objects.get(
+                polling_location_we_vote_id='wv01ploc6').harvest_status, HARVEST_REQUEST_FAILED)
+
+    def test_recorded_responses_are_named_with_a_hash_and_pruned(self):
+        with tempfile.TemporaryDirectory() as response_cache_path, \
+                mock.patch('import_export_google_civic.controllers.GOOGLE_CIVIC_RESPONSE_CACHE_PATH',
+                           response_cache_path):
+            self.harvest(response_cache_mode=RESPONSE_CACHE_RECORD)
+            response_cache_file_paths = [os.path.join(directory_path, file_name)
+                                         for directory_path, directory_names, file_names in os.walk(response_cache_path)
+                                         for file_name in file_names]
+            self.assertEqual(len(response_cache_file_paths), 5)
+            for response_cache_file_path in response_cache_file_paths:
+                self.assertNotIn('Broadway', response_cache_file_path)
+                with gzip.open(response_cache_file_path, 'rt', encoding='utf-8') as response_cache_file:
+                    self.assertEqual(set(json.load(response_cache_file)), {'date_recorded', 'structured_json'})
+
+            self.assertEqual(prune_voter_info_response_cache(), 0)
+            with mock.patch('import_export_google_civic.controllers.GOOGLE_CIVIC_RESPONSE_CACHE_TIMEOUT', -1):
+                self.assertEqual(prune_voter_info_response_cache(), 5)
+
+
+class GoogleCivicApiCounterTestCase(TestCase):
+
+    def setUp(self):
+        google_civic_api_counter_buffer.clear()
+
+    def test_counter_entries_are_buffered_and_summarized(self):
+        google_civic_api_counter_manager = GoogleCivicApiCounterManager()
+        with mock.patch.object(google_civic_api_counter_buffer, 'flush_size', 5):
+            for call_number in range(4):
+                results = google_civic_api_counter_manager.create_counter_entry('ballot', 4184)
+                self.assertEqual(results['status'], 'ENTRY_BUFFERED')
+            self.assertEqual(GoogleCivicApiCounter.objects.count(), 0)
+            results = google_civic_api_counter_manager.create_counter_entry('election')
+            self.assertEqual(results['status'], 'ENTRIES_SAVED')
+        self.assertEqual(GoogleCivicApiCounter.objects.count(), 5)
+
+        google_civic_api_counter_manager.create_counter_entry('ballot', 4184)
+        google_civic_api_counter_manager.create_counter_entry('ballot', 4162)
+        google_civic_api_counter_manager.flush_counter_entries()
+        self.assertEqual(GoogleCivicApiCounter.objects.count(), 7)
+
+        api_call_count_by_kind = dict(
+            ((daily_summary.kind_of_action, daily_summary.google_civic_election_id), daily_summary.api_call_count)
+            for daily_summary in GoogleCivicApiCounterDailySummary.objects.filter(date_of_action=date.today()))
+        self.assertEqual(api_call_count_by_kind, {
+            ('ballot', 4184): 5,
+            ('ballot', 4162): 1,
+            ('election', 0): 1,
+            (KIND_OF_ACTION_ALL, 0): 7,
+        })
+        year_of_action, week_of_action, day_of_week = date.today().isocalendar()
+        self.assertEqual(GoogleCivicApiCounterWeeklySummary.objects.get(
+            year_of_action=year_of_action, week_of_action=week_of_action,
+            kind_of_action=KIND_OF_ACTION_ALL).api_call_count, 7)
+
+        # Calls not saved yet are included
+        google_civic_api_counter_manager.create_counter_entry('ballot', 4184)
+        self.assertEqual(google_civic_api_counter_manager.retrieve_daily_summaries(),
+                         [{'date_string': date.today(), 'count': 8}])
+        self.assertEqual(google_civic_api_counter_manager.retrieve_daily_summaries(kind_of_action='ballot'),
+                         [{'date_string': date.today(), 'count': 7}])
+        self.assertEqual(google_civic_api_counter_manager.retrieve_daily_summaries(google_civic_election_id=4184),
+                         [{'date_string': date.today(), 'count': 6}])
+
+
+class ProcessContestsInBulkTestCase(TestCase):
+
+    def setUp(self):
+        with open('import_export_google_civic/import_data/voterInfoQuery_VA_sample.json') as json_data:
+            self.contests_structured_json = json.load(json_data)['contests']
+        self.contests_structured_json.append({
+            'type': 'Referendum',
+            'referendumTitle': 'Question 1',
+            'referendumSubtitle': 'School bonds',
+            'district': {'id': '125', 'name': 'NELSON COUNTY', 'scope': 'countywide'},
+        })
+        PollingLocation.objects.create(we_vote_id='wv01ploc1', line1='1 Main St', city='Lovingston', state='VA')
+
+    def process_contests(self, voter_id, polling_location_we_vote_id, bulk_store):
+        with mock.patch('import_export_google_civic.controllers.GOOGLE_CIVIC_BULK_STORE', bulk_store), \
+                CaptureQueriesContext(connection) as queries:
+            results = process_contests_from_structured_json(
+                self.contests_structured_json, '4162', 'ocd-division/country:us/state:va', 'VA', voter_id,
+                polling_location_we_vote_id)
+        return results, len(queries)
+
+    def stored_values(self):
+        # we_vote_ids and ids differ between runs, so we compare by name
+        office_name_by_we_vote_id = dict(ContestOffice.objects.values_list('we_vote_id', 'office_name'))
+        office_name_by_we_vote_id.update(ContestMeasure.objects.values_list('we_vote_id', 'measure_title'))
+        return {
+            'offices': sorted(ContestOffice.objects.values_list(
+                'office_name', 'google_civic_election_id', 'state_code', 'district_id', 'district_name',
+                'district_scope', 'number_voting_for', 'number_elected', 'ocd_division_id')),
+            'measures': sorted(ContestMeasure.objects.values_list(
+                'measure_title', 'measure_subtitle', 'google_civic_election_id', 'state_code', 'district_id',
+                'district_name')),
+            'candidates': sorted(
+                (candidate.candidate_name, candidate.party, candidate.order_on_ballot, candidate.candidate_url,
+                 office_name_by_we_vote_id[candidate.contest_office_we_vote_id])
+                for candidate in CandidateCampaign.objects.all()),
+            'ballot_items': sorted(
+                (ballot_item.voter_id, ballot_item.polling_location_we_vote_id, ballot_item.ballot_item_display_name,
+                 ballot_item.google_ballot_placement, ballot_item.local_ballot_order, ballot_item.measure_subtitle,
+                 office_name_by_we_vote_id[ballot_item.contest_office_we_vote_id or
+                                           ballot_item.contest_measure_we_vote_id])
+                for ballot_item in BallotItem.objects.all()),
+        }
+
+    def delete_stored_values(self):
+        for model_class in (ContestOffice, ContestMeasure, CandidateCampaign, BallotItem):
+            model_class.objects.all().delete()
+
+    def test_bulk_store_matches_one_at_a_time(self):
+        results_one_at_a_time, queries_one_at_a_time = self.process_contests(1, 'wv01ploc1', False)
+        self.process_contests(1, 'wv01ploc1', False)
+        stored_values_one_at_a_time = self.stored_values()
+        self.delete_stored_values()
+
+        results_bulk, queries_bulk = self.process_contests(1, 'wv01ploc1', True)
+        self.assertEqual(results_bulk['status'], results_one_at_a_time['status'])
+        updated_results_bulk, updated_queries_bulk = self.process_contests(1, 'wv01ploc1', True)
+        self.assertEqual(updated_results_bulk['status'],
+                         'Contests saved: 0, contests updated: 9, contests not_processed: 0')
+        self.assertEqual(self.stored_values(), stored_values_one_at_a_time)
+        self.assertEqual(len(stored_values_one_at_a_time['candidates']), 14)
+        self.assertEqual(len(stored_values_one_at_a_time['ballot_items']), 18)
+
+        print("process_contests_from_structured_json, voterInfoQuery_VA_sample.json: "
+              "one at a time {queries_one_at_a_time} queries, bulk {queries_bulk} queries "
+              "({updated_queries_bulk} when nothing changed)".format(
+                  queries_one_at_a_time=queries_one_at_a_time, queries_bulk=queries_bulk,
+                  updated_queries_bulk=updated_queries_bulk))
+        self.assertLess(queries_bulk * 4, queries_one_at_a_time)
+        self.assertLessEqual(updated_queries_bulk, 12)
@@ -6,17 +6,23 @@
 
 from .functions import retrieve_twitter_user_info
 from candidate.models import CandidateCampaignManager, CandidateCampaignListManager
+import codecs
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from config.base import get_environment_variable
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from exception.models import handle_record_not_saved_exception
 from organization.controllers import update_social_media_statistics_in_other_tables
 from organization.models import Organization, OrganizationManager
 import re
-from socket import timeout
+import requests
 import tweepy
-import urllib.request
 from voter.models import VoterDeviceLinkManager, VoterManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, \
-    is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import bulk_update_objects, convert_to_int, \
+    extract_twitter_handle_from_text_string, HostRequestLimiter, is_voter_device_id_valid, positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_SOCIAL_MEDIA_SCRAPE
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -37,18 +43,22 @@ TWITTER_CONSUMER_SECRET = get_environment_variable("TWITTER_CONSUMER_SECRET")
 TWITTER_ACCESS_TOKEN = get_environment_variable("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_TOKEN_SECRET = get_environment_variable("TWITTER_ACCESS_TOKEN_SECRET")
 
-
-class FakeFirefoxURLopener(urllib.request.FancyURLopener):
-    version = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.9; rv:25.0)' \
-            + ' Gecko/20100101 Firefox/25.0'
-
-
-class GetOutOfLoop(Exception):
-    pass
-
-
-class GetOutOfLoopLocal(Exception):
-    pass
+SCRAPE_HEADERS = {
+    'User-Agent':
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
+}
+SCRAPE_TIMEOUT_SECONDS = 5
+# We read each page this many bytes at a time, and keep the end of the text we have already searched so we still find
+#  a link that is split between two chunks
+SCRAPE_CHUNK_SIZE = 16384
+SCRAPE_OVERLAP_CHARACTERS = 200
+# When scraping many sites, we fetch this many pages at once, wait this many seconds between requests to the same
+#  host, stop reading each page after this many bytes, and save the handles we find this many at a time
+SOCIAL_MEDIA_SCRAPE_WORKERS = getattr(settings, 'SOCIAL_MEDIA_SCRAPE_WORKERS', 8)
+SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST = \
+    getattr(settings, 'SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST', 1)
+SOCIAL_MEDIA_SCRAPE_MAXIMUM_BYTES = getattr(settings, 'SOCIAL_MEDIA_SCRAPE_MAXIMUM_BYTES', 1048576)
+SOCIAL_MEDIA_SCRAPE_SAVE_BATCH_SIZE = getattr(settings, 'SOCIAL_MEDIA_SCRAPE_SAVE_BATCH_SIZE', 100)
 
 
 def refresh_twitter_candidate_details(candidate_campaign):
@@ -119,7 +129,14 @@ def refresh_twitter_organization_details(organization):
     return results
 
 
-def scrape_social_media_from_one_site(site_url):
+def scrape_social_media_from_one_site(site_url, host_request_limiter=None,
+                                      maximum_bytes=SOCIAL_MEDIA_SCRAPE_MAXIMUM_BYTES):
+    """
+    Look for a Twitter handle in the page at site_url. We read the page a chunk at a time and stop as soon as we find
+    a handle, or once we have read maximum_bytes.
+    :param host_request_limiter: A HostRequestLimiter, so we don't ask one host for many pages at once
+    :param maximum_bytes: 0 means read the whole page
+    """
     twitter_handle = ''
     twitter_handle_found = False
     facebook_page = ''
@@ -137,71 +154,47 @@ def scrape_social_media_from_one_site(site_url):
         }
         return results
 
-    urllib._urlopener = FakeFirefoxURLopener()
-    headers = {
-        'User-Agent':
-            'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
-           }
-    # 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    # 'Accept-Encoding': 'none',
-    # 'Accept-Language': 'en-US,en;q=0.8',
-    # 'Connection': 'keep-alive'
-    # 'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+    if host_request_limiter is not None:
+        host_request_limiter.wait(site_url)
     try:
-        request = urllib.request.Request(site_url, None, headers)
-        page = urllib.request.urlopen(request, timeout=5)
-        for line in page.readlines():
-            try:
-                if not twitter_handle_found:
-                    for m in re.finditer(RE_TWITTER, line.decode()):
-                        if m:
-                            name = m.group(1)
-                            if name not in TWITTER_BLACKLIST:
-                                twitter_handle = name
-                                twitter_handle_found = True
-                                raise GetOutOfLoopLocal
-            except GetOutOfLoopLocal:
-                pass
-            # SEE NOTE ABOUT FACEBOOK SCRAPING ABOVE
-            # try:
-            #     if not facebook_page_found:
-            #         for m2 in re.finditer(RE_FACEBOOK, line.decode()):
-            #             if m2:
-            #                 possible_page1 = m2.group(1)
-            #                 if possible_page1 not in FACEBOOK_BLACKLIST:
-            #                     facebook_page = possible_page1
-            #                     facebook_page_found = True
-            #                     raise GetOutOfLoopLocal
-            #                 try:
-            #                     possible_page2 = m2.group(2)
-            #                     if possible_page2 not in FACEBOOK_BLACKLIST:
-            #                         facebook_page = possible_page2
-            #                         facebook_page_found = True
-            #                         raise GetOutOfLoopLocal
-            #                     # ATTEMPT 1
-            #                     # start_of_close_tag_index = possible_page2.find('"')
-            #                     # possible_page2 = possible_page2[:start_of_close_tag_index]
-            #                     # ATTEMPT 2
-            #                     # fb_re = re.compile(r'facebook.com([^"]+)')
-            #                     # results = fb_re.findall(possible_page2)
-            #                 except Exception as error_instance:
-            #                     pass
-            #                 # possible_page3 = m2.group(3)
-            #                 # possible_page4 = m2.group(4)
-            # except GetOutOfLoopLocal:
-            #     pass
-            if twitter_handle_found:  # and facebook_page_found:
-                raise GetOutOfLoop
-        success = True
+        bytes_read = 0
+        text_to_search = ''
+        page_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
         status = 'FINISHED_SCRAPING_PAGE'
-    except timeout:
+        # We don't try a website again, since we will scrape it again next time
+        response = http_get(INTEGRATION_SOCIAL_MEDIA_SCRAPE, site_url, headers=SCRAPE_HEADERS,
+                            timeout=SCRAPE_TIMEOUT_SECONDS, maximum_retries=0, stream=True)
+        try:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=SCRAPE_CHUNK_SIZE):
+                bytes_read += len(chunk)
+                last_chunk = positive_value_exists(maximum_bytes) and bytes_read >= maximum_bytes
+                text_to_search += page_decoder.decode(chunk, final=last_chunk)
+                twitter_handle = find_twitter_handle_in_text(text_to_search, last_chunk)
+                # SEE NOTE ABOUT FACEBOOK SCRAPING ABOVE
+                if positive_value_exists(twitter_handle):
+                    twitter_handle_found = True
+                    status = 'TWITTER_HANDLE_FOUND-BREAK_OUT'
+                    break
+                if last_chunk:
+                    status = 'FINISHED_SCRAPING_PAGE-MAXIMUM_BYTES_READ'
+                    break
+                text_to_search = text_to_search[-SCRAPE_OVERLAP_CHARACTERS:]
+            else:
+                twitter_handle = find_twitter_handle_in_text(text_to_search + page_decoder.decode(b'', final=True),
+                                                             True)
+                if positive_value_exists(twitter_handle):
+                    twitter_handle_found = True
+                    status = 'TWITTER_HANDLE_FOUND-BREAK_OUT'
+        finally:
+            # Closing before we read the whole page drops the connection instead of returning it to the pool
+            response.close()
+        success = True
+    except requests.Timeout:
         status = "SCRAPE_TIMEOUT_ERROR"
         success = False
-    except GetOutOfLoop:
-        success = True
-        status = 'TWITTER_HANDLE_FOUND-BREAK_OUT'
-    except IOError as error_instance:
-        # Catch the error message coming back from urllib.request.urlopen and pass it in the status
+    except (requests.RequestException, IOError) as error_instance:
+        # Catch the error message coming back from requests and pass it in the status
         error_message = error_instance
         status = "SCRAPE_SOCIAL_IO_ERROR: {error_message}".format(error_message=error_message)
         success = False
@@ -222,45 +215,135 @@ def scrape_social_media_from_one_site(site_url):
     return results
 
 
-def scrape_and_save_social_media_from_all_organizations(state_code='', force_retrieve=False):
-    facebook_pages_found = 0
+def find_twitter_handle_in_text(text_to_search, end_of_text):
+    """
+    Return the first Twitter handle linked to in text_to_search that isn't in TWITTER_BLACKLIST, or ''.
+    Unless end_of_text is True, we skip a match that reaches the end of text_to_search, since the rest of the handle
+    may be in the next chunk.
+    """
+    for m in re.finditer(RE_TWITTER, text_to_search):
+        if not end_of_text and m.end() == len(text_to_search):
+            break
+        name = m.group(1)
+        if name not in TWITTER_BLACKLIST:
+            return name
+    return ''
+
+
+def scrape_social_media_from_many_sites(site_url_list, worker_count=SOCIAL_MEDIA_SCRAPE_WORKERS,
+                                        seconds_between_requests_per_host=None,
+                                        maximum_bytes=SOCIAL_MEDIA_SCRAPE_MAXIMUM_BYTES):
+    """
+    Scrape each site from a pool of worker_count threads, and yield
+    (site_url_key, scrape_results) as each site finishes (not in the order of site_url_list). Workers don't use the
+    database, so the caller can save as the results come in.
+    :param site_url_list: Any iterable of (site_url_key, site_url). It is read only as workers are ready for more.
+    :param seconds_between_requests_per_host: If not passed in, we use
+    SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST
+    """
+    if seconds_between_requests_per_host is None:
+        seconds_between_requests_per_host = SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST
+    host_request_limiter = HostRequestLimiter(seconds_between_requests_per_host)
+
+    def scrape_one_site(site_url_key, site_url):
+        return site_url_key, scrape_social_media_from_one_site(site_url, host_request_limiter, maximum_bytes)
+
+    site_url_iterator = iter(site_url_list)
+    # Only keep a few sites waiting for each worker, so we don't load every organization into memory at once
+    maximum_sites_waiting = worker_count * 2
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        sites_waiting = set()
+        while True:
+            for site_url_key, site_url in site_url_iterator:
+                sites_waiting.add(executor.submit(scrape_one_site, site_url_key, site_url))
+                if len(sites_waiting) >= maximum_sites_waiting:
+                    break
+            if not sites_waiting:
+                break
+            sites_finished, sites_waiting = wait(sites_waiting, return_when=FIRST_COMPLETED)
+            for site_finished in sites_finished:
+                yield site_finished.result()
+
+
+def save_social_media_in_batches(scraped_object_iterator, twitter_field_name, facebook_field_name,
+                                 batch_size=SOCIAL_MEDIA_SCRAPE_SAVE_BATCH_SIZE):
+    """
+    Copy the Twitter handle and Facebook page found for each object onto it (like update_organization_social_media,
+    we do not save blank values), and save the changed objects batch_size at a time
+    :param scraped_object_iterator: Yields (object, scrape_results), ex/ from scrape_social_media_from_many_sites
+    :return:
+    """
     twitter_handles_found = 0
+    facebook_pages_found = 0
+    objects_saved = 0
+    objects_to_save = []
 
-    organization_manager = OrganizationManager()
-    organization_list_query = Organization.objects.order_by('organization_name')
-    if positive_value_exists(state_code):
-        organization_list_query = organization_list_query.filter(state_served_code=state_code)
+    def save_objects():
+        try:
+            with transaction.atomic():
+                return bulk_update_objects(objects_to_save, [twitter_field_name, facebook_field_name])
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger,
+                                              exception_message_optional='SOCIAL_MEDIA_BATCH_NOT_SAVED')
+            return 0
+
+    for one_object, scrape_results in scraped_object_iterator:
+        values_changed = False
+        # Only include a change if we have a new value (do not try to save blank value)
+        if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
+            twitter_handles_found += 1
+            twitter_handle = scrape_results['twitter_handle'].strip()
+            if twitter_handle != getattr(one_object, twitter_field_name):
+                setattr(one_object, twitter_field_name, twitter_handle)
+                values_changed = True
+        if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
+            facebook_pages_found += 1
+            facebook_page = scrape_results['facebook_page'].strip()
+            if facebook_page != getattr(one_object, facebook_field_name):
+                setattr(one_object, facebook_field_name, facebook_page)
+                values_changed = True
+        if values_changed:
+            objects_to_save.append(one_object)
+            if len(objects_to_save) >= batch_size:
+                objects_saved += save_objects()
+                objects_to_save = []
+    if len(objects_to_save):
+        objects_saved += save_objects()
 
-    organization_list = organization_list_query
-    for organization in organization_list:
-        twitter_handle = False
-        facebook_page = False
-        if not organization.organization_website:
-            continue
-        if (not positive_value_exists(organization.organization_twitter_handle)) or force_retrieve:
-            scrape_results = scrape_social_media_from_one_site(organization.organization_website)
+    results = {
+        'twitter_handles_found':    twitter_handles_found,
+        'facebook_pages_found':     facebook_pages_found,
+        'objects_saved':            objects_saved,
+    }
+    return results
 
-            # Only include a change if we have a new value (do not try to save blank value)
-            if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
-                twitter_handle = scrape_results['twitter_handle']
-                twitter_handles_found += 1
 
-            if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
-                facebook_page = scrape_results['facebook_page']
-                facebook_pages_found += 1
+def scrape_and_save_social_media_from_all_organizations(state_code='', force_retrieve=False,
+                                                        worker_count=SOCIAL_MEDIA_SCRAPE_WORKERS):
+    organization_list_query = Organization.objects.order_by('organization_name')
+    if positive_value_exists(state_code):
+        organization_list_query = organization_list_query.filter(state_served_code=state_code)
+    organization_list_query = organization_list_query.exclude(organization_website__isnull=True).exclude(
+        organization_website='')
+    if not force_retrieve:
+        organization_list_query = organization_list_query.filter(
+            Q(organization_twitter_handle__isnull=True) | Q(organization_twitter_handle=''))
 
-            save_results = organization_manager.update_organization_social_media(organization, twitter_handle,
-                                                                                 facebook_page)
+    site_url_list = ((organization, organization.organization_website)
+                     for organization in organization_list_query.iterator())
+    save_results = save_social_media_in_batches(
+        scrape_social_media_from_many_sites(site_url_list, worker_count),
+        'organization_twitter_handle', 'organization_facebook')
 
-        # ######################################
-        # We refresh the Twitter information in another function
+    # ######################################
+    # We refresh the Twitter information in another function
 
     status = "ORGANIZATION_SOCIAL_MEDIA_SCRAPED"
     results = {
         'success':                  True,
         'status':                   status,
-        'twitter_handles_found':    twitter_handles_found,
-        'facebook_pages_found':     facebook_pages_found,
+        'twitter_handles_found':    save_results['twitter_handles_found'],
+        'facebook_pages_found':     save_results['facebook_pages_found'],
     }
     return results
 
@@ -310,14 +393,12 @@ def retrieve_twitter_data_for_all_organizations(state_code='', google_civic_elec
     return results
 
 
-def scrape_and_save_social_media_for_candidates_in_one_election(google_civic_election_id=0):
-    facebook_pages_found = 0
-    twitter_handles_found = 0
+def scrape_and_save_social_media_for_candidates_in_one_election(google_civic_election_id=0,
+                                                                worker_count=SOCIAL_MEDIA_SCRAPE_WORKERS):
     force_retrieve = False
     status = ""
     google_civic_election_id = convert_to_int(google_civic_election_id)
 
-    candidate_manager = CandidateCampaignManager()
     candidate_list_manager = CandidateCampaignListManager()
     return_list_of_objects = True
     results = candidate_list_manager.retrieve_all_candidates_for_upcoming_election(google_civic_election_id,
@@ -328,34 +409,22 @@ def scrape_and_save_social_media_for_candidates_in_one_election(google_civic_ele
     else:
         candidate_list = []
 
-    for candidate in candidate_list:
-        twitter_handle = False
-        facebook_page = False
-        if not candidate.candidate_url:
-            continue
-        if (not positive_value_exists(candidate.candidate_twitter_handle)) or force_retrieve:
-            scrape_results = scrape_social_media_from_one_site(candidate.candidate_url)
-
-            # Only include a change if we have a new value (do not try to save blank value)
-            if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
-                twitter_handle = scrape_results['twitter_handle']
-                twitter_handles_found += 1
+    site_url_list = ((candidate, candidate.candidate_url) for candidate in candidate_list
+                     if candidate.candidate_url and
+                     ((not positive_value_exists(candidate.candidate_twitter_handle)) or force_retrieve))
+    save_results = save_social_media_in_batches(
+        scrape_social_media_from_many_sites(site_url_list, worker_count),
+        'candidate_twitter_handle', 'facebook_url')
 
-            if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
-                facebook_page = scrape_results['facebook_page']
-                facebook_pages_found += 1
-
-            save_results = candidate_manager.update_candidate_social_media(candidate, twitter_handle, facebook_page)
-
-        # ######################################
-        # We refresh the Twitter information in another function
+    # ######################################
+    # We refresh the Twitter information in another function
 
     status = "ORGANIZATION_SOCIAL_MEDIA_RETRIEVED"
     results = {
         'success':                  True,
         'status':                   status,
-        'twitter_handles_found':    twitter_handles_found,
-        'facebook_pages_found':     facebook_pages_found,
+        'twitter_handles_found':    save_results['twitter_handles_found'],
+        'facebook_pages_found':     save_results['facebook_pages_found'],
     }
     return results
 
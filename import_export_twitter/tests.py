@@ -5,5 +5,139 @@
 # See also WeVoteServer/twitter/tests.py for routines that manage internal twitter data
 
 from django.test import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from import_export_twitter.controllers import SCRAPE_CHUNK_SIZE, scrape_and_save_social_media_from_all_organizations, \
+    scrape_social_media_from_one_site
+from organization.models import Organization
+import os
+import threading
+import time
+from unittest import mock
+from urllib.parse import urlparse
+from wevote_functions.functions import HostRequestLimiter, positive_value_exists
 
-# Create your tests here.
+SAMPLE_PAGES_PATH = os.path.join(os.path.dirname(__file__), 'import_data', 'scrape_sample_pages')
+
+
+class SocialMediaSiteStubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pages in import_data/scrape_sample_pages, plus two made up pages: one with a Twitter link split across
+    two chunks, and one with a Twitter link after 2MB of text
+    """
+    paths_requested = []
+    paths_requested_lock = threading.Lock()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.paths_requested_lock:
+            self.paths_requested.append(path)
+
+        if path == '/split_handle':
+            link_start = '<a href="https://twitter.com/We'
+            body = 'x' * (SCRAPE_CHUNK_SIZE - len(link_start)) + link_start + 'VoteUSA">Twitter</a>'
+        elif path == '/handle_after_filler':
+            body = 'x' * 2097152 + '<a href="https://twitter.com/WeVoteUSA">Twitter</a>'
+        else:
+            page_path = os.path.join(SAMPLE_PAGES_PATH, os.path.basename(path))
+            if not os.path.isfile(page_path):
+                self.send_error(404)
+                return
+            with open(page_path) as page_file:
+                body = page_file.read()
+
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The scraper stops reading once it has what it needs
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ScrapeSocialMediaTestCase(TestCase):
+
+    def setUp(self):
+        SocialMediaSiteStubHandler.paths_requested = []
+        self.stub_server = ThreadingHTTPServer(('127.0.0.1', 0), SocialMediaSiteStubHandler)
+        threading.Thread(target=self.stub_server.serve_forever, daemon=True).start()
+        self.site_url = 'http://127.0.0.1:{port}'.format(port=self.stub_server.server_address[1])
+
+    def tearDown(self):
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+
+    def test_scrape_one_site(self):
+        results = scrape_social_media_from_one_site(self.site_url + '/twitter_handle_in_footer.html')
+        self.assertTrue(results['twitter_handle_found'])
+        self.assertEqual(results['twitter_handle'], 'OaklandParks')
+
+        results = scrape_social_media_from_one_site(self.site_url + '/no_twitter_handle.html')
+        self.assertTrue(results['success'])
+        self.assertFalse(results['twitter_handle_found'])
+
+        results = scrape_social_media_from_one_site(self.site_url + '/missing.html')
+        self.assertFalse(results['success'])
+        self.assertTrue(results['status'].startswith('SCRAPE_SOCIAL_IO_ERROR'))
+
+    def test_scrape_reads_page_in_chunks(self):
+        # The first chunk ends in the middle of the handle
+        results = scrape_social_media_from_one_site(self.site_url + '/split_handle')
+        self.assertEqual(results['twitter_handle'], 'WeVoteUSA')
+
+        results = scrape_social_media_from_one_site(self.site_url + '/handle_after_filler', maximum_bytes=1048576)
+        self.assertFalse(results['twitter_handle_found'])
+        self.assertEqual(results['status'], 'FINISHED_SCRAPING_PAGE-MAXIMUM_BYTES_READ')
+
+        results = scrape_social_media_from_one_site(self.site_url + '/handle_after_filler', maximum_bytes=0)
+        self.assertEqual(results['twitter_handle'], 'WeVoteUSA')
+
+    def test_scrape_and_save_all_organizations(self):
+        page_url = self.site_url + '/twitter_handle_in_footer.html'
+        organization_with_handle_on_site = Organization.objects.create(
+            organization_name='Friends of Oakland Parks', organization_website=page_url)
+        organization_without_handle_on_site = Organization.objects.create(
+            organization_name='Alameda County Library Friends',
+            organization_website=self.site_url + '/no_twitter_handle.html')
+        organization_with_broken_site = Organization.objects.create(
+            organization_name='Broken Site', organization_website=self.site_url + '/missing.html')
+        organization_with_handle = Organization.objects.create(
+            organization_name='Already Has Handle', organization_website=page_url,
+            organization_twitter_handle='AlreadyHasHandle')
+
+        with mock.patch('import_export_twitter.controllers.SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST', 0):
+            results = scrape_and_save_social_media_from_all_organizations(worker_count=3)
+        self.assertEqual(results['twitter_handles_found'], 1)
+        # Organizations that already have a handle are not scraped again
+        self.assertEqual(len(SocialMediaSiteStubHandler.paths_requested), 3)
+        organization_with_handle_on_site.refresh_from_db()
+        self.assertEqual(organization_with_handle_on_site.organization_twitter_handle, 'OaklandParks')
+        for organization in (organization_without_handle_on_site, organization_with_broken_site):
+            organization.refresh_from_db()
+            self.assertFalse(positive_value_exists(organization.organization_twitter_handle))
+        organization_with_handle.refresh_from_db()
+        self.assertEqual(organization_with_handle.organization_twitter_handle, 'AlreadyHasHandle')
+
+        SocialMediaSiteStubHandler.paths_requested = []
+        with mock.patch('import_export_twitter.controllers.SOCIAL_MEDIA_SCRAPE_SECONDS_BETWEEN_REQUESTS_PER_HOST', 0):
+            scrape_and_save_social_media_from_all_organizations(force_retrieve=True, worker_count=3)
+        self.assertEqual(len(SocialMediaSiteStubHandler.paths_requested), 4)
+        organization_with_handle.refresh_from_db()
+        self.assertEqual(organization_with_handle.organization_twitter_handle, 'OaklandParks')
+
+    def test_host_request_limiter(self):
+        host_request_limiter = HostRequestLimiter(0.2)
+        start_time = time.monotonic()
+        for request_number in range(3):
+            host_request_limiter.wait('http://one.example.org/page{number}'.format(number=request_number))
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.4)
+
+        # Another host doesn't wait for the first one
+        start_time = time.monotonic()
+        host_request_limiter.wait('http://two.example.org/')
+        self.assertLess(time.monotonic() - start_time, 0.1)
@@ -12,20 +12,37 @@ from .models import VoteSmartApiCounterManager, VoteSmartCandidate, VoteSmartCan
     vote_smart_special_interest_group_list_filter, \
     VoteSmartState, vote_smart_state_filter
 from .votesmart_local import votesmart, VotesmartApiError
-from candidate.models import CandidateCampaignManager
+from candidate.models import CandidateCampaign, CandidateCampaignManager
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from config.base import get_environment_variable
-import copy
+from django.conf import settings
+from django.db import connections
 from exception.models import handle_record_found_more_than_one_exception
-from position.models import PositionEnteredManager, PERCENT_RATING
+from import_export_google_civic.controllers import bulk_update_or_create_by_key
+import multiprocessing
+from organization.models import Organization
+from position.models import PositionEntered, PositionEnteredManager, PositionForFriends, PositionTallyManager, \
+    PERCENT_RATING
 import requests
+from voter_guide.models import delete_cached_voter_guides_to_follow_for_ballot_item
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions import bulk_update_objects, convert_to_int, generate_chunks, positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_VOTE_SMART
+from wevote_settings.models import fetch_next_we_vote_id_integer_list, fetch_site_unique_id_prefix
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 VOTE_SMART_API_KEY = get_environment_variable("VOTE_SMART_API_KEY")
 VOTE_SMART_API_URL = get_environment_variable("VOTE_SMART_API_URL")
 
+# How many worker processes transfer_vote_smart_ratings_to_positions_for_election uses
+VOTE_SMART_TRANSFER_WORKERS = getattr(settings, 'VOTE_SMART_TRANSFER_WORKERS', 4)
+VOTE_SMART_TRANSFER_CANDIDATES_PER_TASK = 200  # How many candidates a worker transfers the ratings of at a time
+# How many candidates we ask Vote Smart for the ratings of at the same time
+VOTE_SMART_RATINGS_RETRIEVE_WORKERS = getattr(settings, 'VOTE_SMART_RATINGS_RETRIEVE_WORKERS', 4)
+VOTE_SMART_RATINGS_SAVE_BATCH_SIZE = 200  # How many candidates' ratings we compare with the database and save together
+
 votesmart.apikey = VOTE_SMART_API_KEY
 
 
@@ -329,103 +346,145 @@ def retrieve_vote_smart_ratings_for_candidate_into_local_db(vote_smart_candidate
     :param vote_smart_candidate_id:
     :return:
     """
-    rating_one_candidate_exists = False
-    rating_one_candidate_created = False
+    results = retrieve_vote_smart_ratings_for_candidates_into_local_db([vote_smart_candidate_id], workers=1)
+    results = {
+        'status':                       results['status'],
+        'success':                      not results['candidates_failed'],
+        'rating_one_candidate_exists':  str(vote_smart_candidate_id) in results['candidates_with_ratings'],
+        'rating_one_candidate_created': str(vote_smart_candidate_id) in results['candidates_with_new_ratings'],
+    }
+    return results
 
-    try:
+
+def retrieve_vote_smart_ratings_for_candidates_into_local_db(vote_smart_candidate_id_list,
+                                                            workers=VOTE_SMART_RATINGS_RETRIEVE_WORKERS):
+    """
+    Ask Vote Smart for the ratings of these candidates, workers candidates at a time, and save them with
+    save_vote_smart_ratings_for_candidates VOTE_SMART_RATINGS_SAVE_BATCH_SIZE candidates at a time
+    :return: results dict with the sets of vote_smart_candidate_ids candidates_with_ratings,
+    candidates_with_new_ratings and candidates_failed
+    """
+    vote_smart_api_counter_manager = VoteSmartApiCounterManager()
+
+    def retrieve_ratings_for_one_candidate(vote_smart_candidate_id):
         # Use Vote Smart API call counter to track the number of queries we are doing each day
-        vote_smart_api_counter_manager = VoteSmartApiCounterManager()
         vote_smart_api_counter_manager.create_counter_entry('Rating.getCandidateRating')
+        try:
+            return vote_smart_candidate_id, votesmart.rating.getCandidateRating(vote_smart_candidate_id), ""
+        except (VotesmartApiError, requests.RequestException) as error_instance:
+            # Catch the error message coming back from Vote Smart (or the connection error, once http_get has tried
+            #  again) and pass it in the status, so one candidate doesn't stop the others
+            return vote_smart_candidate_id, [], "EXCEPTION_RAISED-{candidateId}: {error_message} * ".format(
+                candidateId=vote_smart_candidate_id, error_message=error_instance.args)
+
+    status = ""
+    results = {
+        'status':                       "",
+        'success':                      True,
+        'candidates_with_ratings':      set(),
+        'candidates_with_new_ratings':  set(),
+        'candidates_failed':            set(),
+        'ratings_created':              0,
+        'category_links_created':       0,
+    }
+    vote_smart_candidate_id_list = list(collections.OrderedDict.fromkeys(
+        str(vote_smart_candidate_id) for vote_smart_candidate_id in vote_smart_candidate_id_list))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for vote_smart_candidate_id_chunk in generate_chunks(vote_smart_candidate_id_list,
+                                                             VOTE_SMART_RATINGS_SAVE_BATCH_SIZE):
+            ratings_list_by_candidate_id = {}
+            for vote_smart_candidate_id, ratings_list, error_status in executor.map(
+                    retrieve_ratings_for_one_candidate, vote_smart_candidate_id_chunk):
+                if error_status:
+                    status += error_status
+                    results['candidates_failed'].add(vote_smart_candidate_id)
+                else:
+                    ratings_list_by_candidate_id[vote_smart_candidate_id] = ratings_list
+            save_results = save_vote_smart_ratings_for_candidates(ratings_list_by_candidate_id)
+            for results_key in ('candidates_with_ratings', 'candidates_with_new_ratings'):
+                results[results_key].update(save_results[results_key])
+            for results_key in ('ratings_created', 'category_links_created'):
+                results[results_key] += save_results[results_key]
+            status += save_results['status']
+    vote_smart_api_counter_manager.flush_counter_entries()
+
+    results['status'] = "VOTE_SMART_RATINGS_BY_CANDIDATE_PROCESSED " + status
+    return results
 
-        ratings_list = votesmart.rating.getCandidateRating(vote_smart_candidate_id)
 
+def save_vote_smart_ratings_for_candidates(ratings_list_by_candidate_id):
+    """
+    Save the getCandidateRating responses for many candidates, with a few queries. We compare them with the
+    VoteSmartRatingOneCandidate and VoteSmartRatingCategoryLink entries we already have, and only write the new and
+    changed ones.
+    :param ratings_list_by_candidate_id: The list of ratings from votesmart.rating.getCandidateRating for each
+    vote_smart_candidate_id
+    :return: results dict with the created counts, and the sets of vote_smart_candidate_ids candidates_with_ratings and
+    candidates_with_new_ratings
+    """
+    # The same keys update_or_create used, one at a time
+    rating_values_by_key = {}
+    category_link_values_by_key = {}
+    for vote_smart_candidate_id, ratings_list in ratings_list_by_candidate_id.items():
         # A Vote Smart "rating" is like a the voter guide for that group for that election. It contains multiple
         # positions about a variety of candidates.
         for one_rating in ratings_list:
             # Note that this filter is specific to the getCandidateRating call
             one_rating_filtered = vote_smart_candidate_rating_filter(one_rating)
-            one_rating_filtered['candidateId'] = vote_smart_candidate_id
-            try:
-                vote_smart_rating_one_candidate, rating_one_candidate_created_temp = \
-                    VoteSmartRatingOneCandidate.objects.update_or_create(
-                        ratingId=one_rating_filtered['ratingId'],
-                        sigId=one_rating_filtered['sigId'],
-                        candidateId=one_rating_filtered['candidateId'],
-                        timeSpan=one_rating_filtered['timeSpan'],
-                        defaults=one_rating_filtered)
-
-                if not rating_one_candidate_exists:
-                    # Once set to True, this stays true
-                    rating_one_candidate_exists = True if vote_smart_rating_one_candidate.candidateId else False
-
-                if not rating_one_candidate_created:
-                    # Once set to True, this stays true
-                    rating_one_candidate_created = True if rating_one_candidate_created_temp else False
-
-                if vote_smart_rating_one_candidate.candidateId:
-                    # We start with one_rating_filtered, and add additional data with each loop below
-                    category_branch = one_rating.categories['category']
-                    if type(category_branch) is list:
-                        category_list = category_branch
-                    else:
-                        category_list = [category_branch]
-                    for one_category in category_list:
-                        # Now save the category/categories for this rating
-                        rating_values_for_category_save = copy.deepcopy(one_rating_filtered)
-                        rating_values_for_category_save['categoryId'] = one_category['categoryId']
-                        rating_values_for_category_save['categoryName'] = one_category['name']
-                        del rating_values_for_category_save['ratingText']
-                        del rating_values_for_category_save['ratingName']
-                        del rating_values_for_category_save['rating']
-                        try:
-                            vote_smart_category_link, created = VoteSmartRatingCategoryLink.objects.update_or_create(
-                                    ratingId=one_rating_filtered['ratingId'],
-                                    sigId=one_rating_filtered['sigId'],
-                                    candidateId=one_rating_filtered['candidateId'],
-                                    timeSpan=one_rating_filtered['timeSpan'],
-                                    categoryId=one_category['categoryId'],
-                                    defaults=rating_values_for_category_save)
-                        except VoteSmartRatingCategoryLink.MultipleObjectsReturned as e:
-                            exception_message_optional = "retrieve_vote_smart_ratings_for_candidate_into_local_db, " \
-                                                         "VoteSmartRatingCategoryLink.objects.update_or_create: " \
-                                                         "ratingId: {ratingId}, " \
-                                                         "sigId: {sigId}, " \
-                                                         "candidateId: {candidateId}, " \
-                                                         "timeSpan: {timeSpan}, " \
-                                                         "categoryId: {categoryId}, " \
-                                                         "".format(ratingId=one_rating_filtered['ratingId'],
-                                                                   sigId=one_rating_filtered['sigId'],
-                                                                   candidateId=one_rating_filtered['candidateId'],
-                                                                   timeSpan=one_rating_filtered['timeSpan'],
-                                                                   categoryId=one_category['categoryId'])
-                            handle_record_found_more_than_one_exception(
-                                e, logger=logger, exception_message_optional=exception_message_optional)
-            except VoteSmartRatingOneCandidate.MultipleObjectsReturned as e:
-                exception_message_optional = "retrieve_vote_smart_ratings_for_candidate_into_local_db, " \
-                                             "VoteSmartRatingOneCandidate.objects.update_or_create: " \
-                                             "ratingId: {ratingId}, " \
-                                             "sigId: {sigId}, " \
-                                             "candidateId: {candidateId}, " \
-                                             "timeSpan: {timeSpan}, " \
-                                             "".format(ratingId=one_rating_filtered['ratingId'],
-                                                       sigId=one_rating_filtered['sigId'],
-                                                       candidateId=one_rating_filtered['candidateId'],
-                                                       timeSpan=one_rating_filtered['timeSpan'])
-                handle_record_found_more_than_one_exception(
-                    e, logger=logger, exception_message_optional=exception_message_optional)
-            status = "VOTE_SMART_RATINGS_BY_CANDIDATE_PROCESSED"
-        success = True
-    except VotesmartApiError as error_instance:
-        # Catch the error message coming back from Vote Smart and pass it in the status
-        error_message = error_instance.args
-        status = "EXCEPTION_RAISED: {error_message}".format(error_message=error_message)
-        success = False
+            one_rating_filtered['candidateId'] = str(vote_smart_candidate_id)
+            # The fields are all CharFields, so we compare the keys as strings
+            rating_key = (str(one_rating_filtered['ratingId']), str(one_rating_filtered['sigId']),
+                          one_rating_filtered['candidateId'], str(one_rating_filtered['timeSpan']))
+            rating_values_by_key[rating_key] = one_rating_filtered
+
+            category_branch = (getattr(one_rating, 'categories', None) or {}).get('category', [])
+            if type(category_branch) is list:
+                category_list = category_branch
+            else:
+                category_list = [category_branch]
+            for one_category in category_list:
+                category_link_values_by_key[rating_key + (str(one_category['categoryId']),)] = {
+                    'ratingId':     one_rating_filtered['ratingId'],
+                    'sigId':        one_rating_filtered['sigId'],
+                    'candidateId':  one_rating_filtered['candidateId'],
+                    'timeSpan':     one_rating_filtered['timeSpan'],
+                    'categoryId':   one_category['categoryId'],
+                    'categoryName': one_category['name'],
+                }
+
+    vote_smart_candidate_id_list = [str(vote_smart_candidate_id)
+                                    for vote_smart_candidate_id in ratings_list_by_candidate_id.keys()]
+    existing_rating_list = [((rating.ratingId, rating.sigId, rating.candidateId, rating.timeSpan), rating)
+                            for rating in VoteSmartRatingOneCandidate.objects.filter(
+                                candidateId__in=vote_smart_candidate_id_list)]
+    rating_results = bulk_update_or_create_by_key(VoteSmartRatingOneCandidate, rating_values_by_key,
+                                                  existing_rating_list)
+
+    status = ""
+    for rating_key in set(rating_values_by_key.keys()) - set(rating_results['objects_by_key'].keys()):
+        status += "MULTIPLE_RATINGS_FOUND-ratingId:{}-sigId:{}-candidateId:{}-timeSpan:{} * ".format(*rating_key)
+    # Like before, we only save the categories of the ratings we could save
+    category_link_values_by_key = {category_link_key: category_link_values for category_link_key, category_link_values
+                                   in category_link_values_by_key.items()
+                                   if category_link_key[:4] in rating_results['objects_by_key']}
+    existing_category_link_list = [
+        ((category_link.ratingId, category_link.sigId, category_link.candidateId, category_link.timeSpan,
+          category_link.categoryId), category_link)
+        for category_link in VoteSmartRatingCategoryLink.objects.filter(candidateId__in=vote_smart_candidate_id_list)]
+    category_link_results = bulk_update_or_create_by_key(VoteSmartRatingCategoryLink, category_link_values_by_key,
+                                                         existing_category_link_list)
+    for category_link_key in set(category_link_values_by_key.keys()) - \
+            set(category_link_results['objects_by_key'].keys()):
+        status += "MULTIPLE_CATEGORY_LINKS_FOUND-ratingId:{}-sigId:{}-candidateId:{}-timeSpan:{}-categoryId:{} * " \
+                  "".format(*category_link_key)
 
     results = {
         'status':                       status,
-        'success':                      success,
-        'rating_one_candidate_exists':  rating_one_candidate_exists,
-        'rating_one_candidate_created': rating_one_candidate_created,
+        'success':                      True,
+        'candidates_with_ratings':      set(rating_key[2] for rating_key in rating_results['objects_by_key'].keys()),
+        'candidates_with_new_ratings':  set(rating_key[2] for rating_key in rating_results['keys_created']),
+        'ratings_created':              len(rating_results['keys_created']),
+        'category_links_created':       len(category_link_results['keys_created']),
     }
     return results
 
@@ -600,7 +659,7 @@ def make_request(cls, method, **kwargs):
     if not kwargs.get('o'):
         kwargs['o'] = "JSON"
     url = get_api_route(cls, method)
-    resp = requests.get(url, params=kwargs)
+    resp = http_get(INTEGRATION_VOTE_SMART, url, params=kwargs)
     if resp.status_code == 200:
         return resp.json()
     else:
@@ -742,6 +801,263 @@ def transfer_vote_smart_ratings_to_positions(candidate_campaign_id, politician_i
     return results
 
 
+def transfer_vote_smart_ratings_to_positions_for_election(google_civic_election_id,
+                                                         workers=VOTE_SMART_TRANSFER_WORKERS):
+    """
+    Like transfer_vote_smart_ratings_to_positions for every candidate in this election that has a vote_smart_id
+    """
+    candidate_campaign_id_list = list(CandidateCampaign.objects.filter(
+        google_civic_election_id=google_civic_election_id).exclude(vote_smart_id__isnull=True).exclude(
+        vote_smart_id='').order_by('id').values_list('id', flat=True))
+    return transfer_vote_smart_ratings_to_positions_for_candidates(candidate_campaign_id_list, workers)
+
+
+def transfer_vote_smart_ratings_to_positions_for_candidates(candidate_campaign_id_list,
+                                                           workers=VOTE_SMART_TRANSFER_WORKERS):
+    """
+    Like transfer_vote_smart_ratings_to_positions for each of these candidates, with a few queries for each
+    VOTE_SMART_TRANSFER_CANDIDATES_PER_TASK candidates. We first make sure there is an organization for every special
+    interest group that rated these candidates, and then transfer the candidates' ratings in worker processes.
+    :param workers: How many processes transfer ratings at the same time. With 1, we don't start any.
+    :return: results dict with the same counts as transfer_vote_smart_ratings_to_positions
+    """
+    vote_smart_candidate_id_set = set()
+    for candidate_campaign_id_chunk in generate_chunks(candidate_campaign_id_list):
+        vote_smart_candidate_id_set.update(CandidateCampaign.objects.filter(id__in=candidate_campaign_id_chunk)
+                                           .exclude(vote_smart_id__isnull=True).values_list('vote_smart_id', flat=True))
+
+    sig_id_set = set()
+    for vote_smart_candidate_id_chunk in generate_chunks(vote_smart_candidate_id_set):
+        sig_id_set.update(VoteSmartRatingOneCandidate.objects.filter(candidateId__in=vote_smart_candidate_id_chunk)
+                          .exclude(sigId='').values_list('sigId', flat=True).distinct())
+    organization_results = update_or_create_we_vote_organizations_for_special_interest_groups(sig_id_set)
+
+    results = {
+        'status':                               "",
+        'success':                              True,
+        'we_vote_organizations_created':        organization_results['we_vote_organizations_created'],
+        'organization_positions_that_exist':    0,
+        'organization_positions_created':       0,
+    }
+    ratings_status = organization_results['status']
+    candidate_campaign_id_chunk_list = list(generate_chunks(candidate_campaign_id_list,
+                                                            VOTE_SMART_TRANSFER_CANDIDATES_PER_TASK))
+    if workers > 1 and len(candidate_campaign_id_chunk_list) > 1:
+        # The worker processes open their own database connections, instead of sharing ours
+        for connection in connections.all():
+            connection.close()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            chunk_results_list = list(executor.map(transfer_vote_smart_ratings_to_positions_for_candidate_chunk,
+                                                   candidate_campaign_id_chunk_list))
+    else:
+        chunk_results_list = [transfer_vote_smart_ratings_to_positions_for_candidate_chunk(candidate_campaign_id_chunk)
+                              for candidate_campaign_id_chunk in candidate_campaign_id_chunk_list]
+
+    for chunk_results in chunk_results_list:
+        results['organization_positions_that_exist'] += chunk_results['organization_positions_that_exist']
+        results['organization_positions_created'] += chunk_results['organization_positions_created']
+        ratings_status += chunk_results['status']
+        if not chunk_results['success']:
+            results['success'] = False
+
+    results['status'] = "TRANSFER_PROCESS_COMPLETED, {candidate_count} candidates: {ratings_status}" \
+                        "".format(candidate_count=len(candidate_campaign_id_list), ratings_status=ratings_status)
+    return results
+
+
+def transfer_vote_smart_ratings_to_positions_for_candidate_chunk(candidate_campaign_id_list):
+    """
+    Create a public position for each organization that rated these candidates and doesn't have a position on them
+    yet, with one bulk insert. The organizations must already exist (see
+    update_or_create_we_vote_organizations_for_special_interest_groups).
+    """
+    organization_positions_that_exist = 0
+    ratings_status = ""
+    candidate_list_by_vote_smart_id = {}
+    for candidate_campaign in CandidateCampaign.objects.filter(id__in=candidate_campaign_id_list):
+        candidate_list_by_vote_smart_id.setdefault(candidate_campaign.vote_smart_id, []).append(candidate_campaign)
+    rating_list = list(VoteSmartRatingOneCandidate.objects.filter(
+        candidateId__in=list(candidate_list_by_vote_smart_id.keys())).order_by('-timeSpan'))  # Desc order
+
+    organization_by_sig_id = {}
+    for organization in Organization.objects.filter(
+            vote_smart_id__in=set(convert_to_int(one_rating.sigId) for one_rating in rating_list)).order_by('-id'):
+        organization_by_sig_id[str(organization.vote_smart_id)] = organization  # The oldest one wins
+
+    # Positions from either table count, like in retrieve_organization_candidate_campaign_position. Older positions
+    #  may only have the organization's we_vote_id, and positions that transfer_vote_smart_ratings_to_positions
+    #  created without an organization are recognized by their rating.
+    position_pair_set = set()
+    position_we_vote_id_pair_set = set()
+    rating_pair_set = set()
+    for position_model in (PositionEntered, PositionForFriends):
+        for organization_id, organization_we_vote_id, candidate_campaign_id, vote_smart_rating_id in \
+                position_model.objects.filter(candidate_campaign_id__in=candidate_campaign_id_list).values_list(
+                    'organization_id', 'organization_we_vote_id', 'candidate_campaign_id', 'vote_smart_rating_id'):
+            position_pair_set.add((organization_id, candidate_campaign_id))
+            if positive_value_exists(organization_we_vote_id):
+                position_we_vote_id_pair_set.add((organization_we_vote_id, candidate_campaign_id))
+            if positive_value_exists(vote_smart_rating_id):
+                rating_pair_set.add((vote_smart_rating_id, candidate_campaign_id))
+
+    positions_to_create = []
+    for one_candidate_rating in rating_list:
+        if not one_candidate_rating.sigId:
+            ratings_status += "MISSING_SPECIAL_INTEREST_GROUP_ID-{ratingId} * " \
+                              "".format(ratingId=one_candidate_rating.ratingId)
+            continue
+        we_vote_organization = organization_by_sig_id.get(one_candidate_rating.sigId)
+        if we_vote_organization is None:
+            ratings_status += "COULD_NOT_FIND_OR_SAVE_NEW_SIG-{sigId} * ".format(sigId=one_candidate_rating.sigId)
+            continue
+        for candidate_campaign in candidate_list_by_vote_smart_id[one_candidate_rating.candidateId]:
+            if (we_vote_organization.id, candidate_campaign.id) in position_pair_set or \
+                    (we_vote_organization.we_vote_id, candidate_campaign.id) in position_we_vote_id_pair_set or \
+                    (convert_to_int(one_candidate_rating.ratingId), candidate_campaign.id) in rating_pair_set:
+                # For now, we only want to create positions that don't exist
+                organization_positions_that_exist += 1
+                continue
+            position_pair_set.add((we_vote_organization.id, candidate_campaign.id))
+            positions_to_create.append(PositionEntered(
+                organization_id=we_vote_organization.id,
+                organization_we_vote_id=we_vote_organization.we_vote_id,
+                speaker_display_name=we_vote_organization.organization_name,
+                google_civic_election_id=candidate_campaign.google_civic_election_id,
+                ballot_item_display_name=candidate_campaign.candidate_name,
+                candidate_campaign_id=candidate_campaign.id,
+                candidate_campaign_we_vote_id=candidate_campaign.we_vote_id,
+                stance=PERCENT_RATING,
+                statement_text=one_candidate_rating.ratingText,
+                vote_smart_time_span=one_candidate_rating.timeSpan,
+                vote_smart_rating_id=one_candidate_rating.ratingId,
+                vote_smart_rating=one_candidate_rating.rating,
+                vote_smart_rating_name=one_candidate_rating.ratingName,
+            ))
+
+    success = True
+    if len(positions_to_create):
+        # bulk_create doesn't call save, so we give out the we_vote_ids, and update the tallies and caches ourselves
+        site_unique_id_prefix = fetch_site_unique_id_prefix()
+        next_integer_list = fetch_next_we_vote_id_integer_list('we_vote_id_last_position_integer',
+                                                               len(positions_to_create))
+        for new_position, next_integer in zip(positions_to_create, next_integer_list):
+            new_position.we_vote_id = "wv{site_unique_id_prefix}pos{next_integer}".format(
+                site_unique_id_prefix=site_unique_id_prefix, next_integer=next_integer)
+        PositionEntered.objects.bulk_create(positions_to_create, batch_size=500)
+
+        candidate_we_vote_id_list_by_election = {}
+        for new_position in positions_to_create:
+            candidate_we_vote_id_list_by_election.setdefault(new_position.google_civic_election_id, set()).add(
+                new_position.candidate_campaign_we_vote_id)
+        position_tally_manager = PositionTallyManager()
+        for google_civic_election_id, candidate_we_vote_id_set in candidate_we_vote_id_list_by_election.items():
+            tally_results = position_tally_manager.update_position_tallies_for_ballot_items(
+                list(candidate_we_vote_id_set), [], google_civic_election_id)
+            if not tally_results['success']:
+                success = False
+                ratings_status += tally_results['status'] + " * "
+            for candidate_we_vote_id in candidate_we_vote_id_set:
+                delete_cached_voter_guides_to_follow_for_ballot_item(candidate_we_vote_id)
+
+    results = {
+        'status':                               ratings_status,
+        'success':                              success,
+        'organization_positions_that_exist':    organization_positions_that_exist,
+        'organization_positions_created':       len(positions_to_create),
+    }
+    return results
+
+
+def update_or_create_we_vote_organizations_for_special_interest_groups(sig_id_list):
+    """
+    Like VoteSmartSpecialInterestGroupManager.update_or_create_we_vote_organization for each of these special
+    interest groups, with a few queries. Groups we don't have yet are retrieved from Vote Smart first.
+    :return: results dict with organization_by_sig_id
+    """
+    sig_id_list = [str(sig_id) for sig_id in sig_id_list if positive_value_exists(sig_id)]
+    status = ""
+    special_interest_group_by_sig_id = {}
+    for sig_id_chunk in generate_chunks(sig_id_list):
+        for special_interest_group in VoteSmartSpecialInterestGroup.objects.filter(sigId__in=sig_id_chunk):
+            special_interest_group_by_sig_id[special_interest_group.sigId] = special_interest_group
+    for sig_id in sig_id_list:
+        if sig_id not in special_interest_group_by_sig_id:
+            # Reach out to Vote Smart and try to retrieve this special interest group by sigId
+            one_group_results = retrieve_vote_smart_special_interest_group_into_local_db(sig_id)
+            if one_group_results['success']:
+                try:
+                    special_interest_group_by_sig_id[sig_id] = VoteSmartSpecialInterestGroup.objects.get(sigId=sig_id)
+                except VoteSmartSpecialInterestGroup.DoesNotExist:
+                    pass
+            if sig_id not in special_interest_group_by_sig_id:
+                status += "COULD_NOT_FIND_OR_SAVE_NEW_SIG-{sigId}-SPECIAL_INTEREST_GROUP_MISSING * " \
+                          "".format(sigId=sig_id)
+
+    organization_by_sig_id = {}
+    for organization in Organization.objects.filter(
+            vote_smart_id__in=[convert_to_int(sig_id) for sig_id in special_interest_group_by_sig_id.keys()]) \
+            .order_by('-id'):
+        organization_by_sig_id[str(organization.vote_smart_id)] = organization  # The oldest one wins
+
+    # Update existing organizations if email or website is missing
+    organizations_to_update = []
+    for sig_id, organization in organization_by_sig_id.items():
+        vote_smart_organization = special_interest_group_by_sig_id[sig_id]
+        organization_changed = False
+        if not positive_value_exists(organization.organization_email) and \
+                positive_value_exists(vote_smart_organization.email):
+            organization.organization_email = vote_smart_organization.email
+            organization_changed = True
+        if not positive_value_exists(organization.organization_website) and \
+                positive_value_exists(vote_smart_organization.url):
+            organization.organization_website = vote_smart_organization.url
+            organization_changed = True
+        if organization_changed:
+            organizations_to_update.append(organization)
+    bulk_update_objects(organizations_to_update, ['organization_email', 'organization_website'])
+
+    # Create new organizations, or find existing orgs with the same name
+    values_by_organization_name = {}
+    for sig_id, vote_smart_organization in special_interest_group_by_sig_id.items():
+        if sig_id in organization_by_sig_id:
+            continue
+        values_by_organization_name[vote_smart_organization.name] = {
+            'organization_name': vote_smart_organization.name,
+            'organization_address': vote_smart_organization.address,
+            'organization_city': vote_smart_organization.city,
+            'organization_state': vote_smart_organization.state,
+            'organization_zip': vote_smart_organization.zip,
+            'organization_phone1': vote_smart_organization.phone1,
+            'organization_phone2': vote_smart_organization.phone2,
+            'organization_fax': vote_smart_organization.fax,
+            'organization_email': vote_smart_organization.email,
+            'organization_website': vote_smart_organization.url,
+            'organization_contact_name': vote_smart_organization.contactName,
+            'organization_description': vote_smart_organization.description,
+            'state_served_code': vote_smart_organization.stateId,
+            'vote_smart_id': vote_smart_organization.sigId,
+        }
+    existing_organization_list = []
+    for organization_name_chunk in generate_chunks(values_by_organization_name.keys()):
+        existing_organization_list += [(organization.organization_name, organization) for organization
+                                       in Organization.objects.filter(organization_name__in=organization_name_chunk)]
+    save_results = bulk_update_or_create_by_key(Organization, values_by_organization_name, existing_organization_list,
+                                                'we_vote_id_last_org_integer', 'org')
+    for organization_name, organization in save_results['objects_by_key'].items():
+        organization_by_sig_id[str(organization.vote_smart_id)] = organization
+    for organization_name in set(values_by_organization_name.keys()) - set(save_results['objects_by_key'].keys()):
+        status += "UPDATE_OR_CREATE_ORGANIZATION_FROM_VOTE_SMART_MULTIPLE_FOUND-{name} * " \
+                  "".format(name=organization_name)
+
+    results = {
+        'status':                           status,
+        'success':                          True,
+        'organization_by_sig_id':           organization_by_sig_id,
+        'we_vote_organizations_created':    len(save_results['keys_created']),
+    }
+    return results
+
+
 def transfer_vote_smart_special_interest_groups_to_we_vote_organizations():
     organizations_errors = ''
     number_of_we_vote_organizations_created = 0
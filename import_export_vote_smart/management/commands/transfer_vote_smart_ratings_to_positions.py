@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from candidate.models import CandidateCampaign
+from import_export_vote_smart.controllers import retrieve_vote_smart_ratings_for_candidates_into_local_db, \
+    transfer_vote_smart_ratings_to_positions_for_election, VOTE_SMART_RATINGS_RETRIEVE_WORKERS, \
+    VOTE_SMART_TRANSFER_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Creates a position for each Vote Smart rating of the candidates in an election, for the ratings that ' \
+           'are already in VoteSmartRatingOneCandidate, or with --retrieve_ratings the latest ratings from Vote Smart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('google_civic_election_id', type=int)
+        parser.add_argument('--workers', type=int, default=VOTE_SMART_TRANSFER_WORKERS,
+                            help='How many processes transfer ratings at the same time')
+        parser.add_argument('--retrieve_ratings', action='store_true',
+                            help='First ask Vote Smart for the latest ratings of the candidates with a vote_smart_id')
+        parser.add_argument('--retrieve_workers', type=int, default=VOTE_SMART_RATINGS_RETRIEVE_WORKERS,
+                            help='How many candidates we ask Vote Smart for the ratings of at the same time')
+
+    def handle(self, *args, **options):
+        if options['retrieve_ratings']:
+            vote_smart_candidate_id_list = CandidateCampaign.objects.filter(
+                google_civic_election_id=options['google_civic_election_id']).exclude(
+                vote_smart_id__isnull=True).exclude(vote_smart_id='').values_list('vote_smart_id', flat=True)
+            results = retrieve_vote_smart_ratings_for_candidates_into_local_db(vote_smart_candidate_id_list,
+                                                                               options['retrieve_workers'])
+            self.stdout.write('{} candidates with ratings, {} ratings created, {} category links created, '
+                              '{} candidates failed\n'.format(
+                                  len(results['candidates_with_ratings']), results['ratings_created'],
+                                  results['category_links_created'], len(results['candidates_failed'])))
+        results = transfer_vote_smart_ratings_to_positions_for_election(options['google_civic_election_id'],
+                                                                        options['workers'])
+        self.stdout.write('{} organizations created, {} positions already existed, {} positions created\n'.format(
+            results['we_vote_organizations_created'], results['organization_positions_that_exist'],
+            results['organization_positions_created']))
+        self.stdout.write(results['status'] + '\n')
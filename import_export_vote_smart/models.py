@@ -3,15 +3,21 @@
 # -*- coding: UTF-8 -*-
 
 from datetime import date, timedelta
+from django.conf import settings
 from django.db import models
 from django.db.models import Q
 from organization.models import OrganizationManager, Organization
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions import BufferedCounter, convert_to_int, positive_value_exists
 
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# Each process counts calls to the Vote Smart API in memory, and saves them once it has this many, or when the oldest
+#  is this many seconds old (see VoteSmartApiCounterManager)
+VOTE_SMART_API_COUNTER_FLUSH_SIZE = getattr(settings, 'VOTE_SMART_API_COUNTER_FLUSH_SIZE', 50)
+VOTE_SMART_API_COUNTER_FLUSH_SECONDS = getattr(settings, 'VOTE_SMART_API_COUNTER_FLUSH_SECONDS', 60)
+
 
 class VoteSmartApiCounter(models.Model):
     # The data and time we reached out to the Google Civic API
@@ -62,29 +68,21 @@ class VoteSmartApiCounterMonthlySummary(models.Model):
 class VoteSmartApiCounterManager(models.Model):
     def create_counter_entry(self, kind_of_action, google_civic_election_id=0):
         """
-        Create an entry that records that a call to the Vote Smart Api was made.
+        Record that a call to the Vote Smart Api was made. The call is counted in memory, and saved along with the
+        other calls this process has made once there are VOTE_SMART_API_COUNTER_FLUSH_SIZE of them, or the oldest is
+        VOTE_SMART_API_COUNTER_FLUSH_SECONDS old.
         """
-        try:
-            google_civic_election_id = convert_to_int(google_civic_election_id)
-
-            # TODO: We need to work out the timezone questions
-            VoteSmartApiCounter.objects.create(
-                kind_of_action=kind_of_action,
-                google_civic_election_id=google_civic_election_id,
-            )
-            success = True
-            status = 'ENTRY_SAVED'
-        except Exception:
-            success = False
-            status = 'SOME_ERROR'
+        return vote_smart_api_counter_buffer.increase((kind_of_action, convert_to_int(google_civic_election_id)))
 
-        results = {
-            'success':                  success,
-            'status':                   status,
-        }
-        return results
+    def flush_counter_entries(self):
+        """
+        Save the calls this process has counted (see save_vote_smart_api_counter_entries)
+        """
+        return vote_smart_api_counter_buffer.flush()
 
     def retrieve_daily_summaries(self, kind_of_action='', google_civic_election_id=0):
+        # Include the calls this process hasn't saved yet
+        self.flush_counter_entries()
         # Start with today and cycle backwards in time
         daily_summaries = []
         day_on_stage = date.today()  # TODO: We need to work out the timezone questions
@@ -123,6 +121,26 @@ class VoteSmartApiCounterManager(models.Model):
         return daily_summaries
 
 
+def save_vote_smart_api_counter_entries(counter_buffer):
+    """
+    Save one VoteSmartApiCounter entry for each call counted in counter_buffer
+    :param counter_buffer: Key: (kind_of_action, google_civic_election_id), Value: number of calls
+    """
+    counter_entry_list = []
+    for (kind_of_action, google_civic_election_id), api_call_count in counter_buffer.items():
+        # TODO: We need to work out the timezone questions
+        counter_entry_list += [VoteSmartApiCounter(kind_of_action=kind_of_action,
+                                                   google_civic_election_id=google_civic_election_id)
+                               for call_number in range(api_call_count)]
+    VoteSmartApiCounter.objects.bulk_create(counter_entry_list, batch_size=500)
+
+
+# The calls this process has counted and not saved yet. They are saved once there are
+#  VOTE_SMART_API_COUNTER_FLUSH_SIZE of them, or the oldest is VOTE_SMART_API_COUNTER_FLUSH_SECONDS old
+vote_smart_api_counter_buffer = BufferedCounter(save_vote_smart_api_counter_entries, VOTE_SMART_API_COUNTER_FLUSH_SIZE,
+                                                VOTE_SMART_API_COUNTER_FLUSH_SECONDS)
+
+
 class VoteSmartCandidateManager(models.Model):
 
     def __unicode__(self):
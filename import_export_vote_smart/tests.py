@@ -0,0 +1,189 @@
+# import_export_vote_smart/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from .votesmart_local import VotesmartApiError, VotesmartApiObject
+from candidate.models import CandidateCampaign
+from django.test import TestCase
+from import_export_vote_smart.controllers import retrieve_vote_smart_ratings_for_candidates_into_local_db, \
+    save_vote_smart_ratings_for_candidates, transfer_vote_smart_ratings_to_positions_for_election
+from import_export_vote_smart.models import VoteSmartApiCounter, VoteSmartApiCounterManager, \
+    VoteSmartRatingCategoryLink, VoteSmartRatingOneCandidate, VoteSmartSpecialInterestGroup
+import import_export_vote_smart.models
+from organization.models import Organization
+from position.models import PERCENT_RATING, PositionEntered, PositionTally
+import requests
+import time
+from unittest import mock
+
+
+class TransferVoteSmartRatingsTestCase(TestCase):
+
+    def setUp(self):
+        self.candidate_list = [CandidateCampaign.objects.create(
+            candidate_name='Candidate {}'.format(number), google_civic_election_id='4184',
+            vote_smart_id=str(53270 + number)) for number in range(3)]
+        for sig_id, name in (('1012', 'League of Conservation Voters'), ('1034', 'Sierra Club'),
+                             ('1086', 'Friends of Oakland Parks')):
+            VoteSmartSpecialInterestGroup.objects.create(sigId=sig_id, name=name, url='http://sig{}.org'.format(sig_id))
+        self.existing_organization = Organization.objects.create(organization_name='League of Conservation Voters',
+                                                                 vote_smart_id=1012)
+        # Found by name, so it gets the Vote Smart id instead of a new organization being created
+        self.organization_with_same_name = Organization.objects.create(organization_name='Sierra Club')
+        for candidate in self.candidate_list:
+            for sig_id, time_span in (('1012', '2014'), ('1012', '2016'), ('1034', '2016'), ('1086', '2016')):
+                VoteSmartRatingOneCandidate.objects.create(
+                    ratingId=sig_id + time_span, sigId=sig_id, candidateId=candidate.vote_smart_id, timeSpan=time_span,
+                    rating='85', ratingName='Lifetime Score', ratingText='')
+        PositionEntered.objects.create(
+            organization_id=self.existing_organization.id,
+            organization_we_vote_id=self.existing_organization.we_vote_id,
+            candidate_campaign_id=self.candidate_list[0].id,
+            candidate_campaign_we_vote_id=self.candidate_list[0].we_vote_id,
+            google_civic_election_id='4184', stance=PERCENT_RATING)
+        # An older position, with only the organization's we_vote_id
+        PositionEntered.objects.create(
+            organization_we_vote_id=self.organization_with_same_name.we_vote_id,
+            candidate_campaign_id=self.candidate_list[1].id,
+            candidate_campaign_we_vote_id=self.candidate_list[1].we_vote_id,
+            google_civic_election_id='4184', stance=PERCENT_RATING)
+
+    def test_transfer_for_election(self):
+        results = transfer_vote_smart_ratings_to_positions_for_election(4184, workers=1)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['we_vote_organizations_created'], 1)
+        self.assertEqual(results['organization_positions_created'], 7)
+        # Two ratings from the same organization make one position
+        self.assertEqual(results['organization_positions_that_exist'], 5)
+
+        self.assertEqual(Organization.objects.count(), 3)
+        self.organization_with_same_name.refresh_from_db()
+        self.assertEqual(self.organization_with_same_name.vote_smart_id, 1034)
+        self.existing_organization.refresh_from_db()
+        self.assertEqual(self.existing_organization.organization_website, 'http://sig1012.org')
+
+        position = PositionEntered.objects.get(organization_we_vote_id=self.existing_organization.we_vote_id,
+                                               candidate_campaign_id=self.candidate_list[1].id)
+        self.assertEqual(position.vote_smart_time_span, '2016')
+        self.assertEqual(position.ballot_item_display_name, 'Candidate 1')
+        self.assertTrue(position.we_vote_id.startswith('wv'))
+        self.assertEqual(len(set(PositionEntered.objects.values_list('we_vote_id', flat=True))), 9)
+        self.assertTrue(PositionTally.objects.filter(ballot_item_we_vote_id=self.candidate_list[1].we_vote_id).exists())
+
+        results = transfer_vote_smart_ratings_to_positions_for_election(4184, workers=1)
+        self.assertEqual(results['we_vote_organizations_created'], 0)
+        self.assertEqual(results['organization_positions_created'], 0)
+        self.assertEqual(PositionEntered.objects.count(), 9)
+
+
+def candidate_rating(sig_id, time_span, rating, categories):
+    """
+    One rating the way votesmart.rating.getCandidateRating returns it
+    """
+    return VotesmartApiObject({
+        'ratingId': sig_id + time_span, 'sigId': sig_id, 'timespan': time_span, 'rating': rating,
+        'ratingName': 'Lifetime Score', 'ratingText': 'Rated {}'.format(rating), 'categories': categories})
+
+
+class SaveVoteSmartRatingsTestCase(TestCase):
+
+    def setUp(self):
+        environment = {'categoryId': '30', 'name': 'Environment'}
+        energy = {'categoryId': '64', 'name': 'Energy'}
+        # Vote Smart sends one category as a dict, and more than one as a list
+        self.ratings_list_by_candidate_id = {
+            '53270': [candidate_rating('1012', '2016', '85', {'category': environment}),
+                      candidate_rating('1034', '2016', '90', {'category': [environment, energy]})],
+            '53271': [candidate_rating('1012', '2016', '40', {'category': environment})],
+            '53272': [],
+        }
+        import_export_vote_smart.models.vote_smart_api_counter_buffer.clear()
+
+    def test_save_and_save_again(self):
+        results = save_vote_smart_ratings_for_candidates(self.ratings_list_by_candidate_id)
+        self.assertEqual(results['ratings_created'], 3)
+        self.assertEqual(results['category_links_created'], 4)
+        self.assertEqual(results['candidates_with_ratings'], {'53270', '53271'})
+        self.assertEqual(results['candidates_with_new_ratings'], {'53270', '53271'})
+        rating = VoteSmartRatingOneCandidate.objects.get(sigId='1034', candidateId='53270')
+        self.assertEqual((rating.ratingId, rating.timeSpan, rating.rating), ('10342016', '2016', '90'))
+        self.assertEqual(set(VoteSmartRatingCategoryLink.objects.filter(sigId='1034').values_list(
+            'categoryId', 'categoryName')), {('30', 'Environment'), ('64', 'Energy')})
+
+        # Nothing changed, so nothing is written
+        with self.assertNumQueries(2):
+            results = save_vote_smart_ratings_for_candidates(self.ratings_list_by_candidate_id)
+        self.assertEqual(results['ratings_created'], 0)
+        self.assertEqual(results['candidates_with_new_ratings'], set())
+
+        self.ratings_list_by_candidate_id['53271'][0].rating = '45'
+        results = save_vote_smart_ratings_for_candidates(self.ratings_list_by_candidate_id)
+        self.assertEqual(results['ratings_created'], 0)
+        self.assertEqual(VoteSmartRatingOneCandidate.objects.get(candidateId='53271').rating, '45')
+        self.assertEqual(VoteSmartRatingOneCandidate.objects.count(), 3)
+        self.assertEqual(VoteSmartRatingCategoryLink.objects.count(), 4)
+
+    def test_retrieve_counts_the_api_calls(self):
+        def get_candidate_rating(vote_smart_candidate_id):
+            if vote_smart_candidate_id == '53273':
+                raise VotesmartApiError('No Ratings fit this criteria.')
+            if vote_smart_candidate_id == '53274':
+                raise requests.ConnectionError('Connection refused')
+            return self.ratings_list_by_candidate_id[vote_smart_candidate_id]
+
+        with mock.patch('import_export_vote_smart.controllers.votesmart.rating.getCandidateRating',
+                        side_effect=get_candidate_rating):
+            results = retrieve_vote_smart_ratings_for_candidates_into_local_db(
+                [53270, '53271', '53272', '53273', '53274', '53270'], workers=2)
+        self.assertEqual(results['candidates_with_ratings'], {'53270', '53271'})
+        self.assertEqual(results['candidates_failed'], {'53273', '53274'})
+        self.assertIn('No Ratings fit this criteria.', results['status'])
+        self.assertIn('Connection refused', results['status'])
+        self.assertEqual(VoteSmartApiCounter.objects.filter(kind_of_action='Rating.getCandidateRating').count(), 5)
+
+    def test_api_calls_are_saved_together(self):
+        vote_smart_api_counter_manager = VoteSmartApiCounterManager()
+        with mock.patch.object(import_export_vote_smart.models.vote_smart_api_counter_buffer, 'flush_size', 3):
+            for call_number in range(2):
+                self.assertEqual(vote_smart_api_counter_manager.create_counter_entry('Votes.getBill')['status'],
+                                 'ENTRY_BUFFERED')
+            self.assertEqual(VoteSmartApiCounter.objects.count(), 0)
+            self.assertEqual(vote_smart_api_counter_manager.create_counter_entry('Rating.getCandidateRating', 4184)[
+                'status'], 'ENTRIES_SAVED')
+        self.assertEqual(VoteSmartApiCounter.objects.filter(kind_of_action='Votes.getBill').count(), 2)
+        self.assertEqual(VoteSmartApiCounter.objects.get(kind_of_action='Rating.getCandidateRating')
+                         .google_civic_election_id, 4184)
+
+    def test_benchmark_save_ratings(self):
+        candidate_count = 300
+        ratings_list_by_candidate_id = {str(60000 + number): [
+            candidate_rating(str(1000 + sig_number), '2016', str(sig_number * 10),
+                             {'category': [{'categoryId': '30', 'name': 'Environment'},
+                                           {'categoryId': '64', 'name': 'Energy'}]})
+            for sig_number in range(5)] for number in range(candidate_count)}
+
+        start_time = time.time()
+        for vote_smart_candidate_id, ratings_list in ratings_list_by_candidate_id.items():
+            for one_rating in ratings_list:
+                VoteSmartRatingOneCandidate.objects.update_or_create(
+                    ratingId=one_rating.ratingId, sigId=one_rating.sigId, candidateId=vote_smart_candidate_id,
+                    timeSpan=one_rating.timespan, defaults={'rating': one_rating.rating})
+                for one_category in one_rating.categories['category']:
+                    VoteSmartRatingCategoryLink.objects.update_or_create(
+                        ratingId=one_rating.ratingId, sigId=one_rating.sigId, candidateId=vote_smart_candidate_id,
+                        timeSpan=one_rating.timespan, categoryId=one_category['categoryId'],
+                        defaults={'categoryName': one_category['name']})
+        one_at_a_time_seconds = time.time() - start_time
+        VoteSmartRatingOneCandidate.objects.all().delete()
+        VoteSmartRatingCategoryLink.objects.all().delete()
+
+        start_time = time.time()
+        results = save_vote_smart_ratings_for_candidates(ratings_list_by_candidate_id)
+        bulk_seconds = time.time() - start_time
+        self.assertEqual(results['ratings_created'], candidate_count * 5)
+        self.assertEqual(results['category_links_created'], candidate_count * 10)
+
+        print("Saving the ratings of {candidate_count} candidates: update_or_create {one_at_a_time_seconds:.3f}s, "
+              "save_vote_smart_ratings_for_candidates {bulk_seconds:.3f}s".format(
+                  candidate_count=candidate_count, one_at_a_time_seconds=one_at_a_time_seconds,
+                  bulk_seconds=bulk_seconds))
@@ -8,10 +8,12 @@ from .controllers import retrieve_and_match_candidate_from_vote_smart, \
     retrieve_vote_smart_position_categories_into_local_db, \
     retrieve_vote_smart_officials_into_local_db, retrieve_and_save_vote_smart_states, \
     retrieve_vote_smart_ratings_for_candidate_into_local_db, retrieve_vote_smart_ratings_by_group_into_local_db, \
+    retrieve_vote_smart_ratings_for_candidates_into_local_db, \
     retrieve_vote_smart_special_interest_group_into_local_db, \
     retrieve_vote_smart_special_interest_groups_into_local_db, \
     transfer_vote_smart_special_interest_groups_to_we_vote_organizations, \
-    transfer_vote_smart_ratings_to_positions_for_candidate, transfer_vote_smart_ratings_to_positions_for_politician
+    transfer_vote_smart_ratings_to_positions_for_candidate, transfer_vote_smart_ratings_to_positions_for_candidates, \
+    transfer_vote_smart_ratings_to_positions_for_politician
 from .models import VoteSmartCandidate, VoteSmartCategory, VoteSmartRating, VoteSmartRatingOneCandidate, \
     VoteSmartSpecialInterestGroup, VoteSmartState
 from .votesmart_local import VotesmartApiError
@@ -422,32 +424,22 @@ def retrieve_positions_from_vote_smart_for_election_view(request):
     vote_smart_candidates_that_exist = 0
     vote_smart_candidates_created = 0
     vote_smart_candidates_not_found = 0
-    we_vote_organizations_created = 0
-    organization_positions_that_exist = 0
-    organization_positions_created = 0
-    # Do a first pass through where we get positions for candidates for whom we already have an id
+    candidate_campaign_id_list = []
+    # Do a first pass through where we get ratings for candidates for whom we already have an id, all together
+    vote_smart_candidate_id_list = []
     for we_vote_candidate in candidate_list:
         if we_vote_candidate.vote_smart_id:
-            retrieve_results = retrieve_vote_smart_ratings_for_candidate_into_local_db(we_vote_candidate.vote_smart_id)
-            transfer_results = transfer_vote_smart_ratings_to_positions_for_candidate(we_vote_candidate.id)
-
-            if retrieve_results['rating_one_candidate_exists']:
-                vote_smart_candidates_that_exist += 1
-            if retrieve_results['rating_one_candidate_created']:
-                vote_smart_candidates_created += 1
-
-            if transfer_results['we_vote_organizations_created']:
-                we_vote_organizations_created += 1
-            if transfer_results['organization_positions_that_exist']:
-                organization_positions_that_exist += 1
-            if transfer_results['organization_positions_created']:
-                organization_positions_created += 1
+            vote_smart_candidate_id_list.append(we_vote_candidate.vote_smart_id)
+            candidate_campaign_id_list.append(we_vote_candidate.id)
+    retrieve_results = retrieve_vote_smart_ratings_for_candidates_into_local_db(vote_smart_candidate_id_list)
+    vote_smart_candidates_that_exist += len(retrieve_results['candidates_with_ratings'])
+    vote_smart_candidates_created += len(retrieve_results['candidates_with_new_ratings'])
 
     message = "About to cycle through candidates for whom we don't have Vote Smart IDs for."
     print_to_log(logger, exception_message_optional=message)
 
     # Then we cycle through again, reach out to Vote Smart to match the candidate if we did not have a vote_smart_id,
-    # and if we find a new Vote Smart id, we get positions for that candidate
+    # and if we find a new Vote Smart id, we get ratings for that candidate
     for we_vote_candidate in candidate_list:
         if not we_vote_candidate.vote_smart_id:
             force_retrieve = False
@@ -457,22 +449,21 @@ def retrieve_positions_from_vote_smart_for_election_view(request):
                 if we_vote_candidate.vote_smart_id:
                     retrieve_results = retrieve_vote_smart_ratings_for_candidate_into_local_db(
                         we_vote_candidate.vote_smart_id)
-                    transfer_results = transfer_vote_smart_ratings_to_positions_for_candidate(we_vote_candidate.id)
+                    candidate_campaign_id_list.append(we_vote_candidate.id)
 
                     if retrieve_results['rating_one_candidate_exists']:
                         vote_smart_candidates_that_exist += 1
                     if retrieve_results['rating_one_candidate_created']:
                         vote_smart_candidates_created += 1
-
-                    if transfer_results['we_vote_organizations_created']:
-                        we_vote_organizations_created += 1
-                    if transfer_results['organization_positions_that_exist']:
-                        organization_positions_that_exist += 1
-                    if transfer_results['organization_positions_created']:
-                        organization_positions_created += 1
             else:
                 vote_smart_candidates_not_found += 1
 
+    # Turn all of the ratings into positions at once. We don't start worker processes from a web request.
+    transfer_results = transfer_vote_smart_ratings_to_positions_for_candidates(candidate_campaign_id_list, workers=1)
+    we_vote_organizations_created = transfer_results['we_vote_organizations_created']
+    organization_positions_that_exist = transfer_results['organization_positions_that_exist']
+    organization_positions_created = transfer_results['organization_positions_created']
+
     message = "Google Civic Election ID: {election_id}, " \
               "{vote_smart_candidates_that_exist} candidates from Vote Smart looked at, " \
               "{vote_smart_candidates_created} new candidates cached from Vote Smart, " \
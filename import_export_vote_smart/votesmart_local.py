@@ -10,11 +10,11 @@ __copyright__ = "Copyright (c) 2012 Sunlight Labs"
 __license__ = "BSD"
 
 import urllib
-# The following added to support Python 3
+# The following added to support Python 2. Python 3 requests go through wevote_functions.http_client.
 try:
-    from urllib.request import urlopen
-except ImportError:
     import urllib2
+except ImportError:
+    pass
 
 # The following added to support Python 3
 try:
@@ -27,6 +27,9 @@ try:
 except ImportError:
     import simplejson as json
 import sys
+# The following added for We Vote
+import requests
+from wevote_functions.http_client import http_get, INTEGRATION_VOTE_SMART
 
 class VotesmartApiError(Exception):
     """ Exception for Sunlight API errors """
@@ -231,13 +234,15 @@ class votesmart(object):
             params = dict([(k,v) for (k,v) in params.items() if v])
             url = 'http://api.votesmart.org/%s?o=JSON&key=%s&%s' % (func, votesmart.apikey, urlencode(params))
             try:
-                response = urlopen(url).read().decode('utf-8')
-                obj = json.loads(response)
+                # We Vote: Share the pooled connections, timeouts and retries of our other integrations
+                response = http_get(INTEGRATION_VOTE_SMART, url)
+                response.raise_for_status()
+                obj = json.loads(response.content.decode('utf-8'))
                 if 'error' in obj:
                     raise VotesmartApiError(obj['error']['errorMessage'])
                 else:
                     return obj
-            except urllib.error.HTTPError as e:
+            except requests.HTTPError as e:
                 raise VotesmartApiError(e)
             except ValueError:
                 raise VotesmartApiError('Invalid Response')
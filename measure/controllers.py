@@ -8,9 +8,9 @@ from config.base import get_environment_variable
 from django.contrib import messages
 from django.http import HttpResponse
 import json
-import requests
 import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_WE_VOTE_MASTER_SERVER
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -101,7 +101,7 @@ def measures_import_from_master_server(request, google_civic_election_id):
     # Request json file from We Vote servers
     messages.add_message(request, messages.INFO, "Loading Measures from We Vote Master servers")
     logger.info("Loading Measures from We Vote Master servers")
-    request = requests.get(MEASURES_SYNC_URL, params={
+    request = http_get(INTEGRATION_WE_VOTE_MASTER_SERVER, MEASURES_SYNC_URL, params={
         "key": WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":   'json',
         "google_civic_election_id": google_civic_election_id,
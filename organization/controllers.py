@@ -10,11 +10,11 @@ from exception.models import handle_record_not_found_exception
 from follow.models import FollowOrganizationManager, FollowOrganizationList, FOLLOW_IGNORE, FOLLOWING, STOP_FOLLOWING
 import json
 from organization.models import Organization
-import requests
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
 from voter_guide.models import VoterGuide, VoterGuideManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_WE_VOTE_MASTER_SERVER
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -206,7 +206,7 @@ def organizations_import_from_master_server(request, state_code=''):
     messages.add_message(request, messages.INFO, "Loading Organizations from We Vote Master servers")
     logger.info("Loading Organizations from We Vote Master servers")
     # Request json file from We Vote servers
-    request = requests.get(ORGANIZATIONS_SYNC_URL, params={
+    request = http_get(INTEGRATION_WE_VOTE_MASTER_SERVER, ORGANIZATIONS_SYNC_URL, params={
         "key":              WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":           'json',
         "state_served_code": state_code,
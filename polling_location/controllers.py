@@ -7,9 +7,9 @@ from config.base import get_environment_variable
 from django.contrib import messages
 import glob
 import json
-import requests
 import wevote_functions.admin
 from wevote_functions.functions import positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_WE_VOTE_MASTER_SERVER
 import xml.etree.ElementTree as MyElementTree
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -26,7 +26,7 @@ def polling_locations_import_from_master_server(request, state_code):
     # Request json file from We Vote servers
     messages.add_message(request, messages.INFO, "Loading Polling Locations from We Vote Master servers")
     logger.info("Loading Polling Locations from We Vote Master servers")
-    request = requests.get(POLLING_LOCATIONS_SYNC_URL, params={
+    request = http_get(INTEGRATION_WE_VOTE_MASTER_SERVER, POLLING_LOCATIONS_SYNC_URL, params={
         "key": WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":   'json',
         "state": state_code,
@@ -2,30 +2,35 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from .models import PositionEntered, PositionEnteredManager, PositionListManager, ANY_STANCE, NO_STANCE, \
-    FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC
+from .models import PositionEntered, PositionEnteredManager, PositionListManager, PositionTallyManager, ANY_STANCE, \
+    NO_STANCE, FRIENDS_AND_PUBLIC, FRIENDS_ONLY, PUBLIC_ONLY, SHOW_PUBLIC, pause_position_tally_updates
 from ballot.models import OFFICE, CANDIDATE, MEASURE
-from candidate.models import CandidateCampaignManager
+from candidate.models import CandidateCampaign, CandidateCampaignManager
 from config.base import get_environment_variable
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
 from django.http import HttpResponse
 from election.models import fetch_election_state
 from exception.models import handle_record_not_saved_exception
 from follow.models import FollowOrganizationManager, FollowOrganizationList
-from measure.models import ContestMeasureManager
+from measure.models import ContestMeasure, ContestMeasureManager
 from office.models import ContestOfficeManager
-from organization.models import OrganizationManager
+from organization.models import Organization, OrganizationManager
 import json
-import requests
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
-from voter_guide.models import ORGANIZATION, PUBLIC_FIGURE, VOTER, UNKNOWN_VOTER_GUIDE
+from voter_guide.models import delete_cached_voter_guides_to_follow_for_ballot_item, ORGANIZATION, PUBLIC_FIGURE, \
+    VOTER, UNKNOWN_VOTER_GUIDE
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import convert_to_int, generate_chunks, is_voter_device_id_valid, \
+    positive_value_exists
+from wevote_functions.sync_out import retrieve_rows_from_master_server, save_master_server_sync_next_since
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_API_KEY = get_environment_variable("WE_VOTE_API_KEY")
 POSITIONS_SYNC_URL = get_environment_variable("POSITIONS_SYNC_URL")
+POSITIONS_IMPORT_CHUNK_SIZE = 500  # Number of positions we look up and save together
 
 
 # We retrieve from only one of the two possible variables
@@ -548,7 +553,7 @@ def position_list_for_ballot_item_for_api(voter_device_id, friends_vs_public,  #
     if len(public_positions_list):
         follow_organization_list_manager = FollowOrganizationList()
         organizations_followed_by_voter = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+            follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)['following_ids']
 
         if show_positions_this_voter_follows:
             position_objects = position_list_manager.calculate_positions_followed_by_voter(
@@ -966,8 +971,7 @@ def positions_import_from_sample_file(request=None):  # , load_from_uri=False
     with open("position/import_data/positions_sample.json") as json_data:
         structured_json = json.load(json_data)
 
-    request = None
-    return positions_import_from_structured_json(request, structured_json)
+    return positions_import_from_structured_json(structured_json)
 
 
 def positions_import_from_master_server(request, google_civic_election_id=''):
@@ -977,34 +981,94 @@ def positions_import_from_master_server(request, google_civic_election_id=''):
     """
     messages.add_message(request, messages.INFO, "Loading Positions from We Vote Master servers")
     logger.info("Loading Positions from We Vote Master servers")
-    # Request json file from We Vote servers
-    request = requests.get(POSITIONS_SYNC_URL, params={
+    # Request json file from We Vote servers. We stream the response and parse it as it arrives, so we never need
+    # all of the positions for a national election in memory at once. Once we have imported positions for this
+    # election, we only ask for the ones that changed since.
+    sync_name = 'positions_{google_civic_election_id}'.format(google_civic_election_id=google_civic_election_id)
+    retrieve_results = retrieve_rows_from_master_server(POSITIONS_SYNC_URL, {
         "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":                   'json',
         "google_civic_election_id": google_civic_election_id,
-    })
-    structured_json = json.loads(request.text)
-
-    results = filter_positions_structured_json_for_local_duplicates(structured_json)
-    filtered_structured_json = results['structured_json']
-    duplicates_removed = results['duplicates_removed']
-
-    import_results = positions_import_from_structured_json(filtered_structured_json)
-    import_results['duplicates_removed'] = duplicates_removed
+    }, sync_name)
+    if not retrieve_results['success']:
+        import_results = {
+            'success':              False,
+            'status':               retrieve_results['status'],
+            'saved':                0,
+            'updated':              0,
+            'not_processed':        0,
+            'duplicates_removed':   0,
+        }
+        return import_results
+
+    try:
+        import_results = positions_import_from_structured_json(retrieve_results['structured_json'],
+                                                               filter_local_duplicates=True)
+        save_master_server_sync_next_since(sync_name, retrieve_results['sync_next_since'])
+    except ValueError as e:
+        logger.error("positions_import_from_master_server could not parse the response: {error}".format(error=e))
+        import_results = {
+            'success':              False,
+            'status':               "POSITIONS_IMPORT_COULD_NOT_PARSE_RESPONSE",
+            'saved':                0,
+            'updated':              0,
+            'not_processed':        0,
+            'duplicates_removed':   0,
+        }
 
     return import_results
 
 
-def filter_positions_structured_json_for_local_duplicates(structured_json):
+def filter_positions_structured_json_for_local_duplicates(structured_json, position_we_vote_ids_to_ignore=None):
     """
     With this function, we remove positions that seem to be duplicates, but have different we_vote_id's.
     We do not check to see if we have a matching office this routine -- that is done elsewhere.
+    Positions with an organization and a ballot item are checked together with one query. The rest are checked one
+    at a time with retrieve_possible_duplicate_positions.
     :param structured_json:
+    :param position_we_vote_ids_to_ignore: Local positions that don't count as duplicates (ex/ the ones an import
+    created from earlier chunks of the same structured_json)
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     position_list_manager = PositionListManager()
+
+    # Find the positions we already have that match on organization + ballot item
+    organization_we_vote_id_list = []
+    ballot_item_we_vote_id_list = []
+    for one_position in structured_json:
+        organization_we_vote_id = one_position.get('organization_we_vote_id', '')
+        candidate_campaign_we_vote_id = one_position.get('candidate_campaign_we_vote_id', '')
+        contest_measure_we_vote_id = one_position.get('contest_measure_we_vote_id', '')
+        if positive_value_exists(organization_we_vote_id):
+            organization_we_vote_id_list.append(organization_we_vote_id.lower())
+            if positive_value_exists(candidate_campaign_we_vote_id):
+                ballot_item_we_vote_id_list.append(candidate_campaign_we_vote_id.lower())
+            if positive_value_exists(contest_measure_we_vote_id):
+                ballot_item_we_vote_id_list.append(contest_measure_we_vote_id.lower())
+
+    # Key: (google_civic_election_id, organization_we_vote_id, ballot_item_we_vote_id), Value: set of we_vote_ids
+    local_position_we_vote_ids_by_key = {}
+    if len(organization_we_vote_id_list) and len(ballot_item_we_vote_id_list):
+        local_position_query = PositionEntered.objects.filter(
+            organization_we_vote_id__in=organization_we_vote_id_list)
+        local_position_query = local_position_query.filter(
+            Q(candidate_campaign_we_vote_id__in=ballot_item_we_vote_id_list) |
+            Q(contest_measure_we_vote_id__in=ballot_item_we_vote_id_list))
+        local_position_query = local_position_query.order_by().values_list(
+            'google_civic_election_id', 'organization_we_vote_id', 'candidate_campaign_we_vote_id',
+            'contest_measure_we_vote_id', 'we_vote_id')
+        for google_civic_election_id, organization_we_vote_id, candidate_campaign_we_vote_id, \
+                contest_measure_we_vote_id, we_vote_id in local_position_query:
+            if position_we_vote_ids_to_ignore and (we_vote_id or '').lower() in position_we_vote_ids_to_ignore:
+                continue
+            for ballot_item_we_vote_id in (candidate_campaign_we_vote_id, contest_measure_we_vote_id):
+                if positive_value_exists(ballot_item_we_vote_id):
+                    key = (str(google_civic_election_id), organization_we_vote_id.lower(),
+                           ballot_item_we_vote_id.lower())
+                    local_position_we_vote_ids_by_key.setdefault(key, set()).add((we_vote_id or '').lower())
+
     for one_position in structured_json:
         we_vote_id = one_position['we_vote_id'] if 'we_vote_id' in one_position else ''
         google_civic_election_id = \
@@ -1019,12 +1083,33 @@ def filter_positions_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = position_list_manager.retrieve_possible_duplicate_positions(
-            google_civic_election_id, organization_we_vote_id,
-            candidate_campaign_we_vote_id, contest_measure_we_vote_id,
-            we_vote_id_from_master)
-
-        if results['position_list_found']:
+        if positive_value_exists(organization_we_vote_id) and \
+                (positive_value_exists(candidate_campaign_we_vote_id) or
+                 positive_value_exists(contest_measure_we_vote_id)):
+            duplicate_found = False
+            for ballot_item_we_vote_id in (candidate_campaign_we_vote_id, contest_measure_we_vote_id):
+                if not positive_value_exists(ballot_item_we_vote_id):
+                    continue
+                key = (str(google_civic_election_id), organization_we_vote_id.lower(), ballot_item_we_vote_id.lower())
+                local_we_vote_ids = local_position_we_vote_ids_by_key.get(key, set())
+                if positive_value_exists(we_vote_id_from_master):
+                    local_we_vote_ids = local_we_vote_ids - {we_vote_id_from_master.lower()}
+                if len(local_we_vote_ids):
+                    duplicate_found = True
+                    break
+        else:
+            results = position_list_manager.retrieve_possible_duplicate_positions(
+                google_civic_election_id, organization_we_vote_id,
+                candidate_campaign_we_vote_id, contest_measure_we_vote_id,
+                we_vote_id_from_master)
+            duplicate_found = False
+            if results['position_list_found']:
+                duplicate_found = any(
+                    not position_we_vote_ids_to_ignore or
+                    (possible_duplicate.we_vote_id or '').lower() not in position_we_vote_ids_to_ignore
+                    for possible_duplicate in results['position_list'])
+
+        if duplicate_found:
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -1039,11 +1124,110 @@ def filter_positions_structured_json_for_local_duplicates(structured_json):
     return positions_results
 
 
-def positions_import_from_structured_json(structured_json):
+def positions_import_from_structured_json(structured_json, filter_local_duplicates=False):
+    """
+    Create or update PositionEntered entries from a list (or any iterable, like a stream from
+    iterate_json_array_from_chunks) of positions. We work through the positions in chunks, looking up the local ids
+    for each chunk with a few IN queries and saving each chunk in one transaction.
+    :param structured_json:
+    :param filter_local_duplicates: Run each chunk through filter_positions_structured_json_for_local_duplicates.
+    Like filtering all of structured_json before importing it, each chunk is only compared with the positions we had
+    before this import, not with the ones we created from earlier chunks.
+    :return:
+    """
     positions_saved = 0
     positions_updated = 0
     positions_not_processed = 0
-    for one_position in structured_json:
+    duplicates_removed = 0
+    # The ballot items we need to update PositionTally for, with their google_civic_election_id
+    ballot_items_changed = {}
+    position_we_vote_ids_created = set()
+    for position_chunk in generate_chunks(structured_json, POSITIONS_IMPORT_CHUNK_SIZE):
+        if filter_local_duplicates:
+            filter_results = filter_positions_structured_json_for_local_duplicates(position_chunk,
+                                                                                   position_we_vote_ids_created)
+            duplicates_removed += filter_results['duplicates_removed']
+            position_chunk = filter_results['structured_json']
+        chunk_results = positions_import_chunk_from_structured_json(position_chunk, ballot_items_changed)
+        position_we_vote_ids_created.update(chunk_results['we_vote_ids_created'])
+        positions_saved += chunk_results['saved']
+        positions_updated += chunk_results['updated']
+        positions_not_processed += chunk_results['not_processed']
+
+    # Update the tallies once per ballot item, instead of once per position. New positions were saved with
+    # bulk_create, which doesn't call save(), so we also clear the cached voterGuidesToFollow lists here.
+    position_tally_manager = PositionTallyManager()
+    for ballot_item_we_vote_id, google_civic_election_id in ballot_items_changed.items():
+        position_tally_manager.update_position_tally_for_ballot_item(ballot_item_we_vote_id, google_civic_election_id)
+        delete_cached_voter_guides_to_follow_for_ballot_item(ballot_item_we_vote_id)
+
+    positions_results = {
+        'success': True,
+        'status': "POSITIONS_IMPORT_PROCESS_COMPLETE",
+        'saved': positions_saved,
+        'updated': positions_updated,
+        'not_processed': positions_not_processed,
+    }
+    if filter_local_duplicates:
+        positions_results['duplicates_removed'] = duplicates_removed
+    return positions_results
+
+
+def positions_import_chunk_from_structured_json(position_chunk, ballot_items_changed):
+    """
+    Import one chunk of positions for positions_import_from_structured_json
+    :param position_chunk:
+    :param ballot_items_changed: Updated with the ballot items (and their google_civic_election_id) we changed
+    :return:
+    """
+    positions_saved = 0
+    positions_updated = 0
+    positions_not_processed = 0
+
+    # Look up everything we need for this chunk at once
+    position_we_vote_id_list = []
+    organization_we_vote_id_list = []
+    candidate_campaign_we_vote_id_list = []
+    contest_measure_we_vote_id_list = []
+    for one_position in position_chunk:
+        if positive_value_exists(one_position.get("we_vote_id")):
+            position_we_vote_id_list.append(one_position["we_vote_id"].strip().lower())
+        if positive_value_exists(one_position.get("organization_we_vote_id")):
+            organization_we_vote_id_list.append(one_position["organization_we_vote_id"])
+        if positive_value_exists(one_position.get("candidate_campaign_we_vote_id")):
+            candidate_campaign_we_vote_id_list.append(one_position["candidate_campaign_we_vote_id"])
+        elif positive_value_exists(one_position.get("contest_measure_we_vote_id")):
+            contest_measure_we_vote_id_list.append(one_position["contest_measure_we_vote_id"])
+
+    existing_positions_by_we_vote_id = {}
+    if len(position_we_vote_id_list):
+        for position_on_stage in PositionEntered.objects.filter(we_vote_id__in=position_we_vote_id_list):
+            # If there is more than one, we update the first one, like PositionEntered.objects.filter(...)[0]
+            existing_positions_by_we_vote_id.setdefault(position_on_stage.we_vote_id, position_on_stage)
+    organization_ids_by_we_vote_id = {}
+    if len(organization_we_vote_id_list):
+        organization_ids_by_we_vote_id = dict(Organization.objects.filter(
+            we_vote_id__in=organization_we_vote_id_list).values_list('we_vote_id', 'id'))
+    candidate_campaigns_by_we_vote_id = {}
+    if len(candidate_campaign_we_vote_id_list):
+        for we_vote_id, candidate_campaign_id, google_civic_candidate_name in CandidateCampaign.objects.filter(
+                we_vote_id__in=candidate_campaign_we_vote_id_list).values_list(
+                'we_vote_id', 'id', 'google_civic_candidate_name'):
+            candidate_campaigns_by_we_vote_id[we_vote_id] = {
+                'candidate_campaign_id':        candidate_campaign_id,
+                'google_civic_candidate_name':  google_civic_candidate_name,
+            }
+    contest_measure_ids_by_we_vote_id = {}
+    if len(contest_measure_we_vote_id_list):
+        contest_measure_ids_by_we_vote_id = dict(ContestMeasure.objects.filter(
+            we_vote_id__in=contest_measure_we_vote_id_list).values_list('we_vote_id', 'id'))
+
+    positions_to_create = []
+    positions_to_create_by_we_vote_id = {}
+    positions_to_update_by_we_vote_id = {}
+    # One entry for each position in the chunk we will save, so the counters match saving them one at a time
+    position_records = []
+    for one_position in position_chunk:
         # Make sure we have the minimum required variables
         if positive_value_exists(one_position["we_vote_id"]) \
                 and (positive_value_exists(one_position["organization_we_vote_id"]) or positive_value_exists(
@@ -1062,24 +1246,10 @@ def positions_import_from_structured_json(structured_json):
             positions_not_processed += 1
             continue
 
-        # Check to see if this position had been imported previously
-        position_on_stage_found = False
-        try:
-            if len(one_position["we_vote_id"]) > 0:
-                position_query = PositionEntered.objects.filter(we_vote_id=one_position["we_vote_id"])
-                if len(position_query):
-                    position_on_stage = position_query[0]
-                    position_on_stage_found = True
-        except PositionEntered.DoesNotExist as e:
-            pass
-        except Exception as e:
-            pass
-
         # We need to look up the local organization_id and store for internal use
         organization_id = 0
         if positive_value_exists(one_position["organization_we_vote_id"]):
-            organization_manager = OrganizationManager()
-            organization_id = organization_manager.fetch_organization_id(one_position["organization_we_vote_id"])
+            organization_id = organization_ids_by_we_vote_id.get(one_position["organization_we_vote_id"], 0)
             if not positive_value_exists(organization_id):
                 # If an id does not exist, then we don't have this organization locally
                 positions_not_processed += 1
@@ -1088,95 +1258,67 @@ def positions_import_from_structured_json(structured_json):
             # TODO Build this for public_figure - skip for now
             continue
 
-        candidate_campaign_manager = CandidateCampaignManager()
         candidate_campaign_id = 0
         contest_measure_id = 0
+        candidate_campaign = {}
         if positive_value_exists(one_position["candidate_campaign_we_vote_id"]):
             # We need to look up the local candidate_campaign_id and store for internal use
-            candidate_campaign_id = candidate_campaign_manager.fetch_candidate_campaign_id_from_we_vote_id(
-                one_position["candidate_campaign_we_vote_id"])
+            candidate_campaign = candidate_campaigns_by_we_vote_id.get(one_position["candidate_campaign_we_vote_id"],
+                                                                       {})
+            candidate_campaign_id = candidate_campaign.get('candidate_campaign_id', 0)
             if not positive_value_exists(candidate_campaign_id):
                 # If an id does not exist, then we don't have this candidate locally
                 positions_not_processed += 1
                 continue
         elif positive_value_exists(one_position["contest_measure_we_vote_id"]):
-            contest_measure_manager = ContestMeasureManager()
-            contest_measure_id = contest_measure_manager.fetch_contest_measure_id_from_we_vote_id(
-                one_position["contest_measure_we_vote_id"])
+            contest_measure_id = contest_measure_ids_by_we_vote_id.get(one_position["contest_measure_we_vote_id"], 0)
             if not positive_value_exists(contest_measure_id):
                 # If an id does not exist, then we don't have this measure locally
                 positions_not_processed += 1
                 continue
 
-        contest_office_id = 0
-        if positive_value_exists(one_position['contest_office_we_vote_id']):
-            # TODO
-            pass
-
-        politician_id = 0
-        if positive_value_exists(one_position['politician_we_vote_id']):
-            # TODO
-            pass
-
-        voter_id = 0
-        if positive_value_exists(one_position['voter_we_vote_id']):
-            # TODO
-            pass
-
         # Find the google_civic_candidate_name so we have a backup way to link position if the we_vote_id is lost
         google_civic_candidate_name = one_position["google_civic_candidate_name"] if \
             "google_civic_candidate_name" in one_position else ''
         if not positive_value_exists(google_civic_candidate_name):
-            google_civic_candidate_name = candidate_campaign_manager.fetch_google_civic_candidate_name_from_we_vote_id(
-                one_position["candidate_campaign_we_vote_id"])
+            google_civic_candidate_name = candidate_campaign.get('google_civic_candidate_name', '')
+
+        # Check to see if this position had been imported previously (or earlier in this chunk)
+        we_vote_id = one_position["we_vote_id"].strip().lower()
+        position_on_stage_found = True
+        if we_vote_id in existing_positions_by_we_vote_id:
+            position_on_stage = existing_positions_by_we_vote_id[we_vote_id]
+        elif we_vote_id in positions_to_create_by_we_vote_id:
+            position_on_stage = positions_to_create_by_we_vote_id[we_vote_id]
+        else:
+            position_on_stage = PositionEntered()
+            position_on_stage_found = False
 
         try:
-            if position_on_stage_found:
-                # Update
-                position_on_stage.we_vote_id = one_position["we_vote_id"]
-                position_on_stage.candidate_campaign_id = candidate_campaign_id
-                position_on_stage.candidate_campaign_we_vote_id = one_position["candidate_campaign_we_vote_id"]
-                position_on_stage.contest_measure_id = contest_measure_id
-                position_on_stage.contest_measure_we_vote_id = one_position["contest_measure_we_vote_id"]
-                position_on_stage.contest_office_id = contest_office_id
-                position_on_stage.contest_office_we_vote_id = one_position["contest_office_we_vote_id"]
-                position_on_stage.date_entered = one_position["date_entered"]
-                position_on_stage.google_civic_candidate_name = google_civic_candidate_name
-                position_on_stage.google_civic_election_id = one_position["google_civic_election_id"]
-                position_on_stage.more_info_url = one_position["more_info_url"]
-                position_on_stage.organization_id = organization_id
-                position_on_stage.organization_we_vote_id = one_position["organization_we_vote_id"]
-                position_on_stage.stance = one_position["stance"]
-                position_on_stage.statement_text = one_position["statement_text"]
-                position_on_stage.statement_html = one_position["statement_html"]
-            else:
-                # Create new
-                position_on_stage = PositionEntered(
-                    we_vote_id=one_position["we_vote_id"],
-                    candidate_campaign_id=candidate_campaign_id,
-                    candidate_campaign_we_vote_id=one_position["candidate_campaign_we_vote_id"],
-                    contest_measure_id=contest_measure_id,
-                    contest_measure_we_vote_id=one_position["contest_measure_we_vote_id"],
-                    contest_office_id=contest_office_id,
-                    contest_office_we_vote_id=one_position["contest_office_we_vote_id"],
-                    date_entered=one_position["date_entered"],
-                    google_civic_candidate_name=google_civic_candidate_name,
-                    google_civic_election_id=one_position["google_civic_election_id"],
-                    more_info_url=one_position["more_info_url"],
-                    organization_id=organization_id,
-                    organization_we_vote_id=one_position["organization_we_vote_id"],
-                    stance=one_position["stance"],
-                    statement_html=one_position["statement_html"],
-                    statement_text=one_position["statement_text"],
-                )
-
+            # PositionEntered.save does this for us, but bulk_create does not call save
+            position_on_stage.we_vote_id = we_vote_id
+            position_on_stage.candidate_campaign_id = candidate_campaign_id
+            position_on_stage.candidate_campaign_we_vote_id = one_position["candidate_campaign_we_vote_id"]
+            position_on_stage.contest_measure_id = contest_measure_id
+            position_on_stage.contest_measure_we_vote_id = one_position["contest_measure_we_vote_id"]
+            position_on_stage.contest_office_id = 0
+            position_on_stage.contest_office_we_vote_id = one_position["contest_office_we_vote_id"]
+            position_on_stage.date_entered = one_position["date_entered"]
+            position_on_stage.google_civic_candidate_name = google_civic_candidate_name
+            position_on_stage.google_civic_election_id = one_position["google_civic_election_id"]
+            position_on_stage.more_info_url = one_position["more_info_url"]
+            position_on_stage.organization_id = organization_id
+            position_on_stage.organization_we_vote_id = one_position["organization_we_vote_id"]
+            position_on_stage.stance = one_position["stance"]
+            position_on_stage.statement_text = one_position["statement_text"]
+            position_on_stage.statement_html = one_position["statement_html"]
             position_on_stage.ballot_item_display_name = one_position["ballot_item_display_name"]
             position_on_stage.ballot_item_image_url_https = one_position["ballot_item_image_url_https"]
             position_on_stage.ballot_item_twitter_handle = one_position["ballot_item_twitter_handle"]
             position_on_stage.from_scraper = one_position["from_scraper"]
             position_on_stage.date_last_changed = one_position["date_last_changed"]
             position_on_stage.organization_certified = one_position["organization_certified"]
-            position_on_stage.politician_id = politician_id
+            position_on_stage.politician_id = 0  # TODO Look up from politician_we_vote_id
             position_on_stage.politician_we_vote_id = one_position["politician_we_vote_id"]
             position_on_stage.public_figure_we_vote_id = one_position["public_figure_we_vote_id"]
             position_on_stage.speaker_display_name = one_position["speaker_display_name"]
@@ -1190,26 +1332,71 @@ def positions_import_from_structured_json(structured_json):
             position_on_stage.vote_smart_rating_name = one_position["vote_smart_rating_name"]
             position_on_stage.vote_smart_time_span = one_position["vote_smart_time_span"]
             position_on_stage.voter_entering_position = one_position["voter_entering_position"]
-            position_on_stage.voter_id = voter_id
+            position_on_stage.voter_id = 0  # TODO Look up from voter_we_vote_id
             position_on_stage.voter_we_vote_id = one_position["voter_we_vote_id"]
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            positions_not_processed += 1
+            continue
 
-            position_on_stage.save()
+        if not position_on_stage_found:
+            positions_to_create.append(position_on_stage)
+            positions_to_create_by_we_vote_id[we_vote_id] = position_on_stage
+        elif we_vote_id in existing_positions_by_we_vote_id:
+            positions_to_update_by_we_vote_id[we_vote_id] = position_on_stage
+        position_records.append((position_on_stage, position_on_stage_found))
+
+    # Save the whole chunk in one transaction. Django does not have a bulk update, so updates are saved one at a time
+    # but still inside the one transaction.
+    try:
+        # positions_import_from_structured_json updates the tallies once for each ballot item at the end
+        with transaction.atomic(), pause_position_tally_updates():
+            PositionEntered.objects.bulk_create(positions_to_create)
+            for position_on_stage in positions_to_update_by_we_vote_id.values():
+                position_on_stage.save()
+        for position_on_stage, position_on_stage_found in position_records:
             if position_on_stage_found:
-                # Update
                 positions_updated += 1
             else:
-                # New
                 positions_saved += 1
-        except Exception as e:
-            handle_record_not_saved_exception(e, logger=logger)
-            positions_not_processed += 1
+        positions_changed = positions_to_create + list(positions_to_update_by_we_vote_id.values())
+        we_vote_ids_created = [position_on_stage.we_vote_id for position_on_stage in positions_to_create]
+    except Exception as e:
+        # Something in this chunk could not be saved. Fall back to saving one position at a time so we only lose
+        # the positions that have problems.
+        logger.error("positions_import_chunk_from_structured_json bulk save failed, saving one at a time: "
+                     "{error}".format(error=e))
+        positions_changed = []
+        we_vote_ids_created = []
+        for position_on_stage, position_on_stage_found in position_records:
+            try:
+                with pause_position_tally_updates():
+                    position_on_stage.save()
+                positions_changed.append(position_on_stage)
+                if position_on_stage_found:
+                    positions_updated += 1
+                else:
+                    positions_saved += 1
+                    we_vote_ids_created.append(position_on_stage.we_vote_id)
+            except Exception as e:
+                handle_record_not_saved_exception(e, logger=logger)
+                positions_not_processed += 1
+
+    for position_on_stage in positions_changed:
+        if positive_value_exists(position_on_stage.candidate_campaign_we_vote_id):
+            ballot_items_changed[position_on_stage.candidate_campaign_we_vote_id] = \
+                position_on_stage.google_civic_election_id
+        elif positive_value_exists(position_on_stage.contest_measure_we_vote_id):
+            ballot_items_changed[position_on_stage.contest_measure_we_vote_id] = \
+                position_on_stage.google_civic_election_id
 
     positions_results = {
         'success': True,
-        'status': "POSITIONS_IMPORT_PROCESS_COMPLETE",
+        'status': "POSITIONS_IMPORT_CHUNK_PROCESS_COMPLETE",
         'saved': positions_saved,
         'updated': positions_updated,
         'not_processed': positions_not_processed,
+        'we_vote_ids_created': we_vote_ids_created,
     }
     return positions_results
 
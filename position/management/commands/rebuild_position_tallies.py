@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from election.models import Election
+from position.models import PositionTallyManager
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the PositionTally entries (support/oppose counts per ballot item) from the position tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--google_civic_election_id', type=int, default=0,
+                            help='Only rebuild the tallies for this election')
+
+    def handle(self, *args, **options):
+        if options['google_civic_election_id']:
+            google_civic_election_id_list = [options['google_civic_election_id']]
+        else:
+            google_civic_election_id_list = Election.objects.order_by('google_civic_election_id').values_list(
+                'google_civic_election_id', flat=True)
+
+        position_tally_manager = PositionTallyManager()
+        for google_civic_election_id in google_civic_election_id_list:
+            results = position_tally_manager.rebuild_position_tallies_for_election(google_civic_election_id)
+            self.stdout.write('Election {}: {} ballot items, {} tallies ({})\n'.format(
+                google_civic_election_id, results['ballot_item_count'], results['position_tally_count'],
+                results['status']))
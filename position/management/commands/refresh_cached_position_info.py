@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from position.models import PositionEntered, PositionEnteredManager, PositionForFriends
+
+
+class Command(BaseCommand):
+    help = 'Copies the latest speaker and ballot item information (names, photos, state_code, etc.) onto the ' \
+           'PositionEntered and PositionForFriends entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--google_civic_election_id', type=int, default=0,
+                            help='Only refresh the positions for this election')
+        parser.add_argument('--batch_size', type=int, default=500,
+                            help='How many positions to look up and save together')
+
+    def handle(self, *args, **options):
+        position_entered_manager = PositionEnteredManager()
+        for position_model in (PositionEntered, PositionForFriends):
+            position_query = position_model.objects.all()
+            if options['google_civic_election_id']:
+                position_query = position_query.filter(
+                    google_civic_election_id=options['google_civic_election_id'])
+
+            def show_progress(positions_checked, positions_updated, position_count):
+                self.stdout.write('{}: {} of {} positions checked, {} updated\n'.format(
+                    position_model.__name__, positions_checked, position_count, positions_updated))
+
+            results = position_entered_manager.refresh_cached_position_info_for_position_query(
+                position_query, options['batch_size'], show_progress)
+            self.stdout.write('{}: {} positions checked, {} updated ({})\n'.format(
+                position_model.__name__, results['positions_checked'], results['positions_updated'],
+                results['status']))
@@ -4,21 +4,24 @@
 # Diagrams here: https://docs.google.com/drawings/d/1DsPnl97GKe9f14h41RPeZDssDUztRETGkXGaolXCeyo/edit
 
 from candidate.models import CandidateCampaign, CandidateCampaignManager, CandidateCampaignListManager
+from contextlib import contextmanager
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
 from election.models import Election
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
     handle_record_not_found_exception, handle_record_not_saved_exception
 from measure.models import ContestMeasure, ContestMeasureList, ContestMeasureManager
-from office.models import ContestOfficeManager
+from office.models import ContestOffice, ContestOfficeManager
 from organization.models import Organization, OrganizationManager
 from twitter.models import TwitterUser
 from voter.models import fetch_voter_id_from_voter_we_vote_id, fetch_voter_we_vote_id_from_voter_id, Voter, VoterManager
-from voter_guide.models import VoterGuideManager
+from voter_guide.models import delete_cached_voter_guides_to_follow_for_ballot_item, VoterGuideManager
+import threading
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions import bulk_update_objects, convert_to_int, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_last_position_integer, fetch_site_unique_id_prefix
 
 
@@ -45,6 +48,13 @@ FRIENDS_ONLY = 'FRIENDS_ONLY'
 PUBLIC_ONLY = 'PUBLIC_ONLY'
 SHOW_PUBLIC = 'SHOW_PUBLIC'
 
+# The fields refresh_cached_position_info copies over from other tables
+CACHED_POSITION_INFO_FIELDS = [
+    'ballot_item_display_name', 'ballot_item_image_url_https', 'ballot_item_twitter_handle', 'contest_office_id',
+    'contest_office_name', 'contest_office_we_vote_id', 'political_party', 'politician_id', 'politician_we_vote_id',
+    'speaker_display_name', 'speaker_image_url_https', 'speaker_twitter_handle', 'state_code', 'voter_we_vote_id',
+]
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
@@ -229,6 +239,17 @@ class PositionEntered(models.Model):
                 next_integer=next_local_integer,
             )
         super(PositionEntered, self).save(*args, **kwargs)
+        self.delete_cached_voter_guides_to_follow()
+
+    def delete(self, *args, **kwargs):
+        super(PositionEntered, self).delete(*args, **kwargs)
+        self.delete_cached_voter_guides_to_follow()
+
+    def delete_cached_voter_guides_to_follow(self):
+        # The cached voterGuidesToFollow list for this ballot item includes this position (see voter_guide/models.py)
+        for ballot_item_we_vote_id in (self.candidate_campaign_we_vote_id, self.contest_measure_we_vote_id,
+                                       self.contest_office_we_vote_id):
+            delete_cached_voter_guides_to_follow_for_ballot_item(ballot_item_we_vote_id)
 
     # Is the position is an actual endorsement?
     def is_support(self):
@@ -723,6 +744,39 @@ class Position(models.Model):
     #     if candidate_campaign.id:
 
 
+class PositionTally(models.Model):
+    """
+    Pre-calculated support and oppose counts for one ballot item from one organization or voter, so the
+    positionsCountFor... APIs don't need to read every PositionEntered and PositionForFriends entry.
+    Percent ratings are already turned into SUPPORT or OPPOSE, and only the most recent position from each
+    organization is counted. The tallies for a ballot item are recalculated whenever one of its positions changes
+    (see PositionTallyManager), and can be rebuilt with "python manage.py rebuild_position_tallies".
+    """
+    # The unique ID of the election containing this ballot item. (Provided by Google Civic)
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", default=0, null=False, db_index=True)
+    # The candidate_campaign_we_vote_id or contest_measure_we_vote_id
+    ballot_item_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for the candidate or measure", max_length=255, null=False, blank=False,
+        db_index=True)
+    # Who the positions are from. Positions from a voter may also have a linked organization.
+    organization_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for the organization", max_length=255, default='', blank=True)
+    organization_id = models.BigIntegerField(null=True, blank=True)
+    voter_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for the voter", max_length=255, default='', blank=True)
+    voter_id = models.BigIntegerField(null=True, blank=True)
+    # SUPPORT or OPPOSE
+    stance = models.CharField(max_length=15, choices=POSITION_CHOICES, default=NO_STANCE)
+    # PUBLIC_ONLY (PositionEntered) or FRIENDS_ONLY (PositionForFriends)
+    visibility = models.CharField(max_length=15, default=PUBLIC_ONLY)
+    position_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('google_civic_election_id', 'ballot_item_we_vote_id', 'organization_we_vote_id',
+                           'voter_we_vote_id', 'stance', 'visibility')
+
+
 class PositionListManager(models.Model):
     def add_is_public_position(self, incoming_position_list, is_public_position):
         outgoing_position_list = []
@@ -741,15 +795,13 @@ class PositionListManager(models.Model):
         :param organizations_followed_by_voter:
         :return:
         """
-
-        positions_followed_by_voter = []
+        organizations_followed_by_voter = set(organizations_followed_by_voter)
         # Only return the positions if they are from organizations the voter follows
-        for position in all_positions_list:
-            if position.voter_id == voter_id:  # We include the voter currently viewing the ballot in this list
-                positions_followed_by_voter.append(position)
-            # TODO Include a check against a list of "people_followed_by_voter" so we can include friends
-            elif position.organization_id in organizations_followed_by_voter:
-                positions_followed_by_voter.append(position)
+        # We include the voter currently viewing the ballot in this list
+        # TODO Include a check against a list of "people_followed_by_voter" so we can include friends
+        positions_followed_by_voter = [
+            position for position in all_positions_list
+            if position.voter_id == voter_id or position.organization_id in organizations_followed_by_voter]
 
         return positions_followed_by_voter
 
@@ -762,13 +814,11 @@ class PositionListManager(models.Model):
         :param organizations_followed_by_voter:
         :return:
         """
-        positions_not_followed_by_voter = []
-        # Only return the positions if they are from organizations the voter follows
-        for position in all_positions_list:
-            # Some positions are for individual voters, so we want to filter those out
-            if position.organization_id \
-                    and position.organization_id not in organizations_followed_by_voter:
-                positions_not_followed_by_voter.append(position)
+        organizations_followed_by_voter = set(organizations_followed_by_voter)
+        # Some positions are for individual voters, so we want to filter those out
+        positions_not_followed_by_voter = [
+            position for position in all_positions_list
+            if position.organization_id and position.organization_id not in organizations_followed_by_voter]
 
         return positions_not_followed_by_voter
 
@@ -832,13 +882,11 @@ class PositionListManager(models.Model):
         :param organizations_ignored_by_voter:
         :return:
         """
-        positions_ignored_by_voter = []
-        # Only return the positions if they are from organizations the voter follows
-        for position in positions_list:
-            # Some positions are for individual voters, so we want to filter those out
-            if position.organization_id \
-                    and position.organization_id not in organizations_ignored_by_voter:
-                positions_ignored_by_voter.append(position)
+        organizations_ignored_by_voter = set(organizations_ignored_by_voter)
+        # Some positions are for individual voters, so we want to filter those out
+        positions_ignored_by_voter = [
+            position for position in positions_list
+            if position.organization_id and position.organization_id not in organizations_ignored_by_voter]
 
         return positions_ignored_by_voter
 
@@ -1498,43 +1546,274 @@ class PositionListManager(models.Model):
             position_list = []
             return position_list
 
-    def remove_older_positions_for_each_org(self, position_list):
-        # If we have multiple positions for one org, we only want to show the most recent
-        organization_already_reviewed = []
-        organization_with_multiple_positions = []
-        newest_position_for_org = {}  # Figure out the newest position per org that we should show
-        for one_position in position_list:
-            if one_position.organization_we_vote_id:
-                if one_position.organization_we_vote_id not in organization_already_reviewed:
-                    organization_already_reviewed.append(one_position.organization_we_vote_id)
-                # Are we dealing with a time span (instead of google_civic_election_id)?
-                if positive_value_exists(one_position.vote_smart_time_span):
-                    # Take the first four digits of one_position.vote_smart_time_span
-                    first_four_digits = convert_to_int(one_position.vote_smart_time_span[:4])
-                    # And figure out the newest position for each org
-                    if one_position.organization_we_vote_id in newest_position_for_org:
-                        # If we are here, it means we have seen this organization once already
-                        if one_position.organization_we_vote_id not in organization_with_multiple_positions:
-                            organization_with_multiple_positions.append(one_position.organization_we_vote_id)
-                        # If this position is newer than the one already looked at, update newest_position_for_org
-                        if first_four_digits > newest_position_for_org[one_position.organization_we_vote_id]:
-                            newest_position_for_org[one_position.organization_we_vote_id] = first_four_digits
+    def retrieve_public_positions_for_election_query(self, google_civic_election_id):
+        """
+        The public positions retrieve_all_positions_for_election returns, as a query. The candidates and measures in
+        the election are found with subqueries instead of lists.
+        :param google_civic_election_id:
+        :return: A PositionEntered QuerySet
+        """
+        if not positive_value_exists(google_civic_election_id):
+            return PositionEntered.objects.none()
+        candidate_we_vote_id_query = CandidateCampaign.objects.filter(
+            google_civic_election_id=google_civic_election_id).values('we_vote_id')
+        measure_we_vote_id_query = ContestMeasure.objects.filter(
+            google_civic_election_id=google_civic_election_id).values('we_vote_id')
+        return PositionEntered.objects.filter(
+            Q(candidate_campaign_we_vote_id__in=candidate_we_vote_id_query) |
+            Q(contest_measure_we_vote_id__in=measure_we_vote_id_query))
+
+    def retrieve_position_counts_for_ballot_items(self, voter_id, candidate_we_vote_id_list,
+                                                  measure_we_vote_id_list, organizations_followed_by_voter,
+                                                  friends_we_vote_id_list=False,
+                                                  show_positions_this_voter_follows=True):
+        """
+        Calculate the support and oppose counts for many ballot items at once. Instead of running four
+        retrieve_all_positions_for_* queries per ballot item, we run one grouped query against PositionEntered and one
+        against PositionForFriends, and then apply the "most recent only" and follow filters in memory.
+        The counts match what finalize_support_and_oppose_positions_count returns for one ballot item.
+        :param voter_id:
+        :param candidate_we_vote_id_list:
+        :param measure_we_vote_id_list:
+        :param organizations_followed_by_voter: List of organization ids (not we_vote_ids)
+        :param friends_we_vote_id_list: If this comes in as a list, include PositionForFriends entries from these voters
+        :param show_positions_this_voter_follows: If False, count the positions from organizations NOT followed
+        :return: A dict with ballot_item_we_vote_id as key, and {'support_count': 0, 'oppose_count': 0} as value
+        """
+        position_tally_list = []
+        retrieve_public_positions_list = [True]
+        if friends_we_vote_id_list and len(friends_we_vote_id_list):
+            retrieve_public_positions_list.append(False)
+        for retrieve_public_positions in retrieve_public_positions_list:
+            grouped_position_list = self.retrieve_grouped_positions_for_ballot_items(
+                retrieve_public_positions, candidate_we_vote_id_list, measure_we_vote_id_list,
+                friends_we_vote_id_list)
+            position_tally_list += self.calculate_position_tallies(grouped_position_list)
+
+        return self.calculate_position_counts_from_tallies(
+            position_tally_list, list(candidate_we_vote_id_list) + list(measure_we_vote_id_list), voter_id,
+            organizations_followed_by_voter, show_positions_this_voter_follows)
+
+    def retrieve_grouped_positions_for_ballot_items(self, retrieve_public_positions, candidate_we_vote_id_list,
+                                                    measure_we_vote_id_list, friends_we_vote_id_list=False,
+                                                    retrieve_all_friends_positions=False):
+        """
+        One query that returns the support, oppose and percent rating positions for all of these ballot items,
+        grouped so identical positions come back as one row with a position_count.
+        :param retrieve_public_positions:
+        :param candidate_we_vote_id_list:
+        :param measure_we_vote_id_list:
+        :param friends_we_vote_id_list: PositionForFriends entries are limited to the voters in this list...
+        :param retrieve_all_friends_positions: ...unless this is True (used when building PositionTally entries)
+        :return:
+        """
+        if not len(candidate_we_vote_id_list) and not len(measure_we_vote_id_list):
+            return []
+
+        # If retrieving PositionForFriends, make sure we have the necessary variables
+        if not retrieve_public_positions and not friends_we_vote_id_list and not retrieve_all_friends_positions:
+            return []
+
+        grouped_position_list = []
+        try:
+            if retrieve_public_positions:
+                position_queryset = PositionEntered.objects.all()
+            elif retrieve_all_friends_positions:
+                position_queryset = PositionForFriends.objects.all()
+            else:
+                position_queryset = PositionForFriends.objects.all()
+                # Find positions from friends. Look for we_vote_id case insensitive.
+                we_vote_id_filter = Q()
+                for we_vote_id in friends_we_vote_id_list:
+                    we_vote_id_filter |= Q(voter_we_vote_id__iexact=we_vote_id)
+                position_queryset = position_queryset.filter(we_vote_id_filter)
+            position_queryset = position_queryset.filter(
+                Q(candidate_campaign_we_vote_id__in=candidate_we_vote_id_list) |
+                Q(contest_measure_we_vote_id__in=measure_we_vote_id_list))
+            position_queryset = position_queryset.filter(stance__in=(SUPPORT, OPPOSE, PERCENT_RATING))
+            # Clearing the default ordering keeps date_entered out of the GROUP BY
+            grouped_position_list = position_queryset.order_by().values(
+                'candidate_campaign_we_vote_id', 'contest_measure_we_vote_id', 'organization_id',
+                'organization_we_vote_id', 'voter_id', 'voter_we_vote_id', 'stance', 'vote_smart_rating',
+                'vote_smart_time_span').annotate(position_count=Count('id'))
+            grouped_position_list = list(grouped_position_list)
+        except Exception as e:
+            handle_record_not_found_exception(e, logger=logger)
+
+        for one_row in grouped_position_list:
+            one_row['is_public_position'] = retrieve_public_positions
+        return grouped_position_list
+
+    def calculate_position_tallies(self, grouped_position_list):
+        """
+        Turn the rows from retrieve_grouped_positions_for_ballot_items into one SUPPORT or OPPOSE tally per
+        ballot item and speaker, keeping only the most recent position from each organization.
+        """
+        # Sort each grouped row into a (ballot_item_we_vote_id, stance, is_public_position) bucket
+        position_rows_by_bucket = {}
+        for one_row in grouped_position_list:
+            if positive_value_exists(one_row['candidate_campaign_we_vote_id']):
+                ballot_item_we_vote_id = one_row['candidate_campaign_we_vote_id']
+                if one_row['stance'] == PERCENT_RATING:
+                    if one_row['vote_smart_rating'] is None or one_row['vote_smart_rating'] == '':
+                        # A rating without a percentage is neither support nor oppose
+                        continue
+                    # Matches "is_positive_rating" and "is_negative_rating"
+                    rating_percentage = convert_to_int(one_row['vote_smart_rating'])
+                    if rating_percentage >= 66:
+                        stance = SUPPORT
+                    elif rating_percentage <= 33:
+                        stance = OPPOSE
                     else:
-                        newest_position_for_org[one_position.organization_we_vote_id] = first_four_digits
+                        continue
+                else:
+                    stance = one_row['stance']
+            elif positive_value_exists(one_row['contest_measure_we_vote_id']):
+                # We don't have to deal with PERCENT_RATING data with measures
+                ballot_item_we_vote_id = one_row['contest_measure_we_vote_id']
+                if one_row['stance'] == PERCENT_RATING:
+                    continue
+                stance = one_row['stance']
+            else:
+                continue
+            bucket = (ballot_item_we_vote_id, stance, one_row['is_public_position'])
+            position_rows_by_bucket.setdefault(bucket, []).append(one_row)
+
+        position_tally_list = []
+        for (ballot_item_we_vote_id, stance, is_public_position), position_rows in position_rows_by_bucket.items():
+            for one_row in self.remove_older_position_rows_for_each_org(position_rows):
+                position_tally_list.append({
+                    'ballot_item_we_vote_id':   ballot_item_we_vote_id,
+                    'stance':                   stance,
+                    'is_public_position':       is_public_position,
+                    'organization_id':          one_row['organization_id'],
+                    'organization_we_vote_id':  one_row['organization_we_vote_id'],
+                    'voter_id':                 one_row['voter_id'],
+                    'voter_we_vote_id':         one_row['voter_we_vote_id'],
+                    'position_count':           one_row['position_count'],
+                })
+        return position_tally_list
+
+    def calculate_position_counts_from_tallies(self, position_tally_list, ballot_item_we_vote_id_list, voter_id,
+                                               organizations_followed_by_voter,
+                                               show_positions_this_voter_follows=True):
+        """
+        Apply the same follow filter as calculate_positions_followed_by_voter (or
+        calculate_positions_not_followed_by_voter) to the tallies, and add them up for each ballot item.
+        """
+        position_counts_by_ballot_item = {}
+        for ballot_item_we_vote_id in ballot_item_we_vote_id_list:
+            position_counts_by_ballot_item[ballot_item_we_vote_id] = {
+                'support_count':    0,
+                'oppose_count':     0,
+            }
 
-        position_list_filtered = []
-        position_included_for_this_org = {}
-        for one_position in position_list:
-            if one_position.organization_we_vote_id in organization_with_multiple_positions:
-                first_four_digits = convert_to_int(one_position.vote_smart_time_span[:4])
-                if (newest_position_for_org[one_position.organization_we_vote_id] == first_four_digits) and \
-                        (one_position.organization_we_vote_id not in position_included_for_this_org):
-                    # If this position is the newest from among the organization's positions, include in results
-                    position_list_filtered.append(one_position)
-                    # Only add one position to position_list_filtered once
-                    position_included_for_this_org[one_position.organization_we_vote_id] = True
+        organizations_followed_by_voter = set(organizations_followed_by_voter)
+        for one_tally in position_tally_list:
+            if one_tally['ballot_item_we_vote_id'] not in position_counts_by_ballot_item:
+                continue
+            if show_positions_this_voter_follows:
+                # We include the voter currently viewing the ballot in this count
+                if not (one_tally['voter_id'] == voter_id
+                        or one_tally['organization_id'] in organizations_followed_by_voter):
+                    continue
+            else:
+                # Some positions are for individual voters, so we want to filter those out
+                if not one_tally['organization_id'] \
+                        or one_tally['organization_id'] in organizations_followed_by_voter:
+                    continue
+            if one_tally['stance'] == SUPPORT:
+                position_counts_by_ballot_item[one_tally['ballot_item_we_vote_id']]['support_count'] += \
+                    one_tally['position_count']
+            else:
+                position_counts_by_ballot_item[one_tally['ballot_item_we_vote_id']]['oppose_count'] += \
+                    one_tally['position_count']
+
+        return position_counts_by_ballot_item
+
+    def calculate_newest_position_for_each_org(self, organization_we_vote_id_column, time_span_column,
+                                               position_count_column=None):
+        """
+        If an organization has more than one position with a vote_smart_time_span (ex/ Vote Smart ratings from
+        different years), we only want the first of the positions from the newest year. Positions without an
+        organization, and organizations with only one time span, are always kept.
+        This works on columns (one list per field, in the same order) so we only read each field once, and look up
+        each organization in a dict.
+        :param organization_we_vote_id_column:
+        :param time_span_column:
+        :param position_count_column: For grouped rows, how many positions each row stands for. Defaults to 1 each.
+        :return: A list with True for each position we keep
+        """
+        # Take the first four digits of each vote_smart_time_span, once for each different time span
+        year_for_time_span = {}
+        year_column = []
+        for time_span in time_span_column:
+            if positive_value_exists(time_span):
+                if time_span not in year_for_time_span:
+                    year_for_time_span[time_span] = convert_to_int(time_span[:4])
+                year_column.append(year_for_time_span[time_span])
+            else:
+                year_column.append(None)
+
+        # Figure out how many time span positions, and the newest year, for each org
+        time_span_position_count_for_org = {}
+        newest_year_for_org = {}
+        for index, organization_we_vote_id in enumerate(organization_we_vote_id_column):
+            year = year_column[index]
+            if organization_we_vote_id and year is not None:
+                position_count = position_count_column[index] if position_count_column is not None else 1
+                time_span_position_count_for_org[organization_we_vote_id] = \
+                    time_span_position_count_for_org.get(organization_we_vote_id, 0) + position_count
+                if year > newest_year_for_org.get(organization_we_vote_id, year - 1):
+                    newest_year_for_org[organization_we_vote_id] = year
+
+        keep_position_column = []
+        position_included_for_this_org = set()
+        for index, organization_we_vote_id in enumerate(organization_we_vote_id_column):
+            if organization_we_vote_id and time_span_position_count_for_org.get(organization_we_vote_id, 0) > 1:
+                # Only keep the newest position from among the organization's positions, and only once
+                if organization_we_vote_id not in position_included_for_this_org \
+                        and year_column[index] == newest_year_for_org[organization_we_vote_id]:
+                    keep_position_column.append(True)
+                    position_included_for_this_org.add(organization_we_vote_id)
+                else:
+                    keep_position_column.append(False)
             else:
-                position_list_filtered.append(one_position)
+                keep_position_column.append(True)
+
+        return keep_position_column
+
+    def remove_older_position_rows_for_each_org(self, position_rows):
+        """
+        The same rules as remove_older_positions_for_each_org, applied to the grouped rows (with a position_count)
+        returned by retrieve_grouped_positions_for_ballot_items.
+        """
+        keep_position_column = self.calculate_newest_position_for_each_org(
+            [one_row['organization_we_vote_id'] for one_row in position_rows],
+            [one_row['vote_smart_time_span'] for one_row in position_rows],
+            [one_row['position_count'] for one_row in position_rows])
+
+        position_rows_filtered = []
+        for one_row, keep_position in zip(position_rows, keep_position_column):
+            if not keep_position:
+                continue
+            if one_row['organization_we_vote_id'] and positive_value_exists(one_row['vote_smart_time_span']) \
+                    and one_row['position_count'] > 1:
+                # When an org has more than one position, we count only the newest one
+                one_row = dict(one_row, position_count=1)
+            position_rows_filtered.append(one_row)
+
+        return position_rows_filtered
+
+    def remove_older_positions_for_each_org(self, position_list):
+        # If we have multiple positions for one org, we only want to show the most recent
+        position_list = list(position_list)
+        keep_position_column = self.calculate_newest_position_for_each_org(
+            [one_position.organization_we_vote_id for one_position in position_list],
+            [one_position.vote_smart_time_span for one_position in position_list])
+
+        position_list_filtered = [one_position for one_position, keep_position
+                                  in zip(position_list, keep_position_column) if keep_position]
 
         return position_list_filtered
 
@@ -4026,6 +4305,195 @@ class PositionEnteredManager(models.Model):
         :param position_object:
         :return:
         """
+        position_change = self.update_cached_position_info(position_object)
+
+        if position_change:
+            position_object.save()
+
+        return position_object
+
+    def refresh_cached_position_info_for_position_list(self, position_list):
+        """
+        refresh_cached_position_info for many positions (all PositionEntered or all PositionForFriends) at once.
+        We retrieve the source rows for all of the positions with a few IN queries, and save the changes with one
+        UPDATE for each field.
+        :param position_list:
+        :return:
+        """
+        position_list = list(position_list)
+        cached_sources = self.retrieve_cached_position_info_sources(position_list)
+        positions_changed = [one_position for one_position in position_list
+                             if self.update_cached_position_info(one_position, cached_sources)]
+        try:
+            with transaction.atomic():
+                bulk_update_objects(positions_changed, CACHED_POSITION_INFO_FIELDS)
+            success = True
+            status = 'CACHED_POSITION_INFO_REFRESHED'
+            # bulk_update_objects doesn't call save(), so clear the caches that save() would clear
+            for one_position in positions_changed:
+                if isinstance(one_position, PositionEntered):
+                    one_position.delete_cached_voter_guides_to_follow()
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            success = False
+            status = 'CACHED_POSITION_INFO_NOT_SAVED'
+            positions_changed = []
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'positions_checked':    len(position_list),
+            'positions_updated':    len(positions_changed),
+        }
+        return results
+
+    def refresh_cached_position_info_for_position_query(self, position_query, batch_size=500,
+                                                        progress_callback=None):
+        """
+        refresh_cached_position_info_for_position_list, one batch of positions at a time
+        :param position_query: A PositionEntered or PositionForFriends query
+        :param batch_size:
+        :param progress_callback: Called after each batch with (positions_checked, positions_updated, position_count)
+        :return:
+        """
+        success = True
+        positions_checked = 0
+        positions_updated = 0
+        position_count = position_query.count()
+        last_position_id = 0
+        while True:
+            # We page through by id, so we don't hold every position in memory at once
+            position_list = list(position_query.filter(id__gt=last_position_id).order_by('id')[:batch_size])
+            if not len(position_list):
+                break
+            last_position_id = position_list[-1].id
+            results = self.refresh_cached_position_info_for_position_list(position_list)
+            success = success and results['success']
+            positions_checked += results['positions_checked']
+            positions_updated += results['positions_updated']
+            if progress_callback is not None:
+                progress_callback(positions_checked, positions_updated, position_count)
+
+        results = {
+            'success':              success,
+            'status':               'CACHED_POSITION_INFO_REFRESHED' if success else 'CACHED_POSITION_INFO_NOT_SAVED',
+            'positions_checked':    positions_checked,
+            'positions_updated':    positions_updated,
+        }
+        return results
+
+    def retrieve_cached_position_info_sources(self, position_list):
+        """
+        Retrieve every Organization, Voter, CandidateCampaign, ContestMeasure and ContestOffice that the positions
+        refer to, so update_cached_position_info does not need to query for each position.
+        :param position_list:
+        :return:
+        """
+        organization_we_vote_id_set = set()
+        voter_id_set = set()
+        candidate_campaign_id_set = set()
+        candidate_campaign_we_vote_id_set = set()
+        contest_measure_id_set = set()
+        contest_measure_we_vote_id_set = set()
+        contest_office_id_set = set()
+        contest_office_we_vote_id_set = set()
+        for one_position in position_list:
+            if positive_value_exists(one_position.organization_we_vote_id):
+                organization_we_vote_id_set.add(one_position.organization_we_vote_id)
+            if positive_value_exists(one_position.voter_id):
+                voter_id_set.add(one_position.voter_id)
+            if positive_value_exists(one_position.candidate_campaign_id):
+                candidate_campaign_id_set.add(one_position.candidate_campaign_id)
+            if positive_value_exists(one_position.candidate_campaign_we_vote_id):
+                candidate_campaign_we_vote_id_set.add(one_position.candidate_campaign_we_vote_id)
+            if positive_value_exists(one_position.contest_measure_id):
+                contest_measure_id_set.add(one_position.contest_measure_id)
+            if positive_value_exists(one_position.contest_measure_we_vote_id):
+                contest_measure_we_vote_id_set.add(one_position.contest_measure_we_vote_id)
+            if positive_value_exists(one_position.contest_office_id):
+                contest_office_id_set.add(convert_to_int(one_position.contest_office_id))
+            if positive_value_exists(one_position.contest_office_we_vote_id):
+                contest_office_we_vote_id_set.add(one_position.contest_office_we_vote_id)
+
+        cached_sources = {
+            'organization_by_we_vote_id':   {},
+            'voter_by_id':                  {},
+            'candidate_campaign_by_id':     {},
+            'candidate_campaign_by_we_vote_id': {},
+            'contest_measure_by_id':        {},
+            'contest_measure_by_we_vote_id':    {},
+            'contest_office_by_id':         {},
+            'contest_office_by_we_vote_id': {},
+        }
+        if len(organization_we_vote_id_set):
+            for organization in Organization.objects.filter(we_vote_id__in=organization_we_vote_id_set):
+                cached_sources['organization_by_we_vote_id'][organization.we_vote_id] = organization
+        if len(voter_id_set):
+            for voter in Voter.objects.filter(id__in=voter_id_set):
+                cached_sources['voter_by_id'][voter.id] = voter
+        if len(candidate_campaign_id_set) or len(candidate_campaign_we_vote_id_set):
+            for candidate in CandidateCampaign.objects.filter(
+                    Q(id__in=candidate_campaign_id_set) | Q(we_vote_id__in=candidate_campaign_we_vote_id_set)):
+                cached_sources['candidate_campaign_by_id'][candidate.id] = candidate
+                cached_sources['candidate_campaign_by_we_vote_id'][candidate.we_vote_id] = candidate
+                # We might need the candidate's office too
+                if positive_value_exists(candidate.contest_office_id):
+                    # CandidateCampaign.contest_office_id is a CharField
+                    contest_office_id_set.add(convert_to_int(candidate.contest_office_id))
+                if positive_value_exists(candidate.contest_office_we_vote_id):
+                    contest_office_we_vote_id_set.add(candidate.contest_office_we_vote_id)
+        if len(contest_measure_id_set) or len(contest_measure_we_vote_id_set):
+            for contest_measure in ContestMeasure.objects.filter(
+                    Q(id__in=contest_measure_id_set) | Q(we_vote_id__in=contest_measure_we_vote_id_set)):
+                cached_sources['contest_measure_by_id'][contest_measure.id] = contest_measure
+                cached_sources['contest_measure_by_we_vote_id'][contest_measure.we_vote_id] = contest_measure
+        if len(contest_office_id_set) or len(contest_office_we_vote_id_set):
+            for contest_office in ContestOffice.objects.filter(
+                    Q(id__in=contest_office_id_set) | Q(we_vote_id__in=contest_office_we_vote_id_set)):
+                cached_sources['contest_office_by_id'][contest_office.id] = contest_office
+                cached_sources['contest_office_by_we_vote_id'][contest_office.we_vote_id] = contest_office
+        return cached_sources
+
+    def fetch_cached_position_info_source(self, cached_sources, source_name, source_id=0, source_we_vote_id=''):
+        """
+        Look up one 'organization', 'voter', 'candidate_campaign', 'contest_measure' or 'contest_office' for
+        update_cached_position_info. We use cached_sources (from retrieve_cached_position_info_sources) if we have
+        it, and otherwise go to the database.
+        :return: The object, or None if it was not found
+        """
+        if cached_sources is not None:
+            source_object = None
+            if positive_value_exists(source_id):
+                # Some tables store these ids in a CharField, so compare them as integers
+                source_object = cached_sources[source_name + '_by_id'].get(convert_to_int(source_id))
+            if source_object is None and positive_value_exists(source_we_vote_id):
+                source_object = cached_sources[source_name + '_by_we_vote_id'].get(source_we_vote_id)
+            return source_object
+
+        if source_name == 'organization':
+            results = OrganizationManager().retrieve_organization(source_id, source_we_vote_id)
+            return results['organization'] if results['organization_found'] else None
+        elif source_name == 'voter':
+            results = VoterManager().retrieve_voter_by_id(source_id)
+            return results['voter'] if results['voter_found'] else None
+        elif source_name == 'candidate_campaign':
+            results = CandidateCampaignManager().retrieve_candidate_campaign(source_id, source_we_vote_id)
+            return results['candidate_campaign'] if results['candidate_campaign_found'] else None
+        elif source_name == 'contest_measure':
+            results = ContestMeasureManager().retrieve_contest_measure(source_id, source_we_vote_id)
+            return results['contest_measure'] if results['contest_measure_found'] else None
+        elif source_name == 'contest_office':
+            results = ContestOfficeManager().retrieve_contest_office(source_id, source_we_vote_id)
+            return results['contest_office'] if results['contest_office_found'] else None
+        return None
+
+    def update_cached_position_info(self, position_object, cached_sources=None):
+        """
+        Copy the latest information from the source tables onto position_object, without saving it.
+        :param position_object:
+        :param cached_sources: From retrieve_cached_position_info_sources. If None, we query for each source.
+        :return: True if position_object was changed
+        """
         position_change = False
 
         # Start with "speaker" information (Organization, Voter, or Public Figure)
@@ -4035,12 +4503,9 @@ class PositionEnteredManager(models.Model):
                     or not positive_value_exists(position_object.speaker_twitter_handle):
                 try:
                     # We need to look in the organization table for speaker_display_name & speaker_image_url_https
-                    organization_manager = OrganizationManager()
-                    organization_id = 0
-                    results = organization_manager.retrieve_organization(organization_id,
-                                                                         position_object.organization_we_vote_id)
-                    if results['organization_found']:
-                        organization = results['organization']
+                    organization = self.fetch_cached_position_info_source(
+                        cached_sources, 'organization', source_we_vote_id=position_object.organization_we_vote_id)
+                    if organization is not None:
                         if not positive_value_exists(position_object.speaker_display_name):
                             # speaker_display_name is missing so look it up from source
                             position_object.speaker_display_name = organization.organization_name
@@ -4062,10 +4527,9 @@ class PositionEnteredManager(models.Model):
                     or not positive_value_exists(position_object.speaker_twitter_handle):
                 try:
                     # We need to look in the voter table for speaker_display_name
-                    voter_manager = VoterManager()
-                    results = voter_manager.retrieve_voter_by_id(position_object.voter_id)
-                    if results['voter_found']:
-                        voter = results['voter']
+                    voter = self.fetch_cached_position_info_source(
+                        cached_sources, 'voter', source_id=position_object.voter_id)
+                    if voter is not None:
                         if not positive_value_exists(position_object.speaker_display_name):
                             # speaker_display_name is missing so look it up from source
                             position_object.speaker_display_name = voter.get_full_name()
@@ -4091,7 +4555,6 @@ class PositionEnteredManager(models.Model):
         # Now move onto "ballot_item" information
         # Candidate
         check_for_missing_office_data = False
-        candidate_campaign_manager = CandidateCampaignManager()
         contest_office_id = 0
         contest_office_we_vote_id = ""
         if positive_value_exists(position_object.candidate_campaign_id) or \
@@ -4106,10 +4569,10 @@ class PositionEnteredManager(models.Model):
                     or not positive_value_exists(position_object.politician_we_vote_id):
                 try:
                     # We need to look in the voter table for speaker_display_name
-                    results = candidate_campaign_manager.retrieve_candidate_campaign(
-                        position_object.candidate_campaign_id, position_object.candidate_campaign_we_vote_id)
-                    if results['candidate_campaign_found']:
-                        candidate = results['candidate_campaign']
+                    candidate = self.fetch_cached_position_info_source(
+                        cached_sources, 'candidate_campaign', position_object.candidate_campaign_id,
+                        position_object.candidate_campaign_we_vote_id)
+                    if candidate is not None:
                         # Cache for further down
                         contest_office_id = candidate.contest_office_id
                         contest_office_we_vote_id = candidate.contest_office_we_vote_id
@@ -4159,11 +4622,10 @@ class PositionEnteredManager(models.Model):
                     or not positive_value_exists(position_object.state_code):
                 try:
                     # We need to look in the voter table for speaker_display_name
-                    contest_measure_manager = ContestMeasureManager()
-                    results = contest_measure_manager.retrieve_contest_measure(
-                        position_object.contest_measure_id, position_object.contest_measure_we_vote_id)
-                    if results['contest_measure_found']:
-                        contest_measure = results['contest_measure']
+                    contest_measure = self.fetch_cached_position_info_source(
+                        cached_sources, 'contest_measure', position_object.contest_measure_id,
+                        position_object.contest_measure_we_vote_id)
+                    if contest_measure is not None:
                         if not positive_value_exists(position_object.ballot_item_display_name) \
                                 or position_object.ballot_item_display_name == "None":
                             # ballot_item_display_name is missing so look it up from source
@@ -4196,10 +4658,10 @@ class PositionEnteredManager(models.Model):
                         and not positive_value_exists(position_object.contest_office_we_vote_id):
                     if not contest_office_id or not contest_office_we_vote_id:
                         # If here we need to get the contest_office identifier from the candidate
-                        candidate_results = candidate_campaign_manager.retrieve_candidate_campaign_from_we_vote_id(
-                            position_object.candidate_campaign_we_vote_id)
-                        if candidate_results['candidate_campaign_found']:
-                            candidate = candidate_results['candidate_campaign']
+                        candidate = self.fetch_cached_position_info_source(
+                            cached_sources, 'candidate_campaign',
+                            source_we_vote_id=position_object.candidate_campaign_we_vote_id)
+                        if candidate is not None:
                             position_object.contest_office_id = candidate.contest_office_id
                             position_object.contest_office_we_vote_id = candidate.contest_office_we_vote_id
                             position_change = True
@@ -4207,18 +4669,11 @@ class PositionEnteredManager(models.Model):
                         position_object.contest_office_id = contest_office_id
                         position_object.contest_office_we_vote_id = contest_office_we_vote_id
                         position_change = True
-                office_found = False
-                contest_office_manager = ContestOfficeManager()
-                if positive_value_exists(position_object.contest_office_id):
-                    results = contest_office_manager.retrieve_contest_office_from_id(position_object.contest_office_id)
-                    office_found = results['contest_office_found']
-                elif positive_value_exists(position_object.contest_office_we_vote_id):
-                    results = contest_office_manager.retrieve_contest_office_from_we_vote_id(
-                        position_object.contest_office_we_vote_id)
-                    office_found = results['contest_office_found']
+                office_object = self.fetch_cached_position_info_source(
+                    cached_sources, 'contest_office', position_object.contest_office_id,
+                    position_object.contest_office_we_vote_id)
 
-                if office_found:
-                    office_object = results['contest_office']
+                if office_object is not None:
                     if not positive_value_exists(position_object.contest_office_id):
                         position_object.contest_office_id = office_object.id
                         position_change = True
@@ -4229,7 +4684,250 @@ class PositionEnteredManager(models.Model):
                         position_object.contest_office_name = office_object.office_name
                         position_change = True
 
-        if position_change:
-            position_object.save()
+        return position_change
 
-        return position_object
+
+class PositionTallyManager(models.Model):
+
+    def __unicode__(self):
+        return "PositionTallyManager"
+
+    def create_position_tally_list(self, position_tally_list, google_civic_election_id):
+        position_tally_objects = []
+        for one_tally in position_tally_list:
+            position_tally_objects.append(PositionTally(
+                google_civic_election_id=google_civic_election_id,
+                ballot_item_we_vote_id=one_tally['ballot_item_we_vote_id'],
+                organization_we_vote_id=one_tally['organization_we_vote_id'] or '',
+                organization_id=one_tally['organization_id'],
+                voter_we_vote_id=(one_tally['voter_we_vote_id'] or '').lower(),
+                voter_id=one_tally['voter_id'],
+                stance=one_tally['stance'],
+                visibility=PUBLIC_ONLY if one_tally['is_public_position'] else FRIENDS_ONLY,
+                position_count=one_tally['position_count'],
+            ))
+        PositionTally.objects.bulk_create(position_tally_objects, batch_size=500)
+        return len(position_tally_objects)
+
+    def calculate_position_tallies_for_ballot_items(self, candidate_we_vote_id_list, measure_we_vote_id_list):
+        position_list_manager = PositionListManager()
+        position_tally_list = []
+        for retrieve_public_positions in (True, False):
+            grouped_position_list = position_list_manager.retrieve_grouped_positions_for_ballot_items(
+                retrieve_public_positions, candidate_we_vote_id_list, measure_we_vote_id_list,
+                retrieve_all_friends_positions=True)
+            position_tally_list += position_list_manager.calculate_position_tallies(grouped_position_list)
+
+        # Two speakers can only differ by None vs. '', so combine them the same way the unique_together does
+        position_tally_dict = {}
+        for one_tally in position_tally_list:
+            tally_key = (one_tally['ballot_item_we_vote_id'], one_tally['organization_we_vote_id'] or '',
+                         (one_tally['voter_we_vote_id'] or '').lower(), one_tally['stance'],
+                         one_tally['is_public_position'])
+            if tally_key in position_tally_dict:
+                position_tally_dict[tally_key]['position_count'] += one_tally['position_count']
+            else:
+                position_tally_dict[tally_key] = one_tally
+        return list(position_tally_dict.values())
+
+    def update_position_tally_for_position(self, position):
+        """
+        Call this after a PositionEntered or PositionForFriends entry is created, changed or deleted.
+        """
+        if positive_value_exists(position.candidate_campaign_we_vote_id):
+            ballot_item_we_vote_id = position.candidate_campaign_we_vote_id
+        elif positive_value_exists(position.contest_measure_we_vote_id):
+            ballot_item_we_vote_id = position.contest_measure_we_vote_id
+        else:
+            # We don't count positions on offices
+            results = {
+                'success':  True,
+                'status':   "POSITION_TALLY_NOT_NEEDED",
+            }
+            return results
+        return self.update_position_tally_for_ballot_item(ballot_item_we_vote_id,
+                                                          position.google_civic_election_id)
+
+    def update_position_tally_for_ballot_item(self, ballot_item_we_vote_id, google_civic_election_id):
+        """
+        Recalculate all of the tallies for one ballot item from the PositionEntered and PositionForFriends tables.
+        One ballot item doesn't have many positions, and this way a change of stance or visibility can't leave an old
+        tally behind.
+        """
+        if "cand" in ballot_item_we_vote_id:
+            candidate_we_vote_id_list = [ballot_item_we_vote_id]
+            measure_we_vote_id_list = []
+        elif "meas" in ballot_item_we_vote_id:
+            candidate_we_vote_id_list = []
+            measure_we_vote_id_list = [ballot_item_we_vote_id]
+        else:
+            results = {
+                'success':  False,
+                'status':   "POSITION_TALLY_BALLOT_ITEM_NOT_CANDIDATE_OR_MEASURE",
+            }
+            return results
+
+        try:
+            position_tally_list = self.calculate_position_tallies_for_ballot_items(
+                candidate_we_vote_id_list, measure_we_vote_id_list)
+            with transaction.atomic():
+                PositionTally.objects.filter(ballot_item_we_vote_id=ballot_item_we_vote_id).delete()
+                self.create_position_tally_list(position_tally_list, convert_to_int(google_civic_election_id))
+            status = "POSITION_TALLY_UPDATED"
+            success = True
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status = "POSITION_TALLY_NOT_UPDATED"
+            success = False
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def update_position_tallies_for_ballot_items(self, candidate_we_vote_id_list, measure_we_vote_id_list,
+                                                 google_civic_election_id):
+        """
+        Like update_position_tally_for_ballot_item, for many ballot items in one election at once. Call this after
+        creating positions with bulk_create, which doesn't call save.
+        """
+        ballot_item_we_vote_id_list = list(candidate_we_vote_id_list) + list(measure_we_vote_id_list)
+        position_tally_count = 0
+        try:
+            position_tally_list = self.calculate_position_tallies_for_ballot_items(
+                candidate_we_vote_id_list, measure_we_vote_id_list)
+            with transaction.atomic():
+                PositionTally.objects.filter(ballot_item_we_vote_id__in=ballot_item_we_vote_id_list).delete()
+                position_tally_count = self.create_position_tally_list(position_tally_list,
+                                                                       convert_to_int(google_civic_election_id))
+            status = "POSITION_TALLIES_UPDATED"
+            success = True
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status = "POSITION_TALLIES_NOT_UPDATED"
+            success = False
+
+        results = {
+            'success':              success,
+            'status':               status,
+            'position_tally_count': position_tally_count,
+        }
+        return results
+
+    def rebuild_position_tallies_for_election(self, google_civic_election_id):
+        """
+        Throw away the tallies for this election and calculate them again from the positions.
+        """
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        candidate_we_vote_id_list = []
+        candidate_campaign_list_manager = CandidateCampaignListManager()
+        candidate_results = candidate_campaign_list_manager.retrieve_all_candidates_for_upcoming_election(
+            google_civic_election_id)
+        if candidate_results['candidate_list_found']:
+            for one_candidate in candidate_results['candidate_list_light']:
+                candidate_we_vote_id_list.append(one_candidate['candidate_we_vote_id'])
+
+        measure_we_vote_id_list = []
+        contest_measure_list_manager = ContestMeasureList()
+        measure_results = contest_measure_list_manager.retrieve_all_measures_for_upcoming_election(
+            google_civic_election_id)
+        if measure_results['measure_list_found']:
+            for one_measure in measure_results['measure_list_light']:
+                measure_we_vote_id_list.append(one_measure['measure_we_vote_id'])
+
+        position_tally_count = 0
+        try:
+            position_tally_list = self.calculate_position_tallies_for_ballot_items(
+                candidate_we_vote_id_list, measure_we_vote_id_list)
+            with transaction.atomic():
+                PositionTally.objects.filter(google_civic_election_id=google_civic_election_id).delete()
+                PositionTally.objects.filter(
+                    ballot_item_we_vote_id__in=candidate_we_vote_id_list + measure_we_vote_id_list).delete()
+                position_tally_count = self.create_position_tally_list(position_tally_list,
+                                                                       google_civic_election_id)
+            status = "POSITION_TALLIES_REBUILT"
+            success = True
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status = "POSITION_TALLIES_NOT_REBUILT"
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'google_civic_election_id': google_civic_election_id,
+            'ballot_item_count':        len(candidate_we_vote_id_list) + len(measure_we_vote_id_list),
+            'position_tally_count':     position_tally_count,
+        }
+        return results
+
+    def retrieve_position_counts_for_ballot_items(self, voter_id, candidate_we_vote_id_list,
+                                                  measure_we_vote_id_list, organizations_followed_by_voter,
+                                                  friends_we_vote_id_list=False,
+                                                  show_positions_this_voter_follows=True):
+        """
+        The same counts as PositionListManager.retrieve_position_counts_for_ballot_items, read from PositionTally
+        with one query.
+        :return: A dict with ballot_item_we_vote_id as key, and {'support_count': 0, 'oppose_count': 0} as value
+        """
+        ballot_item_we_vote_id_list = list(candidate_we_vote_id_list) + list(measure_we_vote_id_list)
+        position_tally_list = []
+        if len(ballot_item_we_vote_id_list):
+            try:
+                position_tally_queryset = PositionTally.objects.filter(
+                    ballot_item_we_vote_id__in=ballot_item_we_vote_id_list)
+                visibility_filter = Q(visibility=PUBLIC_ONLY)
+                if friends_we_vote_id_list and len(friends_we_vote_id_list):
+                    friends_we_vote_id_list = [we_vote_id.lower() for we_vote_id in friends_we_vote_id_list
+                                               if positive_value_exists(we_vote_id)]
+                    visibility_filter |= Q(visibility=FRIENDS_ONLY, voter_we_vote_id__in=friends_we_vote_id_list)
+                position_tally_queryset = position_tally_queryset.filter(visibility_filter)
+                position_tally_list = list(position_tally_queryset.values(
+                    'ballot_item_we_vote_id', 'stance', 'organization_id', 'voter_id', 'position_count'))
+            except Exception as e:
+                handle_record_not_found_exception(e, logger=logger)
+
+        position_list_manager = PositionListManager()
+        return position_list_manager.calculate_position_counts_from_tallies(
+            position_tally_list, ballot_item_we_vote_id_list, voter_id, organizations_followed_by_voter,
+            show_positions_this_voter_follows)
+
+
+# Set (for this thread) inside pause_position_tally_updates
+position_tally_updates_paused = threading.local()
+
+
+@contextmanager
+def pause_position_tally_updates():
+    """
+    Positions saved or deleted inside this block don't update PositionTally one at a time. Code that changes many
+    positions uses this, and then calls update_position_tally_for_ballot_item once for each ballot item it changed.
+    """
+    was_paused = getattr(position_tally_updates_paused, 'paused', False)
+    position_tally_updates_paused.paused = True
+    try:
+        yield
+    finally:
+        position_tally_updates_paused.paused = was_paused
+
+
+def update_position_tally_after_position_change(sender, instance, **kwargs):
+    """
+    Keep PositionTally up to date when one position is saved or deleted, including from the admin pages.
+    Positions saved with bulk_create, bulk_update_objects or QuerySet.update don't send these signals, so that code
+    calls update_position_tallies_for_ballot_items itself.
+    """
+    if kwargs.get('raw'):
+        # Loading fixtures
+        return
+    if getattr(position_tally_updates_paused, 'paused', False):
+        return
+    PositionTallyManager().update_position_tally_for_position(instance)
+
+
+for position_model_class in (PositionEntered, PositionForFriends):
+    post_save.connect(update_position_tally_after_position_change, sender=position_model_class,
+                      dispatch_uid='position_tally_post_save_' + position_model_class.__name__)
+    post_delete.connect(update_position_tally_after_position_change, sender=position_model_class,
+                        dispatch_uid='position_tally_post_delete_' + position_model_class.__name__)
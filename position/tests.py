@@ -0,0 +1,338 @@
+# position/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from candidate.models import CandidateCampaign
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from measure.models import ContestMeasure
+from office.models import ContestOffice
+from organization.models import Organization
+from position.controllers import filter_positions_structured_json_for_local_duplicates, \
+    positions_import_from_structured_json
+from position.models import ANY_STANCE, OPPOSE, PERCENT_RATING, SUPPORT, PositionEntered, PositionEnteredManager, \
+    PositionListManager, PositionTally
+import time
+from unittest import mock
+from wevote_functions.functions import convert_to_int
+
+
+def one_position_from_master_server(we_vote_id, organization_we_vote_id, candidate_campaign_we_vote_id='',
+                                    contest_measure_we_vote_id='', stance=SUPPORT):
+    return {
+        'we_vote_id':                       we_vote_id,
+        'ballot_item_display_name':         '',
+        'ballot_item_image_url_https':      '',
+        'ballot_item_twitter_handle':       '',
+        'candidate_campaign_we_vote_id':    candidate_campaign_we_vote_id,
+        'contest_measure_we_vote_id':       contest_measure_we_vote_id,
+        'contest_office_we_vote_id':        '',
+        'date_entered':                     '2016-06-01 12:00:00',
+        'date_last_changed':                '2016-06-02 12:00:00',
+        'from_scraper':                     False,
+        'google_civic_candidate_name':      '',
+        'google_civic_election_id':         '4184',
+        'more_info_url':                    '',
+        'organization_certified':           False,
+        'organization_we_vote_id':          organization_we_vote_id,
+        'politician_we_vote_id':            '',
+        'public_figure_we_vote_id':         '',
+        'speaker_display_name':             '',
+        'speaker_image_url_https':          '',
+        'speaker_twitter_handle':           '',
+        'stance':                           stance,
+        'statement_html':                   '',
+        'statement_text':                   '',
+        'tweet_source_id':                  None,
+        'twitter_user_entered_position':    None,
+        'volunteer_certified':              False,
+        'vote_smart_rating':                None,
+        'vote_smart_rating_id':             None,
+        'vote_smart_rating_name':           None,
+        'vote_smart_time_span':             None,
+        'voter_entering_position':          None,
+        'voter_we_vote_id':                 '',
+    }
+
+
+class PositionsImportFromStructuredJsonTestCase(TestCase):
+
+    def setUp(self):
+        self.organization = Organization.objects.create(we_vote_id='wv01org1', organization_name='Org One')
+        self.candidate_campaign = CandidateCampaign.objects.create(
+            we_vote_id='wv01cand1', candidate_name='Candidate One', google_civic_candidate_name='Candidate One')
+        self.contest_measure = ContestMeasure.objects.create(we_vote_id='wv01meas1', measure_title='Measure One')
+        PositionEntered.objects.create(
+            we_vote_id='wv02pos1', organization_we_vote_id='wv01org1', candidate_campaign_we_vote_id='wv01cand1',
+            google_civic_election_id='4184', stance=OPPOSE)
+
+    def test_import_counters(self):
+        structured_json = [
+            # Update of the position we already have
+            one_position_from_master_server('wv02pos1', 'wv01org1', 'wv01cand1'),
+            # New positions
+            one_position_from_master_server('wv02pos2', 'wv01org1', contest_measure_we_vote_id='wv01meas1'),
+            one_position_from_master_server('wv02pos3', 'wv01org1', 'wv01cand1'),
+            # The same position again later in the data is an update
+            one_position_from_master_server('wv02pos3', 'wv01org1', 'wv01cand1', stance=OPPOSE),
+            # We don't have this organization, candidate or measure locally
+            one_position_from_master_server('wv02pos4', 'wv01org2', 'wv01cand1'),
+            one_position_from_master_server('wv02pos5', 'wv01org1', 'wv01cand2'),
+            one_position_from_master_server('wv02pos6', 'wv01org1', contest_measure_we_vote_id='wv01meas2'),
+            # Missing the organization
+            one_position_from_master_server('wv02pos7', '', 'wv01cand1'),
+        ]
+        results = positions_import_from_structured_json(structured_json)
+        self.assertEqual(results['saved'], 2)
+        self.assertEqual(results['updated'], 2)
+        self.assertEqual(results['not_processed'], 4)
+
+        updated_position = PositionEntered.objects.get(we_vote_id='wv02pos1')
+        self.assertEqual(updated_position.stance, SUPPORT)
+        self.assertEqual(updated_position.organization_id, self.organization.id)
+        self.assertEqual(updated_position.candidate_campaign_id, self.candidate_campaign.id)
+        self.assertEqual(updated_position.google_civic_candidate_name, 'Candidate One')
+        self.assertEqual(PositionEntered.objects.get(we_vote_id='wv02pos2').contest_measure_id,
+                         self.contest_measure.id)
+        self.assertEqual(PositionEntered.objects.filter(we_vote_id='wv02pos3').count(), 1)
+        self.assertEqual(PositionEntered.objects.get(we_vote_id='wv02pos3').stance, OPPOSE)
+
+    def test_import_query_count_does_not_grow_with_positions(self):
+        structured_json = [
+            one_position_from_master_server('wv02pos{number}'.format(number=number), 'wv01org1', 'wv01cand1')
+            for number in range(10, 110)]
+        with CaptureQueriesContext(connection) as queries:
+            results = positions_import_from_structured_json(structured_json)
+        self.assertEqual(results['saved'], 100)
+        # The lookups, one bulk insert and the PositionTally update for the one candidate. Not one per position.
+        self.assertLess(len(queries), 20)
+
+    def test_import_updates_tallies_once_for_each_ballot_item(self):
+        for number in range(10, 60):
+            PositionEntered.objects.create(
+                we_vote_id='wv02pos{number}'.format(number=number), organization_we_vote_id='wv01org1',
+                candidate_campaign_we_vote_id='wv01cand1', google_civic_election_id='4184', stance=SUPPORT)
+        structured_json = [
+            one_position_from_master_server('wv02pos{number}'.format(number=number), 'wv01org1', 'wv01cand1',
+                                            stance=OPPOSE)
+            for number in range(10, 60)]
+        with CaptureQueriesContext(connection) as queries:
+            results = positions_import_from_structured_json(structured_json)
+        self.assertEqual(results['updated'], 50)
+        # One UPDATE for each position, and not a PositionTally update for each one too
+        self.assertLess(len(queries), 70)
+        self.assertFalse(PositionTally.objects.filter(ballot_item_we_vote_id='wv01cand1', stance=SUPPORT).exists())
+        self.assertTrue(PositionTally.objects.filter(ballot_item_we_vote_id='wv01cand1', stance=OPPOSE).exists())
+
+    def test_filter_local_duplicates(self):
+        structured_json = [
+            # Same organization and candidate as wv02pos1, but a different we_vote_id
+            one_position_from_master_server('wv03pos1', 'wv01org1', 'wv01cand1'),
+            # The position we already have
+            one_position_from_master_server('wv02pos1', 'wv01org1', 'wv01cand1'),
+            one_position_from_master_server('wv03pos2', 'wv01org1', contest_measure_we_vote_id='wv01meas1'),
+        ]
+        results = filter_positions_structured_json_for_local_duplicates(structured_json)
+        self.assertEqual(results['duplicates_removed'], 1)
+        self.assertEqual([one_position['we_vote_id'] for one_position in results['structured_json']],
+                         ['wv02pos1', 'wv03pos2'])
+
+    def test_filter_local_duplicates_compares_with_positions_from_before_the_import(self):
+        structured_json = [
+            one_position_from_master_server('wv03pos3', 'wv01org1', contest_measure_we_vote_id='wv01meas1'),
+            one_position_from_master_server('wv03pos4', 'wv01org1', contest_measure_we_vote_id='wv01meas1'),
+            # Still a duplicate of wv02pos1, which we had before the import
+            one_position_from_master_server('wv03pos5', 'wv01org1', 'wv01cand1'),
+        ]
+        # The same answer as filtering structured_json all at once, even with the positions in different chunks
+        with mock.patch('position.controllers.POSITIONS_IMPORT_CHUNK_SIZE', 1):
+            results = positions_import_from_structured_json(structured_json, filter_local_duplicates=True)
+        self.assertEqual(results['saved'], 2)
+        self.assertEqual(results['duplicates_removed'], 1)
+        self.assertEqual(PositionEntered.objects.filter(contest_measure_we_vote_id='wv01meas1').count(), 2)
+
+
+def remove_older_positions_for_each_org_with_lists(position_list):
+    """
+    The list-based version of PositionListManager.remove_older_positions_for_each_org we used to have, so we can
+    check the results and compare the speed
+    """
+    organization_with_multiple_positions = []
+    newest_position_for_org = {}
+    for one_position in position_list:
+        if one_position.organization_we_vote_id and one_position.vote_smart_time_span:
+            first_four_digits = convert_to_int(one_position.vote_smart_time_span[:4])
+            if one_position.organization_we_vote_id in newest_position_for_org:
+                if one_position.organization_we_vote_id not in organization_with_multiple_positions:
+                    organization_with_multiple_positions.append(one_position.organization_we_vote_id)
+                if first_four_digits > newest_position_for_org[one_position.organization_we_vote_id]:
+                    newest_position_for_org[one_position.organization_we_vote_id] = first_four_digits
+            else:
+                newest_position_for_org[one_position.organization_we_vote_id] = first_four_digits
+
+    position_list_filtered = []
+    position_included_for_this_org = {}
+    for one_position in position_list:
+        if one_position.organization_we_vote_id in organization_with_multiple_positions:
+            first_four_digits = convert_to_int(one_position.vote_smart_time_span[:4])
+            if (newest_position_for_org[one_position.organization_we_vote_id] == first_four_digits) and \
+                    (one_position.organization_we_vote_id not in position_included_for_this_org):
+                position_list_filtered.append(one_position)
+                position_included_for_this_org[one_position.organization_we_vote_id] = True
+        else:
+            position_list_filtered.append(one_position)
+    return position_list_filtered
+
+
+class PositionListFilterTestCase(TestCase):
+
+    def setUp(self):
+        self.position_list_manager = PositionListManager()
+        self.voter_id = 1
+        # 50,000 positions from 10,000 organizations. Every fifth organization has Vote Smart ratings over the years.
+        self.organizations_followed_by_voter = list(range(0, 10000, 3))
+        self.position_list = []
+        for number in range(50000):
+            organization_id = number % 10000
+            has_ratings = organization_id % 5 == 0
+            self.position_list.append(PositionEntered(
+                we_vote_id='wv01pos{number}'.format(number=number),
+                organization_id=organization_id,
+                organization_we_vote_id='wv01org{id}'.format(id=organization_id),
+                voter_id=self.voter_id if number % 1000 == 0 else None,
+                stance=PERCENT_RATING if has_ratings else SUPPORT,
+                vote_smart_rating='80' if has_ratings else None,
+                vote_smart_time_span=str(2010 + number // 10000) if has_ratings else None))
+
+    def test_follow_filters(self):
+        organizations_followed_by_voter = set(self.organizations_followed_by_voter)
+        positions_followed = self.position_list_manager.calculate_positions_followed_by_voter(
+            self.voter_id, self.position_list, self.organizations_followed_by_voter)
+        self.assertEqual(positions_followed, [
+            one_position for one_position in self.position_list
+            if one_position.voter_id == self.voter_id or
+            one_position.organization_id in organizations_followed_by_voter])
+
+        positions_not_followed = self.position_list_manager.calculate_positions_not_followed_by_voter(
+            self.position_list, self.organizations_followed_by_voter)
+        self.assertEqual(positions_not_followed, [
+            one_position for one_position in self.position_list
+            if one_position.organization_id and one_position.organization_id not in organizations_followed_by_voter])
+
+        positions_not_ignored = self.position_list_manager.remove_positions_ignored_by_voter(
+            self.position_list, self.organizations_followed_by_voter)
+        self.assertEqual(positions_not_ignored, positions_not_followed)
+
+    def test_remove_older_positions_for_each_org(self):
+        position_list_filtered = self.position_list_manager.remove_older_positions_for_each_org(self.position_list)
+        self.assertEqual(position_list_filtered, remove_older_positions_for_each_org_with_lists(self.position_list))
+        # 8,000 organizations with one position each, and the newest (2014) rating for the other 2,000
+        self.assertEqual(len(position_list_filtered), 50000 - 2000 * 4)
+        self.assertEqual(set(one_position.vote_smart_time_span for one_position in position_list_filtered),
+                         {None, '2014'})
+
+    def test_benchmark_50000_positions(self):
+        start_time = time.time()
+        remove_older_positions_for_each_org_with_lists(self.position_list)
+        seconds_with_lists = time.time() - start_time
+
+        start_time = time.time()
+        self.position_list_manager.remove_older_positions_for_each_org(self.position_list)
+        seconds_remove_older = time.time() - start_time
+
+        start_time = time.time()
+        self.position_list_manager.calculate_positions_followed_by_voter(
+            self.voter_id, self.position_list, self.organizations_followed_by_voter)
+        self.position_list_manager.calculate_positions_not_followed_by_voter(
+            self.position_list, self.organizations_followed_by_voter)
+        seconds_follow_filters = time.time() - start_time
+
+        print("50,000 positions: remove_older_positions_for_each_org with lists {seconds_with_lists:.3f}s, "
+              "with dicts {seconds_remove_older:.3f}s, follow filters {seconds_follow_filters:.3f}s".format(
+                  seconds_with_lists=seconds_with_lists, seconds_remove_older=seconds_remove_older,
+                  seconds_follow_filters=seconds_follow_filters))
+        self.assertLess(seconds_remove_older, seconds_with_lists)
+
+
+class PositionListFilterQueryTestCase(TestCase):
+
+    def setUp(self):
+        for organization_number in range(1, 4):
+            for time_span in ('2012', '2015', '2013-2014'):
+                PositionEntered.objects.create(
+                    we_vote_id='wv01pos{org}x{time_span}'.format(org=organization_number, time_span=time_span),
+                    organization_we_vote_id='wv01org{number}'.format(number=organization_number),
+                    contest_measure_we_vote_id='wv01meas1', stance=PERCENT_RATING, vote_smart_rating='50',
+                    vote_smart_time_span=time_span)
+        PositionEntered.objects.create(
+            we_vote_id='wv01pos4', organization_we_vote_id='wv01org4', contest_measure_we_vote_id='wv01meas1',
+            stance=SUPPORT)
+
+    def test_measure_positions_keep_the_newest_for_each_org(self):
+        position_list_manager = PositionListManager()
+        position_list = position_list_manager.retrieve_all_positions_for_contest_measure(
+            True, 0, 'wv01meas1', ANY_STANCE, True)
+        self.assertEqual(sorted(one_position.we_vote_id for one_position in position_list),
+                         ['wv01pos1x2015', 'wv01pos2x2015', 'wv01pos3x2015', 'wv01pos4'])
+        # The same rules as for candidates, on every database
+        self.assertEqual([one_position.we_vote_id for one_position in position_list],
+                         [one_position.we_vote_id for one_position in
+                          position_list_manager.remove_older_positions_for_each_org(
+                              PositionEntered.objects.filter(contest_measure_we_vote_id='wv01meas1')
+                              .order_by('date_entered'))])
+
+
+class RefreshCachedPositionInfoTestCase(TestCase):
+
+    def setUp(self):
+        self.contest_office = ContestOffice.objects.create(we_vote_id='wv01off1', office_name='Mayor')
+        for number in range(1, 21):
+            Organization.objects.create(we_vote_id='wv01org{number}'.format(number=number),
+                                        organization_name='Org {number}'.format(number=number),
+                                        organization_twitter_handle='org{number}'.format(number=number))
+            CandidateCampaign.objects.create(
+                we_vote_id='wv01cand{number}'.format(number=number),
+                candidate_name='Candidate {number}'.format(number=number), state_code='CA',
+                contest_office_id=self.contest_office.id, contest_office_we_vote_id='wv01off1')
+        ContestMeasure.objects.create(we_vote_id='wv01meas1', measure_title='Measure One', state_code='CA')
+        for number in range(1, 21):
+            PositionEntered.objects.create(
+                we_vote_id='wv01pos{number}'.format(number=number), google_civic_election_id='4184',
+                organization_we_vote_id='wv01org{number}'.format(number=number),
+                candidate_campaign_we_vote_id='wv01cand{number}'.format(number=(number % 5) + 1))
+            PositionEntered.objects.create(
+                we_vote_id='wv01posm{number}'.format(number=number), google_civic_election_id='4184',
+                organization_we_vote_id='wv01org{number}'.format(number=number),
+                contest_measure_we_vote_id='wv01meas1')
+
+    def cached_position_info(self):
+        return {
+            one_position.we_vote_id: tuple(getattr(one_position, field_name) for field_name in (
+                'speaker_display_name', 'speaker_twitter_handle', 'ballot_item_display_name', 'state_code',
+                'contest_office_we_vote_id', 'contest_office_name'))
+            for one_position in PositionEntered.objects.all()}
+
+    def test_batch_refresh_matches_one_at_a_time(self):
+        position_entered_manager = PositionEnteredManager()
+        for one_position in PositionEntered.objects.all():
+            position_entered_manager.refresh_cached_position_info(one_position)
+        cached_position_info_one_at_a_time = self.cached_position_info()
+        self.assertEqual(cached_position_info_one_at_a_time['wv01pos1'],
+                         ('Org 1', 'org1', 'Candidate 2', 'CA', 'wv01off1', 'Mayor'))
+
+        PositionEntered.objects.update(speaker_display_name=None, speaker_twitter_handle=None,
+                                       ballot_item_display_name=None, state_code=None,
+                                       contest_office_id=None, contest_office_we_vote_id=None,
+                                       contest_office_name=None)
+        progress = []
+        with CaptureQueriesContext(connection) as queries:
+            results = position_entered_manager.refresh_cached_position_info_for_position_query(
+                PositionEntered.objects.filter(google_civic_election_id='4184'), batch_size=100,
+                progress_callback=lambda *args: progress.append(args))
+        self.assertEqual(results['positions_checked'], 40)
+        self.assertEqual(results['positions_updated'], 40)
+        self.assertEqual(progress, [(40, 40, 40)])
+        self.assertEqual(self.cached_position_info(), cached_position_info_one_at_a_time)
+        # Count, two pages, 5 lookups and one UPDATE. Not three queries per position.
+        self.assertLess(len(queries), 15)
@@ -18,10 +18,10 @@ from exception.models import handle_record_found_more_than_one_exception,\
     handle_record_not_found_exception, handle_record_not_saved_exception
 from position.models import PositionListManager
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.sync_out import sync_out_response
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -34,11 +34,8 @@ class PositionsSyncOutView(APIView):
         google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
 
         position_list_manager = PositionListManager()
-        public_only = True
-        position_list = position_list_manager.retrieve_all_positions_for_election(google_civic_election_id, ANY_STANCE,
-                                                                                  public_only)
-        serializer = PositionSerializer(position_list, many=True)
-        return Response(serializer.data)
+        position_query = position_list_manager.retrieve_public_positions_for_election_query(google_civic_election_id)
+        return sync_out_response(request, position_query, PositionSerializer, 'date_last_changed')
 
 
 @login_required
@@ -2,15 +2,187 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from .models import SEARCH_ALL_FIELD_LIST, SEARCH_ALL_MAXIMUM_RESULTS, SEARCH_INDEX_LIST, SearchIndexChange, \
+    search_local_search_index
 from config.base import get_environment_variable
-from elasticsearch import Elasticsearch
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from elasticsearch import Elasticsearch, helpers
+import threading
+import time
 from voter.models import fetch_voter_id_from_voter_device_link
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import generate_chunks, is_voter_device_id_valid, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
 
+# When building the search indexes, we read this many rows from the database at a time, and send this many documents
+#  to Elastic Search in each bulk request
+SEARCH_INDEX_ROWS_PER_FETCH = getattr(settings, 'SEARCH_INDEX_ROWS_PER_FETCH', 2000)
+SEARCH_INDEX_BULK_CHUNK_SIZE = getattr(settings, 'SEARCH_INDEX_BULK_CHUNK_SIZE', 500)
+SEARCH_INDEX_SETTINGS = {'settings': {'number_of_shards': 3, 'number_of_replicas': 0}}
+
+# searchAll uses one Elasticsearch client for each process, so its connections to the Elastic Search server are kept
+#  open between requests. Created the first time it is needed, so each worker process (after a fork) has its own.
+elastic_search_client = {}
+elastic_search_client_lock = threading.Lock()
+
+
+def fetch_elastic_search_object():
+    with elastic_search_client_lock:
+        if 'client' not in elastic_search_client:
+            elastic_search_client['client'] = Elasticsearch([ELASTIC_SEARCH_CONNECTION_STRING],
+                                                            timeout=2, max_retries=1, retry_on_timeout=True)
+        return elastic_search_client['client']
+
+
+def iterate_rows_with_server_side_cursor(queryset, cursor_name, rows_per_fetch=SEARCH_INDEX_ROWS_PER_FETCH):
+    """
+    Yield the rows of a values_list queryset as PostgreSQL sends them, rows_per_fetch at a time, instead of loading the
+    whole table into memory. Other databases (ex/ for tests) fall back to queryset.iterator().
+    """
+    if connection.vendor != 'postgresql':
+        for row in queryset.iterator():
+            yield row
+        return
+    sql, params = queryset.query.sql_with_params()
+    # psycopg2 only keeps a named (server side) cursor open inside a transaction
+    with transaction.atomic():
+        connection.ensure_connection()
+        with connection.connection.cursor(name=cursor_name) as cursor:
+            cursor.itersize = rows_per_fetch
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+
+
+def generate_search_index_actions(search_index, index_name, row_iterator):
+    """
+    :param row_iterator: Rows of (id, the values of search_index['field_list'])
+    """
+    for row in row_iterator:
+        yield {
+            '_index':   index_name,
+            '_type':    search_index['doc_type'],
+            '_id':      row[0],
+            '_source':  dict(zip(search_index['field_list'], row[1:])),
+        }
+
+
+def rebuild_search_index(elastic_search_object, search_index, chunk_size=SEARCH_INDEX_BULK_CHUNK_SIZE):
+    """
+    Build a new Elastic Search index (ex/ "candidates_20161018143000") with every row of the table, then point the
+    alias (ex/ "candidates") at it and delete the index the alias pointed to before. Searches use the old index until
+    the new one is complete.
+    """
+    index_alias = search_index['index_alias']
+    new_index_name = '{index_alias}_{timestamp}'.format(index_alias=index_alias,
+                                                        timestamp=time.strftime('%Y%m%d%H%M%S'))
+    elastic_search_object.indices.create(index=new_index_name, body=SEARCH_INDEX_SETTINGS)
+    try:
+        queryset = search_index['model_class'].objects.order_by('id').values_list('id', *search_index['field_list'])
+        row_iterator = iterate_rows_with_server_side_cursor(queryset, 'search_index_' + index_alias)
+        documents_indexed, error_list = helpers.bulk(
+            elastic_search_object, generate_search_index_actions(search_index, new_index_name, row_iterator),
+            chunk_size=chunk_size, raise_on_error=False)
+        elastic_search_object.indices.refresh(index=new_index_name)
+        point_search_index_alias(elastic_search_object, index_alias, new_index_name)
+    except Exception:
+        elastic_search_object.indices.delete(index=new_index_name, ignore=[404])
+        raise
+
+    for error in error_list:
+        logger.error('rebuild_search_index {index_name}: {error}'.format(index_name=new_index_name, error=error))
+    results = {
+        'success':                  True,
+        'status':                   'SEARCH_INDEX_REBUILT',
+        'index_name':               new_index_name,
+        'documents_indexed':        documents_indexed,
+        'documents_not_indexed':    len(error_list),
+    }
+    return results
+
+
+def point_search_index_alias(elastic_search_object, index_alias, new_index_name):
+    """
+    Move index_alias to new_index_name in one step, and delete the indexes it pointed to before
+    """
+    alias_action_list = [{'add': {'index': new_index_name, 'alias': index_alias}}]
+    old_index_name_list = []
+    if elastic_search_object.indices.exists_alias(name=index_alias):
+        old_index_name_list = list(elastic_search_object.indices.get_alias(name=index_alias).keys())
+        alias_action_list = [{'remove': {'index': old_index_name, 'alias': index_alias}}
+                             for old_index_name in old_index_name_list] + alias_action_list
+    elif elastic_search_object.indices.exists(index=index_alias):
+        # The indexes made by the old search/populate_data.py script have the name we now use for the alias, so the
+        #  first time we have to delete the index before we can add the alias
+        elastic_search_object.indices.delete(index=index_alias)
+    elastic_search_object.indices.update_aliases(body={'actions': alias_action_list})
+    for old_index_name in old_index_name_list:
+        elastic_search_object.indices.delete(index=old_index_name, ignore=[404])
+
+
+def rebuild_search_indexes(elastic_search_object, index_alias_list=None, chunk_size=SEARCH_INDEX_BULK_CHUNK_SIZE):
+    """
+    Rebuild each search index, and clear the SearchIndexChange entries the rebuild has picked up
+    :param index_alias_list: ex/ ['candidates']. If empty, we rebuild all of them.
+    """
+    last_search_index_change_id = SearchIndexChange.objects.aggregate(Max('id'))['id__max'] or 0
+    results_list = []
+    for search_index in SEARCH_INDEX_LIST:
+        if index_alias_list and search_index['index_alias'] not in index_alias_list:
+            continue
+        results_list.append(rebuild_search_index(elastic_search_object, search_index, chunk_size))
+        SearchIndexChange.objects.filter(id__lte=last_search_index_change_id,
+                                         kind_of_object=search_index['doc_type']).delete()
+    return results_list
+
+
+def update_search_indexes_from_changes(elastic_search_object, chunk_size=SEARCH_INDEX_BULK_CHUNK_SIZE):
+    """
+    Send the objects in SearchIndexChange to Elastic Search (through the index aliases), delete the ones that no longer
+    exist, and clear those SearchIndexChange entries
+    """
+    last_search_index_change_id = SearchIndexChange.objects.aggregate(Max('id'))['id__max'] or 0
+    documents_indexed = 0
+    documents_deleted = 0
+    for search_index in SEARCH_INDEX_LIST:
+        object_id_list = sorted(set(SearchIndexChange.objects.filter(
+            id__lte=last_search_index_change_id, kind_of_object=search_index['doc_type']).values_list(
+            'object_id', flat=True)))
+        for object_id_chunk in generate_chunks(object_id_list, chunk_size):
+            row_list = list(search_index['model_class'].objects.filter(id__in=object_id_chunk).values_list(
+                'id', *search_index['field_list']))
+            object_id_found_set = set(row[0] for row in row_list)
+            action_list = list(generate_search_index_actions(search_index, search_index['index_alias'], row_list))
+            action_list += [{
+                '_op_type': 'delete',
+                '_index':   search_index['index_alias'],
+                '_type':    search_index['doc_type'],
+                '_id':      object_id,
+            } for object_id in object_id_chunk if object_id not in object_id_found_set]
+            success_count, error_list = helpers.bulk(elastic_search_object, action_list, chunk_size=chunk_size,
+                                                     raise_on_error=False)
+            for error in error_list:
+                # Deleting an object that was never indexed is fine
+                if error.get('delete', {}).get('status') != 404:
+                    logger.error('update_search_indexes_from_changes {index_alias}: {error}'.format(
+                        index_alias=search_index['index_alias'], error=error))
+            documents_indexed += len(row_list)
+            documents_deleted += len(object_id_chunk) - len(row_list)
+        SearchIndexChange.objects.filter(id__lte=last_search_index_change_id,
+                                         kind_of_object=search_index['doc_type']).delete()
+
+    results = {
+        'success':              True,
+        'status':               'SEARCH_INDEXES_UPDATED_FROM_CHANGES',
+        'documents_indexed':    documents_indexed,
+        'documents_deleted':    documents_deleted,
+    }
+    return results
+
 
 def search_all_for_api(text_from_search_field, voter_device_id):
     """
@@ -30,17 +202,6 @@ def search_all_for_api(text_from_search_field, voter_device_id):
         }
         return results
 
-    if not positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
-        results = {
-            'status':                   'MISSING_ELASTIC_SEARCH_CONNECTION_STRING',
-            'success':                  False,
-            'text_from_search_field':   text_from_search_field,
-            'voter_device_id':          voter_device_id,
-            'search_results_found':     False,
-            'search_results':           [],
-        }
-        return results
-
     # Get voter_id from the voter_device_id so we can know who is doing the starring
     results = is_voter_device_id_valid(voter_device_id)
     if not results['success']:
@@ -66,118 +227,41 @@ def search_all_for_api(text_from_search_field, voter_device_id):
         }
         return results
 
-    elastic_search_object = Elasticsearch([ELASTIC_SEARCH_CONNECTION_STRING],
-                                          timeout=2, max_retries=1, retry_on_timeout=True)
+    search_results = []
+    if not positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
+        for score, doc_type, object_id, document in search_local_search_index(text_from_search_field):
+            search_results.append(generate_search_result(doc_type, object_id, document, score))
+        results = {
+            'status':                   'SEARCH_ALL_COMPLETE_WITH_LOCAL_SEARCH_INDEX',
+            'success':                  True,
+            'text_from_search_field':   text_from_search_field,
+            'voter_device_id':          voter_device_id,
+            'search_results_found':     True if len(search_results) else False,
+            'search_results':           search_results,
+        }
+        return results
+
+    elastic_search_object = fetch_elastic_search_object()
 
     # query = {"query": {"match": {"candidate_name": text_from_search_field}}}
     # 2016-08-27 No longer searching politician table -- candidate only
     query = {"query": {"multi_match": {"type": "phrase_prefix",
                                        "query": text_from_search_field,
-                                       "fields": ["candidate_name",
-                                                  "candidate_twitter_handle", "twitter_name",
-                                                  "measure_subtitle", "measure_text", "measure_title",
-                                                  "office_name",
-                                                  "party", "organization_name", "organization_twitter_handle",
-                                                  "twitter_description"]}}}
+                                       "fields": SEARCH_ALL_FIELD_LIST}},
+             "size": SEARCH_ALL_MAXIMUM_RESULTS}
 
     # Example of querying ALL indexes
-    search_results = []
-    search_count = 0
     try:
         res = elastic_search_object.search(body=query)
         # See bottom of this file for example results from Elastic Search
 
         for hit in res['hits']['hits']:
-            one_search_result_type = hit['_type']
-            one_search_result_id = hit['_id']
-            one_search_result_dict = hit['_source']
-            one_search_result_score = hit['_score']
-            if one_search_result_type == "office":
-                link_internal = "/office/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['office_name'],
-                    'result_image':             "",
-                    'result_subtitle':          "",
-                    'result_summary':           "",
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "OFFICE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           "",
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "candidate":
-                if positive_value_exists(one_search_result_dict['candidate_twitter_handle']):
-                    link_internal = "/" + one_search_result_dict['candidate_twitter_handle']
-                else:
-                    link_internal = "/candidate/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['candidate_name'],
-                    'result_image':             "",
-                    'result_subtitle':          "",
-                    'result_summary':           "",
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "CANDIDATE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           one_search_result_dict['candidate_twitter_handle'],
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "measure":
-                link_internal = "/measure/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['measure_title'],
-                    'result_image':             "",
-                    'result_subtitle':          one_search_result_dict['measure_subtitle'],
-                    'result_summary':           one_search_result_dict['measure_text'],
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "MEASURE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           "",
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "organization":
-                if 'organization_twitter_handle' in one_search_result_dict and \
-                        positive_value_exists(one_search_result_dict['organization_twitter_handle']):
-                    link_internal = "/" + one_search_result_dict['organization_twitter_handle']
-                else:
-                    link_internal = "/voterguide/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['organization_name'],
-                    'result_image':             "",
-                    'result_subtitle':          "",
-                    'result_summary':           one_search_result_dict['twitter_description'],
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "ORGANIZATION",
-                    'google_civic_election_id': 0,
-                    'state_code':               one_search_result_dict['state_served_code'],
-                    'twitter_handle':           one_search_result_dict['organization_twitter_handle'],
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "politician":
+            if hit['_type'] == "politician":
                 # If we are here, then we should skip out. We aren't displaying politicians
                 break
+            one_search_result = generate_search_result(hit['_type'], hit['_id'], hit['_source'], hit['_score'])
+            if one_search_result:
+                search_results.append(one_search_result)
         status = "SEARCH_ALL_COMPLETE"
         success = True
 
@@ -190,11 +274,96 @@ def search_all_for_api(text_from_search_field, voter_device_id):
         'success':                  success,
         'text_from_search_field':   text_from_search_field,
         'voter_device_id':          voter_device_id,
-        'search_results_found':     True if search_count > 0 else False,
+        'search_results_found':     True if len(search_results) else False,
         'search_results':           search_results,
     }
     return results
 
+
+def generate_search_result(one_search_result_type, one_search_result_id, one_search_result_dict,
+                           one_search_result_score):
+    """
+    Turn one Elastic Search hit (or LocalSearchIndex match) into a searchAll result
+    """
+    if one_search_result_type == "office":
+        link_internal = "/office/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['office_name'],
+            'result_image':             "",
+            'result_subtitle':          "",
+            'result_summary':           "",
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "OFFICE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           "",
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "candidate":
+        if positive_value_exists(one_search_result_dict['candidate_twitter_handle']):
+            link_internal = "/" + one_search_result_dict['candidate_twitter_handle']
+        else:
+            link_internal = "/candidate/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['candidate_name'],
+            'result_image':             "",
+            'result_subtitle':          "",
+            'result_summary':           "",
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "CANDIDATE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           one_search_result_dict['candidate_twitter_handle'],
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "measure":
+        link_internal = "/measure/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['measure_title'],
+            'result_image':             "",
+            'result_subtitle':          one_search_result_dict['measure_subtitle'],
+            'result_summary':           one_search_result_dict['measure_text'],
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "MEASURE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           "",
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "organization":
+        if 'organization_twitter_handle' in one_search_result_dict and \
+                positive_value_exists(one_search_result_dict['organization_twitter_handle']):
+            link_internal = "/" + one_search_result_dict['organization_twitter_handle']
+        else:
+            link_internal = "/voterguide/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['organization_name'],
+            'result_image':             "",
+            'result_subtitle':          "",
+            'result_summary':           one_search_result_dict['twitter_description'],
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "ORGANIZATION",
+            'google_civic_election_id': 0,
+            'state_code':               one_search_result_dict['state_served_code'],
+            'twitter_handle':           one_search_result_dict['organization_twitter_handle'],
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    else:
+        one_search_result = None
+    return one_search_result
+
 # ------------- RESULT --------------
 # _score: 1.3017262
 # _type: candidate
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from elasticsearch import Elasticsearch
+from search.controllers import ELASTIC_SEARCH_CONNECTION_STRING, rebuild_search_indexes, SEARCH_INDEX_BULK_CHUNK_SIZE, \
+    update_search_indexes_from_changes
+from search.models import SEARCH_INDEX_LIST
+from wevote_functions.functions import positive_value_exists
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the candidates, measures, offices and organizations indexes in Elastic Search, or with ' \
+           '--changes_only, sends only the objects saved or deleted since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changes_only', action='store_true', default=False,
+                            help='Only update the objects recorded in SearchIndexChange')
+        parser.add_argument('--index', action='append', default=[],
+                            choices=[search_index['index_alias'] for search_index in SEARCH_INDEX_LIST],
+                            help='Only rebuild this index (can be repeated)')
+        parser.add_argument('--chunk_size', type=int, default=SEARCH_INDEX_BULK_CHUNK_SIZE,
+                            help='How many documents to send to Elastic Search in each bulk request')
+        parser.add_argument('--elastic_search_host', default='',
+                            help='Instead of ELASTIC_SEARCH_CONNECTION_STRING')
+
+    def handle(self, *args, **options):
+        elastic_search_host = options['elastic_search_host'] or ELASTIC_SEARCH_CONNECTION_STRING
+        if not positive_value_exists(elastic_search_host):
+            raise CommandError('Set ELASTIC_SEARCH_CONNECTION_STRING, or use --elastic_search_host')
+        elastic_search_object = Elasticsearch([elastic_search_host], timeout=20, max_retries=5, retry_on_timeout=True)
+
+        if options['changes_only']:
+            results = update_search_indexes_from_changes(elastic_search_object, options['chunk_size'])
+            self.stdout.write('{} documents indexed, {} documents deleted\n'.format(
+                results['documents_indexed'], results['documents_deleted']))
+            return
+
+        for results in rebuild_search_indexes(elastic_search_object, options['index'], options['chunk_size']):
+            self.stdout.write('{}: {} documents indexed, {} documents not indexed\n'.format(
+                results['index_name'], results['documents_indexed'], results['documents_not_indexed']))
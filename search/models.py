@@ -2,4 +2,352 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-# Currently, all search data is stored in Elastic Search
\ No newline at end of file
+# The search data itself is stored in Elastic Search. Here we keep track of the objects that have changed since they
+#  were last sent to Elastic Search (see search/controllers.py and the update_search_indexes command).
+# When ELASTIC_SEARCH_CONNECTION_STRING isn't set, searchAll uses the LocalSearchIndex each process keeps in memory
+#  instead.
+
+from candidate.models import CandidateCampaign
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.timezone import now
+from exception.models import handle_record_not_saved_exception
+from measure.models import ContestMeasure
+from office.models import ContestOffice
+from organization.models import Organization
+import re
+import threading
+import time
+import wevote_functions.admin
+from wevote_functions.functions import objects_bulk_saved
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# For each Elastic Search index: the alias we search, the document type (which is also the kind_of_object in
+#  SearchIndexChange), the model, and the fields we send
+SEARCH_INDEX_LIST = [
+    {
+        'index_alias':  'candidates',
+        'doc_type':     'candidate',
+        'model_class':  CandidateCampaign,
+        'field_list':   ['candidate_name', 'candidate_twitter_handle', 'twitter_name', 'party',
+                         'google_civic_election_id', 'state_code', 'we_vote_id'],
+    },
+    {
+        'index_alias':  'measures',
+        'doc_type':     'measure',
+        'model_class':  ContestMeasure,
+        'field_list':   ['we_vote_id', 'measure_subtitle', 'measure_text', 'measure_title', 'google_civic_election_id',
+                         'state_code'],
+    },
+    {
+        'index_alias':  'offices',
+        'doc_type':     'office',
+        'model_class':  ContestOffice,
+        'field_list':   ['we_vote_id', 'office_name', 'google_civic_election_id', 'state_code'],
+    },
+    {
+        'index_alias':  'organizations',
+        'doc_type':     'organization',
+        'model_class':  Organization,
+        'field_list':   ['we_vote_id', 'organization_name', 'organization_twitter_handle', 'organization_website',
+                         'twitter_description', 'state_served_code'],
+    },
+]
+SEARCH_INDEX_BY_MODEL = {search_index['model_class']: search_index for search_index in SEARCH_INDEX_LIST}
+SEARCH_INDEX_DOC_TYPE_BY_MODEL = {search_index['model_class']: search_index['doc_type']
+                                  for search_index in SEARCH_INDEX_LIST}
+# The fields searchAll looks in
+SEARCH_ALL_FIELD_LIST = ['candidate_name', 'candidate_twitter_handle', 'twitter_name',
+                         'measure_subtitle', 'measure_text', 'measure_title',
+                         'office_name',
+                         'party', 'organization_name', 'organization_twitter_handle',
+                         'twitter_description']
+# Like Elastic Search, we return the 10 best matches
+SEARCH_ALL_MAXIMUM_RESULTS = 10
+
+# Each process builds its LocalSearchIndex the first time it is needed. Saves and deletes in this process update it
+#  right away. Every LOCAL_SEARCH_INDEX_REFRESH_SECONDS we reload the objects other processes have recorded in
+#  SearchIndexChange, and after LOCAL_SEARCH_INDEX_TIMEOUT seconds we rebuild it, to pick up QuerySet.update changes.
+LOCAL_SEARCH_INDEX_REFRESH_SECONDS = getattr(settings, 'LOCAL_SEARCH_INDEX_REFRESH_SECONDS', 60)
+LOCAL_SEARCH_INDEX_TIMEOUT = getattr(settings, 'LOCAL_SEARCH_INDEX_TIMEOUT', 86400)
+# Without Elastic Search nothing else removes the SearchIndexChange entries, so each time a process builds its
+#  LocalSearchIndex it removes the ones older than this. Every LocalSearchIndex is rebuilt (and so no longer needs
+#  them) after LOCAL_SEARCH_INDEX_TIMEOUT seconds.
+SEARCH_INDEX_CHANGE_RETENTION_SECONDS = getattr(settings, 'SEARCH_INDEX_CHANGE_RETENTION_SECONDS', 604800)
+local_search_index = {}
+local_search_index_lock = threading.Lock()
+
+
+class SearchIndexChange(models.Model):
+    """
+    One entry each time a candidate, measure, office or organization is saved or deleted. The entries are removed once
+    the object has been sent to (or deleted from) Elastic Search, or after SEARCH_INDEX_CHANGE_RETENTION_SECONDS.
+    """
+    kind_of_object = models.CharField(verbose_name="search index document type", max_length=20, null=False)
+    object_id = models.PositiveIntegerField(verbose_name="id of the changed object", null=False)
+    date_changed = models.DateTimeField(verbose_name='date changed', null=False, auto_now_add=True)
+
+
+def record_search_index_changes(model_class, object_id_list):
+    kind_of_object = SEARCH_INDEX_DOC_TYPE_BY_MODEL.get(model_class)
+    object_id_list = [object_id for object_id in object_id_list if object_id]
+    if kind_of_object is None or not len(object_id_list):
+        return
+    try:
+        # A savepoint, so if this fails it doesn't break the transaction that saved the object
+        with transaction.atomic():
+            SearchIndexChange.objects.bulk_create(
+                [SearchIndexChange(kind_of_object=kind_of_object, object_id=object_id)
+                 for object_id in object_id_list], batch_size=500)
+    except Exception as e:
+        # The next full rebuild of the search indexes picks up this change
+        handle_record_not_saved_exception(e, logger=logger, exception_message_optional='SEARCH_INDEX_CHANGE_NOT_SAVED')
+
+
+def record_one_search_index_change(sender, instance, **kwargs):
+    record_search_index_changes(sender, [instance.pk])
+    update_local_search_index(sender, [instance])
+
+
+def record_one_search_index_delete(sender, instance, **kwargs):
+    record_search_index_changes(sender, [instance.pk])
+    remove_from_local_search_index(sender, [instance.pk])
+
+
+def record_bulk_search_index_changes(sender, object_list, **kwargs):
+    record_search_index_changes(sender, [one_object.pk for one_object in object_list])
+    update_local_search_index(sender, object_list)
+
+
+def split_search_words(text):
+    """
+    Lower case words, split the way the Elastic Search standard analyzer splits them (ex/ "@WeVote's" becomes
+    ["wevote", "s"])
+    """
+    if not text:
+        return ()
+    return tuple(re.findall(r'\w+', str(text).lower()))
+
+
+def generate_word_trigrams(word):
+    """
+    The three letter pieces of the word, with two spaces in front. Every trigram of the start of a word is also a
+    trigram of the word, so we can find the words that start with some letters the same way we find whole words.
+    """
+    padded_word = '  ' + word
+    return set(padded_word[position:position + 3] for position in range(len(padded_word) - 2))
+
+
+class LocalSearchIndex(object):
+    """
+    The SEARCH_ALL_FIELD_LIST words of every candidate, measure, office and organization, with an index from each word
+    trigram to the documents that have it. search() matches the way our Elastic Search "phrase_prefix" query does: the
+    words of the search text, next to each other in one field, with the last one only the start of a word.
+    """
+    def __init__(self):
+        # Key: (doc_type, object_id), Value: (the document's fields, {field: the field's words})
+        self.document_dict = {}
+        self.trigram_dict = defaultdict(set)
+        self.last_search_index_change_id = 0
+        self.date_built = time.time()
+        self.date_refreshed = self.date_built
+
+    def is_stale(self):
+        return time.time() - self.date_built > LOCAL_SEARCH_INDEX_TIMEOUT
+
+    def is_refresh_needed(self):
+        return time.time() - self.date_refreshed > LOCAL_SEARCH_INDEX_REFRESH_SECONDS
+
+    def fetch_document_trigrams(self, field_word_dict):
+        trigram_set = set()
+        for word_list in field_word_dict.values():
+            for word in word_list:
+                trigram_set |= generate_word_trigrams(word)
+        return trigram_set
+
+    def add(self, doc_type, object_id, document):
+        self.remove(doc_type, object_id)
+        field_word_dict = {}
+        for field in SEARCH_ALL_FIELD_LIST:
+            word_list = split_search_words(document.get(field))
+            if word_list:
+                field_word_dict[field] = word_list
+        if not field_word_dict:
+            return
+        document_key = (doc_type, object_id)
+        self.document_dict[document_key] = (document, field_word_dict)
+        for trigram in self.fetch_document_trigrams(field_word_dict):
+            self.trigram_dict[trigram].add(document_key)
+
+    def remove(self, doc_type, object_id):
+        document_key = (doc_type, object_id)
+        if document_key not in self.document_dict:
+            return
+        document, field_word_dict = self.document_dict.pop(document_key)
+        for trigram in self.fetch_document_trigrams(field_word_dict):
+            document_key_set = self.trigram_dict[trigram]
+            document_key_set.discard(document_key)
+            if not document_key_set:
+                del self.trigram_dict[trigram]
+
+    def search(self, text_from_search_field, maximum_results=SEARCH_ALL_MAXIMUM_RESULTS):
+        """
+        :return: A list of (score, doc_type, object_id, document), best match first
+        """
+        search_word_list = split_search_words(text_from_search_field)
+        if not search_word_list:
+            return []
+        trigram_set = set()
+        for word in search_word_list:
+            trigram_set |= generate_word_trigrams(word)
+        # Start with the rarest trigram, so the sets we intersect stay small
+        posting_list = sorted((self.trigram_dict.get(trigram, ()) for trigram in trigram_set), key=len)
+        candidate_key_set = set(posting_list[0])
+        for document_key_set in posting_list[1:]:
+            if not candidate_key_set:
+                break
+            candidate_key_set &= document_key_set
+
+        search_result_list = []
+        for document_key in candidate_key_set:
+            document, field_word_dict = self.document_dict[document_key]
+            score = max(score_phrase_prefix_match(search_word_list, word_list)
+                        for word_list in field_word_dict.values())
+            if score:
+                search_result_list.append((score, document_key[0], document_key[1], document))
+        search_result_list.sort(key=lambda search_result: (-search_result[0], search_result[1], search_result[2]))
+        return search_result_list[:maximum_results]
+
+
+def score_phrase_prefix_match(search_word_list, word_list):
+    """
+    0 if the search words aren't in word_list. Otherwise more for matches that cover more of the field, and more again
+    when the field starts with them.
+    """
+    last_position = len(search_word_list) - 1
+    for position in range(len(word_list) - last_position):
+        if word_list[position:position + last_position] == search_word_list[:last_position] and \
+                word_list[position + last_position].startswith(search_word_list[last_position]):
+            return len(search_word_list) / len(word_list) + (1.0 if position == 0 else 0.0)
+    return 0.0
+
+
+def fetch_local_search_index_document(search_index, one_object):
+    return {field: getattr(one_object, field) for field in search_index['field_list']}
+
+
+def build_local_search_index():
+    delete_old_search_index_changes()
+    local_index = LocalSearchIndex()
+    # Changes saved while we read the tables are reloaded by the first refresh
+    local_index.last_search_index_change_id = \
+        SearchIndexChange.objects.aggregate(models.Max('id'))['id__max'] or 0
+    for search_index in SEARCH_INDEX_LIST:
+        row_iterator = search_index['model_class'].objects.values_list('id', *search_index['field_list']).iterator()
+        for row in row_iterator:
+            local_index.add(search_index['doc_type'], row[0], dict(zip(search_index['field_list'], row[1:])))
+    return local_index
+
+
+def delete_old_search_index_changes():
+    try:
+        SearchIndexChange.objects.filter(
+            date_changed__lt=now() - timedelta(seconds=SEARCH_INDEX_CHANGE_RETENTION_SECONDS)).delete()
+    except Exception as e:
+        # We try again the next time a LocalSearchIndex is built
+        logger.error('delete_old_search_index_changes: {error}'.format(error=e))
+
+
+def refresh_local_search_index(local_index):
+    """
+    Reload the objects recorded in SearchIndexChange (by any process) since we last looked
+    """
+    local_index.date_refreshed = time.time()
+    change_list = list(SearchIndexChange.objects.filter(id__gt=local_index.last_search_index_change_id).values_list(
+        'id', 'kind_of_object', 'object_id'))
+    if not change_list:
+        return
+    for search_index in SEARCH_INDEX_LIST:
+        object_id_set = set(object_id for change_id, kind_of_object, object_id in change_list
+                            if kind_of_object == search_index['doc_type'])
+        if not object_id_set:
+            continue
+        object_list = list(search_index['model_class'].objects.filter(id__in=object_id_set).only(
+            *search_index['field_list']))
+        with local_search_index_lock:
+            for one_object in object_list:
+                local_index.add(search_index['doc_type'], one_object.id,
+                                fetch_local_search_index_document(search_index, one_object))
+            for object_id in object_id_set - set(one_object.id for one_object in object_list):
+                local_index.remove(search_index['doc_type'], object_id)
+    local_index.last_search_index_change_id = max(local_index.last_search_index_change_id,
+                                                  max(change[0] for change in change_list))
+
+
+def retrieve_local_search_index():
+    with local_search_index_lock:
+        local_index = local_search_index.get('index')
+    if local_index is None or local_index.is_stale():
+        local_index = build_local_search_index()
+        with local_search_index_lock:
+            local_search_index['index'] = local_index
+    elif local_index.is_refresh_needed():
+        refresh_local_search_index(local_index)
+    return local_index
+
+
+def search_local_search_index(text_from_search_field, maximum_results=SEARCH_ALL_MAXIMUM_RESULTS):
+    """
+    :return: A list of (score, doc_type, object_id, document), best match first
+    """
+    local_index = retrieve_local_search_index()
+    with local_search_index_lock:
+        return local_index.search(text_from_search_field, maximum_results)
+
+
+def update_local_search_index(model_class, object_list):
+    """
+    Update these objects in this process's LocalSearchIndex, if it has been built
+    """
+    search_index = SEARCH_INDEX_BY_MODEL.get(model_class)
+    if search_index is None:
+        return
+    with local_search_index_lock:
+        local_index = local_search_index.get('index')
+        if local_index is None:
+            return
+        for one_object in object_list:
+            if one_object.pk:
+                local_index.add(search_index['doc_type'], one_object.pk,
+                                fetch_local_search_index_document(search_index, one_object))
+
+
+def remove_from_local_search_index(model_class, object_id_list):
+    doc_type = SEARCH_INDEX_DOC_TYPE_BY_MODEL.get(model_class)
+    if doc_type is None:
+        return
+    with local_search_index_lock:
+        local_index = local_search_index.get('index')
+        if local_index is None:
+            return
+        for object_id in object_id_list:
+            local_index.remove(doc_type, object_id)
+
+
+def clear_local_search_index():
+    with local_search_index_lock:
+        local_search_index.clear()
+
+
+for search_index in SEARCH_INDEX_LIST:
+    # Changes made with QuerySet.update don't send signals, and are picked up by the next full rebuild
+    post_save.connect(record_one_search_index_change, sender=search_index['model_class'],
+                      dispatch_uid='search_index_post_save_' + search_index['doc_type'])
+    post_delete.connect(record_one_search_index_delete, sender=search_index['model_class'],
+                        dispatch_uid='search_index_post_delete_' + search_index['doc_type'])
+    objects_bulk_saved.connect(record_bulk_search_index_changes, sender=search_index['model_class'],
+                               dispatch_uid='search_index_bulk_saved_' + search_index['doc_type'])
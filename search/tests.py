@@ -0,0 +1,145 @@
+# search/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from candidate.models import CandidateCampaign
+from datetime import timedelta
+from django.db.models import Q
+from django.test import TestCase
+from django.utils.timezone import now
+from office.models import ContestOffice
+from organization.models import Organization
+import random
+from search.controllers import generate_search_result
+from search.models import clear_local_search_index, local_search_index, search_local_search_index, \
+    SearchIndexChange
+import time
+from wevote_functions.functions import bulk_update_objects
+
+
+class SearchIndexChangeTestCase(TestCase):
+
+    def search_index_changes(self):
+        return sorted(SearchIndexChange.objects.values_list('kind_of_object', 'object_id'))
+
+    def test_saves_and_deletes_are_recorded(self):
+        organization = Organization.objects.create(organization_name='Friends of Oakland Parks')
+        office = ContestOffice.objects.create(office_name='Mayor', google_civic_election_id='4184')
+        self.assertEqual(self.search_index_changes(), [('office', office.id), ('organization', organization.id)])
+
+        SearchIndexChange.objects.all().delete()
+        office_id = office.id
+        office.delete()
+        self.assertEqual(self.search_index_changes(), [('office', office_id)])
+
+    def test_bulk_updates_are_recorded(self):
+        candidate_list = [CandidateCampaign.objects.create(candidate_name='Candidate {}'.format(number))
+                          for number in range(3)]
+        SearchIndexChange.objects.all().delete()
+
+        for candidate in candidate_list:
+            candidate.candidate_twitter_handle = candidate.candidate_name.replace(' ', '')
+        bulk_update_objects(candidate_list, ['candidate_twitter_handle'])
+        self.assertEqual(self.search_index_changes(),
+                         sorted(('candidate', candidate.id) for candidate in candidate_list))
+
+
+class LocalSearchIndexTestCase(TestCase):
+
+    def setUp(self):
+        clear_local_search_index()
+        self.candidate = CandidateCampaign.objects.create(candidate_name='Barack Obama', party='Democratic',
+                                                          candidate_twitter_handle='BarackObama')
+        self.organization = Organization.objects.create(organization_name='Friends of Oakland Parks',
+                                                        organization_twitter_handle='OaklandParks')
+        self.office = ContestOffice.objects.create(office_name='Mayor of Oakland', google_civic_election_id='4184')
+
+    def search_keys(self, text_from_search_field):
+        return [(doc_type, object_id) for score, doc_type, object_id, document
+                in search_local_search_index(text_from_search_field)]
+
+    def test_phrase_prefix_search(self):
+        self.assertEqual(self.search_keys('ob'), [('candidate', self.candidate.id)])
+        self.assertEqual(self.search_keys('Barack Ob'), [('candidate', self.candidate.id)])
+        self.assertEqual(self.search_keys('@barackobama'), [('candidate', self.candidate.id)])
+        self.assertEqual(self.search_keys('Obama Barack'), [])
+        self.assertEqual(self.search_keys('Bar Obama'), [])
+        self.assertEqual(self.search_keys('mayor'), [('office', self.office.id)])
+        # The organization's Twitter handle starts with "oak", so it comes before the office
+        self.assertEqual(self.search_keys('oak'), [('organization', self.organization.id), ('office', self.office.id)])
+        self.assertEqual(self.search_keys('oakland parks'), [('organization', self.organization.id)])
+
+        score, doc_type, object_id, document = search_local_search_index('oaklandp')[0]
+        search_result = generate_search_result(doc_type, object_id, document, score)
+        self.assertEqual(search_result['kind_of_owner'], 'ORGANIZATION')
+        self.assertEqual(search_result['link_internal'], '/OaklandParks')
+        self.assertEqual(search_result['we_vote_id'], self.organization.we_vote_id)
+
+    def test_saves_and_deletes_update_the_index(self):
+        self.assertEqual(self.search_keys('measure'), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search_keys('oakland parks'), [('organization', self.organization.id)])
+
+        self.organization.organization_name = 'Friends of Alameda Parks'
+        self.organization.save()
+        candidate = CandidateCampaign.objects.create(candidate_name='Michelle Obama')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search_keys('oakland parks'), [])
+            self.assertEqual(self.search_keys('alameda'), [('organization', self.organization.id)])
+            self.assertEqual(sorted(self.search_keys('obama')),
+                             sorted([('candidate', self.candidate.id), ('candidate', candidate.id)]))
+
+        candidate_id = candidate.id
+        candidate.delete()
+        self.assertEqual(self.search_keys('michelle'), [])
+
+        # Changes made by another process are picked up from SearchIndexChange at the next refresh
+        Organization.objects.filter(id=self.organization.id).update(organization_name='Friends of Piedmont Parks')
+        SearchIndexChange.objects.create(kind_of_object='organization', object_id=self.organization.id)
+        SearchIndexChange.objects.create(kind_of_object='candidate', object_id=candidate_id)
+        self.assertEqual(self.search_keys('piedmont'), [])
+        local_search_index['index'].date_refreshed = 0
+        self.assertEqual(self.search_keys('piedmont'), [('organization', self.organization.id)])
+        self.assertEqual(self.search_keys('alameda'), [])
+
+    def test_old_changes_are_removed_when_the_index_is_built(self):
+        SearchIndexChange.objects.update(date_changed=now() - timedelta(days=8))
+        SearchIndexChange.objects.create(kind_of_object='candidate', object_id=self.candidate.id)
+        self.assertEqual(self.search_keys('obama'), [('candidate', self.candidate.id)])
+        self.assertEqual(list(SearchIndexChange.objects.values_list('kind_of_object', 'object_id')),
+                         [('candidate', self.candidate.id)])
+
+    def test_benchmark_local_search_index_and_database_search(self):
+        generator = random.Random(4184)
+        syllable_list = ['ba', 'ro', 'ma', 'ken', 'del', 'son', 'ti', 'vel', 'ar', 'quin', 'lo', 'mer']
+
+        def random_name():
+            return ' '.join(''.join(generator.choice(syllable_list) for number in range(generator.randint(2, 4)))
+                            .capitalize() for word in range(generator.randint(2, 3)))
+        CandidateCampaign.objects.bulk_create([
+            CandidateCampaign(candidate_name=random_name(), we_vote_id='wv01cand{}'.format(number))
+            for number in range(5000)])
+        Organization.objects.bulk_create([
+            Organization(organization_name=random_name(), we_vote_id='wv01org{}'.format(number))
+            for number in range(2000)])
+        search_text_list = [random_name().split(' ')[0][:generator.randint(2, 6)] for number in range(200)]
+        search_local_search_index('build the index')
+
+        start_time = time.time()
+        for search_text in search_text_list:
+            list(CandidateCampaign.objects.filter(
+                Q(candidate_name__istartswith=search_text) | Q(candidate_name__icontains=' ' + search_text))[:10])
+            list(Organization.objects.filter(
+                Q(organization_name__istartswith=search_text) | Q(organization_name__icontains=' ' + search_text))[:10])
+        seconds_database = time.time() - start_time
+
+        start_time = time.time()
+        with self.assertNumQueries(0):
+            for search_text in search_text_list:
+                search_local_search_index(search_text)
+        seconds_local_search_index = time.time() - start_time
+
+        print("searchAll, 7,000 documents, {search_count} searches: database LIKE queries {seconds_database:.3f}s, "
+              "local search index {seconds_local_search_index:.3f}s".format(
+                  search_count=len(search_text_list), seconds_database=seconds_database,
+                  seconds_local_search_index=seconds_local_search_index))
@@ -5,12 +5,12 @@
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching, \
     voter_ballot_items_retrieve_for_one_election_for_api
 from ballot.models import CANDIDATE, MEASURE, OFFICE
-from candidate.models import CandidateCampaignManager, CandidateCampaignListManager
+from candidate.models import CandidateCampaignManager
 from measure.models import ContestMeasureManager
 from django.http import HttpResponse
 from follow.models import FollowOrganizationList
 import json
-from position.models import SUPPORT, OPPOSE, PositionEnteredManager, PositionListManager
+from position.models import SUPPORT, OPPOSE, PositionEnteredManager, PositionListManager, PositionTallyManager
 from voter.models import fetch_voter_id_from_voter_device_link, VoterAddressManager, VoterDeviceLinkManager, \
     VoterManager
 import wevote_functions.admin
@@ -112,7 +112,7 @@ def positions_count_for_candidate_campaign(voter_id, candidate_id, candidate_we_
     if len(public_positions_list_for_candidate_campaign):
         follow_organization_list_manager = FollowOrganizationList()
         organizations_followed_by_voter = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+            follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)['following_ids']
 
     if show_positions_this_voter_follows:
         position_objects = position_list_manager.calculate_positions_followed_by_voter(
@@ -209,7 +209,7 @@ def positions_count_for_contest_measure(voter_id, measure_id, measure_we_vote_id
     if len(public_positions_list_for_contest_measure):
         follow_organization_list_manager = FollowOrganizationList()
         organizations_followed_by_voter = \
-            follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+            follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)['following_ids']
 
     if show_positions_this_voter_follows:
         position_objects = position_list_manager.calculate_positions_followed_by_voter(
@@ -329,12 +329,11 @@ def positions_count_for_all_ballot_items_for_api(voter_device_id, google_civic_e
         }
         return json_data
 
-    position_list_manager = PositionListManager()
-    candidate_list_object = CandidateCampaignListManager()
+    position_tally_manager = PositionTallyManager()
 
     follow_organization_list_manager = FollowOrganizationList()
     organizations_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+        follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)['following_ids']
 
     # Get a list of all candidates and measures from this election (in the active election)
     if google_civic_election_id:
@@ -350,110 +349,39 @@ def positions_count_for_all_ballot_items_for_api(voter_device_id, google_civic_e
 
     ballot_item_list = ballot_item_results['ballot_item_list']
 
-    # The list where we capture results
-    position_counts_list_results = []
+    # ballot_item_list is populated with contest_office and contest_measure entries. The offices already come back
+    #  with their candidate_list, so we don't need to retrieve the candidates again.
+    # We collect the we_vote_ids in ballot order so we can return the counts in the same order.
+    ballot_item_we_vote_id_list = []
+    candidate_we_vote_id_list = []
+    measure_we_vote_id_list = []
+    for one_ballot_item in ballot_item_list:
+        if one_ballot_item['kind_of_ballot_item'] == OFFICE:
+            for candidate in one_ballot_item['candidate_list']:
+                candidate_we_vote_id_list.append(candidate['we_vote_id'])
+                ballot_item_we_vote_id_list.append(candidate['we_vote_id'])
+        elif one_ballot_item['kind_of_ballot_item'] == MEASURE:
+            measure_we_vote_id_list.append(one_ballot_item['we_vote_id'])
+            ballot_item_we_vote_id_list.append(one_ballot_item['we_vote_id'])
 
     friends_we_vote_id_list = []  # TODO DALE We need to pass in the voter's list of friends (as we_vote_id's)
     # Add yourself as a friend so your opinions show up
     friends_we_vote_id_list.append(voter_we_vote_id)
 
-    # ballot_item_list is populated with contest_office and contest_measure entries
-    for one_ballot_item in ballot_item_list:
-        # Retrieve all positions for each ballot item
-        if one_ballot_item['kind_of_ballot_item'] == OFFICE:
-            results = candidate_list_object.retrieve_all_candidates_for_office(0, one_ballot_item['we_vote_id'])
-            success = results['success']
-            candidate_list = results['candidate_list']
-
-            if success:
-                for candidate in candidate_list:
-                    # Loop through all candidates under this office
-
-                    # Public Positions
-                    retrieve_public_positions_now = True  # The alternate is positions for friends-only
-                    most_recent_only = True
-                    public_support_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            SUPPORT, most_recent_only)
-                    public_oppose_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            OPPOSE, most_recent_only)
-
-                    # Friend's-only Positions
-                    retrieve_public_positions_now = False  # Return friends-only positions counts
-                    most_recent_only = True
-                    friends_only_support_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            SUPPORT, most_recent_only, friends_we_vote_id_list)
-                    friends_only_oppose_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-                    support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-                        friends_only_support_positions_list_for_one_ballot_item
-                    oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-                        friends_only_oppose_positions_list_for_one_ballot_item
-
-                    finalize_results = finalize_support_and_oppose_positions_count(
-                        voter_id, show_positions_this_voter_follows,
-                        organizations_followed_by_voter,
-                        support_positions_list_for_one_ballot_item,
-                        oppose_positions_list_for_one_ballot_item)
-
-                    one_ballot_item_results = {
-                        'ballot_item_we_vote_id': candidate.we_vote_id,
-                        'support_count': finalize_results['support_positions_count'],
-                        'oppose_count': finalize_results['oppose_positions_count'],
-                    }
-                    position_counts_list_results.append(one_ballot_item_results)
-        elif one_ballot_item['kind_of_ballot_item'] == MEASURE:
-            # Public Positions
-            retrieve_public_positions_now = True  # The alternate is positions for friends-only
-            most_recent_only = True
-            public_support_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    SUPPORT, most_recent_only)
-            public_oppose_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    OPPOSE, most_recent_only)
-
-            # Friend's-only Positions
-            retrieve_public_positions_now = False  # Return friends-only positions counts
-            most_recent_only = True
-            friends_support_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    SUPPORT, most_recent_only, friends_we_vote_id_list)
-            friends_oppose_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-            support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-                friends_support_positions_list_for_one_ballot_item
-            oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-                friends_oppose_positions_list_for_one_ballot_item
-
-            finalize_results = finalize_support_and_oppose_positions_count(
-                voter_id, show_positions_this_voter_follows,
-                organizations_followed_by_voter,
-                support_positions_list_for_one_ballot_item,
-                oppose_positions_list_for_one_ballot_item)
-            one_ballot_item_results = {
-                'ballot_item_we_vote_id': one_ballot_item['we_vote_id'],
-                'support_count': finalize_results['support_positions_count'],
-                'oppose_count': finalize_results['oppose_positions_count'],
-            }
-            position_counts_list_results.append(one_ballot_item_results)
-        else:
-            # Skip the rest of this loop
-            continue
+    # Retrieve the counts for every ballot item from the pre-calculated PositionTally entries
+    position_counts_by_ballot_item = position_tally_manager.retrieve_position_counts_for_ballot_items(
+        voter_id, candidate_we_vote_id_list, measure_we_vote_id_list, organizations_followed_by_voter,
+        friends_we_vote_id_list, show_positions_this_voter_follows)
+
+    # The list where we capture results
+    position_counts_list_results = []
+    for ballot_item_we_vote_id in ballot_item_we_vote_id_list:
+        one_ballot_item_results = {
+            'ballot_item_we_vote_id': ballot_item_we_vote_id,
+            'support_count': position_counts_by_ballot_item[ballot_item_we_vote_id]['support_count'],
+            'oppose_count': position_counts_by_ballot_item[ballot_item_we_vote_id]['oppose_count'],
+        }
+        position_counts_list_results.append(one_ballot_item_results)
 
     json_data = {
         'success':                  True,
@@ -507,13 +435,13 @@ def positions_count_for_one_ballot_item_for_api(voter_device_id, ballot_item_we_
         }
         return json_data
 
-    position_list_manager = PositionListManager()
+    position_tally_manager = PositionTallyManager()
     show_positions_this_voter_follows = True
     position_counts_list_results = []
 
     follow_organization_list_manager = FollowOrganizationList()
     organizations_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
+        follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)['following_ids']
 
     friends_we_vote_id_list = []  # TODO DALE We need to pass in the voter's list of friends (as we_vote_id's)
     # Add yourself as a friend so your opinions show up
@@ -522,96 +450,30 @@ def positions_count_for_one_ballot_item_for_api(voter_device_id, ballot_item_we_
     # Figure out if this ballot_item is a candidate or measure
     if "cand" in ballot_item_we_vote_id:  # Is a Candidate
         # We don't need to retrieve the candidate
-
-        # Public Positions
-        retrieve_public_positions_now = True  # The alternate is positions for friends-only
-        most_recent_only = True
-        public_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only)
-        public_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only)
-
-        # Friend's-only Positions
-        retrieve_public_positions_now = False  # Return friends-only positions counts
-        most_recent_only = True
-        friends_only_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only, friends_we_vote_id_list)
-        friends_only_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-        support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-            friends_only_support_positions_list_for_one_ballot_item
-        oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-            friends_only_oppose_positions_list_for_one_ballot_item
-
-        finalize_results = finalize_support_and_oppose_positions_count(
-            voter_id, show_positions_this_voter_follows,
-            organizations_followed_by_voter,
-            support_positions_list_for_one_ballot_item,
-            oppose_positions_list_for_one_ballot_item)
-
-        one_ballot_item_results = {
-            'ballot_item_we_vote_id':   ballot_item_we_vote_id,
-            'support_count':            finalize_results['support_positions_count'],
-            'oppose_count':             finalize_results['oppose_positions_count'],
-        }
-        position_counts_list_results.append(one_ballot_item_results)
+        candidate_we_vote_id_list = [ballot_item_we_vote_id]
+        measure_we_vote_id_list = []
         success = True
     elif "meas" in ballot_item_we_vote_id:  # Is a measure
         # We don't need to retrieve the measure
+        candidate_we_vote_id_list = []
+        measure_we_vote_id_list = [ballot_item_we_vote_id]
+        success = True
+    else:
+        # The ballot_item_we_vote_id is not for a candidate or measure
+        candidate_we_vote_id_list = []
+        measure_we_vote_id_list = []
+        success = False
 
-        # Public Positions
-        retrieve_public_positions_now = True  # The alternate is positions for friends-only
-        most_recent_only = True
-        public_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only)
-        public_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only)
-
-        # Friend's-only Positions
-        retrieve_public_positions_now = False  # Return friends-only positions counts
-        most_recent_only = True
-        friends_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only, friends_we_vote_id_list)
-        friends_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-        support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-            friends_support_positions_list_for_one_ballot_item
-        oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-            friends_oppose_positions_list_for_one_ballot_item
-
-        finalize_results = finalize_support_and_oppose_positions_count(
-            voter_id, show_positions_this_voter_follows,
-            organizations_followed_by_voter,
-            support_positions_list_for_one_ballot_item,
-            oppose_positions_list_for_one_ballot_item)
+    if success:
+        position_counts_by_ballot_item = position_tally_manager.retrieve_position_counts_for_ballot_items(
+            voter_id, candidate_we_vote_id_list, measure_we_vote_id_list, organizations_followed_by_voter,
+            friends_we_vote_id_list, show_positions_this_voter_follows)
         one_ballot_item_results = {
             'ballot_item_we_vote_id':   ballot_item_we_vote_id,
-            'support_count':            finalize_results['support_positions_count'],
-            'oppose_count':             finalize_results['oppose_positions_count'],
+            'support_count':            position_counts_by_ballot_item[ballot_item_we_vote_id]['support_count'],
+            'oppose_count':             position_counts_by_ballot_item[ballot_item_we_vote_id]['oppose_count'],
         }
         position_counts_list_results.append(one_ballot_item_results)
-        success = True
-    else:
-        # The ballot_item_we_vote_id is not for a candidate or measure
-        success = False
 
     json_data = {
         'success':                  success,
@@ -0,0 +1,188 @@
+# support_oppose_deciding/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from position.models import OPPOSE, PERCENT_RATING, SUPPORT, PositionEntered, PositionEnteredManager, \
+    PositionForFriends, PositionListManager, PositionTallyManager
+from support_oppose_deciding.controllers import finalize_support_and_oppose_positions_count
+import time
+
+
+class PositionCountsForBallotItemsTestCase(TestCase):
+
+    def setUp(self):
+        self.voter_id = 1
+        self.voter_we_vote_id = 'wv01voter1'
+        self.friends_we_vote_id_list = [self.voter_we_vote_id]
+        self.organizations_followed_by_voter = [10, 11, 12]
+        self.candidate_we_vote_id_list = ['wv01cand{number}'.format(number=number) for number in range(1, 41)]
+        self.measure_we_vote_id_list = ['wv01meas{number}'.format(number=number) for number in range(1, 21)]
+
+        position_number = 0
+        for candidate_we_vote_id in self.candidate_we_vote_id_list:
+            for organization_id in (10, 11, 13):
+                position_number += 1
+                PositionEntered.objects.create(
+                    we_vote_id='wv01pos{number}'.format(number=position_number),
+                    candidate_campaign_we_vote_id=candidate_we_vote_id,
+                    organization_id=organization_id,
+                    organization_we_vote_id='wv01org{id}'.format(id=organization_id),
+                    stance=SUPPORT if organization_id % 2 else OPPOSE)
+            # Vote Smart ratings from one org over several years. Only the newest one should be counted.
+            for time_span, rating in (('2012', '20'), ('2013-2014', '90'), ('2015', '80')):
+                position_number += 1
+                PositionEntered.objects.create(
+                    we_vote_id='wv01pos{number}'.format(number=position_number),
+                    candidate_campaign_we_vote_id=candidate_we_vote_id,
+                    organization_id=12,
+                    organization_we_vote_id='wv01org12',
+                    stance=PERCENT_RATING,
+                    vote_smart_rating=rating,
+                    vote_smart_time_span=time_span)
+            position_number += 1
+            PositionForFriends.objects.create(
+                we_vote_id='wv01pos{number}'.format(number=position_number),
+                candidate_campaign_we_vote_id=candidate_we_vote_id,
+                voter_id=self.voter_id,
+                voter_we_vote_id=self.voter_we_vote_id,
+                stance=OPPOSE)
+        for measure_we_vote_id in self.measure_we_vote_id_list:
+            for organization_id in (10, 12, 13):
+                position_number += 1
+                PositionEntered.objects.create(
+                    we_vote_id='wv01pos{number}'.format(number=position_number),
+                    contest_measure_we_vote_id=measure_we_vote_id,
+                    organization_id=organization_id,
+                    organization_we_vote_id='wv01org{id}'.format(id=organization_id),
+                    stance=OPPOSE if organization_id == 12 else SUPPORT)
+
+    def retrieve_position_counts_one_ballot_item_at_a_time(self, show_positions_this_voter_follows):
+        position_list_manager = PositionListManager()
+        position_counts_by_ballot_item = {}
+        for candidate_we_vote_id in self.candidate_we_vote_id_list:
+            support_positions_list = \
+                position_list_manager.retrieve_all_positions_for_candidate_campaign(
+                    True, 0, candidate_we_vote_id, SUPPORT, True) + \
+                position_list_manager.retrieve_all_positions_for_candidate_campaign(
+                    False, 0, candidate_we_vote_id, SUPPORT, True, self.friends_we_vote_id_list)
+            oppose_positions_list = \
+                position_list_manager.retrieve_all_positions_for_candidate_campaign(
+                    True, 0, candidate_we_vote_id, OPPOSE, True) + \
+                position_list_manager.retrieve_all_positions_for_candidate_campaign(
+                    False, 0, candidate_we_vote_id, OPPOSE, True, self.friends_we_vote_id_list)
+            finalize_results = finalize_support_and_oppose_positions_count(
+                self.voter_id, show_positions_this_voter_follows, self.organizations_followed_by_voter,
+                support_positions_list, oppose_positions_list)
+            position_counts_by_ballot_item[candidate_we_vote_id] = {
+                'support_count':    finalize_results['support_positions_count'],
+                'oppose_count':     finalize_results['oppose_positions_count'],
+            }
+        for measure_we_vote_id in self.measure_we_vote_id_list:
+            support_positions_list = \
+                position_list_manager.retrieve_all_positions_for_contest_measure(
+                    True, 0, measure_we_vote_id, SUPPORT, True) + \
+                position_list_manager.retrieve_all_positions_for_contest_measure(
+                    False, 0, measure_we_vote_id, SUPPORT, True, self.friends_we_vote_id_list)
+            oppose_positions_list = \
+                position_list_manager.retrieve_all_positions_for_contest_measure(
+                    True, 0, measure_we_vote_id, OPPOSE, True) + \
+                position_list_manager.retrieve_all_positions_for_contest_measure(
+                    False, 0, measure_we_vote_id, OPPOSE, True, self.friends_we_vote_id_list)
+            finalize_results = finalize_support_and_oppose_positions_count(
+                self.voter_id, show_positions_this_voter_follows, self.organizations_followed_by_voter,
+                support_positions_list, oppose_positions_list)
+            position_counts_by_ballot_item[measure_we_vote_id] = {
+                'support_count':    finalize_results['support_positions_count'],
+                'oppose_count':     finalize_results['oppose_positions_count'],
+            }
+        return position_counts_by_ballot_item
+
+    def retrieve_position_counts_for_all_ballot_items(self, show_positions_this_voter_follows):
+        position_list_manager = PositionListManager()
+        return position_list_manager.retrieve_position_counts_for_ballot_items(
+            self.voter_id, self.candidate_we_vote_id_list, self.measure_we_vote_id_list,
+            self.organizations_followed_by_voter, self.friends_we_vote_id_list, show_positions_this_voter_follows)
+
+    def test_counts_match_one_ballot_item_at_a_time(self):
+        for show_positions_this_voter_follows in (True, False):
+            self.assertEqual(self.retrieve_position_counts_one_ballot_item_at_a_time(show_positions_this_voter_follows),
+                             self.retrieve_position_counts_for_all_ballot_items(show_positions_this_voter_follows))
+
+    def test_counts_for_one_candidate(self):
+        position_counts_by_ballot_item = self.retrieve_position_counts_for_all_ballot_items(True)
+        # Org 11 supports, and of org 12's two positive ratings only the newest (2015) is counted.
+        # Org 10, org 12's one negative rating (2012) and the voter oppose. Org 13 is not followed.
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 2, 'oppose_count': 3})
+        position_counts_by_ballot_item = self.retrieve_position_counts_for_all_ballot_items(False)
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 1, 'oppose_count': 0})
+
+    def retrieve_position_counts_from_position_tallies(self, show_positions_this_voter_follows):
+        position_tally_manager = PositionTallyManager()
+        return position_tally_manager.retrieve_position_counts_for_ballot_items(
+            self.voter_id, self.candidate_we_vote_id_list, self.measure_we_vote_id_list,
+            self.organizations_followed_by_voter, self.friends_we_vote_id_list, show_positions_this_voter_follows)
+
+    def test_position_tallies_match_positions(self):
+        position_tally_manager = PositionTallyManager()
+        for ballot_item_we_vote_id in self.candidate_we_vote_id_list + self.measure_we_vote_id_list:
+            position_tally_manager.update_position_tally_for_ballot_item(ballot_item_we_vote_id, 4184)
+        for show_positions_this_voter_follows in (True, False):
+            self.assertEqual(self.retrieve_position_counts_for_all_ballot_items(show_positions_this_voter_follows),
+                             self.retrieve_position_counts_from_position_tallies(show_positions_this_voter_follows))
+        with self.assertNumQueries(1):
+            self.retrieve_position_counts_from_position_tallies(True)
+
+    def test_position_tally_follows_visibility_switch(self):
+        position_tally_manager = PositionTallyManager()
+        position_tally_manager.update_position_tally_for_ballot_item('wv01cand1', 4184)
+        friends_position = PositionForFriends.objects.get(candidate_campaign_we_vote_id='wv01cand1')
+        PositionEnteredManager().transfer_to_public_position(friends_position)
+        # The voter's own position still counts, now from PositionEntered
+        position_counts_by_ballot_item = self.retrieve_position_counts_from_position_tallies(True)
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 2, 'oppose_count': 3})
+        position_counts_by_ballot_item = position_tally_manager.retrieve_position_counts_for_ballot_items(
+            self.voter_id, ['wv01cand1'], [], self.organizations_followed_by_voter, [])
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 2, 'oppose_count': 3})
+
+    def test_position_tally_follows_save_and_delete(self):
+        # Like the admin pages, which save and delete positions directly
+        PositionEntered.objects.get(we_vote_id='wv01pos2').delete()
+        position_counts_by_ballot_item = self.retrieve_position_counts_from_position_tallies(True)
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 1, 'oppose_count': 3})
+
+        # A rating without a percentage isn't counted, and doesn't stop the other positions from being counted
+        rating_without_percentage = PositionEntered.objects.create(
+            we_vote_id='wv01pos9999', candidate_campaign_we_vote_id='wv01cand1', organization_id=14,
+            organization_we_vote_id='wv01org14', stance=PERCENT_RATING, vote_smart_time_span='2016')
+        position_counts_by_ballot_item = self.retrieve_position_counts_from_position_tallies(False)
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 1, 'oppose_count': 0})
+        rating_without_percentage.vote_smart_rating = '90'
+        rating_without_percentage.save()
+        position_counts_by_ballot_item = self.retrieve_position_counts_from_position_tallies(False)
+        self.assertEqual(position_counts_by_ballot_item['wv01cand1'], {'support_count': 2, 'oppose_count': 0})
+
+    def test_query_count_does_not_grow_with_ballot_size(self):
+        with self.assertNumQueries(2):
+            self.retrieve_position_counts_for_all_ballot_items(True)
+
+    def test_benchmark_query_count_and_latency(self):
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as queries_before:
+            self.retrieve_position_counts_one_ballot_item_at_a_time(True)
+        seconds_before = time.time() - start_time
+
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as queries_after:
+            self.retrieve_position_counts_for_all_ballot_items(True)
+        seconds_after = time.time() - start_time
+
+        print("positionsCountForAllBallotItems, {ballot_items} ballot items: "
+              "one at a time {queries_before} queries {seconds_before:.3f}s, "
+              "grouped {queries_after} queries {seconds_after:.3f}s".format(
+                  ballot_items=len(self.candidate_we_vote_id_list) + len(self.measure_we_vote_id_list),
+                  queries_before=len(queries_before), seconds_before=seconds_before,
+                  queries_after=len(queries_after), seconds_after=seconds_after))
+        self.assertLess(len(queries_after), len(queries_before))
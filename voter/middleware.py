@@ -0,0 +1,25 @@
+# voter/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""Voter middleware"""
+
+from voter.models import voter_request_cache
+
+
+class VoterRequestCacheMiddleware(object):
+    """
+    Start an empty voter memo for each request, so we look up the voter behind a voter_device_id at most once per
+    request. The memo is thrown away when the response goes out (see get_voter_request_cache in voter/models.py).
+    """
+    def process_request(self, request):
+        voter_request_cache.memo = {}
+        return None
+
+    def process_response(self, request, response):
+        voter_request_cache.memo = None
+        return response
+
+    def process_exception(self, request, exception):
+        voter_request_cache.memo = None
+        return None
@@ -2,6 +2,8 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import (BaseUserManager, AbstractBaseUser)  # PermissionsMixin
 from django.core.validators import RegexValidator
@@ -12,10 +14,19 @@ import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, generate_voter_device_id, get_voter_device_id, \
     get_voter_api_device_id, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_last_voter_integer, fetch_site_unique_id_prefix
+import threading
 
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# Resolving a voter_device_id to a voter takes two queries (VoterDeviceLink, then Voter), and almost every API call
+#  does it, sometimes more than once per request. We keep the results in two layers:
+#  1) A memo that only lives for the length of one request (turned on by VoterRequestCacheMiddleware)
+#  2) The Django cache, with a short timeout (VOTER_CACHE_TIMEOUT). Unless CACHES points to a cache shared by all
+#     of the workers, keep the timeout short, since a change made by one worker is only cleared in that worker.
+VOTER_CACHE_TIMEOUT = getattr(settings, 'VOTER_CACHE_TIMEOUT', 60)
+voter_request_cache = threading.local()
+
 
 # This way of extending the base user described here:
 # https://docs.djangoproject.com/en/1.8/topics/auth/customizing/#a-full-example
@@ -174,10 +185,26 @@ class VoterManager(BaseUserManager):
             return 0
 
     def retrieve_voter_by_id(self, voter_id):
+        voter_id = convert_to_int(voter_id)
+        voter_on_stage = fetch_cached_voter(voter_id)
+        if voter_on_stage:
+            results = {
+                'error_result':             False,
+                'DoesNotExist':             False,
+                'MultipleObjectsReturned':  False,
+                'voter_found':              True,
+                'voter_id':                 voter_on_stage.id,
+                'voter':                    voter_on_stage,
+            }
+            return results
+
         email = ''
         voter_we_vote_id = ''
         voter_manager = VoterManager()
-        return voter_manager.retrieve_voter(voter_id, email, voter_we_vote_id)
+        results = voter_manager.retrieve_voter(voter_id, email, voter_we_vote_id)
+        if results['voter_found']:
+            store_cached_voter(results['voter'])
+        return results
 
     def retrieve_voter_by_we_vote_id(self, voter_we_vote_id):
         voter_id = ''
@@ -580,6 +607,12 @@ class Voter(AbstractBaseUser):
             )
             # TODO we need to deal with the situation where we_vote_id is NOT unique on save
         super(Voter, self).save(*args, **kwargs)
+        delete_cached_voter(self.id)
+
+    def delete(self, *args, **kwargs):
+        voter_id = self.id
+        super(Voter, self).delete(*args, **kwargs)
+        delete_cached_voter(voter_id)
 
     def get_full_name(self):
         full_name = self.first_name if positive_value_exists(self.first_name) else ''
@@ -691,7 +724,10 @@ class VoterDeviceLinkManager(models.Model):
 
         try:
             if positive_value_exists(voter_id):
-                VoterDeviceLink.objects.filter(voter_id=voter_id).delete()
+                voter_device_link_list = VoterDeviceLink.objects.filter(voter_id=voter_id)
+                for voter_device_id_to_delete in voter_device_link_list.values_list('voter_device_id', flat=True):
+                    delete_cached_voter_id_for_voter_device_id(voter_device_id_to_delete)
+                voter_device_link_list.delete()
                 status = "DELETE_ALL_VOTER_DEVICE_LINKS_SUCCESSFUL"
                 success = True
             else:
@@ -711,6 +747,7 @@ class VoterDeviceLinkManager(models.Model):
         try:
             if positive_value_exists(voter_device_id):
                 VoterDeviceLink.objects.filter(voter_device_id=voter_device_id).delete()
+                delete_cached_voter_id_for_voter_device_id(voter_device_id)
                 status = "DELETE_VOTER_DEVICE_LINK_SUCCESSFUL"
                 success = True
             else:
@@ -783,6 +820,7 @@ class VoterDeviceLinkManager(models.Model):
                 voter_device_link_on_stage.voter_device_id = voter_device_id
                 voter_device_link_on_stage.voter_id = voter_id
                 voter_device_link_on_stage.save()
+                delete_cached_voter_id_for_voter_device_id(voter_device_id)
 
                 voter_device_link_id = voter_device_link_on_stage.id
             else:
@@ -825,6 +863,7 @@ class VoterDeviceLinkManager(models.Model):
                     # If set literally to 0, save it
                     voter_device_link.google_civic_election_id = 0
                 voter_device_link.save()
+                delete_cached_voter_id_for_voter_device_id(voter_device_link.voter_device_id)
 
                 voter_device_link_id = voter_device_link.id
             else:
@@ -847,14 +886,94 @@ class VoterDeviceLinkManager(models.Model):
 
 # This method *just* returns the voter_id or 0
 def fetch_voter_id_from_voter_device_link(voter_device_id):
+    voter_id = fetch_cached_voter_id_for_voter_device_id(voter_device_id)
+    if positive_value_exists(voter_id):
+        return voter_id
+
     voter_device_link_manager = VoterDeviceLinkManager()
     results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id)
     if results['voter_device_link_found']:
         voter_device_link = results['voter_device_link']
+        # We only cache voter_device_ids we find, so a new VoterDeviceLink is picked up right away
+        store_cached_voter_id_for_voter_device_id(voter_device_id, voter_device_link.voter_id)
         return voter_device_link.voter_id
     return 0
 
 
+def get_voter_request_cache():
+    """
+    Return the memo for the current request, or None if we are not inside a request
+    (see VoterRequestCacheMiddleware). Scripts and management commands don't use the memo.
+    """
+    return getattr(voter_request_cache, 'memo', None)
+
+
+def fetch_cached_voter_id_for_voter_device_id(voter_device_id):
+    if not positive_value_exists(voter_device_id):
+        return 0
+    cache_key = 'voter_id_for_voter_device_id_{voter_device_id}'.format(voter_device_id=voter_device_id)
+    memo = get_voter_request_cache()
+    if memo is not None and cache_key in memo:
+        return memo[cache_key]
+    voter_id = cache.get(cache_key, 0)
+    if memo is not None and positive_value_exists(voter_id):
+        memo[cache_key] = voter_id
+    return voter_id
+
+
+def store_cached_voter_id_for_voter_device_id(voter_device_id, voter_id):
+    if not positive_value_exists(voter_device_id) or not positive_value_exists(voter_id):
+        return
+    cache_key = 'voter_id_for_voter_device_id_{voter_device_id}'.format(voter_device_id=voter_device_id)
+    memo = get_voter_request_cache()
+    if memo is not None:
+        memo[cache_key] = voter_id
+    cache.set(cache_key, voter_id, VOTER_CACHE_TIMEOUT)
+
+
+def delete_cached_voter_id_for_voter_device_id(voter_device_id):
+    if not positive_value_exists(voter_device_id):
+        return
+    cache_key = 'voter_id_for_voter_device_id_{voter_device_id}'.format(voter_device_id=voter_device_id)
+    memo = get_voter_request_cache()
+    if memo is not None:
+        memo.pop(cache_key, None)
+    cache.delete(cache_key)
+
+
+def fetch_cached_voter(voter_id):
+    if not positive_value_exists(voter_id):
+        return None
+    cache_key = 'voter_{voter_id}'.format(voter_id=voter_id)
+    memo = get_voter_request_cache()
+    if memo is not None and cache_key in memo:
+        return memo[cache_key]
+    voter = cache.get(cache_key)
+    if memo is not None and voter is not None:
+        memo[cache_key] = voter
+    return voter
+
+
+def store_cached_voter(voter):
+    if not voter or not positive_value_exists(voter.id):
+        return
+    cache_key = 'voter_{voter_id}'.format(voter_id=voter.id)
+    memo = get_voter_request_cache()
+    if memo is not None:
+        memo[cache_key] = voter
+    cache.set(cache_key, voter, VOTER_CACHE_TIMEOUT)
+
+
+def delete_cached_voter(voter_id):
+    if not positive_value_exists(voter_id):
+        return
+    cache_key = 'voter_{voter_id}'.format(voter_id=voter_id)
+    memo = get_voter_request_cache()
+    if memo is not None:
+        memo.pop(cache_key, None)
+    cache.delete(cache_key)
+
+
 # This method *just* returns the voter_id or 0
 def fetch_voter_id_from_voter_we_vote_id(we_vote_id):
     voter_manager = VoterManager()
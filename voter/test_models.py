@@ -2,10 +2,63 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import Client, TestCase
 from django.http import SimpleCookie
 import json
+from voter.models import fetch_voter_id_from_voter_device_link, voter_request_cache, Voter, VoterDeviceLinkManager, \
+    VoterManager
+
+
+class WeVoteTestsVoterCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.voter = Voter.objects.create(we_vote_id='wv01voter1')
+        self.voter_device_id = 'abc123'
+        VoterDeviceLinkManager().save_new_voter_device_link(self.voter_device_id, self.voter.id)
+
+    def tearDown(self):
+        voter_request_cache.memo = None
+        cache.clear()
+
+    def test_voter_from_voter_device_id_is_cached(self):
+        voter_manager = VoterManager()
+        results = voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertEqual(results['voter'].id, self.voter.id)
+        with self.assertNumQueries(0):
+            results = voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+            self.assertEqual(results['voter'].we_vote_id, 'wv01voter1')
+            results = voter_manager.retrieve_voter_by_id(self.voter.id)
+            self.assertEqual(results['voter_found'], True)
+
+    def test_request_memo(self):
+        voter_request_cache.memo = {}
+        fetch_voter_id_from_voter_device_link(self.voter_device_id)
+        cache.clear()
+        # Still in the same request, so we don't need the Django cache
+        with self.assertNumQueries(0):
+            self.assertEqual(fetch_voter_id_from_voter_device_link(self.voter_device_id), self.voter.id)
+
+    def test_update_voter_device_link_clears_cache(self):
+        self.assertEqual(fetch_voter_id_from_voter_device_link(self.voter_device_id), self.voter.id)
+        new_voter = Voter.objects.create(we_vote_id='wv01voter2')
+        voter_device_link_manager = VoterDeviceLinkManager()
+        results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(self.voter_device_id)
+        voter_device_link_manager.update_voter_device_link(results['voter_device_link'], new_voter)
+        self.assertEqual(fetch_voter_id_from_voter_device_link(self.voter_device_id), new_voter.id)
+
+        voter_device_link_manager.delete_voter_device_link(self.voter_device_id)
+        self.assertEqual(fetch_voter_id_from_voter_device_link(self.voter_device_id), 0)
+
+    def test_voter_save_clears_cache(self):
+        voter_manager = VoterManager()
+        voter_manager.retrieve_voter_by_id(self.voter.id)
+        self.voter.first_name = 'Jane'
+        self.voter.save()
+        results = voter_manager.retrieve_voter_by_id(self.voter.id)
+        self.assertEqual(results['voter'].first_name, 'Jane')
 
 
 # class WeVoteTestsVoter(TestCase):
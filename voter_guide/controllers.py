@@ -5,17 +5,19 @@
 from ballot.models import OFFICE, CANDIDATE, MEASURE
 from config.base import get_environment_variable
 from django.contrib import messages
+from django.db.models import Q
 from django.http import HttpResponse
 from follow.models import FollowOrganizationList
 from itertools import chain
 import json
 from organization.models import OrganizationManager
-from position.models import ANY_STANCE, PositionEntered, PositionEnteredManager, PositionListManager
-import requests
+from position.models import ANY_STANCE, PositionListManager
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
-from voter_guide.models import VoterGuideListManager, VoterGuideManager, VoterGuidePossibilityManager
+from voter_guide.models import fetch_cached_voter_guides_to_follow, store_cached_voter_guides_to_follow, VoterGuide, \
+    VoterGuideListManager, VoterGuideManager, VoterGuidePossibilityManager
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import convert_to_int, is_voter_device_id_valid, positive_value_exists
+from wevote_functions.sync_out import import_rows_from_master_server
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -31,20 +33,12 @@ def voter_guides_import_from_master_server(request, google_civic_election_id):
     # Request json file from We Vote servers
     messages.add_message(request, messages.INFO, "Loading Voter Guides from We Vote Master servers")
     logger.info("Loading Voter Guides from We Vote Master servers")
-    request = requests.get(VOTER_GUIDES_SYNC_URL, params={
+    return import_rows_from_master_server(VOTER_GUIDES_SYNC_URL, {
         "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
         "format":                   'json',
         "google_civic_election_id": google_civic_election_id,
-    })
-    structured_json = json.loads(request.text)
-    results = filter_voter_guides_structured_json_for_local_duplicates(structured_json)
-    filtered_structured_json = results['structured_json']
-    duplicates_removed = results['duplicates_removed']
-
-    import_results = voter_guides_import_from_structured_json(filtered_structured_json)
-    import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+    }, 'voter_guides_{google_civic_election_id}'.format(google_civic_election_id=google_civic_election_id),
+        filter_voter_guides_structured_json_for_local_duplicates, voter_guides_import_from_structured_json)
 
 
 def filter_voter_guides_structured_json_for_local_duplicates(structured_json):
@@ -305,15 +299,17 @@ def voter_guides_to_follow_retrieve_for_api(voter_device_id,  # voterGuidesToFol
         return results
 
     voter_guide_list = []
+    voter_guide_entry_list = None
     voter_guides = []
     try:
         if positive_value_exists(kind_of_ballot_item) and positive_value_exists(ballot_item_we_vote_id):
+            # These entries are already serialized, with the position on the ballot item included
             results = retrieve_voter_guides_to_follow_by_ballot_item(voter_id,
                                                                      kind_of_ballot_item, ballot_item_we_vote_id,
-                                                                     search_string)
+                                                                     search_string, google_civic_election_id)
             success = results['success']
             status = results['status']
-            voter_guide_list = results['voter_guide_list']
+            voter_guide_entry_list = results['voter_guide_entry_list']
         elif positive_value_exists(google_civic_election_id):
             # This retrieve also does the reordering
             results = retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_election_id,
@@ -345,70 +341,45 @@ def voter_guides_to_follow_retrieve_for_api(voter_device_id,  # voterGuidesToFol
             linked_organization_we_vote_id = voter.linked_organization_we_vote_id
 
         number_added_to_list = 0
-        position_manager = PositionEnteredManager()
-        position = PositionEntered()
-        for voter_guide in voter_guide_list:
-            if positive_value_exists(voter_guide.organization_we_vote_id) \
-                    and linked_organization_we_vote_id == voter_guide.organization_we_vote_id:
-                # Do not return your own voter guide to follow
-                continue
+        if voter_guide_entry_list is not None:
+            for voter_guide_entry in voter_guide_entry_list:
+                if positive_value_exists(voter_guide_entry['organization_we_vote_id']) \
+                        and linked_organization_we_vote_id == voter_guide_entry['organization_we_vote_id']:
+                    # Do not return your own voter guide to follow
+                    continue
 
-            position_found = False
-            one_voter_guide = {
-                'we_vote_id': voter_guide.we_vote_id,
-                'google_civic_election_id': voter_guide.google_civic_election_id,
-                'time_span': voter_guide.vote_smart_time_span,
-                'voter_guide_display_name': voter_guide.voter_guide_display_name(),
-                'voter_guide_image_url': voter_guide.voter_guide_image_url(),
-                'voter_guide_owner_type': voter_guide.voter_guide_owner_type,
-                'organization_we_vote_id': voter_guide.organization_we_vote_id,
-                'public_figure_we_vote_id': voter_guide.public_figure_we_vote_id,
-                'twitter_description': voter_guide.twitter_description,
-                'twitter_followers_count': voter_guide.twitter_followers_count,
-                'twitter_handle': voter_guide.twitter_handle,
-                'owner_voter_id': voter_guide.owner_voter_id,
-                'last_updated': voter_guide.last_updated.strftime('%Y-%m-%d %H:%M'),
-            }
-            if positive_value_exists(ballot_item_we_vote_id):
-                if kind_of_ballot_item == CANDIDATE:
-                    organization_manager = OrganizationManager()
-                    organization_id = organization_manager.fetch_organization_id(
-                        voter_guide.organization_we_vote_id)
-                    results = position_manager.retrieve_organization_candidate_campaign_position_with_we_vote_id(
-                        organization_id, ballot_item_we_vote_id)
-                    if results['position_found']:
-                        position = results['position']
-                        position_found = True
-                elif kind_of_ballot_item == MEASURE:
-                    organization_manager = OrganizationManager()
-                    organization_id = organization_manager.fetch_organization_id(
-                        voter_guide.organization_we_vote_id)
-                    results = position_manager.retrieve_organization_contest_measure_position_with_we_vote_id(
-                        organization_id, ballot_item_we_vote_id)
-                    if results['position_found']:
-                        position = results['position']
-                        position_found = True
-
-                if position_found:
-                    one_voter_guide['is_support'] = position.is_support()
-                    one_voter_guide['is_positive_rating'] = position.is_positive_rating()
-                    one_voter_guide['is_support_or_positive_rating'] = position.is_support_or_positive_rating()
-                    one_voter_guide['is_oppose'] = position.is_oppose()
-                    one_voter_guide['is_negative_rating'] = position.is_negative_rating()
-                    one_voter_guide['is_oppose_or_negative_rating'] = position.is_oppose_or_negative_rating()
-                    one_voter_guide['is_information_only'] = position.is_information_only()
-                    one_voter_guide['ballot_item_display_name'] = position.ballot_item_display_name
-                    one_voter_guide['speaker_display_name'] = position.speaker_display_name
-                    one_voter_guide['statement_text'] = position.statement_text
-                    one_voter_guide['more_info_url'] = position.more_info_url
-                    one_voter_guide['vote_smart_rating'] = position.vote_smart_rating
-                    one_voter_guide['vote_smart_time_span'] = position.vote_smart_time_span
+                voter_guides.append(voter_guide_entry['voter_guide'].copy())
+                if positive_value_exists(maximum_number_to_retrieve):
+                    number_added_to_list += 1
+                    if number_added_to_list >= maximum_number_to_retrieve:
+                        break
+        else:
+            for voter_guide in voter_guide_list:
+                if positive_value_exists(voter_guide.organization_we_vote_id) \
+                        and linked_organization_we_vote_id == voter_guide.organization_we_vote_id:
+                    # Do not return your own voter guide to follow
+                    continue
 
-            voter_guides.append(one_voter_guide.copy())
-            if positive_value_exists(maximum_number_to_retrieve):
-                number_added_to_list += 1
-                if number_added_to_list >= maximum_number_to_retrieve:
-                    break
+                one_voter_guide = {
+                    'we_vote_id': voter_guide.we_vote_id,
+                    'google_civic_election_id': voter_guide.google_civic_election_id,
+                    'time_span': voter_guide.vote_smart_time_span,
+                    'voter_guide_display_name': voter_guide.voter_guide_display_name(),
+                    'voter_guide_image_url': voter_guide.voter_guide_image_url(),
+                    'voter_guide_owner_type': voter_guide.voter_guide_owner_type,
+                    'organization_we_vote_id': voter_guide.organization_we_vote_id,
+                    'public_figure_we_vote_id': voter_guide.public_figure_we_vote_id,
+                    'twitter_description': voter_guide.twitter_description,
+                    'twitter_followers_count': voter_guide.twitter_followers_count,
+                    'twitter_handle': voter_guide.twitter_handle,
+                    'owner_voter_id': voter_guide.owner_voter_id,
+                    'last_updated': voter_guide.last_updated.strftime('%Y-%m-%d %H:%M'),
+                }
+                voter_guides.append(one_voter_guide.copy())
+                if positive_value_exists(maximum_number_to_retrieve):
+                    number_added_to_list += 1
+                    if number_added_to_list >= maximum_number_to_retrieve:
+                        break
 
         if len(voter_guides):
             json_data = {
@@ -462,11 +433,73 @@ def voter_guides_to_follow_retrieve_for_api(voter_device_id,  # voterGuidesToFol
 
 
 def retrieve_voter_guides_to_follow_by_ballot_item(voter_id, kind_of_ballot_item, ballot_item_we_vote_id,
-                                                   search_string):
-    voter_guide_list_found = False
+                                                   search_string, google_civic_election_id=0):
+    """
+    The list of voter guide entries for a ballot item is the same for every voter, so we build it once and cache it
+    (see retrieve_voter_guide_entries_for_ballot_item). Here we only remove the organizations this voter follows or
+    ignores, and the entries that don't match search_string.
+    """
+    voter_guide_entry_list = []
+    results = retrieve_voter_guide_entries_for_ballot_item(kind_of_ballot_item, ballot_item_we_vote_id,
+                                                           google_civic_election_id)
+    if not results['success']:
+        results = {
+            'success':                      False,
+            'status':                       results['status'],
+            'search_string':                search_string,
+            'voter_guide_list_found':       False,
+            'voter_guide_entry_list':       voter_guide_entry_list,
+        }
+        return results
+
+    follow_organization_list_manager = FollowOrganizationList()
+    follow_organization_sets = follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)
+    organization_ids_to_skip = follow_organization_sets['following_ids'] | follow_organization_sets['ignoring_ids']
+
+    if positive_value_exists(search_string):
+        search_string = str(search_string).lower()  # Make sure search_string is a string
+
+    for voter_guide_entry in results['voter_guide_entry_list']:
+        if voter_guide_entry['organization_id'] in organization_ids_to_skip:
+            continue
+        # If we passed in search_string, make sure they are in this entry.
+        # If they aren't, don't return voter guide
+        if positive_value_exists(search_string):
+            if search_string not in voter_guide_entry['twitter_handle'].lower() \
+                    and search_string not in voter_guide_entry['display_name'].lower():
+                continue
+        voter_guide_entry_list.append(voter_guide_entry)
+
+    results = {
+        'success':                      True,
+        'status':                       'SUCCESSFUL_RETRIEVE_OF_VOTER_GUIDES_BY_BALLOT_ITEM',
+        'search_string':                search_string,
+        'voter_guide_list_found':       True if len(voter_guide_entry_list) else False,
+        'voter_guide_entry_list':       voter_guide_entry_list,
+    }
+    return results
+
+
+def retrieve_voter_guide_entries_for_ballot_item(kind_of_ballot_item, ballot_item_we_vote_id,
+                                                 google_civic_election_id=0):
+    """
+    Find the voter guide for each organization with a public position on this ballot item, and serialize it the way
+    voterGuidesToFollow returns it. The positions and the voter guides are each retrieved with one query, and the
+    result is cached until a VoterGuide, or a position on this ballot item, is saved.
+    :return: voter_guide_entry_list, where each entry is a dict with organization_id, organization_we_vote_id,
+     twitter_handle, display_name (for the search filter) and voter_guide (the dict for the json response)
+    """
+    voter_guide_entry_list = fetch_cached_voter_guides_to_follow(google_civic_election_id, ballot_item_we_vote_id)
+    if voter_guide_entry_list is not None:
+        results = {
+            'success':                  True,
+            'status':                   'VOTER_GUIDE_ENTRIES_RETRIEVED_FROM_CACHE',
+            'voter_guide_entry_list':   voter_guide_entry_list,
+        }
+        return results
+
     retrieve_public_positions = True  # The alternate is positions for friends-only. Since this method returns positions
     # to follow, we never need to return friend's positions here
-
     position_list_manager = PositionListManager()
     if (kind_of_ballot_item == CANDIDATE) and positive_value_exists(ballot_item_we_vote_id):
         candidate_id = 0
@@ -481,75 +514,105 @@ def retrieve_voter_guides_to_follow_by_ballot_item(voter_id, kind_of_ballot_item
         all_positions_list = position_list_manager.retrieve_all_positions_for_contest_office(
                 office_id, ballot_item_we_vote_id, ANY_STANCE)
     else:
-        voter_guide_list = []
         results = {
-            'success':                      False,
-            'status':                       "VOTER_GUIDES_BALLOT_RELATED_VARIABLES_MISSING",
-            'search_string':                search_string,
-            'voter_guide_list_found':       False,
-            'voter_guide_list':             voter_guide_list,
+            'success':                  False,
+            'status':                   "VOTER_GUIDES_BALLOT_RELATED_VARIABLES_MISSING",
+            'voter_guide_entry_list':   [],
         }
         return results
 
-    follow_organization_list_manager = FollowOrganizationList()
-    organizations_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
-
-    positions_list = position_list_manager.calculate_positions_not_followed_by_voter(
-        all_positions_list, organizations_followed_by_voter)
-
-    voter_guide_list = []
-    # Cycle through the positions held by groups that you don't currently follow
-    voter_guide_manager = VoterGuideManager()
+    # Only organizations have voter guides to follow. A position from an election is matched with the organization's
+    # voter guide for that election, and a Vote Smart rating with the voter guide for its time span.
+    positions_list = []
+    organization_we_vote_id_list = set()
+    google_civic_election_id_list = set()
+    vote_smart_time_span_list = set()
+    for one_position in all_positions_list:
+        # Like calculate_positions_not_followed_by_voter, skip positions without an organization_id
+        if not positive_value_exists(one_position.organization_id) \
+                or not positive_value_exists(one_position.organization_we_vote_id):
+            continue
+        if one_position.google_civic_election_id:
+            position_google_civic_election_id = convert_to_int(one_position.google_civic_election_id)
+            if not positive_value_exists(position_google_civic_election_id):
+                continue
+            google_civic_election_id_list.add(position_google_civic_election_id)
+        elif positive_value_exists(one_position.vote_smart_time_span):
+            vote_smart_time_span_list.add(one_position.vote_smart_time_span)
+        else:
+            continue
+        organization_we_vote_id_list.add(one_position.organization_we_vote_id)
+        positions_list.append(one_position)
+
+    voter_guides_by_election = {}
+    voter_guides_by_time_span = {}
+    if len(positions_list):
+        voter_guide_query = VoterGuide.objects.filter(organization_we_vote_id__in=organization_we_vote_id_list)
+        voter_guide_query = voter_guide_query.filter(Q(google_civic_election_id__in=google_civic_election_id_list) |
+                                                     Q(vote_smart_time_span__in=vote_smart_time_span_list))
+        for voter_guide in voter_guide_query:
+            voter_guides_by_election.setdefault(
+                (voter_guide.organization_we_vote_id, voter_guide.google_civic_election_id), []).append(voter_guide)
+            voter_guides_by_time_span.setdefault(
+                (voter_guide.organization_we_vote_id, voter_guide.vote_smart_time_span), []).append(voter_guide)
+
+    voter_guide_entry_list = []
     for one_position in positions_list:
-        if positive_value_exists(one_position.organization_we_vote_id):
-            if one_position.google_civic_election_id:
-                results = voter_guide_manager.retrieve_voter_guide(
-                    voter_guide_id=0,
-                    google_civic_election_id=one_position.google_civic_election_id,
-                    vote_smart_time_span=None,
-                    organization_we_vote_id=one_position.organization_we_vote_id)
-            else:
-                # vote_smart_time_span
-                results = voter_guide_manager.retrieve_voter_guide(
-                    voter_guide_id=0,
-                    google_civic_election_id=0,
-                    vote_smart_time_span=one_position.vote_smart_time_span,
-                    organization_we_vote_id=one_position.organization_we_vote_id)
-
-        elif positive_value_exists(one_position.public_figure_we_vote_id):
-            results['voter_guide_found'] = False
-        elif positive_value_exists(one_position.voter_we_vote_id):
-            results['voter_guide_found'] = False
+        if one_position.google_civic_election_id:
+            voter_guides_found = voter_guides_by_election.get(
+                (one_position.organization_we_vote_id, convert_to_int(one_position.google_civic_election_id)), [])
         else:
-            results['voter_guide_found'] = False
-
-        if results['voter_guide_found']:
-            voter_guide = results['voter_guide']
-            # If we passed in search_string, make sure they are in this entry.
-            # If they aren't, don't return voter guide
-            if positive_value_exists(search_string):
-                search_string = str(search_string)  # Make sure search_string is a string
-                twitter_handle = str(voter_guide.twitter_handle)
-                display_name = str(voter_guide.display_name)
-
-                if search_string.lower() in twitter_handle.lower() or search_string.lower() in display_name.lower():
-                    voter_guide_list.append(voter_guide)
-            else:
-                voter_guide_list.append(voter_guide)
-
-    status = 'SUCCESSFUL_RETRIEVE_OF_VOTER_GUIDES_BY_BALLOT_ITEM'
-    success = True
-
-    if len(voter_guide_list):
-        voter_guide_list_found = True
+            voter_guides_found = voter_guides_by_time_span.get(
+                (one_position.organization_we_vote_id, one_position.vote_smart_time_span), [])
+        if len(voter_guides_found) != 1:
+            # Like VoterGuideManager.retrieve_voter_guide, we don't pick one if more than one matches
+            continue
+        voter_guide = voter_guides_found[0]
+
+        one_voter_guide = {
+            'we_vote_id': voter_guide.we_vote_id,
+            'google_civic_election_id': voter_guide.google_civic_election_id,
+            'time_span': voter_guide.vote_smart_time_span,
+            'voter_guide_display_name': voter_guide.voter_guide_display_name(),
+            'voter_guide_image_url': voter_guide.voter_guide_image_url(),
+            'voter_guide_owner_type': voter_guide.voter_guide_owner_type,
+            'organization_we_vote_id': voter_guide.organization_we_vote_id,
+            'public_figure_we_vote_id': voter_guide.public_figure_we_vote_id,
+            'twitter_description': voter_guide.twitter_description,
+            'twitter_followers_count': voter_guide.twitter_followers_count,
+            'twitter_handle': voter_guide.twitter_handle,
+            'owner_voter_id': voter_guide.owner_voter_id,
+            'last_updated': voter_guide.last_updated.strftime('%Y-%m-%d %H:%M'),
+        }
+        if kind_of_ballot_item in (CANDIDATE, MEASURE):
+            one_voter_guide['is_support'] = one_position.is_support()
+            one_voter_guide['is_positive_rating'] = one_position.is_positive_rating()
+            one_voter_guide['is_support_or_positive_rating'] = one_position.is_support_or_positive_rating()
+            one_voter_guide['is_oppose'] = one_position.is_oppose()
+            one_voter_guide['is_negative_rating'] = one_position.is_negative_rating()
+            one_voter_guide['is_oppose_or_negative_rating'] = one_position.is_oppose_or_negative_rating()
+            one_voter_guide['is_information_only'] = one_position.is_information_only()
+            one_voter_guide['ballot_item_display_name'] = one_position.ballot_item_display_name
+            one_voter_guide['speaker_display_name'] = one_position.speaker_display_name
+            one_voter_guide['statement_text'] = one_position.statement_text
+            one_voter_guide['more_info_url'] = one_position.more_info_url
+            one_voter_guide['vote_smart_rating'] = one_position.vote_smart_rating
+            one_voter_guide['vote_smart_time_span'] = one_position.vote_smart_time_span
+
+        voter_guide_entry_list.append({
+            'organization_id':          one_position.organization_id,
+            'organization_we_vote_id':  voter_guide.organization_we_vote_id,
+            'twitter_handle':           str(voter_guide.twitter_handle),
+            'display_name':             str(voter_guide.display_name),
+            'voter_guide':              one_voter_guide,
+        })
+
+    store_cached_voter_guides_to_follow(google_civic_election_id, ballot_item_we_vote_id, voter_guide_entry_list)
 
     results = {
-        'success':                      success,
-        'status':                       status,
-        'search_string':              search_string,
-        'voter_guide_list_found':       voter_guide_list_found,
-        'voter_guide_list':             voter_guide_list,
+        'success':                  True,
+        'status':                   'VOTER_GUIDE_ENTRIES_RETRIEVED',
+        'voter_guide_entry_list':   voter_guide_entry_list,
     }
     return results
 
@@ -560,10 +623,9 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
 
     # Start with orgs followed and ignored by this voter
     follow_organization_list_manager = FollowOrganizationList()
-    organizations_followed_by_voter = \
-        follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
-    organizations_ignored_by_voter = \
-        follow_organization_list_manager.retrieve_ignore_organization_by_voter_id_simple_id_array(voter_id)
+    follow_organization_sets = follow_organization_list_manager.retrieve_follow_organization_sets(voter_id)
+    organizations_followed_by_voter = follow_organization_sets['following_ids']
+    organizations_ignored_by_voter = follow_organization_sets['ignoring_ids']
 
     position_list_manager = PositionListManager()
     if positive_value_exists(google_civic_election_id):
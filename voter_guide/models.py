@@ -2,6 +2,8 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q
 from election.models import ElectionManager, TIME_SPAN_LIST
@@ -9,12 +11,19 @@ from exception.models import handle_exception, handle_record_not_found_exception
     handle_record_found_more_than_one_exception
 import operator
 from organization.models import Organization, OrganizationManager
+import uuid
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, convert_to_str, positive_value_exists
 from wevote_settings.models import fetch_site_unique_id_prefix, fetch_next_we_vote_id_last_voter_guide_integer
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# The voterGuidesToFollow list for one ballot item is the same for every voter, minus the organizations each voter
+#  follows or ignores. We build it once and keep it in the Django cache (see voter_guide/controllers.py). Saving a
+#  VoterGuide, or a position on the ballot item, clears it. Unless CACHES points to a cache shared by all of the
+#  workers, a save only clears the cache in the worker that made it, so keep the timeout short.
+VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT = getattr(settings, 'VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT', 300)
+
 ORGANIZATION = 'O'
 PUBLIC_FIGURE = 'P'
 VOTER = 'V'
@@ -651,6 +660,11 @@ class VoterGuide(models.Model):
             )
             # TODO we need to deal with the situation where we_vote_id is NOT unique on save
         super(VoterGuide, self).save(*args, **kwargs)
+        delete_all_cached_voter_guides_to_follow()
+
+    def delete(self, *args, **kwargs):
+        super(VoterGuide, self).delete(*args, **kwargs)
+        delete_all_cached_voter_guides_to_follow()
 
 
 # This is the class that we use to rapidly show lists of voter guides, regardless of whether they are from an
@@ -1311,3 +1325,57 @@ class VoterGuidePossibility(models.Model):
             logger.error("voter_guide.organization did not find")
             return
         return organization
+
+
+def fetch_voter_guides_to_follow_cache_key(google_civic_election_id, ballot_item_we_vote_id):
+    """
+    The cache key includes a version for all voter guides, and a version for the ballot item. To clear the cached
+    lists, we give them a new version instead of finding and deleting each key.
+    """
+    all_version_key = 'voter_guides_to_follow_version'
+    ballot_item_version_key = 'voter_guides_to_follow_version_{ballot_item_we_vote_id}'.format(
+        ballot_item_we_vote_id=ballot_item_we_vote_id)
+    versions = cache.get_many([all_version_key, ballot_item_version_key])
+    for version_key in (all_version_key, ballot_item_version_key):
+        if version_key not in versions:
+            # Never reuse an old version, even if this one was evicted from the cache
+            versions[version_key] = uuid.uuid4().hex
+            cache.set(version_key, versions[version_key], VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT)
+    return 'voter_guides_to_follow_{all_version}_{ballot_item_version}_{google_civic_election_id}_' \
+           '{ballot_item_we_vote_id}'.format(all_version=versions[all_version_key],
+                                             ballot_item_version=versions[ballot_item_version_key],
+                                             google_civic_election_id=convert_to_int(google_civic_election_id),
+                                             ballot_item_we_vote_id=ballot_item_we_vote_id)
+
+
+def fetch_cached_voter_guides_to_follow(google_civic_election_id, ballot_item_we_vote_id):
+    """
+    :return: The list stored by store_cached_voter_guides_to_follow, or None
+    """
+    if not positive_value_exists(ballot_item_we_vote_id):
+        return None
+    return cache.get(fetch_voter_guides_to_follow_cache_key(google_civic_election_id, ballot_item_we_vote_id))
+
+
+def store_cached_voter_guides_to_follow(google_civic_election_id, ballot_item_we_vote_id, voter_guide_entry_list):
+    if not positive_value_exists(ballot_item_we_vote_id):
+        return
+    cache.set(fetch_voter_guides_to_follow_cache_key(google_civic_election_id, ballot_item_we_vote_id),
+              voter_guide_entry_list, VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT)
+
+
+def delete_cached_voter_guides_to_follow_for_ballot_item(ballot_item_we_vote_id):
+    """
+    Call this when a position on this ballot item changes
+    """
+    if not positive_value_exists(ballot_item_we_vote_id):
+        return
+    cache.set('voter_guides_to_follow_version_{ballot_item_we_vote_id}'.format(
+        ballot_item_we_vote_id=ballot_item_we_vote_id), uuid.uuid4().hex, VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT)
+
+
+def delete_all_cached_voter_guides_to_follow():
+    """
+    Call this when a voter guide changes, since we don't know which ballot items it has positions on
+    """
+    cache.set('voter_guides_to_follow_version', uuid.uuid4().hex, VOTER_GUIDES_TO_FOLLOW_CACHE_TIMEOUT)
@@ -0,0 +1,84 @@
+# voter_guide/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from ballot.models import CANDIDATE
+from django.core.cache import cache
+from django.test import TestCase
+from follow.models import FOLLOW_IGNORE, FOLLOWING, FollowOrganization
+from position.models import OPPOSE, SUPPORT, PositionEntered
+from voter_guide.controllers import retrieve_voter_guide_entries_for_ballot_item, \
+    retrieve_voter_guides_to_follow_by_ballot_item
+from voter_guide.models import VoterGuide
+
+
+class VoterGuidesToFollowByBallotItemTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.voter_id = 1
+        self.google_civic_election_id = 4184
+        for organization_id in range(1, 8):
+            PositionEntered.objects.create(
+                we_vote_id='wv01pos{id}'.format(id=organization_id),
+                candidate_campaign_we_vote_id='wv01cand1',
+                google_civic_election_id=self.google_civic_election_id,
+                organization_id=organization_id,
+                organization_we_vote_id='wv01org{id}'.format(id=organization_id),
+                stance=SUPPORT if organization_id % 2 else OPPOSE)
+        # A position without an organization_id isn't offered, even though org 9 has a voter guide
+        PositionEntered.objects.create(
+            we_vote_id='wv01pos9', candidate_campaign_we_vote_id='wv01cand1',
+            google_civic_election_id=self.google_civic_election_id,
+            organization_we_vote_id='wv01org9', stance=SUPPORT)
+        # Org 6 has no voter guide, and org 7 has two, so neither is offered
+        for organization_id in (1, 2, 3, 4, 5, 7, 7, 9):
+            VoterGuide.objects.create(
+                google_civic_election_id=self.google_civic_election_id,
+                organization_we_vote_id='wv01org{id}'.format(id=organization_id),
+                display_name='Org {id}'.format(id=organization_id),
+                twitter_handle='org{id}'.format(id=organization_id))
+        FollowOrganization.objects.create(voter_id=self.voter_id, organization_id=1, following_status=FOLLOWING)
+        FollowOrganization.objects.create(voter_id=self.voter_id, organization_id=2, following_status=FOLLOW_IGNORE)
+
+    def retrieve_organization_we_vote_ids_to_follow(self, search_string=''):
+        results = retrieve_voter_guides_to_follow_by_ballot_item(
+            self.voter_id, CANDIDATE, 'wv01cand1', search_string, self.google_civic_election_id)
+        self.assertTrue(results['success'])
+        return sorted(voter_guide_entry['organization_we_vote_id']
+                      for voter_guide_entry in results['voter_guide_entry_list'])
+
+    def test_followed_and_ignored_organizations_are_removed(self):
+        self.assertEqual(self.retrieve_organization_we_vote_ids_to_follow(), ['wv01org3', 'wv01org4', 'wv01org5'])
+        self.assertEqual(self.retrieve_organization_we_vote_ids_to_follow('ORG4'), ['wv01org4'])
+
+    def test_entries_include_position(self):
+        results = retrieve_voter_guide_entries_for_ballot_item(CANDIDATE, 'wv01cand1', self.google_civic_election_id)
+        voter_guides = {voter_guide_entry['organization_we_vote_id']: voter_guide_entry['voter_guide']
+                        for voter_guide_entry in results['voter_guide_entry_list']}
+        self.assertTrue(voter_guides['wv01org3']['is_support'])
+        self.assertTrue(voter_guides['wv01org4']['is_oppose'])
+        self.assertEqual(voter_guides['wv01org4']['voter_guide_display_name'], 'Org 4')
+
+    def test_entries_are_cached_until_a_save(self):
+        results = retrieve_voter_guide_entries_for_ballot_item(CANDIDATE, 'wv01cand1', self.google_civic_election_id)
+        self.assertEqual(results['status'], 'VOTER_GUIDE_ENTRIES_RETRIEVED')
+        with self.assertNumQueries(0):
+            cached_results = retrieve_voter_guide_entries_for_ballot_item(
+                CANDIDATE, 'wv01cand1', self.google_civic_election_id)
+        self.assertEqual(cached_results['status'], 'VOTER_GUIDE_ENTRIES_RETRIEVED_FROM_CACHE')
+        self.assertEqual(cached_results['voter_guide_entry_list'], results['voter_guide_entry_list'])
+
+        # A new position on this ballot item clears the cache
+        PositionEntered.objects.create(
+            we_vote_id='wv01pos8', candidate_campaign_we_vote_id='wv01cand1',
+            google_civic_election_id=self.google_civic_election_id,
+            organization_id=8, organization_we_vote_id='wv01org8', stance=SUPPORT)
+        VoterGuide.objects.create(google_civic_election_id=self.google_civic_election_id,
+                                  organization_we_vote_id='wv01org8', display_name='Org 8')
+        self.assertIn('wv01org8', self.retrieve_organization_we_vote_ids_to_follow())
+
+        # So does a change to a voter guide
+        retrieve_voter_guide_entries_for_ballot_item(CANDIDATE, 'wv01cand1', self.google_civic_election_id)
+        VoterGuide.objects.filter(organization_we_vote_id='wv01org8').first().delete()
+        self.assertNotIn('wv01org8', self.retrieve_organization_we_vote_ids_to_follow())
@@ -17,10 +17,10 @@ from organization.models import Organization, OrganizationListManager
 from organization.views_admin import organization_edit_process_view
 from position.models import PositionEntered, PositionForFriends, PositionListManager
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from voter.models import voter_has_authority
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists, \
     STATE_CODE_MAP
+from wevote_functions.sync_out import sync_out_response
 
 
 # This page does not need to be protected.
@@ -32,8 +32,7 @@ class VoterGuidesSyncOutView(APIView):
         if positive_value_exists(google_civic_election_id):
             voter_guide_list = voter_guide_list.filter(google_civic_election_id=google_civic_election_id)
 
-        serializer = VoterGuideSerializer(voter_guide_list, many=True)
-        return Response(serializer.data)
+        return sync_out_response(request, voter_guide_list, VoterGuideSerializer, 'last_updated')
 
 
 @login_required
@@ -2,12 +2,22 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import atexit
+import codecs
+from collections import OrderedDict
 import datetime
+from django.db.models import Case, F, Value, When
+from django.dispatch import Signal
+import json
 from nameparser import HumanName
 import random
 import string
 import sys
+import threading
+import time
 import types
+from urllib.parse import urlparse
+import weakref
 import wevote_functions.admin
 
 
@@ -138,6 +148,315 @@ def convert_to_int(value):
     return new_value
 
 
+def generate_chunks(iterable, chunk_size=500):
+    """
+    Break any iterable (including a generator) into lists of at most chunk_size items
+    :param iterable:
+    :param chunk_size:
+    :return:
+    """
+    one_chunk = []
+    for one_item in iterable:
+        one_chunk.append(one_item)
+        if len(one_chunk) >= chunk_size:
+            yield one_chunk
+            one_chunk = []
+    if len(one_chunk):
+        yield one_chunk
+
+
+# Sent (with the model class as the sender) when bulk_update_objects, or code that uses bulk_create, saves object_list
+#  without calling save(), so there is no post_save for each object
+objects_bulk_saved = Signal(providing_args=['object_list'])
+
+
+def bulk_update_objects(object_list, field_name_list, batch_size=500):
+    """
+    Save field_name_list for every (already saved) object in object_list, with one UPDATE for each batch:
+    UPDATE ... SET field = CASE WHEN id = 1 THEN ... WHEN id = 2 THEN ... END WHERE id IN (1, 2, ...)
+    Django 1.8 does not have QuerySet.bulk_update. Like QuerySet.update, this does not call save(), but like save() it
+    sets the auto_now fields (ex/ date_last_changed).
+    :param object_list: Objects of one model
+    :param field_name_list:
+    :param batch_size:
+    :return: The number of rows updated
+    """
+    if not len(object_list) or not len(field_name_list):
+        return 0
+    model_class = type(object_list[0])
+    auto_now_field_list = [field for field in model_class._meta.concrete_fields
+                           if getattr(field, 'auto_now', False) and field.name not in field_name_list]
+    if len(auto_now_field_list):
+        for one_object in object_list:
+            for field in auto_now_field_list:
+                field.pre_save(one_object, False)
+        field_name_list = list(field_name_list) + [field.name for field in auto_now_field_list]
+    rows_updated = 0
+    for object_batch in generate_chunks(object_list, batch_size):
+        update_values = {}
+        for field_name in field_name_list:
+            field = model_class._meta.get_field(field_name)
+            when_list = [When(pk=one_object.pk,
+                              then=Value(getattr(one_object, field.attname), output_field=field))
+                         for one_object in object_batch]
+            update_values[field.name] = Case(*when_list, default=F(field.name), output_field=field)
+        rows_updated += model_class.objects.filter(
+            pk__in=[one_object.pk for one_object in object_batch]).update(**update_values)
+    objects_bulk_saved.send(sender=model_class, object_list=object_list)
+    return rows_updated
+
+
+def iterate_json_array_from_chunks(chunk_iterator):
+    """
+    Yield the items of a top-level JSON array one at a time, as the text arrives. This lets us work through a large
+    response (ex/ requests.get(..., stream=True).iter_content()) without holding the whole document in memory.
+    Raises ValueError if the text is not a JSON array.
+    :param chunk_iterator: Returns bytes (decoded as UTF-8) or str
+    :return:
+    """
+    json_decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    array_started = False
+    array_finished = False
+    end_of_stream = False
+    chunk_iterator = iter(chunk_iterator)
+    while not array_finished:
+        try:
+            chunk = next(chunk_iterator)
+        except StopIteration:
+            chunk = utf8_decoder.decode(b'', final=True)
+            end_of_stream = True
+        if isinstance(chunk, bytes):
+            chunk = utf8_decoder.decode(chunk)
+        buffer += chunk
+
+        position = 0
+        while True:
+            # Skip whitespace and the commas between items
+            while position < len(buffer) and (buffer[position].isspace() or
+                                              (array_started and buffer[position] == ',')):
+                position += 1
+            if position >= len(buffer):
+                break
+            if not array_started:
+                if buffer[position] != '[':
+                    raise ValueError("Expected a JSON array, found '{character}'".format(
+                        character=buffer[position]))
+                array_started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                array_finished = True
+                break
+            try:
+                one_item, item_end = json_decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The item is not complete yet, so wait for more text
+                break
+            if not isinstance(one_item, (dict, list)) and not end_of_stream and \
+                    (item_end >= len(buffer) or buffer[item_end] not in ', \t\r\n]'):
+                # A number at the end of the buffer might continue in the next chunk
+                break
+            position = item_end
+            yield one_item
+        buffer = buffer[position:]
+
+        if end_of_stream and not array_finished:
+            raise ValueError("JSON array ended before its closing bracket")
+
+
+class TokenBucket(object):
+    """
+    A rate limiter that threads can share: consume() allows requests_per_second calls on average, with bursts of up to
+    burst_size calls, and sleeps until the next call is allowed. A requests_per_second of 0 means no limit.
+    """
+    def __init__(self, requests_per_second, burst_size=0):
+        self.requests_per_second = float(requests_per_second)
+        self.burst_size = float(burst_size) if positive_value_exists(burst_size) \
+            else max(1.0, self.requests_per_second)
+        self.tokens = self.burst_size
+        self.date_last_refilled = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self):
+        if not self.requests_per_second > 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst_size,
+                                  self.tokens + (now - self.date_last_refilled) * self.requests_per_second)
+                self.date_last_refilled = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                seconds_to_wait = (1 - self.tokens) / self.requests_per_second
+            time.sleep(seconds_to_wait)
+
+
+class HostRequestLimiter(object):
+    """
+    Politeness for crawlers that threads can share: wait(url) sleeps until at least seconds_between_requests have passed
+    since the last request to the same host. Requests to different hosts don't wait for each other.
+    """
+    def __init__(self, seconds_between_requests):
+        self.seconds_between_requests = float(seconds_between_requests)
+        self.date_next_request_by_host = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.seconds_between_requests > 0:
+            return
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            now = time.monotonic()
+            date_of_request = max(now, self.date_next_request_by_host.get(host, now))
+            self.date_next_request_by_host[host] = date_of_request + self.seconds_between_requests
+        if date_of_request > now:
+            time.sleep(date_of_request - now)
+
+
+class LruCache(object):
+    """
+    A dict that threads can share, which holds at most maximum_size entries. Once it is full, setting a new key drops
+    the key that was used least recently.
+    """
+    def __init__(self, maximum_size):
+        self.maximum_size = maximum_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maximum_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class BufferedCounter(object):
+    """
+    Counts that threads can share, kept in memory until they add up to flush_size, or the oldest is flush_seconds old.
+    Then flush() passes them to save_counts (a dict of key: count), and takes them out of memory. If save_counts
+    raises, the counts are put back, and saved with the next flush. Whatever is left is saved when the process exits
+    (see flush_buffered_counters).
+    """
+    def __init__(self, save_counts, flush_size, flush_seconds):
+        self.save_counts = save_counts
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.counts = {}
+        # When the oldest count in self.counts was added (from time.monotonic)
+        self.date_oldest_count = 0.0
+        self.lock = threading.Lock()
+        buffered_counters.add(self)
+
+    def increase(self, key, count=1):
+        with self.lock:
+            self.add_counts({key: count})
+            flush_needed = sum(self.counts.values()) >= self.flush_size or \
+                time.monotonic() - self.date_oldest_count >= self.flush_seconds
+
+        if flush_needed:
+            return self.flush()
+
+        results = {
+            'success':                  True,
+            'status':                   'ENTRY_BUFFERED',
+        }
+        return results
+
+    def flush(self):
+        with self.lock:
+            counts_to_save = self.counts
+            self.counts = {}
+        if not counts_to_save:
+            results = {
+                'success':                  True,
+                'status':                   'NO_ENTRIES_TO_SAVE',
+            }
+            return results
+
+        try:
+            self.save_counts(counts_to_save)
+            success = True
+            status = 'ENTRIES_SAVED'
+        except Exception as e:
+            with self.lock:
+                self.add_counts(counts_to_save)
+            success = False
+            status = 'ENTRIES_NOT_SAVED'
+            logger.error('BufferedCounter {save_counts}: {error}'.format(
+                save_counts=getattr(self.save_counts, '__name__', self.save_counts), error=e))
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+        }
+        return results
+
+    def flush_old_counts(self):
+        """
+        Flush if the oldest count is flush_seconds old. For loops that might stop counting for a while.
+        """
+        with self.lock:
+            flush_needed = self.counts and time.monotonic() - self.date_oldest_count >= self.flush_seconds
+        if flush_needed:
+            return self.flush()
+        results = {
+            'success':                  True,
+            'status':                   'ENTRIES_NOT_OLD_ENOUGH_TO_SAVE',
+        }
+        return results
+
+    def add_counts(self, counts):
+        # Only call this while holding self.lock
+        if not self.counts:
+            self.date_oldest_count = time.monotonic()
+        for key, count in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def clear(self):
+        with self.lock:
+            self.counts = {}
+
+
+# Every BufferedCounter in this process
+buffered_counters = weakref.WeakSet()
+
+
+def flush_buffered_counters():
+    """
+    Save the counts every BufferedCounter in this process is holding. We call this at exit, and it is also called when
+    a gunicorn worker stops (see config/gunicorn.py), or a management command gets SIGTERM, since those skip atexit.
+    """
+    for buffered_counter in list(buffered_counters):
+        buffered_counter.flush()
+
+
+atexit.register(flush_buffered_counters)
+
+
 # This is how we make sure a variable is a string
 def convert_to_str(value):
     try:
@@ -0,0 +1,157 @@
+# wevote_functions/http_client.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# All of our requests to other servers (Google Civic, Vote Smart, Facebook, the We Vote master servers, and the
+#  websites we scrape) go through http_get, so they share one pool of keep-alive connections, have timeouts, are tried
+#  again when the other server has a hiccup, and are counted in http_client_statistics.
+
+from django.conf import settings
+import random
+import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# The integration names we count requests under
+INTEGRATION_FACEBOOK = 'facebook'
+INTEGRATION_GOOGLE_CIVIC = 'google_civic'
+INTEGRATION_SOCIAL_MEDIA_SCRAPE = 'social_media_scrape'
+INTEGRATION_VOTE_SMART = 'vote_smart'
+INTEGRATION_WE_VOTE_MASTER_SERVER = 'we_vote_master_server'
+
+HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS = getattr(settings, 'HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS', 5)
+HTTP_CLIENT_READ_TIMEOUT_SECONDS = getattr(settings, 'HTTP_CLIENT_READ_TIMEOUT_SECONDS', 60)
+HTTP_CLIENT_MAXIMUM_RETRIES = getattr(settings, 'HTTP_CLIENT_MAXIMUM_RETRIES', 3)
+HTTP_CLIENT_RETRY_BACKOFF_SECONDS = getattr(settings, 'HTTP_CLIENT_RETRY_BACKOFF_SECONDS', 0.5)
+HTTP_CLIENT_MAXIMUM_BACKOFF_SECONDS = 30
+# How many hosts we keep connections open to, and how many connections we keep open to each host
+HTTP_CLIENT_POOL_HOSTS = getattr(settings, 'HTTP_CLIENT_POOL_HOSTS', 20)
+HTTP_CLIENT_POOL_CONNECTIONS_PER_HOST = getattr(settings, 'HTTP_CLIENT_POOL_CONNECTIONS_PER_HOST', 10)
+# We only ask again for requests that don't change anything, and only when the answer might be different next time
+HTTP_CLIENT_RETRY_METHODS = ('GET', 'HEAD')
+HTTP_CLIENT_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Created the first time it is needed, so each worker process (after a fork) opens its own connections
+http_client_session = {}
+http_client_session_lock = threading.Lock()
+
+# Key: integration, Value: dict with request_count, error_count, retry_count, total_seconds and maximum_seconds
+http_client_statistics = {}
+http_client_statistics_lock = threading.Lock()
+
+
+def fetch_http_client_session():
+    with http_client_session_lock:
+        if 'session' not in http_client_session:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_CLIENT_POOL_HOSTS,
+                                  pool_maxsize=HTTP_CLIENT_POOL_CONNECTIONS_PER_HOST)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            http_client_session['session'] = session
+        return http_client_session['session']
+
+
+def http_get(integration, url, **kwargs):
+    return http_request(integration, 'GET', url, **kwargs)
+
+
+def http_request(integration, method, url, timeout=None, maximum_retries=None, **kwargs):
+    """
+    Make a request with the shared session. Connection errors, timeouts and the status codes in
+    HTTP_CLIENT_RETRY_STATUS_CODES are tried again up to maximum_retries times, waiting a random time that doubles with
+    each try (or the time the server asks for in Retry-After).
+    :param integration: ex/ INTEGRATION_GOOGLE_CIVIC, for http_client_statistics
+    :param timeout: Seconds, or (connect seconds, read seconds). If not passed in, we use
+    HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS and HTTP_CLIENT_READ_TIMEOUT_SECONDS
+    :param maximum_retries: If not passed in, we use HTTP_CLIENT_MAXIMUM_RETRIES
+    :param kwargs: Passed on to requests, ex/ params, headers, stream
+    :return: The requests.Response. If the last try raised an exception, we raise it.
+    """
+    if timeout is None:
+        timeout = (HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS, HTTP_CLIENT_READ_TIMEOUT_SECONDS)
+    if maximum_retries is None:
+        maximum_retries = HTTP_CLIENT_MAXIMUM_RETRIES
+    if method.upper() not in HTTP_CLIENT_RETRY_METHODS:
+        maximum_retries = 0
+    session = fetch_http_client_session()
+
+    retry_count = 0
+    while True:
+        # With stream=True, this is the time until the headers arrive
+        start_time = time.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record_http_client_request(integration, time.monotonic() - start_time, True)
+            if retry_count >= maximum_retries:
+                raise
+            seconds_to_wait = fetch_seconds_before_retry(retry_count)
+            error_message = e
+        else:
+            retry_needed = response.status_code in HTTP_CLIENT_RETRY_STATUS_CODES
+            record_http_client_request(integration, time.monotonic() - start_time, retry_needed)
+            if not retry_needed or retry_count >= maximum_retries:
+                return response
+            seconds_to_wait = fetch_seconds_before_retry(retry_count, response.headers.get('Retry-After'))
+            error_message = 'status {status_code}'.format(status_code=response.status_code)
+            response.close()
+
+        logger.info('HTTP_CLIENT_RETRY {integration} {url} in {seconds:.1f} seconds: {error}'.format(
+            integration=integration, url=url, seconds=seconds_to_wait, error=error_message))
+        with http_client_statistics_lock:
+            http_client_statistics[integration]['retry_count'] += 1
+        time.sleep(seconds_to_wait)
+        retry_count += 1
+
+
+def fetch_seconds_before_retry(retry_count, retry_after=None):
+    """
+    A random wait between 0 and HTTP_CLIENT_RETRY_BACKOFF_SECONDS * 2^retry_count, so many workers that failed at the
+    same moment don't all try again at the same moment. We wait at least as long as the server's Retry-After seconds.
+    """
+    seconds_to_wait = random.uniform(0, min(HTTP_CLIENT_RETRY_BACKOFF_SECONDS * 2 ** retry_count,
+                                            HTTP_CLIENT_MAXIMUM_BACKOFF_SECONDS))
+    try:
+        seconds_to_wait = max(seconds_to_wait, min(float(retry_after), HTTP_CLIENT_MAXIMUM_BACKOFF_SECONDS))
+    except (TypeError, ValueError):
+        # No Retry-After, or a date instead of seconds
+        pass
+    return seconds_to_wait
+
+
+def record_http_client_request(integration, seconds, error):
+    with http_client_statistics_lock:
+        integration_statistics = http_client_statistics.setdefault(integration, {
+            'request_count':    0,
+            'error_count':      0,
+            'retry_count':      0,
+            'total_seconds':    0.0,
+            'maximum_seconds':  0.0,
+        })
+        integration_statistics['request_count'] += 1
+        if error:
+            integration_statistics['error_count'] += 1
+        integration_statistics['total_seconds'] += seconds
+        integration_statistics['maximum_seconds'] = max(integration_statistics['maximum_seconds'], seconds)
+
+
+def retrieve_http_client_statistics():
+    """
+    The requests this process has made to each integration since it started
+    :return: A list of dicts, one for each integration, sorted by integration
+    """
+    statistics_list = []
+    with http_client_statistics_lock:
+        for integration, integration_statistics in sorted(http_client_statistics.items()):
+            one_integration = dict(integration_statistics)
+            one_integration['integration'] = integration
+            one_integration['average_milliseconds'] = \
+                int(1000 * integration_statistics['total_seconds'] / integration_statistics['request_count'])
+            one_integration['maximum_milliseconds'] = int(1000 * integration_statistics['maximum_seconds'])
+            statistics_list.append(one_integration)
+    return statistics_list
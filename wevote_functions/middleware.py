@@ -0,0 +1,47 @@
+# wevote_functions/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""
+Middleware that steps aside for the stateless API URLs. The JSON APIs identify the voter with voter_device_id, so
+loading the Django session and user (and the Facebook account behind them) is wasted work on those requests.
+"""
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+import re
+
+# Requests whose path matches this regular expression don't get request.session, request.user or request.facebook.
+#  Leave it empty to run the session, auth and social middleware on every request.
+STATELESS_API_URL_PATTERN = getattr(settings, 'STATELESS_API_URL_PATTERN', '')
+stateless_api_url_regex = re.compile(STATELESS_API_URL_PATTERN) if STATELESS_API_URL_PATTERN else None
+
+
+def is_stateless_api_request(request):
+    return stateless_api_url_regex is not None and stateless_api_url_regex.match(request.path_info) is not None
+
+
+class StatelessApiSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware, except that the stateless API requests don't read or write the session
+    """
+    def process_request(self, request):
+        if is_stateless_api_request(request):
+            return None
+        return super(StatelessApiSessionMiddleware, self).process_request(request)
+
+    def process_response(self, request, response):
+        if is_stateless_api_request(request):
+            return response
+        return super(StatelessApiSessionMiddleware, self).process_response(request, response)
+
+
+class StatelessApiAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware, except that the stateless API requests don't get request.user
+    """
+    def process_request(self, request):
+        if is_stateless_api_request(request):
+            return None
+        return super(StatelessApiAuthenticationMiddleware, self).process_request(request)
@@ -0,0 +1,242 @@
+# wevote_functions/sync_out.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# The *SyncOut endpoints send a JSON array of rows to the servers that import from the We Vote master server. Besides
+#  their own filters, they accept:
+#   since=<ISO 8601 date>: Only the rows changed at or after this time. The X-Sync-Next-Since response header has the
+#     time the master server started the response, less SYNC_OUT_SINCE_OVERLAP_SECONDS, which the importing server
+#     passes as "since" the next time. The overlap means a row saved by a transaction that committed after the
+#     response started is sent again, instead of never.
+#   after_id=<id>&page_size=<number of rows>: One page of rows, in id order. When there are more rows, the Link header
+#     has the URL of the next page (rel="next").
+# The rows are written out as they are read from the database, gzipped when the client accepts it. Each response has
+#  an ETag, so a client that sends it back in If-None-Match gets "304 Not Modified" when nothing has changed.
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from django.utils.text import compress_sequence
+import datetime
+import hashlib
+import json
+from rest_framework.utils.encoders import JSONEncoder
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, generate_chunks, iterate_json_array_from_chunks, \
+    positive_value_exists
+from wevote_functions.http_client import http_get, INTEGRATION_WE_VOTE_MASTER_SERVER
+from wevote_settings.models import WeVoteSettingsManager
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# The *SyncOut endpoints read this many rows from the database at a time
+SYNC_OUT_ROWS_PER_QUERY = getattr(settings, 'SYNC_OUT_ROWS_PER_QUERY', 1000)
+# When importing from the master server, ask only for the rows changed since the last complete import
+MASTER_SERVER_SYNC_DELTA = getattr(settings, 'MASTER_SERVER_SYNC_DELTA', True)
+# How far before the start of the response X-Sync-Next-Since is. Rows changed in the overlap are sent twice, which the
+#  importing server's duplicate checks handle.
+SYNC_OUT_SINCE_OVERLAP_SECONDS = getattr(settings, 'SYNC_OUT_SINCE_OVERLAP_SECONDS', 300)
+MASTER_SERVER_SYNC_STREAM_BYTES = 65536  # How much of the master server response we read at a time
+MASTER_SERVER_SYNC_IMPORT_CHUNK_SIZE = 500  # How many rows we check for local duplicates and import at a time
+# The X-Sync-Next-Since of the last complete import of each sync_name is kept in WeVoteSetting under this prefix
+SYNC_NEXT_SINCE_SETTING_PREFIX = 'sync_next_since_'
+
+
+def sync_out_response(request, queryset, serializer_class, date_last_changed_field_name=None):
+    """
+    Answer a *SyncOut request with the rows of queryset (see the top of this file)
+    :param queryset: The rows to send, before the since, after_id and page_size filters
+    :param serializer_class: ex/ CandidateCampaignSerializer
+    :param date_last_changed_field_name: The auto_now field "since" is compared with. If None, "since" is ignored.
+    :return: A StreamingHttpResponse, or an HttpResponse for "304 Not Modified" or an error
+    """
+    # date_last_changed is set when a row is saved, not when its transaction commits, so we go back a little
+    sync_next_since = timezone.now() - datetime.timedelta(seconds=SYNC_OUT_SINCE_OVERLAP_SECONDS)
+    queryset = queryset.order_by()
+
+    since_text = request.GET.get('since', '')
+    if positive_value_exists(since_text) and date_last_changed_field_name:
+        since = parse_sync_out_since(since_text)
+        if since is None:
+            json_data = {
+                'status':   'SYNC_OUT_SINCE_NOT_VALID',
+                'success':  False,
+                'since':    since_text,
+            }
+            return HttpResponse(json.dumps(json_data), content_type='application/json', status=400)
+        queryset = queryset.filter(**{date_last_changed_field_name + '__gte': since})
+    after_id = convert_to_int(request.GET.get('after_id', 0))
+    if positive_value_exists(after_id):
+        queryset = queryset.filter(id__gt=after_id)
+
+    # The ETag changes whenever a row is added, deleted or (through its date_last_changed) changed
+    summary_aggregates = {'row_count': Count('id'), 'maximum_id': Max('id')}
+    if date_last_changed_field_name:
+        summary_aggregates['date_last_changed'] = Max(date_last_changed_field_name)
+    summary = queryset.aggregate(**summary_aggregates)
+    etag = hashlib.md5(repr((
+        serializer_class.__name__, serializer_class.Meta.fields, sorted(summary.items()),
+        request.GET.get('page_size', ''))).encode('utf-8')).hexdigest()
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = quote_etag(etag)
+        return response
+
+    next_page_url = ''
+    page_size = convert_to_int(request.GET.get('page_size', 0))
+    if positive_value_exists(page_size):
+        last_id_in_page_list = list(queryset.order_by('id').values_list('id', flat=True)[page_size - 1:page_size])
+        if len(last_id_in_page_list) and last_id_in_page_list[0] < summary['maximum_id']:
+            queryset = queryset.filter(id__lte=last_id_in_page_list[0])
+            next_page_parameters = request.GET.copy()
+            next_page_parameters['after_id'] = last_id_in_page_list[0]
+            next_page_url = request.build_absolute_uri(request.path) + '?' + next_page_parameters.urlencode()
+
+    content = (text.encode('utf-8') for text in generate_sync_out_json(queryset, serializer_class))
+    gzip_response = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if gzip_response:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type='application/json')
+    if gzip_response:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['ETag'] = quote_etag(etag)
+    if date_last_changed_field_name:
+        response['X-Sync-Next-Since'] = sync_next_since.isoformat()
+    if next_page_url:
+        response['Link'] = '<{url}>; rel="next"'.format(url=next_page_url)
+    return response
+
+
+def generate_sync_out_json(queryset, serializer_class):
+    """
+    Yield the text of a JSON array of the serialized rows, reading SYNC_OUT_ROWS_PER_QUERY rows at a time in id order
+    """
+    yield '['
+    last_id = 0
+    first_rows = True
+    while True:
+        row_list = list(queryset.filter(id__gt=last_id).order_by('id')[:SYNC_OUT_ROWS_PER_QUERY])
+        if not len(row_list):
+            break
+        # We serialize each chunk as a list, and leave off the brackets
+        rows_text = json.dumps(serializer_class(row_list, many=True).data, cls=JSONEncoder)[1:-1]
+        yield rows_text if first_rows else ',' + rows_text
+        first_rows = False
+        last_id = row_list[-1].id
+        if len(row_list) < SYNC_OUT_ROWS_PER_QUERY:
+            break
+    yield ']'
+
+
+def parse_sync_out_since(since_text):
+    """
+    :return: A timezone aware datetime, or None if since_text isn't an ISO 8601 date and time
+    """
+    try:
+        since = parse_datetime(since_text.strip())
+    except ValueError:
+        since = None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since, timezone.utc)
+    return since
+
+
+def retrieve_rows_from_master_server(sync_url, parameters, sync_name, delta=None):
+    """
+    Ask a *SyncOut endpoint on the master server for its rows, and return them as they arrive
+    :param sync_url: ex/ CANDIDATES_SYNC_URL
+    :param parameters: ex/ {"key": WE_VOTE_API_KEY, "format": 'json', "google_civic_election_id": 4184}
+    :param sync_name: Where we keep the X-Sync-Next-Since of the last complete import, ex/ 'candidates_4184'
+    :param delta: If True, only ask for the rows changed since the last complete import. If None, we use
+    MASTER_SERVER_SYNC_DELTA.
+    :return: results dict. structured_json is an iterator of the rows, which raises ValueError if the response isn't
+    a JSON array. Once they are all imported, pass sync_next_since to save_master_server_sync_next_since.
+    """
+    if delta is None:
+        delta = MASTER_SERVER_SYNC_DELTA
+    parameters = dict(parameters)
+    if delta:
+        since = WeVoteSettingsManager().fetch_setting(SYNC_NEXT_SINCE_SETTING_PREFIX + sync_name)
+        if positive_value_exists(since):
+            parameters['since'] = since
+
+    response = http_get(INTEGRATION_WE_VOTE_MASTER_SERVER, sync_url, params=parameters, stream=True)
+    if response.status_code != 200:
+        response.close()
+        results = {
+            'success':          False,
+            'status':           'MASTER_SERVER_SYNC_FAILED_WITH_STATUS_{status_code}'.format(
+                status_code=response.status_code),
+            'structured_json':  [],
+            'sync_next_since':  '',
+        }
+        return results
+
+    results = {
+        'success':          True,
+        'status':           'MASTER_SERVER_SYNC_STARTED' + (' SINCE ' + parameters['since']
+                                                            if 'since' in parameters else ''),
+        'structured_json':  iterate_json_array_from_chunks(
+            response.iter_content(chunk_size=MASTER_SERVER_SYNC_STREAM_BYTES)),
+        'sync_next_since':  response.headers.get('X-Sync-Next-Since', ''),
+    }
+    return results
+
+
+def save_master_server_sync_next_since(sync_name, sync_next_since):
+    if positive_value_exists(sync_next_since):
+        WeVoteSettingsManager().save_setting(SYNC_NEXT_SINCE_SETTING_PREFIX + sync_name, sync_next_since)
+
+
+def import_rows_from_master_server(sync_url, parameters, sync_name, filter_function, import_function, delta=None):
+    """
+    Import the rows of a *SyncOut endpoint MASTER_SERVER_SYNC_IMPORT_CHUNK_SIZE at a time, so we never hold all of
+    them in memory. Once they are all imported, we save X-Sync-Next-Since for the next delta import. If some rows were
+    not processed (ex/ a position whose organization we don't have yet), we keep the old X-Sync-Next-Since, so the next
+    import tries them again.
+    :param filter_function: ex/ filter_candidates_structured_json_for_local_duplicates, or None
+    :param import_function: ex/ candidates_import_from_structured_json
+    :return: results dict with saved, updated, not_processed and duplicates_removed
+    """
+    import_results = {
+        'success':              False,
+        'status':               '',
+        'saved':                0,
+        'updated':              0,
+        'not_processed':        0,
+        'duplicates_removed':   0,
+    }
+    retrieve_results = retrieve_rows_from_master_server(sync_url, parameters, sync_name, delta)
+    if not retrieve_results['success']:
+        import_results['status'] = retrieve_results['status']
+        return import_results
+
+    status = 'MASTER_SERVER_SYNC_NO_ROWS'
+    try:
+        for row_chunk in generate_chunks(retrieve_results['structured_json'], MASTER_SERVER_SYNC_IMPORT_CHUNK_SIZE):
+            if filter_function is not None:
+                filter_results = filter_function(row_chunk)
+                import_results['duplicates_removed'] += filter_results['duplicates_removed']
+                row_chunk = filter_results['structured_json']
+            chunk_results = import_function(row_chunk)
+            import_results['saved'] += chunk_results['saved']
+            import_results['updated'] += chunk_results['updated']
+            import_results['not_processed'] += chunk_results['not_processed']
+            status = chunk_results['status']
+    except ValueError as e:
+        logger.error("Could not parse the response from {sync_url}: {error}".format(sync_url=sync_url, error=e))
+        import_results['status'] = 'MASTER_SERVER_SYNC_COULD_NOT_PARSE_RESPONSE'
+        return import_results
+
+    if import_results['not_processed']:
+        status += ' MASTER_SERVER_SYNC_NEXT_SINCE_NOT_SAVED'
+    else:
+        save_master_server_sync_next_since(sync_name, retrieve_results['sync_next_since'])
+    import_results['success'] = True
+    import_results['status'] = retrieve_results['status'] + ' ' + status
+    return import_results
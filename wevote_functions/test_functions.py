@@ -0,0 +1,52 @@
+# wevote_functions/test_functions.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import SimpleTestCase
+from .functions import BufferedCounter, flush_buffered_counters
+
+
+class BufferedCounterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.counts_saved = []
+        self.save_fails = False
+
+    def save_counts(self, counts):
+        if self.save_fails:
+            raise RuntimeError('Database unavailable')
+        self.counts_saved.append(counts)
+
+    def test_counts_are_saved_together(self):
+        buffered_counter = BufferedCounter(self.save_counts, flush_size=3, flush_seconds=60)
+        self.assertEqual(buffered_counter.increase('a')['status'], 'ENTRY_BUFFERED')
+        self.assertEqual(buffered_counter.increase('b')['status'], 'ENTRY_BUFFERED')
+        self.assertEqual(buffered_counter.increase('a')['status'], 'ENTRIES_SAVED')
+        self.assertEqual(self.counts_saved, [{'a': 2, 'b': 1}])
+        self.assertEqual(buffered_counter.flush()['status'], 'NO_ENTRIES_TO_SAVE')
+
+    def test_counts_are_kept_when_the_save_fails(self):
+        buffered_counter = BufferedCounter(self.save_counts, flush_size=2, flush_seconds=60)
+        self.save_fails = True
+        buffered_counter.increase('a')
+        self.assertEqual(buffered_counter.increase('a')['status'], 'ENTRIES_NOT_SAVED')
+        self.save_fails = False
+        buffered_counter.increase('b')
+        self.assertEqual(self.counts_saved, [{'a': 2, 'b': 1}])
+
+    def test_old_counts_are_saved(self):
+        buffered_counter = BufferedCounter(self.save_counts, flush_size=100, flush_seconds=0)
+        self.assertEqual(buffered_counter.increase('a')['status'], 'ENTRIES_SAVED')
+        self.assertEqual(self.counts_saved, [{'a': 1}])
+
+    def test_flush_old_counts_and_flush_every_counter(self):
+        buffered_counter = BufferedCounter(self.save_counts, flush_size=100, flush_seconds=60)
+        buffered_counter.increase('a')
+        self.assertEqual(buffered_counter.flush_old_counts()['status'], 'ENTRIES_NOT_OLD_ENOUGH_TO_SAVE')
+        buffered_counter.flush_seconds = 0
+        self.assertEqual(buffered_counter.flush_old_counts()['status'], 'ENTRIES_SAVED')
+
+        buffered_counter.flush_seconds = 60
+        buffered_counter.increase('b')
+        flush_buffered_counters()
+        self.assertEqual(self.counts_saved, [{'a': 1}, {'b': 1}])
@@ -0,0 +1,96 @@
+# wevote_functions/test_http_client.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import SimpleTestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import socket
+import threading
+from unittest import mock
+from .http_client import http_client_statistics, http_get, http_request, retrieve_http_client_statistics
+
+
+class FlakyServerStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers "503 Service Unavailable" to the first failures_remaining requests, and "200 OK" after that
+    """
+    failures_remaining = 0
+    requests_received = 0
+    lock = threading.Lock()
+
+    def answer(self):
+        with self.lock:
+            FlakyServerStubHandler.requests_received += 1
+            failure = FlakyServerStubHandler.failures_remaining > 0
+            if failure:
+                FlakyServerStubHandler.failures_remaining -= 1
+        body = b'Try again' if failure else b'{"status": "OK"}'
+        self.send_response(503 if failure else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.answer()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        FlakyServerStubHandler.failures_remaining = 0
+        FlakyServerStubHandler.requests_received = 0
+        http_client_statistics.clear()
+        self.stub_server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyServerStubHandler)
+        threading.Thread(target=self.stub_server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{port}/'.format(port=self.stub_server.server_address[1])
+        backoff_patch = mock.patch('wevote_functions.http_client.HTTP_CLIENT_RETRY_BACKOFF_SECONDS', 0.01)
+        backoff_patch.start()
+        self.addCleanup(backoff_patch.stop)
+
+    def tearDown(self):
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+
+    def test_server_errors_are_tried_again(self):
+        FlakyServerStubHandler.failures_remaining = 2
+        response = http_get('test_integration', self.url, maximum_retries=3)
+        self.assertEqual(response.json(), {'status': 'OK'})
+        self.assertEqual(FlakyServerStubHandler.requests_received, 3)
+
+        FlakyServerStubHandler.failures_remaining = 5
+        response = http_get('test_integration', self.url, maximum_retries=1)
+        self.assertEqual(response.status_code, 503)
+
+        statistics_list = retrieve_http_client_statistics()
+        self.assertEqual(len(statistics_list), 1)
+        self.assertEqual(statistics_list[0]['integration'], 'test_integration')
+        self.assertEqual(statistics_list[0]['request_count'], 5)
+        self.assertEqual(statistics_list[0]['error_count'], 4)
+        self.assertEqual(statistics_list[0]['retry_count'], 3)
+
+    def test_post_is_not_tried_again(self):
+        FlakyServerStubHandler.failures_remaining = 1
+        response = http_request('test_integration', 'POST', self.url, data={'name': 'value'}, maximum_retries=3)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(FlakyServerStubHandler.requests_received, 1)
+
+    def test_connection_errors_are_raised_after_retries(self):
+        # Find a port nothing is listening on
+        unused_socket = socket.socket()
+        unused_socket.bind(('127.0.0.1', 0))
+        unused_url = 'http://127.0.0.1:{port}/'.format(port=unused_socket.getsockname()[1])
+        unused_socket.close()
+
+        with self.assertRaises(requests.ConnectionError):
+            http_get('test_integration', unused_url, maximum_retries=2)
+        statistics_list = retrieve_http_client_statistics()
+        self.assertEqual(statistics_list[0]['error_count'], 3)
+        self.assertEqual(statistics_list[0]['retry_count'], 2)
@@ -3,7 +3,10 @@
 # -*- coding: UTF-8 -*-
 
 from django.test import TestCase
-from .functions import positive_value_exists
+from .functions import generate_chunks, iterate_json_array_from_chunks, LruCache, positive_value_exists, \
+    TokenBucket
+import json
+import time
 
 
 class WeVoteFunctionsTestsModels(TestCase):
@@ -74,3 +77,51 @@ class WeVoteFunctionsTestsModels(TestCase):
         value_to_test = []
         self.assertEqual(positive_value_exists(value_to_test), False,
                          "Testing value: {value_to_test}, False expected".format(value_to_test=value_to_test))
+
+    def test_iterate_json_array_from_chunks(self):
+        """
+        The items should come out the same no matter where the chunk boundaries fall
+        :return:
+        """
+        structured_json = [{'we_vote_id': 'wv01pos{number}'.format(number=number), 'statement_text': 'Oui \u2713'}
+                           for number in range(100)] + [12345, 1.5, 'text', None, [1, 2]]
+        json_bytes = json.dumps(structured_json, ensure_ascii=False).encode('utf-8')
+        for chunk_size in (1, 7, 1000, len(json_bytes)):
+            chunks = (json_bytes[start:start + chunk_size] for start in range(0, len(json_bytes), chunk_size))
+            self.assertEqual(list(iterate_json_array_from_chunks(chunks)), structured_json,
+                             "Testing chunk_size: {chunk_size}".format(chunk_size=chunk_size))
+
+        with self.assertRaises(ValueError):
+            list(iterate_json_array_from_chunks([b'{"status": "NOT_A_LIST"}']))
+        with self.assertRaises(ValueError):
+            list(iterate_json_array_from_chunks([b'[{"we_vote_id": "wv01pos1"}, ']))
+
+    def test_generate_chunks(self):
+        self.assertEqual([len(one_chunk) for one_chunk in generate_chunks(range(1200), 500)], [500, 500, 200])
+        self.assertEqual(list(generate_chunks([], 500)), [])
+
+    def test_token_bucket(self):
+        # The first call uses the burst, and each of the next 5 waits a twentieth of a second
+        token_bucket = TokenBucket(20, burst_size=1)
+        start_time = time.monotonic()
+        for call_number in range(6):
+            token_bucket.consume()
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.2)
+        # With no limit, consume never waits
+        token_bucket = TokenBucket(0)
+        start_time = time.monotonic()
+        for call_number in range(1000):
+            token_bucket.consume()
+        self.assertLess(time.monotonic() - start_time, 0.2)
+
+    def test_lru_cache(self):
+        lru_cache = LruCache(2)
+        lru_cache.set('69.181.21', 'Oakland')
+        lru_cache.set('73.15.2', 'Berkeley')
+        self.assertEqual(lru_cache.get('69.181.21'), 'Oakland')
+        # Berkeley is now the least recently used, so it is the one dropped
+        lru_cache.set('24.5.60', 'Alameda')
+        self.assertEqual(len(lru_cache), 2)
+        self.assertNotIn('73.15.2', lru_cache)
+        self.assertIsNone(lru_cache.get('73.15.2'))
+        self.assertEqual(lru_cache.get('24.5.60'), 'Alameda')
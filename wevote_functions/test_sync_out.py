@@ -0,0 +1,106 @@
+# wevote_functions/test_sync_out.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from .sync_out import import_rows_from_master_server
+
+
+class MasterServerStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers like a *SyncOut endpoint with rows_to_send, and remembers the query parameters of each request
+    """
+    rows_to_send = []
+    parameters_received = []
+
+    def do_GET(self):
+        MasterServerStubHandler.parameters_received.append(parse_qs(urlparse(self.path).query))
+        body = json.dumps(MasterServerStubHandler.rows_to_send).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Sync-Next-Since', '2016-10-18T14:30:00+00:00')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ImportRowsFromMasterServerTestCase(TestCase):
+
+    def setUp(self):
+        MasterServerStubHandler.rows_to_send = [{'we_vote_id': 'wv01cand{}'.format(number)} for number in range(7)]
+        MasterServerStubHandler.parameters_received = []
+        self.stub_server = ThreadingHTTPServer(('127.0.0.1', 0), MasterServerStubHandler)
+        threading.Thread(target=self.stub_server.serve_forever, daemon=True).start()
+        self.sync_url = 'http://127.0.0.1:{port}/'.format(port=self.stub_server.server_address[1])
+        chunk_size_patch = mock.patch('wevote_functions.sync_out.MASTER_SERVER_SYNC_IMPORT_CHUNK_SIZE', 3)
+        chunk_size_patch.start()
+        self.addCleanup(chunk_size_patch.stop)
+        self.chunks_imported = []
+
+    def tearDown(self):
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+
+    def import_chunk(self, structured_json):
+        self.chunks_imported.append([one_row['we_vote_id'] for one_row in structured_json])
+        return {'success': True, 'status': 'IMPORTED', 'saved': len(structured_json), 'updated': 0,
+                'not_processed': 0}
+
+    def filter_chunk(self, structured_json):
+        filtered_structured_json = [one_row for one_row in structured_json if one_row['we_vote_id'] != 'wv01cand4']
+        return {'structured_json': filtered_structured_json,
+                'duplicates_removed': len(structured_json) - len(filtered_structured_json)}
+
+    def test_rows_are_imported_in_chunks_and_since_is_saved(self):
+        results = import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'candidates_4184',
+                                                 self.filter_chunk, self.import_chunk)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['saved'], 6)
+        self.assertEqual(results['duplicates_removed'], 1)
+        self.assertEqual(self.chunks_imported, [['wv01cand0', 'wv01cand1', 'wv01cand2'],
+                                                ['wv01cand3', 'wv01cand5'], ['wv01cand6']])
+        self.assertNotIn('since', MasterServerStubHandler.parameters_received[0])
+
+        # The next import only asks for what changed, unless we ask for everything
+        import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'candidates_4184', None, self.import_chunk)
+        self.assertEqual(MasterServerStubHandler.parameters_received[1]['since'], ['2016-10-18T14:30:00+00:00'])
+        import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'candidates_4184', None, self.import_chunk,
+                                       delta=False)
+        self.assertNotIn('since', MasterServerStubHandler.parameters_received[2])
+
+    def test_since_is_not_saved_when_the_response_cannot_be_parsed(self):
+        MasterServerStubHandler.rows_to_send = {'status': 'NOT_A_LIST'}
+        results = import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'candidates_4184', None,
+                                                 self.import_chunk)
+        self.assertFalse(results['success'])
+        self.assertEqual(results['status'], 'MASTER_SERVER_SYNC_COULD_NOT_PARSE_RESPONSE')
+
+        MasterServerStubHandler.rows_to_send = []
+        import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'candidates_4184', None, self.import_chunk)
+        self.assertNotIn('since', MasterServerStubHandler.parameters_received[1])
+
+    def test_since_is_not_saved_when_rows_are_not_processed(self):
+        def import_chunk_with_rows_not_processed(structured_json):
+            # ex/ positions whose organization isn't on this server yet
+            return {'success': True, 'status': 'IMPORTED', 'saved': len(structured_json) - 1, 'updated': 0,
+                    'not_processed': 1}
+
+        results = import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'positions_4184', None,
+                                                 import_chunk_with_rows_not_processed)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['not_processed'], 3)
+        self.assertIn('MASTER_SERVER_SYNC_NEXT_SINCE_NOT_SAVED', results['status'])
+
+        # So the next import asks for every row again
+        import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'positions_4184', None, self.import_chunk)
+        self.assertNotIn('since', MasterServerStubHandler.parameters_received[1])
+        import_rows_from_master_server(self.sync_url, {'format': 'json'}, 'positions_4184', None, self.import_chunk)
+        self.assertEqual(MasterServerStubHandler.parameters_received[2]['since'], ['2016-10-18T14:30:00+00:00'])
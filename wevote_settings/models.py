@@ -2,16 +2,26 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from exception.models import handle_record_found_more_than_one_exception,\
     handle_record_not_saved_exception
 import string
+import threading
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, generate_random_string
 
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# How many we_vote_id integers each process reserves at a time (see fetch_next_we_vote_id_integer)
+WE_VOTE_ID_BLOCK_SIZE = getattr(settings, 'WE_VOTE_ID_BLOCK_SIZE', 100)
+
+# The integers this process has reserved and not handed out yet.
+# Key: setting_name, Value: [next integer to hand out, last integer reserved]
+we_vote_id_integer_pool = {}
+we_vote_id_integer_pool_lock = threading.Lock()
+
 
 class WeVoteSetting(models.Model):
     """
@@ -122,6 +132,44 @@ class WeVoteSettingsManager(models.Model):
         }
         return results
 
+    def reserve_integer_block(self, setting_name, block_size):
+        """
+        Add block_size to an integer setting and return the integers we reserved. The setting is locked
+        (SELECT ... FOR UPDATE) while we do this, so two workers never reserve the same integers.
+        :param setting_name:
+        :param block_size:
+        :return:
+        """
+        # The setting needs to exist before we can lock it. If two workers create it at the same moment, they both
+        # lock the one with the lowest id below, so they still get different integers.
+        if not WeVoteSetting.objects.filter(name=setting_name).exists():
+            try:
+                # A savepoint, so if another worker creates the setting first we can still lock theirs
+                with transaction.atomic():
+                    WeVoteSetting.objects.create(name=setting_name, value_type=WeVoteSetting.INTEGER,
+                                                 integer_value=0, boolean_value=False)
+            except IntegrityError:
+                pass
+
+        with transaction.atomic():
+            we_vote_setting = WeVoteSetting.objects.select_for_update().filter(name=setting_name).order_by('id')[0]
+            if we_vote_setting.value_type == WeVoteSetting.STRING:
+                last_integer = convert_to_int(we_vote_setting.string_value or 0)
+            else:
+                last_integer = convert_to_int(we_vote_setting.integer_value or 0)
+            first_integer = last_integer + 1
+            last_integer += block_size
+            we_vote_setting.value_type = WeVoteSetting.INTEGER
+            we_vote_setting = self.set_setting_value_by_type(we_vote_setting, last_integer, WeVoteSetting.INTEGER)
+            we_vote_setting.save()
+
+        results = {
+            'success':          True,
+            'first_integer':    first_integer,
+            'last_integer':     last_integer,
+        }
+        return results
+
     def set_setting_value_by_type(self, we_vote_setting, setting_value, setting_type):
         if setting_type == WeVoteSetting.BOOLEAN:
             we_vote_setting.boolean_value = setting_value
@@ -164,127 +212,96 @@ def fetch_site_unique_id_prefix():
     return site_unique_id_prefix
 
 
-def fetch_next_we_vote_id_last_org_integer():
+def fetch_next_we_vote_id_integer(setting_name):
+    """
+    Return the next integer for a we_vote_id, like 'wv01org123'. We reserve WE_VOTE_ID_BLOCK_SIZE integers at a time
+    from the database and hand them out from this process, so most new objects do not need any queries for this.
+    The integers are unique across all workers, but not sequential: integers reserved by a process that stops are
+    never used.
+    :param setting_name: ex/ 'we_vote_id_last_org_integer'
+    :return:
+    """
+    with we_vote_id_integer_pool_lock:
+        integer_pool = we_vote_id_integer_pool.get(setting_name)
+        if integer_pool and integer_pool[0] <= integer_pool[1]:
+            next_integer = integer_pool[0]
+            integer_pool[0] += 1
+            return next_integer
+
+        we_vote_settings_manager = WeVoteSettingsManager()
+        if transaction.get_connection().in_atomic_block:
+            # If the surrounding transaction is rolled back, our reservation is rolled back with it. So we only
+            # reserve the one integer we use now, and never keep integers another worker might reserve again.
+            results = we_vote_settings_manager.reserve_integer_block(setting_name, 1)
+            return results['first_integer']
+
+        results = we_vote_settings_manager.reserve_integer_block(setting_name, WE_VOTE_ID_BLOCK_SIZE)
+        we_vote_id_integer_pool[setting_name] = [results['first_integer'] + 1, results['last_integer']]
+        return results['first_integer']
+
+
+def fetch_next_we_vote_id_integer_list(setting_name, integer_count):
+    """
+    Reserve integer_count integers for we_vote_ids at once, for code that creates many objects with bulk_create
+    (which doesn't call save). Inside a transaction, the reservation is rolled back along with the objects.
+    :param setting_name: ex/ 'we_vote_id_last_contest_office_integer'
+    :param integer_count:
+    :return:
+    """
+    if integer_count < 1:
+        return []
     we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_org_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_org_integer')
-    we_vote_id_last_org_integer = convert_to_int(we_vote_id_last_org_integer)
-    we_vote_id_last_org_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_org_integer', we_vote_id_last_org_integer)
-    return we_vote_id_last_org_integer
+    results = we_vote_settings_manager.reserve_integer_block(setting_name, integer_count)
+    return list(range(results['first_integer'], results['last_integer'] + 1))
+
+
+def fetch_next_we_vote_id_last_org_integer():
+    return fetch_next_we_vote_id_integer('we_vote_id_last_org_integer')
 
 
 def fetch_next_we_vote_id_last_position_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_position_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_position_integer')
-    we_vote_id_last_position_integer = convert_to_int(we_vote_id_last_position_integer)
-    we_vote_id_last_position_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_position_integer', we_vote_id_last_position_integer)
-    return we_vote_id_last_position_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_position_integer')
 
 
 def fetch_next_we_vote_id_last_candidate_campaign_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_candidate_campaign_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_candidate_campaign_integer')
-    we_vote_id_last_candidate_campaign_integer = convert_to_int(we_vote_id_last_candidate_campaign_integer)
-    we_vote_id_last_candidate_campaign_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_candidate_campaign_integer',
-                                          we_vote_id_last_candidate_campaign_integer)
-    return we_vote_id_last_candidate_campaign_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_candidate_campaign_integer')
 
 
 def fetch_next_we_vote_id_last_contest_office_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_contest_office_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_contest_office_integer')
-    we_vote_id_last_contest_office_integer = convert_to_int(we_vote_id_last_contest_office_integer)
-    we_vote_id_last_contest_office_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_contest_office_integer',
-                                          we_vote_id_last_contest_office_integer)
-    return we_vote_id_last_contest_office_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_contest_office_integer')
 
 
 def fetch_next_we_vote_id_last_contest_measure_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_contest_measure_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_contest_measure_integer')
-    we_vote_id_last_contest_measure_integer = convert_to_int(we_vote_id_last_contest_measure_integer)
-    we_vote_id_last_contest_measure_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_contest_measure_integer',
-                                          we_vote_id_last_contest_measure_integer)
-    return we_vote_id_last_contest_measure_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_contest_measure_integer')
 
 
 def fetch_next_we_vote_id_last_measure_campaign_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_measure_campaign_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_measure_campaign_integer')
-    we_vote_id_last_measure_campaign_integer = convert_to_int(we_vote_id_last_measure_campaign_integer)
-    we_vote_id_last_measure_campaign_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_measure_campaign_integer',
-                                          we_vote_id_last_measure_campaign_integer)
-    return we_vote_id_last_measure_campaign_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_measure_campaign_integer')
 
 
 def fetch_next_we_vote_id_last_politician_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_politician_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_politician_integer')
-    we_vote_id_last_politician_integer = convert_to_int(we_vote_id_last_politician_integer)
-    we_vote_id_last_politician_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_politician_integer',
-                                          we_vote_id_last_politician_integer)
-    return we_vote_id_last_politician_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_politician_integer')
 
 
 def fetch_next_we_vote_id_last_polling_location_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_polling_location_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_polling_location_integer')
-    we_vote_id_last_polling_location_integer = convert_to_int(we_vote_id_last_polling_location_integer)
-    we_vote_id_last_polling_location_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_polling_location_integer',
-                                          we_vote_id_last_polling_location_integer)
-    return we_vote_id_last_polling_location_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_polling_location_integer')
 
 
 def fetch_next_we_vote_id_last_quick_info_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_quick_info_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_quick_info_integer')
-    we_vote_id_last_quick_info_integer = convert_to_int(we_vote_id_last_quick_info_integer)
-    we_vote_id_last_quick_info_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_quick_info_integer', we_vote_id_last_quick_info_integer)
-    return we_vote_id_last_quick_info_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_quick_info_integer')
 
 
 def fetch_next_we_vote_id_last_quick_info_master_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_quick_info_master_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_quick_info_master_integer')
-    we_vote_id_last_quick_info_master_integer = convert_to_int(we_vote_id_last_quick_info_master_integer)
-    we_vote_id_last_quick_info_master_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_quick_info_master_integer',
-                                          we_vote_id_last_quick_info_master_integer)
-    return we_vote_id_last_quick_info_master_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_quick_info_master_integer')
 
 
 def fetch_next_we_vote_id_last_voter_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_voter_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_voter_integer')
-    we_vote_id_last_voter_integer = convert_to_int(we_vote_id_last_voter_integer)
-    we_vote_id_last_voter_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_voter_integer', we_vote_id_last_voter_integer)
-    return we_vote_id_last_voter_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_voter_integer')
 
 
 # Related to voter guide
 def fetch_next_we_vote_id_last_voter_guide_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_voter_guide_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_voter_guide_integer')
-    we_vote_id_last_voter_guide_integer = convert_to_int(we_vote_id_last_voter_guide_integer)
-    we_vote_id_last_voter_guide_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_voter_guide_integer', we_vote_id_last_voter_guide_integer)
-    return we_vote_id_last_voter_guide_integer
+    return fetch_next_we_vote_id_integer('we_vote_id_last_voter_guide_integer')
 
 
 def fetch_next_we_vote_election_id_integer():
@@ -0,0 +1,96 @@
+# wevote_settings/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from organization.models import Organization
+import threading
+import time
+from unittest import mock
+from wevote_settings.models import WeVoteSetting, WeVoteSettingsManager, fetch_next_we_vote_id_integer, \
+    fetch_site_unique_id_prefix, we_vote_id_integer_pool
+
+
+# TransactionTestCase, because fetch_next_we_vote_id_integer only keeps a pool of integers outside of a transaction,
+#  and so the threads below can see each other's work
+class WeVoteIdIntegerTestCase(TransactionTestCase):
+
+    def setUp(self):
+        we_vote_id_integer_pool.clear()
+        fetch_site_unique_id_prefix()
+
+    def tearDown(self):
+        we_vote_id_integer_pool.clear()
+
+    def run_in_threads(self, target, thread_count):
+        errors = []
+
+        def run_target():
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                # Each thread has its own database connection
+                connection.close()
+
+        thread_list = [threading.Thread(target=run_target) for thread_number in range(thread_count)]
+        for one_thread in thread_list:
+            one_thread.start()
+        for one_thread in thread_list:
+            one_thread.join()
+        self.assertEqual(errors, [])
+
+    def test_next_integer_continues_from_existing_setting(self):
+        WeVoteSettingsManager().save_setting('we_vote_id_last_org_integer', 41)
+        self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_org_integer'), 42)
+        self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_org_integer'), 43)
+        # The rest of the block is reserved, so other workers start after it
+        we_vote_setting = WeVoteSetting.objects.get(name='we_vote_id_last_org_integer')
+        self.assertEqual(we_vote_setting.integer_value, 41 + 100)
+
+    def test_reserve_integer_block_from_concurrent_workers(self):
+        # Each thread stands in for a separate gunicorn worker with its own pool
+        integer_blocks = []
+
+        def reserve_blocks():
+            we_vote_settings_manager = WeVoteSettingsManager()
+            for block_number in range(20):
+                results = we_vote_settings_manager.reserve_integer_block('we_vote_id_last_test_integer', 10)
+                integer_blocks.append(list(range(results['first_integer'], results['last_integer'] + 1)))
+
+        self.run_in_threads(reserve_blocks, 8)
+        integer_list = [one_integer for one_block in integer_blocks for one_integer in one_block]
+        self.assertEqual(len(integer_list), 8 * 20 * 10)
+        self.assertEqual(len(set(integer_list)), len(integer_list))
+
+    def test_no_duplicate_we_vote_ids_under_concurrent_inserts(self):
+        def create_organizations():
+            for organization_number in range(50):
+                Organization.objects.create(organization_name='Concurrent Org')
+
+        self.run_in_threads(create_organizations, 8)
+        we_vote_id_list = list(Organization.objects.values_list('we_vote_id', flat=True))
+        self.assertEqual(len(we_vote_id_list), 8 * 50)
+        self.assertEqual(len(set(we_vote_id_list)), len(we_vote_id_list))
+
+    def create_organizations_and_measure(self, organization_count):
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            for organization_number in range(organization_count):
+                Organization.objects.create(organization_name='Bulk Org')
+        return len(queries), time.time() - start_time
+
+    def test_benchmark_bulk_creates(self):
+        with mock.patch('wevote_settings.models.WE_VOTE_ID_BLOCK_SIZE', 1):
+            queries_before, seconds_before = self.create_organizations_and_measure(300)
+        we_vote_id_integer_pool.clear()
+        queries_after, seconds_after = self.create_organizations_and_measure(300)
+
+        print("300 Organization creates: one integer at a time {queries_before} queries {seconds_before:.3f}s, "
+              "blocks of 100 {queries_after} queries {seconds_after:.3f}s".format(
+                  queries_before=queries_before, seconds_before=seconds_before,
+                  queries_after=queries_after, seconds_after=seconds_after))
+        self.assertLess(queries_after, queries_before)
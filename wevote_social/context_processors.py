@@ -6,10 +6,11 @@
 def profile_photo(request):
     """Social template context processors"""
     context_extras = {}
-    if hasattr(request, 'facebook'):
+    facebook = getattr(request, 'facebook', None)
+    if facebook:
         context_extras = {
             'social': {
-                'profile_photo': request.facebook.profile_url()
+                'profile_photo': facebook.profile_url()
             }
         }
 
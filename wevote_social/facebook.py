@@ -6,11 +6,10 @@ from future.standard_library import install_aliases
 install_aliases()
 
 # from urllib.parse import urlparse, urlencode
-from urllib.request import urlopen, Request
 # from urllib.error import HTTPError
 import logging
-import json
 import wevote_functions.admin
+from wevote_functions.http_client import http_get, INTEGRATION_FACEBOOK
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -23,11 +22,11 @@ class FacebookAPI(object):
         self.social_user = social_user
 
     def fetch_friends(self):
-        request = self._request()
+        friends_url = self._request()
         friends = []
 
         try:
-            friends = json.loads(urlopen(request).read()).get('data')
+            friends = http_get(INTEGRATION_FACEBOOK, friends_url).json().get('data')
         except Exception as err:
             logger.error(err)
 
@@ -45,5 +44,4 @@ class FacebookAPI(object):
                   self.social_user.extra_data['access_token'],
               )
 
-        request = Request(url)
-        return request
+        return url
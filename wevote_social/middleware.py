@@ -11,17 +11,33 @@ from social.apps.django_app.middleware import SocialAuthExceptionMiddleware
 from django.core.urlresolvers import reverse
 from django.contrib import messages
 from django.http import HttpResponseRedirect
+from django.utils.functional import SimpleLazyObject
 from wevote_functions.functions import get_voter_api_device_id, positive_value_exists
+from wevote_functions.middleware import is_stateless_api_request
 
 
-class SocialMiddleware(object):
-    def process_request(self, request):
-        if request.user and hasattr(request.user, 'social_auth'):
+def get_facebook_api(request):
+    """
+    :return: A FacebookAPI for the signed in user's Facebook account, or None. We look it up once per request.
+    """
+    if not hasattr(request, '_cached_facebook_api'):
+        facebook_api = None
+        if hasattr(request, 'user') and hasattr(request.user, 'social_auth'):
             social_user = request.user.social_auth.filter(
                 provider='facebook',
             ).first()
             if social_user:
-                request.facebook = FacebookAPI(social_user)
+                facebook_api = FacebookAPI(social_user)
+        request._cached_facebook_api = facebook_api
+    return request._cached_facebook_api
+
+
+class SocialMiddleware(object):
+    def process_request(self, request):
+        # request.facebook is only looked up in the database when it is used. It is a FacebookAPI, or None when the
+        #  user hasn't signed in with Facebook. The stateless API requests don't get it at all.
+        if not is_stateless_api_request(request):
+            request.facebook = SimpleLazyObject(lambda: get_facebook_api(request))
 
         return None
 